@@ -0,0 +1,129 @@
+"""Generation counters that version the team, hierarchy-graph and summary caches.
+
+Cached team payloads fold the generations they depend on into their key: the global
+hierarchy generation plus either the generation of each business unit in scope or, for
+scopes that are not limited to units, the "any unit" generation bumped with every unit.
+A write bumps the counters it affects, so stale entries are never read again and simply
+expire.
+
+The counters are ``CacheGeneration`` rows, so every process sees a bump once it commits.
+Payloads and hit/miss counters live in the default cache: with the per-process LocMemCache
+each process keeps its own, a shared backend (``DJANGO_CACHE_BACKEND``) pools them.
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from core.models import CacheGeneration
+
+GLOBAL_GENERATION_KEY = "team_cache:gen:global"
+ANY_UNIT_GENERATION_KEY = "team_cache:gen:bu:any"
+UNIT_GENERATION_KEY = "team_cache:gen:bu:{}"
+STATS_KEY = "team_cache:stats:{}:{}"
+NAMESPACES = ("sales_team_rows", "team_personal_info", "sales_team_graph", "my_team_summary")
+
+
+def cache_ttl() -> int:
+    return int(getattr(settings, "TEAM_CACHE_TTL_SECONDS", 120))
+
+
+def shared_cache() -> bool:
+    """Whether the default cache is seen by every process (not a per-process LocMemCache)."""
+    return not settings.CACHES["default"]["BACKEND"].endswith("LocMemCache")
+
+
+def _seed() -> int:
+    # Una fila nueva arranca por encima de cualquier valor anterior (p. ej. una base recreada con el cache vivo).
+    return time.time_ns() // 1000
+
+
+def current_generations(keys: Iterable[str]) -> dict[str, int]:
+    """Values of the ``CacheGeneration`` rows in ``keys``, creating the missing ones."""
+    keys = list(keys)
+    found = dict(CacheGeneration.objects.filter(key__in=keys).values_list("key", "value"))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        CacheGeneration.objects.bulk_create([CacheGeneration(key=key, value=_seed()) for key in missing], ignore_conflicts=True)
+        found.update(CacheGeneration.objects.filter(key__in=missing).values_list("key", "value"))
+    return found
+
+
+def bump_generations(keys: Iterable[str]) -> None:
+    """Move every generation in ``keys``; readers in other processes see it once the transaction commits."""
+    keys = list(dict.fromkeys(keys))
+    if CacheGeneration.objects.filter(key__in=keys).update(value=F("value") + 1) == len(keys):
+        return
+    existing = set(CacheGeneration.objects.filter(key__in=keys).values_list("key", flat=True))
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        CacheGeneration.objects.bulk_create([CacheGeneration(key=key, value=_seed()) for key in missing], ignore_conflicts=True)
+
+
+def generation_token(business_unit_ids: Iterable[int] | None = None) -> str:
+    """Generations an entry depends on; ``None`` means every business unit."""
+    if business_unit_ids is None:
+        keys = [GLOBAL_GENERATION_KEY, ANY_UNIT_GENERATION_KEY]
+    else:
+        keys = [GLOBAL_GENERATION_KEY, *(UNIT_GENERATION_KEY.format(unit_id) for unit_id in sorted(set(business_unit_ids)))]
+    generations = current_generations(keys)
+    return ".".join(str(generations.get(key, 0)) for key in keys)
+
+
+def invalidate_team_caches(business_unit_ids: Iterable[int] = (), *, hierarchy: bool = False) -> None:
+    """Bump the units in ``business_unit_ids`` and, with ``hierarchy``, the global generation.
+
+    Use ``hierarchy`` for anything a scope can see from outside its units: roles, managers,
+    names and scope membership. Changes local to a rep or unit only need the unit.
+    """
+    units = sorted({unit_id for unit_id in business_unit_ids if unit_id})
+    keys = [GLOBAL_GENERATION_KEY] if hierarchy else []
+    if units:
+        keys += [ANY_UNIT_GENERATION_KEY, *(UNIT_GENERATION_KEY.format(unit_id) for unit_id in units)]
+    if keys:
+        bump_generations(keys)
+
+
+def record_lookup(namespace: str, hit: bool) -> None:
+    key = STATS_KEY.format(namespace, "hits" if hit else "misses")
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_or_build(namespace: str, key: str, build: Callable[[], Any], timeout: int | None = None) -> Any:
+    """Cached value of ``key`` or the result of ``build``, counting the lookup under ``namespace``."""
+    value = cache.get(key)
+    if value is not None:
+        record_lookup(namespace, True)
+        return value
+    record_lookup(namespace, False)
+    value = build()
+    cache.set(key, value, cache_ttl() if timeout is None else timeout)
+    return value
+
+
+def cache_stats(namespaces: Iterable[str] = NAMESPACES) -> dict[str, dict[str, float]]:
+    namespaces = list(namespaces)
+    keys = [STATS_KEY.format(namespace, outcome) for namespace in namespaces for outcome in ("hits", "misses")]
+    counts = cache.get_many(keys)
+    stats: dict[str, dict[str, float]] = {}
+    for namespace in namespaces:
+        hits = counts.get(STATS_KEY.format(namespace, "hits"), 0)
+        misses = counts.get(STATS_KEY.format(namespace, "misses"), 0)
+        lookups = hits + misses
+        stats[namespace] = {"hits": hits, "misses": misses, "hit_rate": round(hits / lookups * 100, 1) if lookups else 0.0}
+    return stats
+
+
+def reset_cache_stats(namespaces: Iterable[str] = NAMESPACES) -> None:
+    cache.delete_many([STATS_KEY.format(namespace, outcome) for namespace in namespaces for outcome in ("hits", "misses")])
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core.rbac.hierarchy import find_closure_drift
+from core.rbac.hierarchy import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the UserProfile.manager closure table, or check it for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift; do not rewrite the table.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drift = find_closure_drift()
+            if drift.is_clean:
+                self.stdout.write(self.style.SUCCESS("Hierarchy closure is in sync."))
+                return
+            for ancestor_id, descendant_id, depth in drift.missing[:20]:
+                self.stdout.write(f"missing: {ancestor_id} -> {descendant_id} (depth {depth})")
+            for ancestor_id, descendant_id, depth in drift.stale[:20]:
+                self.stdout.write(f"stale: {ancestor_id} -> {descendant_id} (depth {depth})")
+            raise CommandError(
+                f"Hierarchy closure drift: {len(drift.missing)} missing, {len(drift.stale)} stale rows."
+            )
+
+        total = rebuild_closure()
+        self.stdout.write(self.style.SUCCESS(f"Hierarchy closure rebuilt with {total} rows."))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.cache_generations import cache_stats
+from core.cache_generations import invalidate_team_caches
+from core.cache_generations import reset_cache_stats
+from core.cache_generations import shared_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Show hit/miss counters of the team, hierarchy graph and summary caches; --invalidate bumps "
+        "the global generation (after update() or SQL that skipped signals), --reset zeroes the counters. "
+        "Counters are only pooled across processes with a shared cache backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--invalidate", action="store_true", help="Discard every cached team payload.")
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        if not shared_cache():
+            # Con LocMemCache este proceso no ve los contadores del servidor web ni de los workers.
+            self.stdout.write(self.style.WARNING("Per-process cache backend: counters below only cover this command."))
+        for namespace, stats in cache_stats().items():
+            self.stdout.write(f"{namespace}: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']}% hits)")
+        if options["reset"]:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
+        if options["invalidate"]:
+            invalidate_team_caches(hierarchy=True)
+            self.stdout.write(self.style.SUCCESS("Team caches invalidated."))
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_hierarchy_closure(apps, schema_editor):
+    UserProfile = apps.get_model("core", "UserProfile")
+    UserHierarchyClosure = apps.get_model("core", "UserHierarchyClosure")
+
+    manager_by_user = {}
+    for user_id, manager_id in UserProfile.objects.values_list("user_id", "manager_id"):
+        manager_by_user[user_id] = manager_id
+        if manager_id is not None:
+            manager_by_user.setdefault(manager_id, None)
+
+    rows = []
+    for user_id in manager_by_user:
+        path = []
+        current = user_id
+        while current is not None and current not in path:
+            path.append(current)
+            current = manager_by_user.get(current)
+        for depth, ancestor_id in enumerate(path):
+            rows.append(UserHierarchyClosure(ancestor_id=ancestor_id, descendant_id=user_id, depth=depth))
+
+    UserHierarchyClosure.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_alter_role_code_alter_rolechangeaudit_new_role_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserHierarchyClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_descendant_links', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_ancestor_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='core_hier_desc_depth_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(backfill_hierarchy_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from typing import Any
+
+_MISSING = object()
+
+
+class DirtyFieldsMixin:
+    """Remember the values of ``tracked_fields`` as loaded from the database.
+
+    The snapshot is taken in ``from_db`` and refreshed after every ``save`` (once
+    ``post_save`` receivers have run), so signal handlers can compare the
+    instance against its stored state without an extra query.
+    """
+
+    tracked_fields: tuple[str, ...] = ()
+
+    @classmethod
+    def _tracked_attnames(cls) -> dict[str, str]:
+        return {name: cls._meta.get_field(name).attname for name in cls.tracked_fields}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None) -> None:
+        loaded = self.__dict__.setdefault("_loaded_values", {})
+        for name, attname in self._tracked_attnames().items():
+            if fields is not None and name not in fields and attname not in fields:
+                continue
+            if attname in self.__dict__:
+                loaded[name] = self.__dict__[attname]
+
+    def is_field_loaded(self, name: str) -> bool:
+        return name in self.__dict__.get("_loaded_values", {})
+
+    def get_loaded_value(self, name: str, default: Any = None) -> Any:
+        return self.__dict__.get("_loaded_values", {}).get(name, default)
+
+    def get_dirty_fields(self) -> dict[str, Any]:
+        """Tracked fields whose current value differs from the loaded one, mapped to the loaded value."""
+        loaded = self.__dict__.get("_loaded_values", {})
+        dirty: dict[str, Any] = {}
+        for name, attname in self._tracked_attnames().items():
+            previous = loaded.get(name, _MISSING)
+            current = self.__dict__.get(attname, _MISSING)
+            if previous is _MISSING or current is _MISSING:
+                continue
+            if previous != current:
+                dirty[name] = previous
+        return dirty
+
+    def has_field_changed(self, name: str) -> bool:
+        return name in self.get_dirty_fields()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._snapshot_tracked_fields(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._snapshot_tracked_fields(fields)
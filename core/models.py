@@ -4,7 +4,9 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
 from django.db import models
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
 from django.dispatch import receiver
 
 from core.rbac.constants import ModuleCode
@@ -154,6 +156,39 @@ class UserProfile(models.Model):
         return self.role in {RoleCode.PARTNER, RoleCode.ADMINISTRADOR, RoleCode.JR_PARTNER} or self.user.is_superuser
 
 
+class UserHierarchyClosure(models.Model):
+    """Materialized ancestor/descendant pairs of the ``UserProfile.manager`` tree.
+
+    Every node has a ``depth=0`` row pointing to itself, so "descendants of X"
+    and "is Y under X" are single indexed lookups on ``ancestor``.
+    """
+
+    ancestor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="hierarchy_descendant_links")
+    descendant = models.ForeignKey(User, on_delete=models.CASCADE, related_name="hierarchy_ancestor_links")
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("ancestor", "descendant")
+        indexes = [models.Index(fields=["descendant", "depth"], name="core_hier_desc_depth_idx")]
+
+    def __str__(self) -> str:
+        return f"{self.ancestor_id} -> {self.descendant_id} ({self.depth})"
+
+
+class CacheGeneration(models.Model):
+    """Version counter of a cache kept in process memory or in a per-process cache backend.
+
+    Readers compare the value with the one their copy was built for; living in the database,
+    a bump is seen by every web and worker process as soon as its transaction commits.
+    """
+
+    key = models.CharField(max_length=120, unique=True)
+    value = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f"{self.key}={self.value}"
+
+
 class RoleChangeAudit(models.Model):
     actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name="role_changes_performed")
     target = models.ForeignKey(User, on_delete=models.CASCADE, related_name="role_changes_received")
@@ -182,3 +217,44 @@ def ensure_user_profile(sender, instance, created, **kwargs):
         instance.profile.role = RoleCode.PARTNER
         instance.profile.role_ref = partner_role
         instance.profile.save(update_fields=["role", "role_ref"])
+
+
+@receiver(post_save, sender=UserProfile)
+def sync_user_hierarchy_closure(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if not created and update_fields is not None and not {"manager", "manager_id"} & set(update_fields):
+        return
+
+    from core.rbac.hierarchy import sync_user_manager
+
+    sync_user_manager(instance.user_id, instance.manager_id)
+
+
+@receiver(pre_delete, sender=UserProfile)
+def detach_user_hierarchy_closure(sender, instance, **kwargs):
+    from core.rbac.hierarchy import sync_user_manager
+
+    # Sin perfil el usuario deja de colgar de su manager, pero conserva su subarbol.
+    sync_user_manager(instance.user_id, None)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=ModulePermission)
+@receiver(post_delete, sender=ModulePermission)
+@receiver(post_save, sender=RoleModulePermission)
+@receiver(post_delete, sender=RoleModulePermission)
+def invalidate_role_permission_cache(sender, **kwargs):
+    from core.rbac.permissions import invalidate_permission_cache
+
+    invalidate_permission_cache()
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def invalidate_team_caches_on_role_write(sender, **kwargs):
+    from core.cache_generations import invalidate_team_caches
+
+    # Prioridad y nombre del rol se copian en las filas de equipo de todas las unidades.
+    invalidate_team_caches(hierarchy=True)
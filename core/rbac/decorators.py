@@ -14,7 +14,8 @@ def require_module_permission(module: str, action: str):
     def decorator(view_func):
         @wraps(view_func)
         def _wrapped(request, *args, **kwargs):
-            if not has_module_permission(request.user, module=module, action=action):
+            context = getattr(request, "rbac", None)
+            if not has_module_permission(request.user, module=module, action=action, context=context):
                 return HttpResponseForbidden("No autorizado")
             return view_func(request, *args, **kwargs)
 
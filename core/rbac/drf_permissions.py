@@ -17,4 +17,5 @@ class RBACModulePermission(BasePermission):
         action = getattr(view, "required_action", self.required_action)
         if not module:
             return False
-        return has_module_permission(request.user, module=module, action=action)
+        context = getattr(request, "rbac", None)
+        return has_module_permission(request.user, module=module, action=action, context=context)
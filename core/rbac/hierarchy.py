@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from core.models import UserHierarchyClosure
+from core.models import UserProfile
+
+BULK_BATCH_SIZE = 2000
+
+
+@dataclass(frozen=True)
+class ClosureDrift:
+    missing: tuple[tuple[int, int, int], ...]
+    stale: tuple[tuple[int, int, int], ...]
+
+    @property
+    def is_clean(self) -> bool:
+        return not self.missing and not self.stale
+
+
+def descendant_user_ids(user_id: int, *, include_self: bool = True) -> set[int]:
+    qs = UserHierarchyClosure.objects.filter(ancestor_id=user_id)
+    if not include_self:
+        qs = qs.filter(depth__gt=0)
+    ids = set(qs.values_list("descendant_id", flat=True))
+    if include_self:
+        ids.add(int(user_id))
+    return ids
+
+
+def ancestor_user_ids(user_id: int) -> list[int]:
+    """Managers above ``user_id``, nearest first."""
+    return list(
+        UserHierarchyClosure.objects.filter(descendant_id=user_id, depth__gt=0)
+        .order_by("depth")
+        .values_list("ancestor_id", flat=True)
+    )
+
+
+def is_descendant(ancestor_id: int, descendant_id: int) -> bool:
+    if ancestor_id == descendant_id:
+        return False
+    return UserHierarchyClosure.objects.filter(
+        ancestor_id=ancestor_id,
+        descendant_id=descendant_id,
+        depth__gt=0,
+    ).exists()
+
+
+@transaction.atomic
+def sync_user_manager(user_id: int, manager_id: int | None) -> None:
+    """Re-hang ``user_id`` (and its whole subtree) under ``manager_id``."""
+    links = dict(
+        UserHierarchyClosure.objects.filter(descendant_id=user_id, depth__lte=1).values_list("depth", "ancestor_id")
+    )
+    if 0 not in links:
+        UserHierarchyClosure.objects.create(ancestor_id=user_id, descendant_id=user_id, depth=0)
+    elif links.get(1) == manager_id:
+        return
+
+    subtree = dict(UserHierarchyClosure.objects.filter(ancestor_id=user_id).values_list("descendant_id", "depth"))
+    subtree_ids = UserHierarchyClosure.objects.filter(ancestor_id=user_id).values("descendant_id")
+    UserHierarchyClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+    # Un manager dentro del propio subarbol crearia un ciclo: el nodo queda como raiz.
+    if manager_id is None or manager_id in subtree:
+        return
+
+    ancestors = list(UserHierarchyClosure.objects.filter(descendant_id=manager_id).values_list("ancestor_id", "depth"))
+    if not ancestors:
+        UserHierarchyClosure.objects.create(ancestor_id=manager_id, descendant_id=manager_id, depth=0)
+        ancestors = [(manager_id, 0)]
+
+    UserHierarchyClosure.objects.bulk_create(
+        (
+            UserHierarchyClosure(ancestor_id=ancestor_id, descendant_id=node_id, depth=ancestor_depth + 1 + node_depth)
+            for ancestor_id, ancestor_depth in ancestors
+            for node_id, node_depth in subtree.items()
+        ),
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+
+def iter_closure_rows(edges: Iterable[tuple[int, int | None]]) -> Iterator[tuple[int, int, int]]:
+    """Yield ``(ancestor, descendant, depth)`` for a ``(user_id, manager_id)`` edge list.
+
+    Cycles are broken at their lowest user id, which is then treated as a root.
+    """
+    manager_by_user: dict[int, int | None] = {}
+    for user_id, manager_id in edges:
+        manager_by_user[user_id] = manager_id
+        if manager_id is not None:
+            manager_by_user.setdefault(manager_id, None)
+
+    children: dict[int, list[int]] = {}
+    for user_id, manager_id in manager_by_user.items():
+        if manager_id is not None and manager_id != user_id:
+            children.setdefault(manager_id, []).append(user_id)
+
+    placed: set[int] = set()
+
+    def walk(root_id: int) -> Iterator[tuple[int, int, int]]:
+        stack: list[tuple[int, tuple[int, ...]]] = [(root_id, ())]
+        while stack:
+            node_id, path = stack.pop()
+            if node_id in placed:
+                continue
+            placed.add(node_id)
+            yield node_id, node_id, 0
+            for depth, ancestor_id in enumerate(reversed(path), start=1):
+                yield ancestor_id, node_id, depth
+            child_path = (*path, node_id)
+            for child_id in children.get(node_id, ()):
+                stack.append((child_id, child_path))
+
+    for user_id in sorted(manager_by_user):
+        manager_id = manager_by_user[user_id]
+        if manager_id is None or manager_id == user_id:
+            yield from walk(user_id)
+    for user_id in sorted(manager_by_user):
+        if user_id not in placed:
+            yield from walk(user_id)
+
+
+def _profile_edges() -> list[tuple[int, int | None]]:
+    return list(UserProfile.objects.values_list("user_id", "manager_id"))
+
+
+@transaction.atomic
+def rebuild_closure() -> int:
+    UserHierarchyClosure.objects.all().delete()
+    rows = [
+        UserHierarchyClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for ancestor_id, descendant_id, depth in iter_closure_rows(_profile_edges())
+    ]
+    UserHierarchyClosure.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+    return len(rows)
+
+
+def find_closure_drift() -> ClosureDrift:
+    expected = set(iter_closure_rows(_profile_edges()))
+    actual = set(UserHierarchyClosure.objects.values_list("ancestor_id", "descendant_id", "depth"))
+    return ClosureDrift(
+        missing=tuple(sorted(expected - actual)),
+        stale=tuple(sorted(actual - expected)),
+    )
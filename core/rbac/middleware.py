@@ -2,8 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 
-from core.models import RoleModulePermission
-from core.rbac.services import get_profile
+from core.rbac.permissions import get_role_permissions
 from core.rbac.services import get_role_code
 from core.rbac.constants import role_priority
 
@@ -12,7 +11,8 @@ from core.rbac.constants import role_priority
 class RBACRequestContext:
     role_code: str | None
     role_priority: int
-    permissions: tuple[tuple[str, str], ...]
+    permissions: frozenset[tuple[str, str]]
+    user_id: int | None = None
 
 
 class RBACContextMiddleware:
@@ -22,22 +22,15 @@ class RBACContextMiddleware:
     def __call__(self, request):
         user = getattr(request, "user", None)
         if user and user.is_authenticated:
-            profile = get_profile(user)
             code = get_role_code(user)
-            if user.is_superuser:
-                permissions = tuple()
-            else:
-                permissions = tuple(
-                    RoleModulePermission.objects.filter(role__code=code, allowed=True)
-                    .values_list("permission__module", "permission__action")
-                    .distinct()
-                )
+            permissions = frozenset() if user.is_superuser else get_role_permissions(code)
             request.rbac = RBACRequestContext(
                 role_code=code,
                 role_priority=999 if user.is_superuser else role_priority(code),
                 permissions=permissions,
+                user_id=user.pk,
             )
         else:
-            request.rbac = RBACRequestContext(role_code=None, role_priority=0, permissions=tuple())
+            request.rbac = RBACRequestContext(role_code=None, role_priority=0, permissions=frozenset())
 
         return self.get_response(request)
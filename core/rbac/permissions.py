@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import threading
+
+from core.cache_generations import bump_generations
+from core.cache_generations import current_generations
+from core.models import RoleModulePermission
+
+PERMISSIONS_GENERATION_KEY = "rbac:permissions"
+
+_matrix_lock = threading.Lock()
+_matrix_state: dict[str, object] = {"version": None, "matrix": {}}
+
+
+def _current_version() -> int:
+    return current_generations([PERMISSIONS_GENERATION_KEY])[PERMISSIONS_GENERATION_KEY]
+
+
+def invalidate_permission_cache() -> None:
+    """Discard the role->permission matrix of every process once the current transaction commits."""
+    bump_generations([PERMISSIONS_GENERATION_KEY])
+
+
+def _load_matrix() -> dict[str, frozenset[tuple[str, str]]]:
+    matrix: dict[str, set[tuple[str, str]]] = {}
+    rows = RoleModulePermission.objects.filter(allowed=True, role__is_active=True).values_list(
+        "role__code",
+        "permission__module",
+        "permission__action",
+    )
+    for role_code, module, action in rows:
+        matrix.setdefault(role_code, set()).add((module, action))
+    return {role_code: frozenset(pairs) for role_code, pairs in matrix.items()}
+
+
+def get_role_permission_matrix() -> dict[str, frozenset[tuple[str, str]]]:
+    version = _current_version()
+    if _matrix_state["version"] == version:
+        return _matrix_state["matrix"]  # type: ignore[return-value]
+
+    with _matrix_lock:
+        if _matrix_state["version"] != version:
+            _matrix_state["matrix"] = _load_matrix()
+            _matrix_state["version"] = version
+        return _matrix_state["matrix"]  # type: ignore[return-value]
+
+
+def get_role_permissions(role_code: str | None) -> frozenset[tuple[str, str]]:
+    if not role_code:
+        return frozenset()
+    return get_role_permission_matrix().get(role_code, frozenset())
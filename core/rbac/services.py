@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied
 from django.db import transaction
 
+from core.cache_generations import invalidate_team_caches
 from core.models import ModulePermission
 from core.models import Role
 from core.models import RoleChangeAudit
@@ -15,6 +16,8 @@ from core.rbac.constants import PermissionAction
 from core.rbac.constants import RoleCode
 from core.rbac.constants import is_global_role
 from core.rbac.constants import role_priority
+from core.rbac.hierarchy import is_descendant
+from core.rbac.permissions import get_role_permissions
 
 User = get_user_model()
 
@@ -34,45 +37,28 @@ def get_role_code(user: User) -> str | None:
 
 
 def is_descendant_user(manager: User, target: User) -> bool:
-    if manager.pk == target.pk:
-        return False
+    return is_descendant(manager.pk, target.pk)
 
-    pending = [manager.pk]
-    visited: set[int] = set()
-    while pending:
-        current_id = pending.pop()
-        if current_id in visited:
-            continue
-        visited.add(current_id)
-        children = list(
-            UserProfile.objects.filter(manager_id=current_id).values_list("user_id", flat=True)
-        )
-        if target.pk in children:
-            return True
-        pending.extend(children)
-    return False
 
+def has_module_permission(user: User, module: str, action: str, *, context=None) -> bool:
+    """Check a module permission without touching the database.
 
-def has_module_permission(user: User, module: str, action: str) -> bool:
+    ``context`` is the request-scoped ``RBACRequestContext``; when it belongs to
+    ``user`` its snapshot is reused, otherwise the cached role matrix is used.
+    """
     if user.is_superuser:
         return True
 
-    role_code = get_role_code(user)
-    if not role_code:
-        return False
+    if context is not None and context.user_id == user.pk and context.role_code:
+        role_code = context.role_code
+        permissions = context.permissions
+    else:
+        role_code = get_role_code(user)
+        if not role_code:
+            return False
+        permissions = get_role_permissions(role_code)
 
-    db_permission = (
-        RoleModulePermission.objects.filter(
-            role__code=role_code,
-            permission__module=module,
-            permission__action=action,
-            allowed=True,
-            role__is_active=True,
-        )
-        .select_related("permission", "role")
-        .exists()
-    )
-    if db_permission:
+    if (module, action) in permissions:
         return True
 
     defaults = DEFAULT_ROLE_PERMISSIONS.get(role_code, {})
@@ -174,6 +160,8 @@ def assign_role(
             new_role=role_obj.code,
             reason=reason.strip(),
         )
+        # Explicito: el cambio de rol no depende de que la app dashboard tenga sus signals registrados.
+        invalidate_team_caches(hierarchy=True)
 
     return profile
 
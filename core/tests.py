@@ -1,19 +1,41 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from core.cache_generations import UNIT_GENERATION_KEY
+from core.cache_generations import cache_stats
+from core.cache_generations import generation_token
+from core.cache_generations import get_or_build
+from core.cache_generations import invalidate_team_caches
+from core.models import CacheGeneration
 from core.models import ModulePermission
 from core.models import Role
 from core.models import RoleChangeAudit
+from core.models import RoleModulePermission
+from core.models import UserHierarchyClosure
 from core.models import UserProfile
 from core.rbac.constants import ModuleCode
+from core.rbac.constants import PermissionAction
 from core.rbac.constants import RoleCode
+from core.rbac.hierarchy import ancestor_user_ids
+from core.rbac.hierarchy import descendant_user_ids
+from core.rbac.hierarchy import find_closure_drift
+from core.rbac.permissions import PERMISSIONS_GENERATION_KEY
 from core.rbac.services import assign_role
 from core.rbac.services import can_approve
 from core.rbac.services import can_manage
 from core.rbac.services import can_view
 from core.rbac.services import ensure_seeded_roles_and_permissions
+from core.rbac.services import has_module_permission
 
 User = get_user_model()
 
@@ -116,3 +138,186 @@ class DecoratorIntegrationTests(RBACBaseTestCase):
         denied = self.client.get(reverse("core:rbac_manage_user", kwargs={"user_id": self.outside.id}))
         self.assertEqual(allowed.status_code, 200)
         self.assertEqual(denied.status_code, 403)
+
+
+class HierarchyClosureTests(RBACBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.partner = User.objects.create_user(username="closure_partner", password="secretpass123")
+        self.manager = User.objects.create_user(username="closure_manager", password="secretpass123")
+        self.advisor = User.objects.create_user(username="closure_advisor", password="secretpass123")
+        self.consultant = User.objects.create_user(username="closure_consultant", password="secretpass123")
+        self.other_manager = User.objects.create_user(username="closure_other", password="secretpass123")
+
+        self.set_role(self.partner, RoleCode.PARTNER)
+        self.set_role(self.manager, RoleCode.MANAGER, manager=self.partner)
+        self.set_role(self.advisor, RoleCode.SOLAR_ADVISOR, manager=self.manager)
+        self.set_role(self.consultant, RoleCode.SOLAR_CONSULTANT, manager=self.advisor)
+        self.set_role(self.other_manager, RoleCode.MANAGER, manager=self.partner)
+
+    def test_descendants_and_depth_are_materialized(self):
+        self.assertEqual(
+            descendant_user_ids(self.manager.id),
+            {self.manager.id, self.advisor.id, self.consultant.id},
+        )
+        self.assertEqual(ancestor_user_ids(self.consultant.id), [self.advisor.id, self.manager.id, self.partner.id])
+        self.assertEqual(
+            UserHierarchyClosure.objects.get(ancestor=self.partner, descendant=self.consultant).depth,
+            3,
+        )
+
+    def test_descendant_check_is_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(can_manage(self.manager, self.consultant))
+
+    def test_moving_a_subtree_relinks_all_descendants(self):
+        self.set_role(self.advisor, RoleCode.SOLAR_ADVISOR, manager=self.other_manager)
+
+        self.assertEqual(descendant_user_ids(self.manager.id), {self.manager.id})
+        self.assertIn(self.consultant.id, descendant_user_ids(self.other_manager.id))
+        self.assertEqual(
+            ancestor_user_ids(self.consultant.id),
+            [self.advisor.id, self.other_manager.id, self.partner.id],
+        )
+        self.assertTrue(find_closure_drift().is_clean)
+
+    def test_assign_role_with_new_manager_updates_closure(self):
+        assign_role(
+            actor=self.partner,
+            target=self.consultant,
+            new_role_code=RoleCode.SOLAR_ADVISOR,
+            manager=self.other_manager,
+        )
+        self.assertFalse(can_manage(self.advisor, self.consultant))
+        self.assertIn(self.consultant.id, descendant_user_ids(self.other_manager.id))
+
+    def test_deleting_a_manager_detaches_its_subtree(self):
+        self.manager.delete()
+
+        self.assertEqual(ancestor_user_ids(self.advisor.id), [])
+        self.assertEqual(ancestor_user_ids(self.consultant.id), [self.advisor.id])
+        self.assertNotIn(self.consultant.id, descendant_user_ids(self.partner.id))
+        self.assertTrue(find_closure_drift().is_clean)
+
+    def test_manager_cycle_is_not_linked(self):
+        self.set_role(self.manager, RoleCode.MANAGER, manager=self.consultant)
+        self.assertEqual(ancestor_user_ids(self.manager.id), [])
+        self.assertFalse(can_manage(self.consultant, self.manager))
+
+    def test_rebuild_command_repairs_drift(self):
+        UserHierarchyClosure.objects.filter(descendant=self.consultant).delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_hierarchy_closure", check=True, stdout=StringIO())
+
+        call_command("rebuild_hierarchy_closure", stdout=StringIO())
+        call_command("rebuild_hierarchy_closure", check=True, stdout=StringIO())
+        self.assertEqual(ancestor_user_ids(self.consultant.id), [self.advisor.id, self.manager.id, self.partner.id])
+
+
+class PermissionSnapshotTests(RBACBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = User.objects.create_user(username="snapshot_manager", password="secretpass123")
+        self.consultant = User.objects.create_user(username="snapshot_consultant", password="secretpass123")
+        self.set_role(self.manager, RoleCode.MANAGER)
+        self.set_role(self.consultant, RoleCode.SOLAR_CONSULTANT, manager=self.manager)
+
+    def test_module_decorator_reuses_request_snapshot(self):
+        self.client.login(username="snapshot_manager", password="secretpass123")
+        self.client.get(reverse("core:rbac_health"))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("core:rbac_health"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if "core_rolemodulepermission" in q["sql"]])
+
+    def test_matrix_is_cached_between_checks(self):
+        has_module_permission(self.manager, ModuleCode.REPORTS, PermissionAction.VIEW)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(has_module_permission(self.manager, ModuleCode.REPORTS, PermissionAction.VIEW))
+            self.assertFalse(has_module_permission(self.manager, ModuleCode.SETTINGS, PermissionAction.MANAGE))
+        # Solo se lee la generacion de permisos, no la matriz.
+        self.assertFalse([q for q in ctx.captured_queries if "core_rolemodulepermission" in q["sql"]])
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_permission_changes_invalidate_cached_matrix(self):
+        self.assertFalse(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+        grant = RoleModulePermission.objects.create(
+            role=Role.objects.get(code=RoleCode.SOLAR_CONSULTANT),
+            permission=ModulePermission.objects.get(module=ModuleCode.SETTINGS, action=PermissionAction.VIEW),
+        )
+        self.assertTrue(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+        grant.delete()
+        self.assertFalse(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+    def test_matrix_reloads_when_another_process_bumps_the_generation(self):
+        self.assertFalse(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+        # Otro proceso: escribe sin pasar por los signals de este y solo mueve la fila de generacion.
+        RoleModulePermission.objects.bulk_create([
+            RoleModulePermission(
+                role=Role.objects.get(code=RoleCode.SOLAR_CONSULTANT),
+                permission=ModulePermission.objects.get(module=ModuleCode.SETTINGS, action=PermissionAction.VIEW),
+            )
+        ])
+        self.assertFalse(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+        CacheGeneration.objects.filter(key=PERMISSIONS_GENERATION_KEY).update(value=F("value") + 1)
+        self.assertTrue(has_module_permission(self.consultant, ModuleCode.SETTINGS, PermissionAction.VIEW))
+
+
+class TeamCacheGenerationTests(RBACBaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_unit_writes_only_move_their_unit_and_the_any_unit_generation(self):
+        unit_one, unit_two, everything = generation_token([1]), generation_token([2]), generation_token()
+
+        invalidate_team_caches([1])
+        self.assertNotEqual(generation_token([1]), unit_one)
+        self.assertEqual(generation_token([2]), unit_two)
+        self.assertNotEqual(generation_token(), everything)
+
+        unit_two = generation_token([2])
+        invalidate_team_caches(hierarchy=True)
+        self.assertNotEqual(generation_token([2]), unit_two)
+
+    def test_bumps_from_another_process_are_seen(self):
+        built = []
+        token = generation_token([1])
+        get_or_build("sales_team_rows", f"gen-test:{token}", lambda: built.append(1) or [])
+
+        # Otro proceso (web o worker) confirma un cambio: solo comparte la base de datos.
+        CacheGeneration.objects.filter(key=UNIT_GENERATION_KEY.format(1)).update(value=F("value") + 1)
+        self.assertNotEqual(generation_token([1]), token)
+        get_or_build("sales_team_rows", f"gen-test:{generation_token([1])}", lambda: built.append(1) or [])
+        self.assertEqual(len(built), 2)
+
+    def test_role_writes_and_assign_role_move_the_global_generation(self):
+        admin = User.objects.create_user(username="gen_admin", password="secretpass123", is_superuser=True)
+        target = User.objects.create_user(username="gen_target", password="secretpass123")
+        before = generation_token([1])
+        assign_role(actor=admin, target=target, new_role_code=RoleCode.MANAGER)
+        self.assertNotEqual(generation_token([1]), before)
+
+        before = generation_token([1])
+        role = Role.objects.get(code=RoleCode.MANAGER)
+        role.name = "Gerente"
+        role.save(update_fields=["name"])
+        self.assertNotEqual(generation_token([1]), before)
+
+    def test_lookups_are_counted_per_namespace(self):
+        built = []
+        for _ in range(3):
+            get_or_build("my_team_summary", "gen-test", lambda: built.append(1) or {"total": 1})
+        self.assertEqual(len(built), 1)
+        self.assertEqual(cache_stats()["my_team_summary"], {"hits": 2, "misses": 1, "hit_rate": 66.7})
+        self.assertEqual(cache_stats()["sales_team_rows"]["hit_rate"], 0.0)
+
+        out = StringIO()
+        call_command("team_cache_stats", "--reset", stdout=out)
+        self.assertIn("my_team_summary: 2 hits, 1 misses (66.7% hits)", out.getvalue())
+        self.assertEqual(cache_stats()["my_team_summary"]["hits"], 0)
@@ -464,3 +464,29 @@ class CrmDealExcelUploadForm(forms.Form):
         if extension not in self.ALLOWED_EXTENSIONS:
             raise ValidationError("Formato no soportado. Usa .xlsx, .xlsm, .xltx o .xltm.")
         return file_obj
+
+
+class LeadImportUploadForm(forms.Form):
+    ALLOWED_EXTENSIONS = {".csv", ".xlsx", ".xlsm"}
+
+    report_file = forms.FileField(label="Listado de prospectos (CSV o Excel)")
+    sales_rep = forms.ModelChoiceField(label="Asignar a", queryset=SalesRep.objects.none())
+    sheet_name = forms.CharField(label="Hoja (opcional)", max_length=120, required=False)
+    dry_run = forms.BooleanField(label="Solo validar (no guardar cambios)", required=False)
+
+    def __init__(self, *args, **kwargs):
+        salesrep_queryset = kwargs.pop("salesrep_queryset", SalesRep.objects.none())
+        super().__init__(*args, **kwargs)
+        self.fields["sales_rep"].queryset = salesrep_queryset
+        self.fields["sales_rep"].label_from_instance = lambda rep: rep.user.get_full_name().strip() or rep.user.get_username()
+        self.fields["report_file"].widget.attrs["class"] = "form-control"
+        self.fields["sales_rep"].widget.attrs["class"] = "form-select"
+        self.fields["sheet_name"].widget.attrs["class"] = "form-control"
+        self.fields["dry_run"].widget.attrs["class"] = "form-check-input"
+
+    def clean_report_file(self):
+        file_obj = self.cleaned_data.get("report_file")
+        extension = Path((getattr(file_obj, "name", "") or "")).suffix.lower()
+        if extension not in self.ALLOWED_EXTENSIONS:
+            raise ValidationError("Formato no soportado. Usa .csv, .xlsx o .xlsm.")
+        return file_obj
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from crm.services import find_fingerprint_drift
+from crm.services import rebuild_lead_fingerprints
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lead duplicate fingerprints from Lead, or check them for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift; do not rewrite the fingerprints.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drift = find_fingerprint_drift()
+            if drift:
+                raise CommandError(f"{drift} leads have out-of-sync fingerprints; run rebuild_lead_fingerprints.")
+            self.stdout.write(self.style.SUCCESS("Lead fingerprints are in sync."))
+            return
+
+        written = rebuild_lead_fingerprints()
+        self.stdout.write(self.style.SUCCESS(f"Lead fingerprints rebuilt: {written} rows."))
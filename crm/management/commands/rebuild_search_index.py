@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from crm.search import find_search_drift
+from crm.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the lead/deal search documents (and the FTS table on SQLite), or check them for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift; do not rewrite the index.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drift = find_search_drift()
+            if drift:
+                raise CommandError(f"{drift} leads/deals have out-of-sync search documents; run rebuild_search_index.")
+            self.stdout.write(self.style.SUCCESS("Search index is in sync."))
+            return
+
+        written = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt: {written} documents."))
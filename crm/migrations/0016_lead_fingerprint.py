@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:17
+
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada de LeadFingerprint.hash_key / service_key.
+def _hash_key(value):
+    return (value or "").strip().lower()
+
+
+def _service_key(account_number, meter_number, location_id):
+    parts = [(value or "").strip().upper() for value in (account_number, meter_number, location_id)]
+    if not all(parts):
+        return ""
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    Lead = apps.get_model("crm", "Lead")
+    LeadFingerprint = apps.get_model("crm", "LeadFingerprint")
+    InvoiceDuplicateOverride = apps.get_model("crm", "InvoiceDuplicateOverride")
+    rows = []
+    leads = Lead.objects.values_list("pk", "electricity_invoice_hash", "invoice_hash", "account_number", "meter_number", "location_id")
+    for pk, electricity_hash, invoice_hash, account, meter, location in leads.iterator(chunk_size=2000):
+        for key in {_hash_key(electricity_hash), _hash_key(invoice_hash)} - {""}:
+            rows.append(LeadFingerprint(lead_id=pk, kind="hash", key=key))
+        service_key = _service_key(account, meter, location)
+        if service_key:
+            rows.append(LeadFingerprint(lead_id=pk, kind="service", key=service_key))
+    LeadFingerprint.objects.bulk_create(rows, batch_size=1000)
+
+    overrides = list(InvoiceDuplicateOverride.objects.all())
+    for override in overrides:
+        override.hash_key = _hash_key(override.invoice_hash)
+        override.service_key = _service_key(override.account_number, override.meter_number, override.location_id)
+    InvoiceDuplicateOverride.objects.bulk_update(overrides, ["hash_key", "service_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0015_crmdeal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceduplicateoverride',
+            name='hash_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='invoiceduplicateoverride',
+            name='service_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='LeadFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('hash', 'Hash de factura'), ('service', 'Cuenta + contador + localidad')], max_length=10)),
+                ('lead', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fingerprints', to='crm.lead')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('key', 'kind', 'lead'), name='crm_leadfingerprint_key_kind_lead_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
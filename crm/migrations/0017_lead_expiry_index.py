@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0016_lead_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leadactivitylog',
+            name='activity_type',
+            field=models.CharField(choices=[('VIEW', 'Ver detalle'), ('PHONE', 'Llamada'), ('EMAIL', 'Correo'), ('SMS', 'SMS'), ('WHATSAPP', 'WhatsApp'), ('ASSIGN', 'Asignacion'), ('ACCEPT', 'Aceptacion'), ('EXPIRE', 'Vencimiento de aceptacion')], max_length=24),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['sales_rep', 'lead_kind', '-created_at'], name='crm_lead_rep_kind_created_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:37
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE crm_searchdocument_fts USING fts5("
+    "body, content='crm_searchdocument', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER crm_searchdocument_fts_ai AFTER INSERT ON crm_searchdocument BEGIN "
+    "INSERT INTO crm_searchdocument_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER crm_searchdocument_fts_ad AFTER DELETE ON crm_searchdocument BEGIN "
+    "INSERT INTO crm_searchdocument_fts(crm_searchdocument_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER crm_searchdocument_fts_au AFTER UPDATE ON crm_searchdocument BEGIN "
+    "INSERT INTO crm_searchdocument_fts(crm_searchdocument_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO crm_searchdocument_fts(rowid, body) VALUES (new.id, new.body); END",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS crm_searchdocument_fts_au",
+    "DROP TRIGGER IF EXISTS crm_searchdocument_fts_ad",
+    "DROP TRIGGER IF EXISTS crm_searchdocument_fts_ai",
+    "DROP TABLE IF EXISTS crm_searchdocument_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE INDEX crm_searchdocument_body_tsv_idx ON crm_searchdocument USING gin (to_tsvector('simple', body))",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS crm_searchdocument_body_tsv_idx",
+]
+
+
+def _run(schema_editor, statements_by_vendor):
+    for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def install_full_text(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD})
+
+
+def remove_full_text(apps, schema_editor):
+    _run(schema_editor, {"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD})
+
+
+# Copia congelada de crm.search.fold / document_body.
+def _fold(text):
+    decomposed = unicodedata.normalize("NFKD", str(text or "")).lower()
+    return re.findall(r"[a-z0-9]+", "".join(ch for ch in decomposed if not unicodedata.combining(ch)))
+
+
+def _body(values, phone_fields=(), labels=None):
+    words = []
+    for name, value in values.items():
+        value = value or ""
+        words += _fold(value)
+        if labels and name in labels:
+            words += _fold(labels[name].get(value, ""))
+        if name in phone_fields:
+            digits = "".join(ch for ch in value if ch.isdigit())
+            if len(digits) >= 7:
+                words += list(dict.fromkeys((digits, digits[-10:], digits[-7:])))
+    return " ".join(words)
+
+
+def backfill_documents(apps, schema_editor):
+    Lead = apps.get_model("crm", "Lead")
+    CrmDeal = apps.get_model("crm", "CrmDeal")
+    SearchDocument = apps.get_model("crm", "SearchDocument")
+    lead_fields = (
+        "full_name", "customer_name", "phone", "customer_phone", "email",
+        "customer_email", "city", "customer_city", "source", "lead_source",
+    )
+    deal_fields = (
+        "customer_name", "customer_email", "customer_phone", "proposal_id",
+        "sunrun_service_contract_id", "stage", "imported_salesrep_name",
+    )
+    stage_labels = {"stage": dict(CrmDeal._meta.get_field("stage").choices)}
+    rows = []
+    for values in Lead.objects.values("pk", *lead_fields).iterator(chunk_size=2000):
+        pk = values.pop("pk")
+        rows.append(SearchDocument(kind="lead", object_id=pk, body=_body(values, phone_fields=("phone", "customer_phone"))))
+    for values in CrmDeal.objects.values("pk", *deal_fields).iterator(chunk_size=2000):
+        pk = values.pop("pk")
+        rows.append(SearchDocument(kind="deal", object_id=pk, body=_body(values, phone_fields=("customer_phone",), labels=stage_labels)))
+    SearchDocument.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0017_lead_expiry_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('lead', 'Lead'), ('deal', 'Deal')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='crm_searchdocument_kind_object_uniq')],
+            },
+        ),
+        migrations.RunPython(install_full_text, remove_full_text),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import hashlib
+
 from django.core.exceptions import ValidationError
 from django.core.validators import FileExtensionValidator
 from django.core.validators import MaxValueValidator
@@ -6,6 +8,7 @@ from django.core.validators import RegexValidator
 from django.db import models
 from django.utils import timezone
 
+from core.model_mixins import DirtyFieldsMixin
 from core.rbac.constants import RoleCode
 
 US_STATE_CHOICES = [
@@ -80,7 +83,7 @@ def get_default_salesrep_level_id() -> int | None:
     return role.id if role else None
 
 
-class SalesRep(models.Model):
+class SalesRep(DirtyFieldsMixin, models.Model):
     user = models.OneToOneField("auth.User", on_delete=models.CASCADE, related_name="sales_rep_profile")
     business_unit = models.ForeignKey("core.BusinessUnit", on_delete=models.CASCADE, related_name="sales_reps")
     tier = models.ForeignKey("rewards.Tier", on_delete=models.SET_NULL, null=True, blank=True, related_name="sales_reps")
@@ -181,6 +184,9 @@ class SalesRep(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     modified_at = models.DateTimeField(auto_now=True)
 
+    # Al cambiar de unidad se invalidan las caches de equipo de la unidad anterior y la nueva.
+    tracked_fields = ("business_unit",)
+
     class Meta:
         ordering = ["user__username"]
 
@@ -225,7 +231,7 @@ class LeadSource(models.Model):
         return self.name
 
 
-class Lead(models.Model):
+class Lead(DirtyFieldsMixin, models.Model):
     class LeadKind(models.TextChoices):
         RESIDENTIAL = "residential", "Residencial"
         COMMERCIAL = "commercial", "Comercial"
@@ -324,8 +330,23 @@ class Lead(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = (
+        "status",
+        "sales_rep",
+        "is_accepted",
+        "business_unit",
+        "invoice_hash",
+        "electricity_invoice_hash",
+        "account_number",
+        "meter_number",
+        "location_id",
+    )
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["sales_rep", "lead_kind", "-created_at"], name="crm_lead_rep_kind_created_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.full_name
@@ -365,6 +386,7 @@ class LeadActivityLog(models.Model):
         WHATSAPP = "WHATSAPP", "WhatsApp"
         ASSIGN = "ASSIGN", "Asignacion"
         ACCEPT = "ACCEPT", "Aceptacion"
+        EXPIRE = "EXPIRE", "Vencimiento de aceptacion"
 
     lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name="activity_logs")
     actor = models.ForeignKey("auth.User", on_delete=models.SET_NULL, null=True, related_name="lead_activity_logs")
@@ -412,14 +434,57 @@ class InvoiceDuplicateOverride(models.Model):
     expires_at = models.DateTimeField(db_index=True)
     used_at = models.DateTimeField(null=True, blank=True)
     used_on_lead = models.ForeignKey(Lead, on_delete=models.SET_NULL, null=True, blank=True, related_name="consumed_overrides")
+    hash_key = models.CharField(max_length=64, blank=True, db_index=True)
+    service_key = models.CharField(max_length=64, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-created_at"]
         db_table = "crm_invoice_duplicate_override_v2"
 
+    def save(self, *args, **kwargs):
+        self.hash_key = LeadFingerprint.hash_key(self.invoice_hash)
+        self.service_key = LeadFingerprint.service_key(self.account_number, self.meter_number, self.location_id)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "hash_key", "service_key"}
+        super().save(*args, **kwargs)
+
+
+class LeadFingerprint(models.Model):
+    """Normalized duplicate-detection keys of a lead, kept in sync by ``crm.signals``.
+
+    ``key`` is the lowercased invoice hash or a SHA-256 of account, meter and location.
+    Several leads can share a key once a Partner approves a duplicate, so the key is
+    indexed rather than unique; a lead holds each key once.
+    """
+
+    class Kind(models.TextChoices):
+        INVOICE_HASH = "hash", "Hash de factura"
+        SERVICE_KEYS = "service", "Cuenta + contador + localidad"
+
+    key = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    lead = models.ForeignKey(Lead, on_delete=models.CASCADE, related_name="fingerprints")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["key", "kind", "lead"], name="crm_leadfingerprint_key_kind_lead_uniq"),
+        ]
 
-class CrmDeal(models.Model):
+    @staticmethod
+    def hash_key(invoice_hash: str) -> str:
+        return (invoice_hash or "").strip().lower()
+
+    @staticmethod
+    def service_key(account_number: str, meter_number: str, location_id: str) -> str:
+        parts = [(value or "").strip().upper() for value in (account_number, meter_number, location_id)]
+        if not all(parts):
+            return ""
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class CrmDeal(DirtyFieldsMixin, models.Model):
     class DealKind(models.TextChoices):
         RESIDENTIAL = "residential", "Residencial"
         COMMERCIAL = "commercial", "Comercial"
@@ -480,6 +545,8 @@ class CrmDeal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = ("stage", "salesrep", "deal_kind", "closing_date")
+
     class Meta:
         ordering = ["-closing_date", "-id"]
         permissions = (
@@ -490,7 +557,30 @@ class CrmDeal(models.Model):
         return self.customer_name or self.proposal_id or f"Deal {self.pk}"
 
 
-class Sale(models.Model):
+class SearchDocument(models.Model):
+    """Accent-folded search text of a lead or deal, kept in sync by ``crm.signals``.
+
+    ``body`` is the lowercase ASCII words of the searchable columns joined by spaces, so
+    every backend tokenizes it the same way. On SQLite triggers mirror it into the FTS5
+    table ``crm_searchdocument_fts``; on PostgreSQL a GIN index over
+    ``to_tsvector('simple', body)`` serves the lookups (see ``crm.search``).
+    """
+
+    class Kind(models.TextChoices):
+        LEAD = "lead", "Lead"
+        DEAL = "deal", "Deal"
+
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="crm_searchdocument_kind_object_uniq"),
+        ]
+
+
+class Sale(DirtyFieldsMixin, models.Model):
     class Status(models.TextChoices):
         DRAFT = "DRAFT", "Draft"
         PENDING = "PENDING", "Pending"
@@ -508,6 +598,8 @@ class Sale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = ("status", "business_unit", "sales_rep")
+
     class Meta:
         ordering = ["-created_at"]
 
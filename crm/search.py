@@ -0,0 +1,204 @@
+"""Accent-insensitive search over leads and deals.
+
+Every Lead and CrmDeal has a ``SearchDocument`` holding the folded words of its searchable
+columns. A query is folded the same way and each of its words must match the start of a
+document word, so "jose 0101" finds "José Pérez, (787) 555-0101". SQLite answers through
+FTS5 and ranks with ``bm25``; PostgreSQL uses a tsvector GIN index and ``ts_rank``; any
+other backend falls back to ``LIKE`` on the single body column, without ranking.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections.abc import Iterable
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models.expressions import RawSQL
+
+from crm.models import CrmDeal
+from crm.models import Lead
+from crm.models import SearchDocument
+
+LEAD_SEARCH_FIELDS = (
+    "full_name",
+    "customer_name",
+    "phone",
+    "customer_phone",
+    "email",
+    "customer_email",
+    "city",
+    "customer_city",
+    "source",
+    "lead_source",
+)
+DEAL_SEARCH_FIELDS = (
+    "customer_name",
+    "customer_email",
+    "customer_phone",
+    "proposal_id",
+    "sunrun_service_contract_id",
+    "stage",
+    "imported_salesrep_name",
+)
+SEARCH_FIELDS = {SearchDocument.Kind.LEAD: LEAD_SEARCH_FIELDS, SearchDocument.Kind.DEAL: DEAL_SEARCH_FIELDS}
+SEARCH_MODELS = {SearchDocument.Kind.LEAD: Lead, SearchDocument.Kind.DEAL: CrmDeal}
+PHONE_FIELDS = frozenset({"phone", "customer_phone"})
+MAX_QUERY_TERMS = 8
+FTS_TABLE = "crm_searchdocument_fts"
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text) -> list[str]:
+    """Lowercase ASCII words of ``text`` with the accents removed ("Peñuelas" -> ["penuelas"])."""
+    decomposed = unicodedata.normalize("NFKD", str(text or "")).lower()
+    return _WORD_RE.findall("".join(ch for ch in decomposed if not unicodedata.combining(ch)))
+
+
+def _phone_terms(value: str) -> list[str]:
+    # "(787) 555-0101" tambien se encuentra escrito de corrido, con o sin codigo de area.
+    digits = "".join(ch for ch in value if ch.isdigit())
+    if len(digits) < 7:
+        return []
+    return list(dict.fromkeys((digits, digits[-10:], digits[-7:])))
+
+
+def _kind_for(model) -> str:
+    for kind, search_model in SEARCH_MODELS.items():
+        if issubclass(model, search_model):
+            return kind
+    raise ValueError(f"{model.__name__} no tiene indice de busqueda.")
+
+
+def document_body(instance) -> str:
+    words: list[str] = []
+    for name in SEARCH_FIELDS[_kind_for(type(instance))]:
+        value = getattr(instance, name, "") or ""
+        words += fold(value)
+        if instance._meta.get_field(name).choices:
+            words += fold(getattr(instance, f"get_{name}_display")())
+        if name in PHONE_FIELDS:
+            words += _phone_terms(value)
+    # Sin deduplicar: una palabra que aparece en varias columnas (nombre y ciudad) pesa mas en el ranking.
+    return " ".join(words)
+
+
+def index_documents(instances: Iterable[Lead | CrmDeal], *, batch_size: int = 1000) -> int:
+    """Upsert the documents of ``instances``, for ``bulk_create``/``bulk_update`` paths (no signals)."""
+    rows = [SearchDocument(kind=_kind_for(type(obj)), object_id=obj.pk, body=document_body(obj)) for obj in instances]
+    if rows:
+        SearchDocument.objects.bulk_create(
+            rows,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["body"],
+        )
+    return len(rows)
+
+
+def drop_document(instance: Lead | CrmDeal) -> None:
+    SearchDocument.objects.filter(kind=_kind_for(type(instance)), object_id=instance.pk).delete()
+
+
+def query_terms(text: str) -> list[str]:
+    return list(dict.fromkeys(fold(text)))[:MAX_QUERY_TERMS]
+
+
+def _vendor(qs) -> str:
+    return connections[qs.db].vendor
+
+
+def apply_search(qs, text: str):
+    """Rows of ``qs`` (leads or deals) whose document has a word starting with each query word.
+
+    A query without words (only punctuation) leaves ``qs`` unfiltered.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return qs
+    kind = _kind_for(qs.model)
+    vendor = _vendor(qs)
+    if vendor == "sqlite":
+        # Con IN el MATCH corre una sola vez; como JOIN, SQLite recorria crm_searchdocument y
+        # evaluaba el MATCH por cada fila.
+        ids = RawSQL(
+            f"SELECT object_id FROM crm_searchdocument WHERE kind = %s AND id IN "
+            f"(SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)",
+            (kind, _fts5_match(terms)),
+        )
+    elif vendor == "postgresql":
+        ids = RawSQL(
+            "SELECT object_id FROM crm_searchdocument "
+            "WHERE kind = %s AND to_tsvector('simple', body) @@ to_tsquery('simple', %s)",
+            (kind, _tsquery(terms)),
+        )
+    else:
+        documents = SearchDocument.objects.filter(kind=kind)
+        for term in terms:
+            documents = documents.filter(Q(body__startswith=term) | Q(body__contains=f" {term}"))
+        ids = documents.values("object_id")
+    return qs.filter(pk__in=ids)
+
+
+def with_search_rank(qs, text: str):
+    """Annotate ``search_rank`` on rows already filtered by ``apply_search``: ascending is best first."""
+    terms = query_terms(text)
+    vendor = _vendor(qs)
+    if not terms or vendor not in {"sqlite", "postgresql"}:
+        return qs.annotate(search_rank=Value(0.0))
+    kind = _kind_for(qs.model)
+    quote = connections[qs.db].ops.quote_name
+    outer_pk = f"{quote(qs.model._meta.db_table)}.{quote(qs.model._meta.pk.column)}"
+    if vendor == "sqlite":
+        # MATERIALIZED: los puntajes se calculan una vez por consulta y cada fila los busca por id.
+        rank = RawSQL(
+            f"WITH scores AS MATERIALIZED (SELECT rowid AS id, bm25({FTS_TABLE}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s) "
+            f"SELECT scores.score FROM scores JOIN crm_searchdocument d ON d.id = scores.id "
+            f"WHERE d.kind = %s AND d.object_id = {outer_pk}",
+            (_fts5_match(terms), kind),
+        )
+    else:
+        rank = RawSQL(
+            "SELECT -ts_rank(to_tsvector('simple', body), to_tsquery('simple', %s)) "
+            f"FROM crm_searchdocument WHERE kind = %s AND object_id = {outer_pk}",
+            (_tsquery(terms), kind),
+        )
+    return qs.annotate(search_rank=rank)
+
+
+def _fts5_match(terms: list[str]) -> str:
+    # Los terminos ya son [a-z0-9]+: entre comillas no hay nada que escapar.
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def _tsquery(terms: list[str]) -> str:
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def find_search_drift() -> int:
+    """Leads and deals whose stored document differs from what their fields produce, plus orphans."""
+    drift = 0
+    for kind, model in SEARCH_MODELS.items():
+        stored = dict(SearchDocument.objects.filter(kind=kind).values_list("object_id", "body").iterator())
+        for obj in model.objects.only("pk", *SEARCH_FIELDS[kind]).iterator(chunk_size=2000):
+            if stored.pop(obj.pk, None) != document_body(obj):
+                drift += 1
+        drift += len(stored)
+    return drift
+
+
+def rebuild_search_index() -> int:
+    SearchDocument.objects.all().delete()
+    written = 0
+    for kind, model in SEARCH_MODELS.items():
+        written += index_documents(model.objects.only("pk", *SEARCH_FIELDS[kind]).iterator(chunk_size=2000))
+    if connections[SearchDocument.objects.db].vendor == "sqlite":
+        with connections[SearchDocument.objects.db].cursor() as cursor:
+            # Reconstruye tambien la tabla FTS por si quedo desalineada de crm_searchdocument.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    return written
@@ -4,6 +4,34 @@ from crm.models import CrmDeal
 
 
 class CrmDealDetailSerializer:
+    VALUES_FIELDS = (
+        "id",
+        "deal_kind",
+        "salesrep_id",
+        "salesrep__user_id",
+        "salesrep__user__first_name",
+        "salesrep__user__last_name",
+        "salesrep__user__username",
+        "imported_salesrep_name",
+        "customer_name",
+        "proposal_id",
+        "sunrun_service_contract_id",
+        "customer_phone",
+        "customer_email",
+        "system_size",
+        "epc_price",
+        "epc_base",
+        "epc_table",
+        "epc_adjustment",
+        "closing_date",
+        "stage",
+        "sr_signoff_date",
+        "customer_sign_off_date",
+        "final_completion_date",
+        "imported_at",
+        "created_at",
+    )
+
     def __init__(self, instance: CrmDeal):
         self.instance = instance
 
@@ -44,3 +72,45 @@ class CrmDealDetailSerializer:
     @classmethod
     def serialize_many(cls, queryset) -> list[dict]:
         return [cls(instance=item).data for item in queryset]
+
+    @classmethod
+    def serialize_values(cls, rows) -> list[dict]:
+        """Same payload as ``data`` built from ``queryset.values(*VALUES_FIELDS)`` rows, without model instances."""
+        stage_labels = dict(CrmDeal.Stage.choices)
+        return [cls._from_values(row, stage_labels) for row in rows]
+
+    @staticmethod
+    def _from_values(row: dict, stage_labels: dict[str, str]) -> dict:
+        if row["salesrep_id"] and row["salesrep__user_id"]:
+            full_name = f"{row['salesrep__user__first_name']} {row['salesrep__user__last_name']}".strip()
+            salesrep_name = full_name or row["salesrep__user__username"]
+        else:
+            salesrep_name = (row["imported_salesrep_name"] or "").strip() or "Pendiente por adjudicar"
+
+        def iso(value) -> str:
+            return value.isoformat() if value else ""
+
+        return {
+            "id": row["id"],
+            "deal_kind": row["deal_kind"],
+            "salesrep_name": salesrep_name,
+            "adjudication_label": "Asignada" if row["salesrep_id"] else "Pendiente",
+            "customer_name": row["customer_name"],
+            "proposal_id": row["proposal_id"],
+            "sunrun_service_contract_id": row["sunrun_service_contract_id"],
+            "customer_phone": row["customer_phone"],
+            "customer_email": row["customer_email"],
+            "system_size": float(row["system_size"] or 0),
+            "epc_price": float(row["epc_price"] or 0),
+            "epc_base": float(row["epc_base"] or 0),
+            "epc_table": float(row["epc_table"] or 0),
+            "epc_adjustment": float(row["epc_adjustment"] or 0),
+            "closing_date": iso(row["closing_date"]),
+            "stage": row["stage"],
+            "stage_display": stage_labels.get(row["stage"], row["stage"]),
+            "sr_signoff_date": iso(row["sr_signoff_date"]),
+            "customer_sign_off_date": iso(row["customer_sign_off_date"]),
+            "final_completion_date": iso(row["final_completion_date"]),
+            "imported_at": iso(row["imported_at"]),
+            "created_at": iso(row["created_at"]),
+        }
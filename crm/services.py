@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from django.db.models import Case
+from django.db.models import Exists
+from django.db.models import Max
+from django.db.models import Q
+from django.db.models import Value
+from django.db.models import When
+from django.utils import timezone
+
+from crm.models import InvoiceDuplicateOverride
+from crm.models import Lead
+from crm.models import LeadFingerprint
+from crm.models import SalesRep
+
+FINGERPRINT_FIELDS = ("invoice_hash", "electricity_invoice_hash", "account_number", "meter_number", "location_id")
+
+
+@dataclass(frozen=True)
+class Fingerprints:
+    """Duplicate-detection keys of a lead or of a lead about to be created."""
+
+    hash_keys: tuple[str, ...] = ()
+    service_key: str = ""
+
+    @classmethod
+    def of(cls, *, invoice_hashes: Iterable[str] = (), account_number: str = "", meter_number: str = "", location_id: str = "") -> Fingerprints:
+        hash_keys = tuple(dict.fromkeys(key for key in map(LeadFingerprint.hash_key, invoice_hashes) if key))
+        return cls(hash_keys, LeadFingerprint.service_key(account_number, meter_number, location_id))
+
+    @classmethod
+    def for_lead(cls, lead: Lead) -> Fingerprints:
+        return cls.of(
+            invoice_hashes=(lead.electricity_invoice_hash, lead.invoice_hash),
+            account_number=lead.account_number,
+            meter_number=lead.meter_number,
+            location_id=lead.location_id,
+        )
+
+    @property
+    def rows(self) -> set[tuple[str, str]]:
+        rows = {(LeadFingerprint.Kind.INVOICE_HASH.value, key) for key in self.hash_keys}
+        if self.service_key:
+            rows.add((LeadFingerprint.Kind.SERVICE_KEYS.value, self.service_key))
+        return rows
+
+    @property
+    def keys(self) -> list[str]:
+        return [*self.hash_keys, self.service_key] if self.service_key else list(self.hash_keys)
+
+
+@dataclass(frozen=True)
+class DuplicateMatch:
+    """Newest other lead sharing the invoice hash and/or the service keys."""
+
+    hash_lead_id: int | None
+    service_lead_id: int | None
+    has_override: bool = False
+
+    @property
+    def by_hash(self) -> bool:
+        return self.hash_lead_id is not None
+
+    @property
+    def by_service_keys(self) -> bool:
+        return self.service_lead_id is not None
+
+    @property
+    def lead_id(self) -> int | None:
+        return self.hash_lead_id or self.service_lead_id
+
+
+def _open_overrides(requester: SalesRep, fingerprints: Fingerprints):
+    matches = Q()
+    if fingerprints.hash_keys:
+        matches |= Q(hash_key__in=fingerprints.hash_keys)
+    if fingerprints.service_key:
+        matches |= Q(service_key=fingerprints.service_key)
+    return InvoiceDuplicateOverride.objects.filter(
+        matches,
+        requester=requester,
+        expires_at__gte=timezone.now(),
+        used_at__isnull=True,
+    )
+
+
+def find_duplicate(
+    fingerprints: Fingerprints,
+    *,
+    exclude_lead_id: int | None = None,
+    override_requester: SalesRep | None = None,
+) -> DuplicateMatch | None:
+    """Duplicate or not, which lead, and whether ``override_requester`` holds an unused override: one query."""
+    if not fingerprints.keys:
+        return None
+    rows = LeadFingerprint.objects.filter(key__in=fingerprints.keys)
+    if exclude_lead_id is not None:
+        rows = rows.exclude(lead_id=exclude_lead_id)
+    aggregates = {
+        "hash_lead_id": Max("lead_id", filter=Q(kind=LeadFingerprint.Kind.INVOICE_HASH)),
+        "service_lead_id": Max("lead_id", filter=Q(kind=LeadFingerprint.Kind.SERVICE_KEYS)),
+    }
+    if override_requester is not None:
+        aggregates["has_override"] = Max(
+            Case(When(Exists(_open_overrides(override_requester, fingerprints)), then=Value(1)), default=Value(0))
+        )
+    row = rows.order_by().aggregate(**aggregates)
+    if row["hash_lead_id"] is None and row["service_lead_id"] is None:
+        return None
+    return DuplicateMatch(row["hash_lead_id"], row["service_lead_id"], bool(row.get("has_override")))
+
+
+def find_duplicates(candidates: Sequence[Fingerprints]) -> list[DuplicateMatch | None]:
+    """``find_duplicate`` for a batch of candidates (imports) with a single query; overrides are not considered."""
+    keys = {key for candidate in candidates for key in candidate.keys}
+    newest: dict[tuple[str, str], int] = {}
+    if keys:
+        for kind, key, lead_id in LeadFingerprint.objects.filter(key__in=keys).values_list("kind", "key", "lead_id").iterator():
+            if lead_id > newest.get((kind, key), 0):
+                newest[(kind, key)] = lead_id
+    matches: list[DuplicateMatch | None] = []
+    for candidate in candidates:
+        hash_ids = [newest[(LeadFingerprint.Kind.INVOICE_HASH, key)] for key in candidate.hash_keys if (LeadFingerprint.Kind.INVOICE_HASH, key) in newest]
+        service_id = newest.get((LeadFingerprint.Kind.SERVICE_KEYS, candidate.service_key)) if candidate.service_key else None
+        if not hash_ids and service_id is None:
+            matches.append(None)
+            continue
+        matches.append(DuplicateMatch(max(hash_ids) if hash_ids else None, service_id))
+    return matches
+
+
+def consume_override(requester: SalesRep, lead: Lead) -> InvoiceDuplicateOverride | None:
+    """Mark the override that let ``lead`` through as used."""
+    override = _open_overrides(requester, Fingerprints.for_lead(lead)).first()
+    if override:
+        override.used_at = timezone.now()
+        override.used_on_lead = lead
+        override.save(update_fields=["used_at", "used_on_lead"])
+    return override
+
+
+def sync_lead_fingerprints(lead: Lead, *, created: bool = False) -> None:
+    wanted = Fingerprints.for_lead(lead).rows
+    if created:
+        if wanted:
+            LeadFingerprint.objects.bulk_create([LeadFingerprint(lead=lead, kind=kind, key=key) for kind, key in wanted])
+        return
+    existing = {(kind, key): pk for pk, kind, key in LeadFingerprint.objects.filter(lead=lead).values_list("pk", "kind", "key")}
+    stale = [pk for row, pk in existing.items() if row not in wanted]
+    if stale:
+        LeadFingerprint.objects.filter(pk__in=stale).delete()
+    missing = wanted - existing.keys()
+    if missing:
+        LeadFingerprint.objects.bulk_create([LeadFingerprint(lead=lead, kind=kind, key=key) for kind, key in missing])
+
+
+def add_fingerprints_for_leads(leads: Iterable[Lead], *, batch_size: int = 1000) -> int:
+    """Fingerprints for leads inserted with ``bulk_create`` (no signals); returns rows written."""
+    rows = [
+        LeadFingerprint(lead_id=lead.pk, kind=kind, key=key)
+        for lead in leads
+        for kind, key in Fingerprints.for_lead(lead).rows
+    ]
+    LeadFingerprint.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+
+def find_fingerprint_drift() -> int:
+    """Leads whose stored fingerprints differ from what their fields produce."""
+    stored: dict[int, set[tuple[str, str]]] = {}
+    for lead_id, kind, key in LeadFingerprint.objects.values_list("lead_id", "kind", "key").iterator():
+        stored.setdefault(lead_id, set()).add((kind, key))
+    drift = 0
+    for lead in Lead.objects.only("pk", *FINGERPRINT_FIELDS).iterator(chunk_size=2000):
+        if stored.pop(lead.pk, set()) != Fingerprints.for_lead(lead).rows:
+            drift += 1
+    return drift + len(stored)
+
+
+def rebuild_lead_fingerprints() -> int:
+    LeadFingerprint.objects.all().delete()
+    return add_fingerprints_for_leads(Lead.objects.only("pk", *FINGERPRINT_FIELDS).iterator(chunk_size=2000))
@@ -1,7 +1,15 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
+from crm.models import CrmDeal
+from crm.models import Lead
 from crm.models import Sale
+from crm.services import FINGERPRINT_FIELDS
+from crm.search import DEAL_SEARCH_FIELDS
+from crm.search import LEAD_SEARCH_FIELDS
+from crm.search import drop_document
+from crm.search import index_documents
+from crm.services import sync_lead_fingerprints
 from finance.services import process_sale_compensation
 
 
@@ -11,8 +19,12 @@ def cache_previous_status(sender, instance, **kwargs):
         instance._previous_status = None
         return
 
-    previous = Sale.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
-    instance._previous_status = previous
+    if instance.is_field_loaded("status"):
+        instance._previous_status = instance.get_loaded_value("status")
+        return
+
+    # Instancia construida a mano o con "status" diferido: no hay snapshot de carga.
+    instance._previous_status = Sale.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
 
 
 @receiver(post_save, sender=Sale)
@@ -21,3 +33,34 @@ def on_sale_saved(sender, instance, created, **kwargs):
     became_confirmed = instance.status == Sale.Status.CONFIRMED and (created or previous_status != Sale.Status.CONFIRMED)
     if became_confirmed:
         process_sale_compensation(instance)
+
+
+@receiver(post_save, sender=Lead)
+def on_lead_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # loaddata no pasa por aqui: se repara con rebuild_lead_fingerprints.
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(FINGERPRINT_FIELDS):
+        return
+    if not created and all(instance.is_field_loaded(name) for name in FINGERPRINT_FIELDS):
+        if not any(instance.has_field_changed(name) for name in FINGERPRINT_FIELDS):
+            return
+    sync_lead_fingerprints(instance, created=created)
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_save, sender=CrmDeal)
+def on_searchable_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # loaddata no pasa por aqui: se repara con rebuild_search_index.
+    if raw:
+        return
+    searchable = LEAD_SEARCH_FIELDS if sender is Lead else DEAL_SEARCH_FIELDS
+    if update_fields is not None and not set(update_fields) & set(searchable):
+        return
+    index_documents([instance])
+
+
+@receiver(post_delete, sender=Lead)
+@receiver(post_delete, sender=CrmDeal)
+def on_searchable_deleted(sender, instance, **kwargs):
+    drop_document(instance)
@@ -1,25 +1,58 @@
 from __future__ import annotations
 
+import gzip
+import json
+import tempfile
 from datetime import timedelta
+from decimal import Decimal
 from io import BytesIO
+from io import StringIO
+from pathlib import Path
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from core.models import BusinessUnit, Role
 from core.rbac.constants import RoleCode
 from crm.models import CrmDeal
+from crm.models import InvoiceDuplicateOverride
 from crm.models import InvoiceDuplicateReviewRequest
 from crm.models import Lead
+from crm.models import LeadActivityLog
+from crm.models import LeadFingerprint
 from crm.models import LeadSource
+from crm.models import Sale
 from crm.models import SalesRep
 from crm.models import SalesrepLevel
+from crm.models import SearchDocument
+from crm.search import apply_search
+from crm.search import fold
+from crm.serializers import CrmDealDetailSerializer
+from crm.services import Fingerprints
+from crm.services import find_duplicate
+from crm.services import find_duplicates
+from dashboard.deals_views import _compute_deal_kpis
+from dashboard.deals_views import _import_deals_from_excel
+from dashboard.leads_views import _import_leads_from_file
+from dashboard.services.lead_expiry_service import expire_lead_acceptances
+from dashboard.services.rollup_service import find_rollup_drift
+from finance.models import Commission
+from inventory.models import Product
+from jobs.models import Job
+from jobs.services import run_pending_jobs
 from openpyxl import Workbook
+from rewards.models import CompensationPlan
+from rewards.models import PlanTierRule
+from rewards.models import Tier
 
 User = get_user_model()
 
@@ -326,6 +359,80 @@ class ResidentialLeadsFlowTests(TestCase):
         self.assertIsNone(lead.sales_rep)
         self.assertFalse(lead.is_accepted)
 
+    def test_expiry_sweep_releases_expired_leads_in_bulk(self):
+        past = timezone.now() - timedelta(minutes=1)
+        expired = [
+            self._lead(salesrep=self.associate_rep, name=f"Vencido {idx}", is_accepted=False, acceptance_deadline=past, assigned_by=self.partner)
+            for idx in range(3)
+        ]
+        pending = self._lead(salesrep=self.associate_rep, name="Pendiente", is_accepted=False, acceptance_deadline=timezone.now() + timedelta(hours=1))
+        self._lead(salesrep=self.associate_rep, name="Aceptado", acceptance_deadline=past)
+
+        with self.assertRaises(CommandError):
+            call_command("expire_lead_acceptances", "--check", stdout=StringIO())
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(expire_lead_acceptances(), 3)
+        self.assertLess(len(ctx.captured_queries), 15)
+        call_command("expire_lead_acceptances", "--check", stdout=StringIO())
+
+        for lead in expired:
+            lead.refresh_from_db()
+            self.assertEqual((lead.sales_rep_id, lead.assigned_by_id, lead.acceptance_deadline), (None, None, None))
+            self.assertEqual(lead.activity_logs.get().activity_type, LeadActivityLog.ActivityType.EXPIRE)
+        pending.refresh_from_db()
+        self.assertEqual(pending.sales_rep_id, self.associate_rep.id)
+        self.assertEqual(find_rollup_drift()["leaddailyrollup"], 0)
+
+        self.client.login(username="assoc_leads", password="secretpass123")
+        names = {row["full_name"] for row in self.client.get(reverse("dashboard:crm_leads_api")).json()["data"]}
+        self.assertEqual(names, {"Pendiente", "Aceptado"})
+
+    def test_activity_batch_checks_ownership_once_and_bulk_inserts(self):
+        own = [self._lead(salesrep=self.associate_rep, name=f"Propio {idx}") for idx in range(3)]
+        foreign = self._lead(salesrep=self.partner_rep, name="Ajeno")
+        events = [{"lead_id": lead.pk, "activity_type": "phone", "payload": {"via": "tabla"}} for lead in own]
+        events += [
+            {"lead_id": foreign.pk, "activity_type": "VIEW"},
+            {"lead_id": own[0].pk, "activity_type": "ASSIGN"},
+            {"lead_id": "x", "activity_type": "EMAIL"},
+            {"lead_id": own[1].pk, "activity_type": "WHATSAPP", "payload": "no-dict"},
+        ]
+        self.client.login(username="assoc_leads", password="secretpass123")
+        url = reverse("dashboard:crm_leads_log_activity_batch")
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, data={"events": events}, content_type="application/json")
+        self.assertEqual(response.json(), {"success": True, "logged": 4, "rejected": [3, 4, 5]})
+        self.assertEqual(len([q for q in ctx.captured_queries if "crm_lead_activity_log_v2" in q["sql"]]), 1)
+        self.assertEqual(LeadActivityLog.objects.filter(activity_type=LeadActivityLog.ActivityType.PHONE, actor=self.associate).count(), 3)
+        self.assertEqual(LeadActivityLog.objects.get(activity_type=LeadActivityLog.ActivityType.WHATSAPP).payload, {})
+        self.assertFalse(foreign.activity_logs.exists())
+
+        self.assertEqual(self.client.post(url, data="{", content_type="application/json").status_code, 400)
+        too_many = {"events": [events[0]] * 201}
+        self.assertEqual(self.client.post(url, data=too_many, content_type="application/json").status_code, 400)
+
+    def test_archive_moves_old_activity_to_compressed_jsonl(self):
+        lead = self._lead(salesrep=self.associate_rep)
+        old = [LeadActivityLog.objects.create(lead=lead, actor=self.associate, activity_type="PHONE", payload={"n": idx}) for idx in range(5)]
+        LeadActivityLog.objects.filter(pk__in=[log.pk for log in old]).update(created_at=timezone.now() - timedelta(days=400))
+        recent = LeadActivityLog.objects.create(lead=lead, actor=self.associate, activity_type="VIEW")
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with self.assertRaises(CommandError):
+                call_command("archive_lead_activity", "--days", "365", "--check", stdout=StringIO())
+            call_command("archive_lead_activity", "--days", "365", "--batch-size", "2", "--output-dir", archive_dir, stdout=StringIO())
+            call_command("archive_lead_activity", "--days", "365", "--check", stdout=StringIO())
+
+            files = list(Path(archive_dir).glob("*.jsonl.gz"))
+            self.assertEqual(len(files), 1)
+            with gzip.open(files[0], "rt", encoding="utf-8") as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual([row["id"] for row in rows], [log.pk for log in old])
+        self.assertEqual(rows[0]["payload"], {"n": 0})
+        self.assertEqual(rows[0]["lead_id"], lead.pk)
+        self.assertEqual(list(LeadActivityLog.objects.values_list("pk", flat=True)), [recent.pk])
+
     def test_create_valid(self):
         self.client.login(username="assoc_leads", password="secretpass123")
         response = self.client.post(
@@ -423,6 +530,67 @@ class ResidentialLeadsFlowTests(TestCase):
         self.assertIn("kpis", payload)
         self.assertEqual(payload["kpis"]["total"], 1)
 
+    def test_api_search_is_accent_insensitive_prefix_and_ranked(self):
+        self._lead(salesrep=self.associate_rep, name="Ana Rivera", city="Ponce")
+        best = self._lead(salesrep=self.associate_rep, name="José Peñuelas", phone="(787) 555-0101", city="Peñuelas")
+        self._lead(salesrep=self.associate_rep, name="Jose Rivera", lead_source="Peñuelas Expo")
+        self.client.login(username="assoc_leads", password="secretpass123")
+        url = reverse("dashboard:crm_leads_api")
+
+        payload = self.client.get(url, {"search": "penu"}).json()
+        self.assertEqual(payload["recordsFiltered"], 2)
+        self.assertEqual(payload["data"][0]["id"], best.pk)
+        self.assertEqual(self.client.get(url, {"search": "JOSÉ 5550101"}).json()["recordsFiltered"], 1)
+        self.assertEqual(self.client.get(url, {"search": "riv"}).json()["recordsFiltered"], 2)
+        self.assertEqual(self.client.get(url, {"search": "ivera"}).json()["recordsFiltered"], 0)
+
+        # Un orden de columna explicito manda sobre la relevancia.
+        ordered = self.client.get(
+            url,
+            {"search": "penu", "order[0][column]": "0", "order[0][dir]": "desc", "columns[0][data]": "full_name"},
+        ).json()
+        self.assertEqual([row["full_name"] for row in ordered["data"]], ["José Peñuelas", "Jose Rivera"])
+        ordered = self.client.get(
+            url,
+            {"search": "penu", "order[0][column]": "0", "order[0][dir]": "asc", "columns[0][data]": "full_name"},
+        ).json()
+        self.assertEqual([row["full_name"] for row in ordered["data"]], ["Jose Rivera", "José Peñuelas"])
+
+    def test_api_paginates_and_orders_server_side(self):
+        for idx in range(5):
+            self._lead(salesrep=self.associate_rep, name=f"Lead {idx}", phone="787" if idx % 2 else "")
+        self._lead(salesrep=self.associate_rep, name="Otro", status=Lead.Status.CLOSED)
+        self.client.login(username="assoc_leads", password="secretpass123")
+
+        response = self.client.get(
+            reverse("dashboard:crm_leads_api"),
+            {
+                "draw": "3",
+                "start": "1",
+                "length": "2",
+                "order[0][column]": "0",
+                "order[0][dir]": "asc",
+                "columns[0][data]": "full_name",
+                "status": Lead.Status.NEW,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        payload = response.json()
+        self.assertEqual(payload["draw"], 3)
+        self.assertEqual(payload["recordsTotal"], 6)
+        self.assertEqual(payload["recordsFiltered"], 5)
+        self.assertEqual([row["full_name"] for row in payload["data"]], ["Lead 1", "Lead 2"])
+        self.assertEqual(payload["kpis"]["total"], 5)
+        self.assertEqual(payload["kpis"]["with_phone"], 2)
+
+    def test_list_page_does_not_embed_rows(self):
+        self._lead(salesrep=self.associate_rep, name="Lead Pagina")
+        self.client.login(username="assoc_leads", password="secretpass123")
+        response = self.client.get(reverse("dashboard:crm_leads_list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("initial_rows", response.context)
+        self.assertEqual(response.context["kpis"]["total"], 1)
+
     def test_system_size_calculation(self):
         self.client.login(username="assoc_leads", password="secretpass123")
         response = self.client.post(
@@ -444,13 +612,17 @@ class ResidentialLeadsFlowTests(TestCase):
             b"Monto total: $187.35\n"
             b"Consumo promedio kWh: 512\n"
         )
-        response = self.client.post(
+        queued = self.client.post(
             reverse("dashboard:crm_leads_parse_invoice_preview"),
             data={"electricity_invoice_pdf": self._pdf("Bill Luz.pdf", pdf_content)},
             HTTP_X_REQUESTED_WITH="XMLHttpRequest",
         )
-        self.assertEqual(response.status_code, 200)
-        payload = response.json()
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(run_pending_jobs(), 1)
+        job = self.client.get(queued.json()["status_url"]).json()
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["result"]["http_status"], 200)
+        payload = job["result"]["response"]
         self.assertTrue(payload.get("success"))
         extracted = payload.get("extracted", {})
         self.assertEqual(extracted.get("account_number"), "A2222")
@@ -459,6 +631,32 @@ class ResidentialLeadsFlowTests(TestCase):
         self.assertEqual(extracted.get("electricity_bill"), "187.35")
         self.assertEqual(extracted.get("consumo_promedio_kwh"), "512")
 
+    def test_create_reuses_preview_job_for_same_invoice(self):
+        self.client.login(username="assoc_leads", password="secretpass123")
+        pdf_content = b"Numero de cuenta: A3333\nNumero de contador: M3333\nLocation ID: L3333\n" + b" " * 40
+        queued = self.client.post(
+            reverse("dashboard:crm_leads_parse_invoice_preview"),
+            data={"electricity_invoice_pdf": self._pdf("Factura.pdf", pdf_content)},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        run_pending_jobs()
+        job = Job.objects.get(pk=queued.json()["job_id"])
+        # Si el resultado del job se usa, el OCR no vuelve a ejecutarse al guardar.
+        job.result["response"]["extracted"]["account_number"] = "FROM-JOB"
+        job.save(update_fields=["result"])
+
+        response = self.client.post(
+            reverse("dashboard:crm_lead_create_modal"),
+            data={
+                **self._create_payload(account_number="", meter_number="", location_id=""),
+                "electricity_invoice_pdf": self._pdf("Factura.pdf", pdf_content),
+                "invoice_job_id": str(job.pk),
+            },
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.get(pk=response.json()["id"]).account_number, "FROM-JOB")
+
     def test_delete_permissions(self):
         lead = self._lead(salesrep=self.associate_rep)
         self.client.login(username="assoc_leads", password="secretpass123")
@@ -608,6 +806,88 @@ class ResidentialLeadsFlowTests(TestCase):
         self.assertEqual(qr.status_code, 200)
         self.assertEqual(qr["Content-Type"], "image/png")
 
+    def _leads_csv(self, *rows: str, header: str = "Nombre;Teléfono;Email;Número de cuenta;Contador;Localidad;Factura") -> SimpleUploadedFile:
+        content = "\n".join((header, *rows)) + "\n"
+        return SimpleUploadedFile("prospectos.csv", content.encode("cp1252"), content_type="text/csv")
+
+    def test_import_leads_requires_partner(self):
+        self.client.login(username="assoc_leads", password="secretpass123")
+        response = self.client.get(reverse("dashboard:crm_leads_import"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_import_leads_csv_dry_run_and_real(self):
+        self.client.login(username="partner_leads", password="secretpass123")
+        rows = ("María Pérez;787-555-0001;maria@example.com;A1;M1;L1;$120.50", "Juan Rivera;787-555-0002;;A2;M2;L2;")
+        dry = self.client.post(
+            reverse("dashboard:crm_leads_import"),
+            data={"sales_rep": self.associate_rep.pk, "dry_run": "on", "report_file": self._leads_csv(*rows)},
+        )
+        self.assertEqual(dry.status_code, 302)
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(Lead.objects.count(), 0)
+        self.assertEqual(self.client.get(dry["Location"]).context["upload_summary"]["created"], 2)
+
+        real = self.client.post(
+            reverse("dashboard:crm_leads_import"),
+            data={"sales_rep": self.associate_rep.pk, "report_file": self._leads_csv(*rows)},
+        )
+        self.assertEqual(run_pending_jobs(), 1)
+        summary = self.client.get(real["Location"]).context["upload_summary"]
+        self.assertEqual((summary["processed"], summary["created"], summary["errors"]), (2, 2, []))
+        lead = Lead.objects.get(customer_name="María Pérez")
+        self.assertEqual((lead.sales_rep_id, lead.assigned_by_id, lead.is_accepted), (self.associate_rep.id, self.partner.id, False))
+        self.assertIsNotNone(lead.acceptance_deadline)
+        self.assertEqual(lead.electricity_bill, Decimal("120.50"))
+        self.assertEqual(lead.phone, "787-555-0001")
+        self.assertEqual(lead.activity_logs.count(), 1)
+        self.assertEqual(LeadFingerprint.objects.filter(lead=lead).count(), 1)
+        self.assertEqual(find_rollup_drift()["leaddailyrollup"], 0)
+
+    def test_import_leads_skips_duplicates_and_reports_row_errors(self):
+        existing = self._lead(salesrep=self.partner_rep, invoice_hash="hash-old", account_number="A0", meter_number="M0", location_id="L0")
+        wb = Workbook()
+        ws = wb.active
+        ws.append(["NOMBRE", "TELEFONO", "EMAIL", "NUMERO DE CUENTA", "CONTADOR", "LOCALIDAD", "HASH FACTURA"])
+        for idx in range(40):
+            ws.append([f"Prospecto {idx}", 7875550000 + idx, "", f"A{idx + 1}", f"M{idx + 1}", f"L{idx + 1}", ""])
+        ws.append(["Duplicado cuenta", "7875551111", "", "a0", "m0", "l0", ""])
+        ws.append(["Duplicado hash", "7875552222", "", "", "", "", "HASH-OLD"])
+        ws.append(["Repetido en archivo", "7875553333", "", "A1", "M1", "L1", ""])
+        ws.append(["", "7875554444", "", "", "", "", ""])
+        ws.append(["Sin contacto", "", "", "", "", "", ""])
+        ws.append(["Correo malo", "", "no-es-correo", "", "", "", ""])
+        ws.append([None, None, None, None, None, None, None])
+        buffer = BytesIO()
+        wb.save(buffer)
+
+        with CaptureQueriesContext(connection) as ctx:
+            summary = _import_leads_from_file(
+                file_obj=BytesIO(buffer.getvalue()),
+                file_name="prospectos.xlsx",
+                sheet_name="",
+                dry_run=False,
+                actor=self.partner,
+                sales_rep_id=self.partner_rep.pk,
+            )
+        self.assertLess(len(ctx.captured_queries), 25)
+        self.assertEqual(
+            (summary["processed"], summary["created"], summary["duplicates"], summary["skipped"]),
+            (46, 40, 3, 3),
+        )
+        self.assertIn(f"Fila 42: duplicado del lead #{existing.pk} (cuenta+contador+localidad).", summary["warnings"])
+        self.assertIn(f"Fila 43: duplicado del lead #{existing.pk} (hash).", summary["warnings"])
+        self.assertIn("Fila 44: duplicado de la fila 2.", summary["warnings"])
+        self.assertEqual(len(summary["errors"]), 3)
+        self.assertTrue(summary["errors"][2].startswith("Fila 47: correo invalido"))
+
+        imported = Lead.objects.exclude(pk=existing.pk)
+        self.assertEqual(imported.count(), 40)
+        # Importar a nombre propio no abre ventana de aceptacion.
+        self.assertFalse(imported.filter(is_accepted=False).exists())
+        self.assertEqual(imported.get(customer_name="Prospecto 0").phone, "7875550000")
+        self.assertEqual(LeadFingerprint.objects.filter(lead__in=imported).count(), 40)
+        self.assertEqual(find_duplicate(Fingerprints.of(account_number="A1", meter_number="M1", location_id="L1")).lead_id, imported.get(customer_name="Prospecto 0").pk)
+
 
 class ResidentialDealsPipelineTests(TestCase):
     def setUp(self) -> None:
@@ -694,14 +974,60 @@ class ResidentialDealsPipelineTests(TestCase):
             reverse("dashboard:crm_deals_list"),
             data={"deal_kind": "residential", "sheet_name": "FEBRERO 2026", "dry_run": "on", "report_file": self._excel_file()},
         )
-        self.assertEqual(dry.status_code, 200)
+        self.assertEqual(dry.status_code, 302)
+        self.assertEqual(run_pending_jobs(), 1)
         self.assertEqual(CrmDeal.objects.count(), 0)
         real = self.client.post(
             reverse("dashboard:crm_deals_list"),
             data={"deal_kind": "residential", "sheet_name": "FEBRERO 2026", "report_file": self._excel_file()},
         )
-        self.assertEqual(real.status_code, 200)
+        self.assertEqual(real.status_code, 302)
+        self.assertEqual(CrmDeal.objects.count(), 0)
+        self.assertEqual(run_pending_jobs(), 1)
         self.assertEqual(CrmDeal.objects.count(), 1)
+        summary_page = self.client.get(real["Location"])
+        self.assertEqual(summary_page.context["upload_summary"]["created"], 1)
+
+    def test_import_excel_bulk_updates_existing_and_repeated_rows(self):
+        existing = self._deal(proposal="P-OLD", contract="SC-OLD")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "FEBRERO 2026"
+        ws.append(["SERVICE CONTRACT+/PROPOSAL ID", "SALES REP. NAME", "DATE APPROVED", "EPC PRICED"])
+        ws.append(["SC-OLD/P-OLD", "assoc_deals", "2026-02-01", "100"])
+        for idx in range(30):
+            ws.append([f"SC-N{idx}/P-N{idx}", "assoc_deals", "2026-02-02", "10"])
+        ws.append(["SC-N0/P-N0", "desconocido", "2026-02-03", "20"])
+        buffer = BytesIO()
+        wb.save(buffer)
+
+        with CaptureQueriesContext(connection) as ctx:
+            summary = _import_deals_from_excel(
+                file_obj=BytesIO(buffer.getvalue()),
+                sheet_name="FEBRERO 2026",
+                dry_run=False,
+                actor=self.partner,
+                deal_kind=CrmDeal.DealKind.RESIDENTIAL,
+            )
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual((summary["processed"], summary["created"], summary["updated"]), (32, 30, 2))
+        self.assertEqual(summary["errors"], [])
+        self.assertEqual(CrmDeal.objects.count(), 31)
+        existing.refresh_from_db()
+        self.assertEqual(existing.salesrep_id, self.associate_rep.id)
+        self.assertEqual(existing.epc_price, Decimal("100"))
+        repeated = CrmDeal.objects.get(proposal_id="P-N0")
+        self.assertEqual(repeated.epc_price, Decimal("20"))
+        self.assertEqual(find_rollup_drift()["dealdailyrollup"], 0)
+
+        dry = _import_deals_from_excel(
+            file_obj=BytesIO(buffer.getvalue()),
+            sheet_name="FEBRERO 2026",
+            dry_run=True,
+            actor=self.partner,
+            deal_kind=CrmDeal.DealKind.RESIDENTIAL,
+        )
+        self.assertEqual((dry["created"], dry["updated"]), (0, 32))
 
     def test_update_ajax_success_and_error(self):
         deal = self._deal(salesrep=self.associate_rep, proposal="P-UPD", contract="SC-UPD")
@@ -741,3 +1067,285 @@ class ResidentialDealsPipelineTests(TestCase):
         proposal_ids = {row["proposal_id"] for row in response.json()["data"]}
         self.assertIn("P-RES", proposal_ids)
         self.assertNotIn("P-COM", proposal_ids)
+
+    def test_api_pages_with_keyset_cursor(self):
+        today = timezone.localdate()
+        for idx in range(3):
+            self._deal(salesrep=self.partner_rep, proposal=f"P-K{idx}", contract=f"SC-K{idx}", closing_date=today - timedelta(days=idx))
+        self._deal(salesrep=self.partner_rep, proposal="P-NODATE", contract="SC-NODATE", stage=CrmDeal.Stage.CLOSED)
+        self.client.login(username="partner_deals", password="secretpass123")
+        url = reverse("dashboard:crm_deals_details_api")
+        first = self.client.get(url, {"deal_kind": "residential", "length": 2, "draw": 3}).json()
+        self.assertEqual(first["draw"], 3)
+        self.assertEqual([row["proposal_id"] for row in first["data"]], ["P-K0", "P-K1"])
+        self.assertEqual(first["recordsTotal"], 4)
+        self.assertEqual(first["recordsFiltered"], 4)
+        self.assertTrue(first["next_cursor"])
+        second = self.client.get(url, {"deal_kind": "residential", "length": 2, "cursor": first["next_cursor"]}).json()
+        self.assertEqual([row["proposal_id"] for row in second["data"]], ["P-K2", "P-NODATE"])
+        self.assertEqual(second["next_cursor"], "")
+        by_offset = self.client.get(url, {"deal_kind": "residential", "length": 2, "start": 2}).json()
+        self.assertEqual([row["proposal_id"] for row in by_offset["data"]], ["P-K2", "P-NODATE"])
+        self.assertEqual(second["kpis"]["stage_counts"], {"Planificado": 3, "Cerrado": 1})
+
+    def test_api_sorts_by_whitelisted_columns_with_keyset_cursor(self):
+        today = timezone.localdate()
+        for idx, size in enumerate(["7.5", "5.0", "6.25"]):
+            self._deal(
+                salesrep=self.partner_rep,
+                proposal=f"P-O{idx}",
+                contract=f"SC-O{idx}",
+                closing_date=today - timedelta(days=idx),
+                system_size=Decimal(size),
+            )
+        self._deal(salesrep=self.partner_rep, proposal="P-ONODATE", contract="SC-ONODATE")
+        self.client.login(username="partner_deals", password="secretpass123")
+        url = reverse("dashboard:crm_deals_details_api")
+
+        def page(column, direction, **extra):
+            params = {"deal_kind": "residential", "length": 2, "order[0][column]": 5, "order[0][dir]": direction, "columns[5][data]": column}
+            return self.client.get(url, {**params, **extra}).json()
+
+        first = page("closing_date", "asc")
+        self.assertEqual([row["proposal_id"] for row in first["data"]], ["P-O2", "P-O1"])
+        second = page("closing_date", "asc", cursor=first["next_cursor"])
+        self.assertEqual([row["proposal_id"] for row in second["data"]], ["P-O0", "P-ONODATE"])
+
+        first = page("system_size", "desc")
+        self.assertEqual([row["proposal_id"] for row in first["data"]], ["P-O0", "P-O2"])
+        second = page("system_size", "desc", cursor=first["next_cursor"])
+        self.assertEqual([row["proposal_id"] for row in second["data"]], ["P-O1", "P-ONODATE"])
+
+        # Una columna fuera de la lista vuelve a la fecha de cierre mas reciente primero.
+        fallback = page("customer_name", "asc")
+        self.assertEqual([row["proposal_id"] for row in fallback["data"]], ["P-O0", "P-O1"])
+
+    def test_api_search_uses_index_and_keeps_keyset_order(self):
+        self._deal(salesrep=self.partner_rep, proposal="P-A", contract="SC-A", customer_name="Marí Ortiz", closing_date=timezone.localdate())
+        self._deal(salesrep=self.partner_rep, proposal="P-B", contract="SC-B", customer_name="Mario Ortiz", stage=CrmDeal.Stage.SIGNED)
+        self._deal(salesrep=self.partner_rep, proposal="P-C", contract="SC-C", customer_name="Luis Vega")
+        self.client.login(username="partner_deals", password="secretpass123")
+        url = reverse("dashboard:crm_deals_details_api")
+
+        payload = self.client.get(url, {"deal_kind": "residential", "search": "mari ortiz"}).json()
+        self.assertEqual([row["proposal_id"] for row in payload["data"]], ["P-A", "P-B"])
+        self.assertEqual(payload["recordsFiltered"], 2)
+        signed = self.client.get(url, {"deal_kind": "residential", "search": "firmado"}).json()
+        self.assertEqual([row["proposal_id"] for row in signed["data"]], ["P-B"])
+
+    def test_values_serializer_matches_instance_serializer(self):
+        self._deal(salesrep=self.associate_rep, proposal="P-VAL", contract="SC-VAL", epc_price=Decimal("1234.50"), closing_date=timezone.localdate())
+        self._deal(proposal="P-NOREP", contract="SC-NOREP", imported_salesrep_name="Rep Importado")
+        qs = CrmDeal.objects.order_by("id")
+        self.assertEqual(
+            CrmDealDetailSerializer.serialize_values(qs.values(*CrmDealDetailSerializer.VALUES_FIELDS)),
+            CrmDealDetailSerializer.serialize_many(qs),
+        )
+
+    def test_search_kpis_use_single_grouped_query(self):
+        self._deal(salesrep=self.partner_rep, proposal="P-S1", contract="SC-S1", epc_price=Decimal("100"), closing_date=timezone.localdate())
+        self._deal(salesrep=self.partner_rep, proposal="P-S2", contract="SC-S2", epc_price=Decimal("50"), stage=CrmDeal.Stage.CLOSED)
+        with CaptureQueriesContext(connection) as ctx:
+            kpis = _compute_deal_kpis(CrmDeal.objects.all())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(kpis["total"], 2)
+        self.assertEqual(kpis["total_pipeline"], 150.0)
+        self.assertEqual(kpis["month_total"], 1)
+
+
+class SaleStatusTrackingTests(TestCase):
+    def setUp(self) -> None:
+        self.business_unit = BusinessUnit.objects.create(name="Techo", code="techo")
+        self.tier = Tier.objects.create(name="Junior", rank=1)
+        self.user = User.objects.create_user(username="tracked_rep", password="secretpass123")
+        self.rep = SalesRep.objects.create(user=self.user, business_unit=self.business_unit, tier=self.tier)
+        self.product = Product.objects.create(
+            business_unit=self.business_unit,
+            name="Solar Kit",
+            sku="SKU-TRACK",
+            price=Decimal("1000.00"),
+        )
+        self.plan = CompensationPlan.objects.create(business_unit=self.business_unit, product=self.product, name="PPA")
+        PlanTierRule.objects.create(
+            plan=self.plan,
+            tier=self.tier,
+            commission_percent=Decimal("10.00"),
+            bonus_percent=Decimal("2.00"),
+            points_per_dollar=Decimal("0.10"),
+        )
+        self.sale = Sale.objects.create(
+            business_unit=self.business_unit,
+            sales_rep=self.rep,
+            product=self.product,
+            plan=self.plan,
+            amount=Decimal("1000.00"),
+        )
+
+    def _status_selects(self, queries):
+        return [q for q in queries if q["sql"].startswith('SELECT "crm_sale"."status"')]
+
+    def test_confirming_loaded_sale_skips_status_select(self):
+        sale = Sale.objects.get(pk=self.sale.pk)
+        sale.status = Sale.Status.CONFIRMED
+        self.assertEqual(sale.get_dirty_fields(), {"status": Sale.Status.DRAFT})
+
+        with CaptureQueriesContext(connection) as ctx:
+            sale.save()
+
+        self.assertFalse(self._status_selects(ctx.captured_queries))
+        self.assertTrue(Commission.objects.filter(sale=sale).exists())
+        self.assertEqual(sale.get_dirty_fields(), {})
+
+    def test_resaving_confirmed_sale_does_not_recompute(self):
+        self.sale.status = Sale.Status.CONFIRMED
+        self.sale.save()
+        Commission.objects.filter(sale=self.sale).delete()
+
+        self.sale.amount = Decimal("2000.00")
+        self.sale.save()
+        self.assertFalse(Commission.objects.filter(sale=self.sale).exists())
+
+    def test_deferred_status_falls_back_to_query(self):
+        sale = Sale.objects.defer("status").get(pk=self.sale.pk)
+        sale.status = Sale.Status.CONFIRMED
+
+        with CaptureQueriesContext(connection) as ctx:
+            sale.save()
+
+        self.assertEqual(len(self._status_selects(ctx.captured_queries)), 1)
+        self.assertTrue(Commission.objects.filter(sale=sale).exists())
+
+    def test_lead_tracks_status_and_owner_changes(self):
+        lead = Lead.objects.create(business_unit=self.business_unit, full_name="Cliente", sales_rep=self.rep)
+        lead = Lead.objects.get(pk=lead.pk)
+        lead.status = Lead.Status.CONTACTADO
+        lead.sales_rep = None
+
+        self.assertEqual(lead.get_dirty_fields(), {"status": Lead.Status.NUEVO, "sales_rep": self.rep.pk})
+        lead.save(update_fields=["status"])
+        self.assertEqual(lead.get_dirty_fields(), {"sales_rep": self.rep.pk})
+
+
+class LeadFingerprintTests(TestCase):
+    def setUp(self) -> None:
+        self.business_unit = BusinessUnit.objects.create(name="Solar", code="solar_fp")
+        self.rep = SalesRep.objects.create(
+            user=User.objects.create_user(username="fp_rep", password="secretpass123"),
+            business_unit=self.business_unit,
+        )
+
+    def _lead(self, **fields) -> Lead:
+        return Lead.objects.create(business_unit=self.business_unit, full_name="Cliente", **fields)
+
+    def test_fingerprints_follow_lead_saves_and_deletes(self):
+        lead = self._lead(invoice_hash="ABC", account_number="a1", meter_number="m1", location_id="l1")
+        self.assertEqual(
+            set(lead.fingerprints.values_list("kind", "key")),
+            {("hash", "abc"), ("service", LeadFingerprint.service_key("A1", "M1", "L1"))},
+        )
+
+        with CaptureQueriesContext(connection) as ctx:
+            lead.full_name = "Otro nombre"
+            lead.save()
+        self.assertFalse([q for q in ctx.captured_queries if "crm_leadfingerprint" in q["sql"]])
+
+        lead.location_id = ""
+        lead.save(update_fields=["location_id"])
+        self.assertEqual(set(lead.fingerprints.values_list("kind", "key")), {("hash", "abc")})
+
+        lead.delete()
+        self.assertFalse(LeadFingerprint.objects.exists())
+
+    def test_single_query_answers_duplicate_lead_and_override(self):
+        older = self._lead(account_number="A1", meter_number="M1", location_id="L1")
+        newer = self._lead(invoice_hash="h1", account_number="A1", meter_number="M1", location_id="L1")
+        candidate = Fingerprints.of(invoice_hashes=["H1"], account_number="a1", meter_number="m1", location_id="l1")
+
+        with self.assertNumQueries(1):
+            match = find_duplicate(candidate, override_requester=self.rep)
+        self.assertEqual((match.hash_lead_id, match.service_lead_id, match.has_override), (newer.pk, newer.pk, False))
+        self.assertEqual(find_duplicate(candidate, exclude_lead_id=newer.pk).lead_id, older.pk)
+
+        InvoiceDuplicateOverride.objects.create(
+            requester=self.rep,
+            account_number="A1",
+            meter_number="M1",
+            location_id="L1",
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertTrue(find_duplicate(candidate, override_requester=self.rep).has_override)
+        self.assertIsNone(find_duplicate(Fingerprints.of(invoice_hashes=["otro"])))
+
+    def test_batch_check_uses_one_query(self):
+        first = self._lead(invoice_hash="h1")
+        second = self._lead(account_number="A2", meter_number="M2", location_id="L2")
+        candidates = [
+            Fingerprints.of(invoice_hashes=["h1"]),
+            Fingerprints.of(account_number="A2", meter_number="M2", location_id="L2"),
+            Fingerprints.of(invoice_hashes=["nuevo"]),
+        ]
+        with self.assertNumQueries(1):
+            matches = find_duplicates(candidates)
+        self.assertEqual(matches[0].hash_lead_id, first.pk)
+        self.assertEqual(matches[1].service_lead_id, second.pk)
+        self.assertIsNone(matches[2])
+
+    def test_rebuild_command_repairs_drift(self):
+        self._lead(invoice_hash="h1")
+        LeadFingerprint.objects.all().delete()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_lead_fingerprints", "--check", stdout=StringIO())
+        call_command("rebuild_lead_fingerprints", stdout=StringIO())
+        call_command("rebuild_lead_fingerprints", "--check", stdout=StringIO())
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self) -> None:
+        self.business_unit = BusinessUnit.objects.create(name="Solar Home Power", code="solar-home-power")
+
+    def _document(self, obj) -> str:
+        kind = SearchDocument.Kind.LEAD if isinstance(obj, Lead) else SearchDocument.Kind.DEAL
+        return SearchDocument.objects.get(kind=kind, object_id=obj.pk).body
+
+    def test_fold_strips_accents_and_punctuation(self):
+        self.assertEqual(fold("Peñuelas, JOSÉ-Ángel (787)"), ["penuelas", "jose", "angel", "787"])
+
+    def test_documents_follow_saves_and_deletes(self):
+        lead = Lead.objects.create(business_unit=self.business_unit, full_name="Ñico Pérez", customer_phone="787-555-0101")
+        self.assertEqual(self._document(lead), "nico perez 787 555 0101 7875550101 5550101")
+
+        with CaptureQueriesContext(connection) as ctx:
+            lead.save(update_fields=["status"])
+        self.assertFalse([q for q in ctx.captured_queries if "crm_searchdocument" in q["sql"]])
+
+        lead.full_name = "Nicolás"
+        lead.save(update_fields=["full_name"])
+        self.assertTrue(self._document(lead).startswith("nicolas "))
+        self.assertEqual(list(apply_search(Lead.objects.all(), "NICOL")), [lead])
+        self.assertFalse(apply_search(Lead.objects.all(), "nico perez").exists())
+
+        deal = CrmDeal.objects.create(customer_name="Cliente", proposal_id="P-9", stage=CrmDeal.Stage.INSTALLED)
+        self.assertIn("installed instalado", self._document(deal))
+        lead.delete()
+        deal.delete()
+        self.assertFalse(SearchDocument.objects.exists())
+        self.assertFalse(apply_search(Lead.objects.all(), "nicolas").exists())
+
+    def test_bulk_import_is_indexed(self):
+        rep = SalesRep.objects.create(user=User.objects.create_user(username="search_rep", password="x"), business_unit=self.business_unit)
+        csv_file = BytesIO("Nombre;Teléfono\nMaría Gómez;787-555-0199\n".encode("utf-8"))
+        summary = _import_leads_from_file(
+            file_obj=csv_file, file_name="leads.csv", sheet_name="", dry_run=False, actor=rep.user, sales_rep_id=rep.pk
+        )
+        self.assertEqual(summary["created"], 1)
+        self.assertEqual(apply_search(Lead.objects.all(), "gomez 0199").get().full_name, "María Gómez")
+
+    def test_rebuild_command_repairs_drift(self):
+        lead = Lead.objects.create(business_unit=self.business_unit, full_name="Drift")
+        SearchDocument.objects.filter(object_id=lead.pk).update(body="otro")
+        with self.assertRaises(CommandError):
+            call_command("rebuild_search_index", "--check", stdout=StringIO())
+        call_command("rebuild_search_index", stdout=StringIO())
+        call_command("rebuild_search_index", "--check", stdout=StringIO())
+        self.assertEqual(list(apply_search(Lead.objects.all(), "drift")), [lead])
+        self.assertFalse(apply_search(Lead.objects.all(), "otro").exists())
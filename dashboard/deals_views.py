@@ -5,12 +5,15 @@ from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 import logging
 import re
+from urllib.parse import urlencode
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
 from django.http import Http404, JsonResponse
-from django.shortcuts import get_object_or_404, render
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods
@@ -21,11 +24,22 @@ from core.rbac.constants import ModuleCode, PermissionAction, RoleCode
 from core.rbac.services import has_module_permission
 from crm.forms import CrmDealExcelUploadForm, CrmDealSalesrepForm
 from crm.models import CrmDeal, SalesRep
+from crm.search import apply_search
+from crm.search import index_documents
 from crm.serializers import CrmDealDetailSerializer
+from dashboard.models import DealDailyRollup
+from dashboard.request_params import int_param
 from dashboard.services.hierarchy_scope_service import get_downline_user_ids
+from dashboard.services.rollup_service import deal_buckets
+from dashboard.services.rollup_service import refresh_deal_buckets
+from dashboard.services.sales_metrics_service import compute_deal_kpis
+from jobs.models import Job
+from jobs.services import enqueue
 
 logger = logging.getLogger(__name__)
 
+DEAL_IMPORT_JOB = "deals.import_excel"
+
 
 @dataclass(frozen=True)
 class DealAccess:
@@ -91,11 +105,10 @@ def _deal_access(user) -> DealAccess:
     )
 
 
-def _deals_queryset_for_user(user, *, deal_kind: str):
-    access = _deal_access(user)
+def _visible_deals(access: DealAccess, qs):
+    """Narrow ``qs`` (CrmDeal or DealDailyRollup, both keyed by ``salesrep``) to what ``access`` may see."""
     if not access.can_view:
-        return CrmDeal.objects.none()
-    qs = CrmDeal.objects.filter(deal_kind=deal_kind).select_related("salesrep__user", "imported_by")
+        return qs.none()
     if access.is_global:
         return qs
     if access.visible_user_ids and len(access.visible_user_ids) > 1:
@@ -105,7 +118,16 @@ def _deals_queryset_for_user(user, *, deal_kind: str):
         return qs.filter(q)
     if access.my_salesrep:
         return qs.filter(salesrep=access.my_salesrep)
-    return CrmDeal.objects.none()
+    return qs.none()
+
+
+def _deals_queryset_for_user(user, *, deal_kind: str, access: DealAccess | None = None):
+    qs = CrmDeal.objects.filter(deal_kind=deal_kind).select_related("salesrep__user", "imported_by")
+    return _visible_deals(access or _deal_access(user), qs)
+
+
+def _deal_rollups_for_user(user, *, deal_kind: str, access: DealAccess | None = None):
+    return _visible_deals(access or _deal_access(user), DealDailyRollup.objects.filter(deal_kind=deal_kind))
 
 
 def _salesrep_choices_for_user(user):
@@ -200,16 +222,29 @@ def _sync_deal_hierarchy_snapshot(deal: CrmDeal, salesrep: SalesRep | None):
     deal.partner_rate = salesrep.partner_rate or Decimal("0")
 
 
-def _match_salesrep_by_name(name: str) -> SalesRep | None:
-    candidate = (name or "").strip()
-    if not candidate:
-        return None
-    qs = SalesRep.objects.select_related("user").filter(is_active=True)
+REP_HIERARCHY_FIELDS = (
+    "consultant",
+    "teamleader",
+    "manager",
+    "promanager",
+    "executivemanager",
+    "jr_partner",
+    "partner",
+)
+
+
+def _salesrep_name_index() -> dict[str, SalesRep]:
+    """Active reps keyed by lowercased display name, loaded once per import with the chain used by the snapshot."""
+    qs = SalesRep.objects.select_related(
+        "user",
+        *(f"{field}__user" for field in REP_HIERARCHY_FIELDS),
+    ).filter(is_active=True)
+    index: dict[str, SalesRep] = {}
     for rep in qs:
         display = rep.user.get_full_name().strip() or rep.user.get_username()
-        if display.lower() == candidate.lower():
-            return rep
-    return None
+        # Ante nombres repetidos gana el primero en el orden por username, como antes.
+        index.setdefault(display.lower(), rep)
+    return index
 
 
 def _parse_contract_and_proposal(raw_value: str) -> tuple[str, str]:
@@ -222,7 +257,73 @@ def _parse_contract_and_proposal(raw_value: str) -> tuple[str, str]:
     return value, value
 
 
-def _import_deals_from_excel(*, file_obj, sheet_name: str, dry_run: bool, actor, deal_kind: str) -> dict:
+IMPORT_CHUNK_SIZE = 500
+IMPORTED_DEAL_FIELDS = (
+    "sunrun_service_contract_id",
+    "proposal_id",
+    "imported_salesrep_name",
+    "imported_by",
+    "imported_at",
+    "closing_date",
+    "sr_signoff_date",
+    "epc_price",
+    "system_size",
+    "epc_base",
+    "epc_table",
+    "epc_adjustment",
+    "stage",
+    "salesrep",
+    "consultant_name",
+    "advisor_name",
+    "manager_name",
+    "senior_manager_name",
+    "elite_manager_name",
+    "business_manager_name",
+    "jr_partner_name",
+    "partner_name",
+    "consultant_rate",
+    "advisor_rate",
+    "manager_rate",
+    "senior_manager_rate",
+    "elite_manager_rate",
+    "business_manager_rate",
+    "jr_partner_rate",
+    "partner_rate",
+    "updated_at",
+)
+
+
+class _ExistingDeals:
+    """Deals of one kind matching a chunk of the report, looked up by contract or proposal ID.
+
+    Mirrors ``filter(Q(contract) | Q(proposal)).first()``: when both IDs hit different deals,
+    the one that sorts first in ``CrmDeal.Meta.ordering`` wins.
+    """
+
+    def __init__(self, deal_kind: str, keys: list[tuple[str, str]]):
+        contracts = {contract for contract, _ in keys}
+        proposals = {proposal for _, proposal in keys}
+        self.by_contract: dict[str, tuple[int, CrmDeal]] = {}
+        self.by_proposal: dict[str, tuple[int, CrmDeal]] = {}
+        deals = CrmDeal.objects.filter(deal_kind=deal_kind).filter(
+            Q(sunrun_service_contract_id__in=contracts) | Q(proposal_id__in=proposals)
+        )
+        for rank, deal in enumerate(deals):
+            self.by_contract.setdefault(deal.sunrun_service_contract_id, (rank, deal))
+            self.by_proposal.setdefault(deal.proposal_id, (rank, deal))
+
+    def find(self, contract: str, proposal: str) -> CrmDeal | None:
+        hits = [hit for hit in (self.by_contract.get(contract), self.by_proposal.get(proposal)) if hit]
+        return min(hits, key=lambda hit: hit[0])[1] if hits else None
+
+    def remember(self, deal: CrmDeal) -> None:
+        # Filas repetidas dentro del mismo bloque actualizan el deal pendiente, como si ya estuviera guardado.
+        self.by_contract[deal.sunrun_service_contract_id] = (-1, deal)
+        self.by_proposal[deal.proposal_id] = (-1, deal)
+
+
+def _import_deals_from_excel(*, file_obj, sheet_name: str, dry_run: bool, actor, deal_kind: str, progress=None) -> dict:
+    """Import a Sunrun report sheet; ``progress(rows_done, rows_total)`` is called after every chunk."""
     summary = {
         "processed": 0,
         "created": 0,
@@ -231,115 +332,234 @@ def _import_deals_from_excel(*, file_obj, sheet_name: str, dry_run: bool, actor,
         "warnings": [],
         "errors": [],
     }
-    wb = load_workbook(file_obj, data_only=True)
-    ws = wb[sheet_name] if sheet_name and sheet_name in wb.sheetnames else wb[wb.sheetnames[0]]
-    rows = list(ws.iter_rows(values_only=True))
-    if not rows:
-        summary["errors"].append("La hoja seleccionada no contiene datos.")
-        return summary
-    header = [_norm_header(str(cell or "")) for cell in rows[0]]
-    idx = {name: i for i, name in enumerate(header)}
-
-    def col(*names):
-        for name in names:
-            if name in idx:
-                return idx[name]
-        return None
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name and sheet_name in wb.sheetnames else wb[wb.sheetnames[0]]
+        rows = ws.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            summary["errors"].append("La hoja seleccionada no contiene datos.")
+            return summary
+        header = [_norm_header(str(cell or "")) for cell in header_row]
+        idx = {name: i for i, name in enumerate(header)}
+
+        def col(*names):
+            for name in names:
+                if name in idx:
+                    return idx[name]
+            return None
+
+        columns = {
+            "contract": col("SERVICE CONTRACT PROPOSAL ID", "SERVICE CONTRACT PROPOSAL ID "),
+            "rep_name": col("SALES REP NAME", "SALES REP NAME "),
+            "date_approved": col("DATE APPROVED"),
+            "epc_priced": col("EPC PRICED"),
+            "system_size": col("SYSTEM SIZE DC"),
+            "epc_base": col("EPC BASE"),
+            "epc_table": col("EPC TABLA"),
+            "epc_adj": col("AJUSTE POR EPC"),
+        }
+        # En modo read-only max_row sale de la etiqueta <dimension> y puede faltar.
+        rows_total = max((ws.max_row or 0) - 1, 0)
+        reps_by_name = _salesrep_name_index()
+        imported_at = timezone.now()
+        # En dry-run nada se guarda; se recuerdan las claves vistas para contar igual que la importacion real.
+        dry_run_keys: set[tuple[str, str]] = set()
+
+        chunk: list[tuple[int, tuple]] = []
+        for row_idx, row in enumerate(rows, start=2):
+            chunk.append((row_idx, row))
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                _import_deal_chunk(chunk, columns, reps_by_name, summary, dry_run, dry_run_keys, actor, deal_kind, imported_at)
+                chunk = []
+                if progress:
+                    progress(summary["processed"], rows_total)
+        if chunk:
+            _import_deal_chunk(chunk, columns, reps_by_name, summary, dry_run, dry_run_keys, actor, deal_kind, imported_at)
+    finally:
+        wb.close()
 
-    col_contract = col("SERVICE CONTRACT PROPOSAL ID", "SERVICE CONTRACT PROPOSAL ID ")
-    col_rep_name = col("SALES REP NAME", "SALES REP NAME ")
-    col_date_approved = col("DATE APPROVED")
-    col_epc_priced = col("EPC PRICED")
-    col_system_size = col("SYSTEM SIZE DC")
-    col_epc_base = col("EPC BASE")
-    col_epc_table = col("EPC TABLA")
-    col_epc_adj = col("AJUSTE POR EPC")
+    if len(summary["warnings"]) > 20:
+        summary["warnings_hidden"] = len(summary["warnings"]) - 20
+        summary["warnings"] = summary["warnings"][:20]
+    else:
+        summary["warnings_hidden"] = 0
+    if len(summary["errors"]) > 20:
+        summary["errors_hidden"] = len(summary["errors"]) - 20
+        summary["errors"] = summary["errors"][:20]
+    else:
+        summary["errors_hidden"] = 0
+    return summary
+
+
+def _import_deal_chunk(chunk, columns, reps_by_name, summary, dry_run, dry_run_keys, actor, deal_kind, imported_at) -> None:
+    def cell(row, name):
+        position = columns[name]
+        return row[position] if position is not None and position < len(row) else None
 
-    for row_idx, row in enumerate(rows[1:], start=2):
+    parsed = []
+    for row_idx, row in chunk:
         summary["processed"] += 1
-        contract_raw = str(row[col_contract] or "").strip() if col_contract is not None and col_contract < len(row) else ""
+        contract_raw = str(cell(row, "contract") or "").strip()
         if not contract_raw:
             summary["skipped"] += 1
             summary["warnings"].append(f"Fila {row_idx}: sin SERVICE CONTRACT+/PROPOSAL ID.")
             continue
+        parsed.append((row_idx, row, _parse_contract_and_proposal(contract_raw)))
+    if not parsed:
+        return
 
-        service_contract, proposal = _parse_contract_and_proposal(contract_raw)
-        imported_salesrep_name = str(row[col_rep_name] or "").strip() if col_rep_name is not None and col_rep_name < len(row) else ""
-
-        existing = CrmDeal.objects.filter(deal_kind=deal_kind).filter(
-            Q(sunrun_service_contract_id=service_contract) | Q(proposal_id=proposal)
-        ).first()
+    existing_deals = _ExistingDeals(deal_kind, [keys for _, _, keys in parsed])
+    to_create: dict[int, CrmDeal] = {}
+    to_update: dict[int, CrmDeal] = {}
+    created = updated = 0
+    for row_idx, row, (service_contract, proposal) in parsed:
+        imported_salesrep_name = str(cell(row, "rep_name") or "").strip()
+        existing = existing_deals.find(service_contract, proposal)
         deal = existing or CrmDeal(deal_kind=deal_kind)
+        is_update = existing is not None or (
+            dry_run and (("contract", service_contract) in dry_run_keys or ("proposal", proposal) in dry_run_keys)
+        )
 
         deal.sunrun_service_contract_id = service_contract
         deal.proposal_id = proposal
         deal.imported_salesrep_name = imported_salesrep_name
         deal.imported_by = actor
-        deal.imported_at = timezone.now()
-        deal.closing_date = _normalize_date(row[col_date_approved] if col_date_approved is not None and col_date_approved < len(row) else None)
+        deal.imported_at = imported_at
+        deal.updated_at = imported_at
+        deal.closing_date = _normalize_date(cell(row, "date_approved"))
         deal.sr_signoff_date = deal.closing_date
-        deal.epc_price = _normalize_decimal(row[col_epc_priced] if col_epc_priced is not None and col_epc_priced < len(row) else None)
-        deal.system_size = _normalize_decimal(row[col_system_size] if col_system_size is not None and col_system_size < len(row) else None)
-        deal.epc_base = _normalize_decimal(row[col_epc_base] if col_epc_base is not None and col_epc_base < len(row) else None)
-        deal.epc_table = _normalize_decimal(row[col_epc_table] if col_epc_table is not None and col_epc_table < len(row) else None)
-        deal.epc_adjustment = _normalize_decimal(row[col_epc_adj] if col_epc_adj is not None and col_epc_adj < len(row) else None)
+        deal.epc_price = _normalize_decimal(cell(row, "epc_priced"))
+        deal.system_size = _normalize_decimal(cell(row, "system_size"))
+        deal.epc_base = _normalize_decimal(cell(row, "epc_base"))
+        deal.epc_table = _normalize_decimal(cell(row, "epc_table"))
+        deal.epc_adjustment = _normalize_decimal(cell(row, "epc_adj"))
         if not deal.stage:
             deal.stage = CrmDeal.Stage.PLANNED
 
-        matched_rep = _match_salesrep_by_name(imported_salesrep_name)
+        matched_rep = reps_by_name.get(imported_salesrep_name.lower()) if imported_salesrep_name else None
         if matched_rep:
             deal.salesrep = matched_rep
             _sync_deal_hierarchy_snapshot(deal, matched_rep)
         elif imported_salesrep_name:
             summary["warnings"].append(f'Fila {row_idx}: no se encontro asociado "{imported_salesrep_name}".')
 
+        if is_update:
+            updated += 1
+        else:
+            created += 1
         if dry_run:
-            if existing:
-                summary["updated"] += 1
-            else:
-                summary["created"] += 1
+            dry_run_keys.add(("contract", service_contract))
+            dry_run_keys.add(("proposal", proposal))
             continue
+        if deal.pk:
+            to_update[id(deal)] = deal
+        else:
+            to_create[id(deal)] = deal
+        existing_deals.remember(deal)
+
+    if dry_run:
+        summary["created"] += created
+        summary["updated"] += updated
+        return
 
-        try:
-            deal.save()
-            if existing:
-                summary["updated"] += 1
-            else:
-                summary["created"] += 1
-        except Exception as exc:
-            summary["errors"].append(f"Fila {row_idx}: error guardando registro ({exc}).")
-
-    if len(summary["warnings"]) > 20:
-        summary["warnings_hidden"] = len(summary["warnings"]) - 20
-        summary["warnings"] = summary["warnings"][:20]
-    else:
-        summary["warnings_hidden"] = 0
-    if len(summary["errors"]) > 20:
-        summary["errors_hidden"] = len(summary["errors"]) - 20
-        summary["errors"] = summary["errors"][:20]
-    else:
-        summary["errors_hidden"] = 0
-    return summary
+    # bulk_create/bulk_update no emiten post_save: los rollups del pipeline y el indice de busqueda se actualizan aqui.
+    buckets = set()
+    for deal in (*to_create.values(), *to_update.values()):
+        buckets |= deal_buckets(deal)
+    first_row, last_row = chunk[0][0], chunk[-1][0]
+    try:
+        with transaction.atomic():
+            CrmDeal.objects.bulk_create(to_create.values(), batch_size=IMPORT_CHUNK_SIZE)
+            CrmDeal.objects.bulk_update(to_update.values(), IMPORTED_DEAL_FIELDS, batch_size=IMPORT_CHUNK_SIZE)
+            index_documents([*to_create.values(), *to_update.values()])
+            refresh_deal_buckets(buckets)
+    except Exception as exc:
+        summary["errors"].append(f"Filas {first_row}-{last_row}: error guardando registros ({exc}).")
+        return
+    summary["created"] += created
+    summary["updated"] += updated
 
 
 def _compute_deal_kpis(qs):
+    """Deal KPIs in one grouped aggregate: per-stage counts, EPC pipeline and closings this month."""
     now = timezone.localdate()
-    total = qs.count()
-    total_pipeline = qs.aggregate(total=Sum("epc_price"))["total"] or Decimal("0")
-    month_total = qs.filter(closing_date__year=now.year, closing_date__month=now.month).count()
+    rows = (
+        qs.order_by()
+        .values("stage")
+        .annotate(
+            total=Count("id"),
+            pipeline=Sum("epc_price"),
+            month_total=Count("id", filter=Q(closing_date__year=now.year, closing_date__month=now.month)),
+        )
+    )
+    by_stage = {row["stage"]: row for row in rows}
     stage_counts = {}
     for stage_key, stage_label in CrmDeal.Stage.choices:
-        value = qs.filter(stage=stage_key).count()
+        value = by_stage[stage_key]["total"] if stage_key in by_stage else 0
         if value:
             stage_counts[stage_label] = value
     return {
-        "total": total,
-        "total_pipeline": float(total_pipeline),
-        "month_total": month_total,
+        "total": sum(row["total"] for row in by_stage.values()),
+        "total_pipeline": float(sum((row["pipeline"] or Decimal("0") for row in by_stage.values()), Decimal("0"))),
+        "month_total": sum(row["month_total"] for row in by_stage.values()),
         "stage_counts": stage_counts,
     }
 
 
+DEALS_PAGE_SIZE = 50
+DEALS_MAX_PAGE_SIZE = 500
+# Columnas que la tabla deja ordenar: todas paginan por cursor (valor, id) con los nulos siempre al final.
+DEALS_SORT_FIELDS = {
+    "closing_date": date.fromisoformat,
+    "sr_signoff_date": date.fromisoformat,
+    "customer_sign_off_date": date.fromisoformat,
+    "final_completion_date": date.fromisoformat,
+    "system_size": Decimal,
+    "epc_price": Decimal,
+}
+# Mismo orden que CrmDeal.Meta.ordering.
+DEFAULT_DEALS_SORT = ("closing_date", True)
+
+
+def _deals_sort(params) -> tuple[str, bool]:
+    """Column and descending flag of the DataTables ``order[0]``; other columns fall back to ``DEFAULT_DEALS_SORT``."""
+    index = (params.get("order[0][column]") or "").strip()
+    field = (params.get(f"columns[{index}][data]") or "").strip() if index.isdigit() else ""
+    if field not in DEALS_SORT_FIELDS:
+        return DEFAULT_DEALS_SORT
+    return field, params.get("order[0][dir]") != "asc"
+
+
+def _deals_keyset_ordering(field: str, descending: bool) -> tuple:
+    if descending:
+        return F(field).desc(nulls_last=True), "-id"
+    return F(field).asc(nulls_last=True), "id"
+
+
+def _deal_cursor(row: dict, field: str) -> str:
+    value = row[field]
+    return f"{'' if value is None else value}:{row['id']}"
+
+
+def _after_deal_cursor(qs, cursor: str, field: str, descending: bool):
+    """Rows strictly after ``cursor`` in ``_deals_keyset_ordering``; an unreadable cursor restarts the listing."""
+    raw_value, _, raw_id = cursor.partition(":")
+    try:
+        last_id = int(raw_id)
+        last_value = DEALS_SORT_FIELDS[field](raw_value) if raw_value else None
+    except (ValueError, ArithmeticError):
+        return qs
+    after = "lt" if descending else "gt"
+    if last_value is None:
+        return qs.filter(**{f"{field}__isnull": True, f"id__{after}": last_id})
+    return qs.filter(
+        Q(**{f"{field}__{after}": last_value})
+        | Q(**{field: last_value, f"id__{after}": last_id})
+        | Q(**{f"{field}__isnull": True})
+    )
+
+
 def _month_options(qs):
     values = (
         qs.exclude(closing_date__isnull=True)
@@ -359,7 +579,7 @@ def crm_deals_list_page(request):
         return JsonResponse({"detail": "No autorizado"}, status=403)
 
     deal_kind = (request.GET.get("deal_kind") or request.POST.get("deal_kind") or CrmDeal.DealKind.RESIDENTIAL).strip() or CrmDeal.DealKind.RESIDENTIAL
-    base_qs = _deals_queryset_for_user(request.user, deal_kind=deal_kind)
+    base_qs = _deals_queryset_for_user(request.user, deal_kind=deal_kind, access=access)
     upload_summary = None
     upload_form = CrmDealExcelUploadForm()
 
@@ -369,33 +589,40 @@ def crm_deals_list_page(request):
         upload_form = CrmDealExcelUploadForm(request.POST, request.FILES)
         if upload_form.is_valid():
             cleaned = upload_form.cleaned_data
-            try:
-                upload_summary = _import_deals_from_excel(
-                    file_obj=cleaned["report_file"],
-                    sheet_name=cleaned.get("sheet_name") or "",
-                    dry_run=bool(cleaned.get("dry_run")),
-                    actor=request.user,
-                    deal_kind=deal_kind,
-                )
-                if cleaned.get("dry_run"):
-                    messages.info(request, "Validacion completada (dry run).")
-                else:
-                    messages.success(request, "Informe procesado correctamente.")
-            except Exception:
-                logger.exception("Error procesando importacion de deals")
-                messages.error(request, "No fue posible procesar el informe.")
+            job = enqueue(
+                DEAL_IMPORT_JOB,
+                user=request.user,
+                payload={
+                    "sheet_name": cleaned.get("sheet_name") or "",
+                    "dry_run": bool(cleaned.get("dry_run")),
+                    "deal_kind": deal_kind,
+                },
+                files={"report_file": cleaned["report_file"]},
+            )
+            messages.info(request, "Informe recibido; el resumen aparecera cuando termine de procesarse.")
+            return redirect(f"{request.path}?{urlencode({'deal_kind': deal_kind, 'import_job': job.pk})}")
+
+    import_job = None
+    import_job_id = request.GET.get("import_job") or ""
+    if import_job_id.isdigit():
+        import_job = Job.objects.filter(pk=int(import_job_id), kind=DEAL_IMPORT_JOB, created_by=request.user).first()
+        if import_job and import_job.status == Job.Status.SUCCEEDED:
+            upload_summary = import_job.result
 
     context = {
         "title": "Pipeline de Deals",
         "deal_kind": deal_kind,
         "upload_form": upload_form,
         "upload_summary": upload_summary,
+        "import_job": import_job,
+        "import_job_status_url": reverse("jobs:job_status", args=[import_job.pk]) if import_job else "",
         "can_reassign_deals_ui": access.can_reassign,
         "can_delete_deals_ui": access.can_delete,
         "api_url": "/apps/api/deals-details/",
         "stages": list(CrmDeal.Stage.choices),
+        "sort_fields": list(DEALS_SORT_FIELDS),
         "month_options": _month_options(base_qs),
-        "kpis": _compute_deal_kpis(base_qs),
+        "kpis": compute_deal_kpis(_deal_rollups_for_user(request.user, deal_kind=deal_kind, access=access)),
     }
     return render(request, "dashboard/deals/deals_list.html", context)
 
@@ -411,28 +638,51 @@ def crm_deals_details_api(request):
     month = (request.GET.get("month") or "").strip()
     search = (request.GET.get("search") or request.GET.get("search[value]") or "").strip()
 
-    qs = _deals_queryset_for_user(request.user, deal_kind=deal_kind)
+    qs = _deals_queryset_for_user(request.user, deal_kind=deal_kind, access=access)
+    rollups = _deal_rollups_for_user(request.user, deal_kind=deal_kind, access=access)
+    records_total = rollups.order_by().aggregate(total=Sum("deal_count"))["total"] or 0
     if stage:
         qs = qs.filter(stage=stage)
+        rollups = rollups.filter(stage=stage)
     if month and re.match(r"^\d{4}-\d{2}$", month):
         year, mon = month.split("-")
         qs = qs.filter(closing_date__year=int(year), closing_date__month=int(mon))
+        rollups = rollups.filter(day__year=int(year), day__month=int(mon))
     if search:
-        qs = qs.filter(
-            Q(customer_name__icontains=search)
-            | Q(customer_email__icontains=search)
-            | Q(customer_phone__icontains=search)
-            | Q(proposal_id__icontains=search)
-            | Q(sunrun_service_contract_id__icontains=search)
-            | Q(stage__icontains=search)
-            | Q(imported_salesrep_name__icontains=search)
-        )
-
-    rows = CrmDealDetailSerializer.serialize_many(qs.order_by("-closing_date", "-id"))
+        qs = apply_search(qs, search)
+
+    length = int_param(request.GET, "length", DEALS_PAGE_SIZE)
+    if length < 1 or length > DEALS_MAX_PAGE_SIZE:
+        length = DEALS_MAX_PAGE_SIZE
+    sort_field, descending = _deals_sort(request.GET)
+    cursor = (request.GET.get("cursor") or "").strip()
+    page_qs = qs.order_by(*_deals_keyset_ordering(sort_field, descending))
+    if cursor:
+        page_qs = _after_deal_cursor(page_qs, cursor, sort_field, descending)
+    else:
+        # Sin cursor (salto directo a una pagina de DataTables) se cae a OFFSET.
+        start = max(int_param(request.GET, "start", 0), 0)
+        page_qs = page_qs[start:]
+    values = list(page_qs.values(*CrmDealDetailSerializer.VALUES_FIELDS)[: length + 1])
+    has_more = len(values) > length
+    values = values[:length]
+
+    rows = CrmDealDetailSerializer.serialize_values(values)
     for row in rows:
         row["can_edit"] = access.can_reassign
         row["can_delete"] = access.can_delete
-    return JsonResponse({"data": rows, "kpis": _compute_deal_kpis(qs)})
+    # La busqueda libre no tiene equivalente en los rollups; solo entonces se agrega sobre los deals.
+    kpis = _compute_deal_kpis(qs) if search else compute_deal_kpis(rollups)
+    return JsonResponse(
+        {
+            "draw": int_param(request.GET, "draw", 0),
+            "data": rows,
+            "next_cursor": _deal_cursor(values[-1], sort_field) if has_more else "",
+            "recordsTotal": records_total,
+            "recordsFiltered": kpis["total"],
+            "kpis": kpis,
+        }
+    )
 
 
 def _visible_deal_or_404(user, deal_id: int, deal_kind: str) -> CrmDeal:
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import csv
 import hashlib
 import io
+import itertools
 import json
 import logging
 import os
 import random
 import re
 import shutil
+import unicodedata
+from collections.abc import Iterator
+from contextlib import ExitStack
+from contextlib import contextmanager
 from dataclasses import dataclass
+from dataclasses import field
 from datetime import datetime
 from datetime import timedelta
 from decimal import Decimal
@@ -19,9 +26,11 @@ from pathlib import Path
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
 from django.db.models import Count, Q
 from django.http import Http404
-from django.http import HttpResponse
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 from django.shortcuts import redirect
@@ -30,12 +39,15 @@ from django.urls import reverse
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 
+from openpyxl import load_workbook
+
 from core.models import BusinessUnit
 from core.rbac.constants import ModuleCode
 from core.rbac.constants import PermissionAction
 from core.rbac.constants import RoleCode
 from core.rbac.services import has_module_permission
 from crm.forms import LeadForm
+from crm.forms import LeadImportUploadForm
 from crm.forms import LeadGenerationPublicForm
 from crm.forms import LeadNoteForm
 from crm.models import InvoiceDuplicateOverride
@@ -45,7 +57,29 @@ from crm.models import LeadActivityLog
 from crm.models import LeadNote
 from crm.models import LeadSource
 from crm.models import SalesRep
+from crm.search import apply_search
+from crm.search import index_documents
+from crm.search import with_search_rank
+from crm.services import Fingerprints
+from crm.services import add_fingerprints_for_leads
+from crm.services import consume_override
+from crm.services import find_duplicate
+from crm.services import find_duplicates
+from dashboard.request_params import int_param
+from dashboard.services import ocr_service
+from dashboard.services import qr_service
 from dashboard.services.hierarchy_scope_service import get_downline_user_ids
+from dashboard.services.invoice_cache_service import cached_extraction
+from dashboard.services.invoice_extraction_service import extract_invoice_fields
+from dashboard.services.invoice_extraction_service import has_required_fields
+from dashboard.services.lead_activity_service import MAX_ACTIVITY_BATCH_EVENTS
+from dashboard.services.lead_activity_service import record_activities
+from dashboard.services.lead_expiry_service import expire_lead_acceptances
+from dashboard.services.rollup_service import refresh_lead_buckets
+from dashboard.services.upload_spool_service import SpooledUpload
+from dashboard.services.upload_spool_service import spool_upload
+from jobs.models import Job
+from jobs.services import enqueue
 
 try:
     from pypdf import PdfReader
@@ -64,63 +98,23 @@ except Exception:  # pragma: no cover - optional at runtime in some environments
 
 try:
     from PIL import Image
-    from PIL import ImageDraw
-    from PIL import ImageFont
-    from PIL import ImageOps
 except Exception:  # pragma: no cover - optional at runtime in some environments
     Image = None
-    ImageDraw = None
-    ImageFont = None
-    ImageOps = None
-
-try:
-    import qrcode
-except Exception:  # pragma: no cover - optional at runtime in some environments
-    qrcode = None
 
 logger = logging.getLogger(__name__)
 
+INVOICE_PREVIEW_JOB = "leads.invoice_preview"
+LEAD_IMPORT_JOB = "leads.import_file"
+LEAD_ACCEPTANCE_WINDOW = timedelta(hours=24)
+# Subir cuando cambien los patrones de extraccion: invalida las entradas de InvoiceExtractionCache.
+INVOICE_EXTRACTOR_VERSION = 3
+
 
 def _safe_slug(value: str) -> str:
     cleaned = re.sub(r"[^a-z0-9]+", "-", (value or "").strip().lower())
     return cleaned.strip("-") or "asociado"
 
 
-def _load_marketing_font(size: int, *, bold: bool = False):
-    if ImageFont is None:
-        return None
-    candidates = []
-    if bold:
-        candidates.extend(
-            [
-                "DejaVuSans-Bold.ttf",
-                "arialbd.ttf",
-                "segoeuib.ttf",
-                r"C:\Windows\Fonts\arialbd.ttf",
-                r"C:\Windows\Fonts\segoeuib.ttf",
-            ]
-        )
-    else:
-        candidates.extend(
-            [
-                "DejaVuSans.ttf",
-                "arial.ttf",
-                "segoeui.ttf",
-                r"C:\Windows\Fonts\arial.ttf",
-                r"C:\Windows\Fonts\segoeui.ttf",
-            ]
-        )
-    for candidate in candidates:
-        try:
-            return ImageFont.truetype(candidate, size=size)
-        except Exception:
-            continue
-    try:
-        return ImageFont.load_default()
-    except Exception:
-        return None
-
-
 @dataclass(frozen=True)
 class LeadAccess:
     salesrep: SalesRep | None
@@ -179,26 +173,21 @@ def _solar_unit() -> BusinessUnit | None:
     return BusinessUnit.objects.filter(code="solar-home-power").first()
 
 
-def _base_residential_queryset(user):
+def _scoped_residential_leads(user):
     access = _lead_access(user)
     scoped_salesrep = access.salesrep or _target_salesrep_for_user(user)
     if not scoped_salesrep:
         return Lead.objects.none()
-    now = timezone.now()
-    return (
-        Lead.objects.filter(
-            sales_rep=scoped_salesrep,
-            lead_kind=Lead.LeadKind.RESIDENTIAL,
-        )
-        .filter(Q(is_accepted=True) | Q(acceptance_deadline__isnull=True) | Q(acceptance_deadline__gte=now))
-        .select_related("sales_rep__user", "assigned_by")
-        .annotate(
-            pending_duplicate_requests=Count(
-                "duplicate_review_requests",
-                filter=Q(duplicate_review_requests__status=InvoiceDuplicateReviewRequest.Status.PENDING),
-            )
+    # Los leads con la ventana de aceptacion vencida los desasigna expire_lead_acceptances.
+    return Lead.objects.filter(sales_rep=scoped_salesrep, lead_kind=Lead.LeadKind.RESIDENTIAL)
+
+
+def _with_row_data(qs):
+    return qs.select_related("sales_rep__user", "assigned_by").annotate(
+        pending_duplicate_requests=Count(
+            "duplicate_review_requests",
+            filter=Q(duplicate_review_requests__status=InvoiceDuplicateReviewRequest.Status.PENDING),
         )
-        .order_by("-created_at")
     )
 
 
@@ -237,42 +226,113 @@ def _serialize_lead(lead: Lead) -> dict:
     }
 
 
-def _salesrep_choices_for_user(user):
-    access = _lead_access(user)
-    if not access.can_assign:
-        return []
+def _assignable_salesreps(user):
     qs = SalesRep.objects.select_related("user").filter(is_active=True)
     if not user.is_superuser:
         visible_ids = get_downline_user_ids(user)
         qs = qs.filter(user_id__in=visible_ids)
+    return qs.order_by("user__first_name", "user__last_name", "user__username")
+
+
+def _salesrep_choices_for_user(user):
+    access = _lead_access(user)
+    if not access.can_assign:
+        return []
     return [
         {
             "id": rep.id,
             "label": rep.user.get_full_name().strip() or rep.user.get_username(),
         }
-        for rep in qs.order_by("user__first_name", "user__last_name", "user__username")
+        for rep in _assignable_salesreps(user)
     ]
 
 
-def _compute_kpis(rows: list[dict]) -> dict:
-    total = len(rows)
-    with_phone = sum(1 for row in rows if (row.get("phone") or "").strip())
-    with_email = sum(1 for row in rows if (row.get("email") or "").strip())
-    contactable = sum(1 for row in rows if (row.get("phone") or "").strip() and (row.get("email") or "").strip())
-    contactable_pct = round((contactable / total) * 100, 1) if total else 0.0
+def _compute_kpis(qs) -> dict:
+    """Lead KPIs for ``qs`` from SQL aggregates (phone/email follow ``_serialize_lead``'s fallbacks)."""
+    has_phone = ~Q(customer_phone="") | ~Q(phone="")
+    has_email = ~Q(customer_email="") | ~Q(email="")
+    qs = qs.order_by()
+    row = qs.aggregate(
+        total=Count("id"),
+        with_phone=Count("id", filter=has_phone),
+        with_email=Count("id", filter=has_email),
+        contactable=Count("id", filter=has_phone & has_email),
+    )
+    status_labels = dict(Lead.Status.choices)
     by_status = {}
-    for row in rows:
-        label = row.get("status_display") or "Sin estado"
-        by_status[label] = by_status.get(label, 0) + 1
+    for item in qs.values("status").annotate(total=Count("id")).order_by("-total", "status"):
+        label = status_labels.get(item["status"], item["status"]) or "Sin estado"
+        by_status[label] = by_status.get(label, 0) + item["total"]
+    total = row["total"]
     return {
         "total": total,
-        "with_phone": with_phone,
-        "with_email": with_email,
-        "contactable_pct": contactable_pct,
+        "with_phone": row["with_phone"],
+        "with_email": row["with_email"],
+        "contactable_pct": round((row["contactable"] / total) * 100, 1) if total else 0.0,
         "status_distribution": by_status,
     }
 
 
+LEADS_PAGE_SIZE = 25
+LEADS_MAX_PAGE_SIZE = 500
+
+# columns[i][data] de DataTables -> campo ordenable
+LEAD_ORDER_FIELDS = {
+    "full_name": "full_name",
+    "phone": "phone",
+    "email": "email",
+    "city": "city",
+    "lead_source_name": "source",
+    "roof_type": "roof_type",
+    "owner_name": "owner_name",
+    "electricity_bill": "electricity_bill",
+    "system_size_kw": "system_size_kw",
+    "status_display": "status",
+    "created_at": "created_at",
+}
+
+
+def _datatables_ordering(params, *, ranked: bool = False) -> list[str]:
+    """ORDER BY for the requested columns; ``ranked`` adds ``search_rank``, which only leads when no column was requested."""
+    ordering = []
+    idx = 0
+    while f"order[{idx}][column]" in params:
+        column = int_param(params, f"order[{idx}][column]", -1)
+        field = LEAD_ORDER_FIELDS.get(params.get(f"columns[{column}][data]", ""))
+        if field:
+            prefix = "-" if params.get(f"order[{idx}][dir]") == "desc" else ""
+            ordering.append(f"{prefix}{field}")
+        idx += 1
+    if ranked:
+        # El orden que pidio el usuario manda; la relevancia solo desempata.
+        ordering.append("search_rank")
+    if not ordering or ordering == ["search_rank"]:
+        ordering.append("-created_at")
+    ordering.append("-id")
+    return ordering
+
+
+def _search_param(params) -> str:
+    return (params.get("search") or params.get("search[value]") or "").strip()
+
+
+def _apply_lead_filters(qs, params):
+    status_filter = (params.get("status") or "").strip()
+    city_filter = (params.get("city") or "").strip()
+    source_filter = (params.get("source") or "").strip()
+    q = _search_param(params)
+
+    if status_filter:
+        qs = qs.filter(status=status_filter)
+    if city_filter:
+        qs = qs.filter(Q(city__iexact=city_filter) | Q(customer_city__iexact=city_filter))
+    if source_filter:
+        qs = qs.filter(Q(source__iexact=source_filter) | Q(lead_source__iexact=source_filter))
+    if q:
+        qs = apply_search(qs, q)
+    return qs
+
+
 def _render_form(request, *, form: LeadForm, lead: Lead | None = None, title: str):
     return render(
         request,
@@ -287,24 +347,6 @@ def _render_form(request, *, form: LeadForm, lead: Lead | None = None, title: st
     )
 
 
-def _invoice_hash(file_obj) -> str:
-    current_pos = None
-    if hasattr(file_obj, "tell"):
-        try:
-            current_pos = file_obj.tell()
-        except Exception:
-            current_pos = None
-    hasher = hashlib.sha256()
-    for chunk in file_obj.chunks():
-        hasher.update(chunk)
-    if hasattr(file_obj, "seek"):
-        try:
-            file_obj.seek(current_pos if current_pos is not None else 0)
-        except Exception:
-            pass
-    return hasher.hexdigest()
-
-
 def _normalize_ocr_language(language: str) -> str:
     value = (language or "").strip().lower()
     if value in {"es", "spa", "spanish", "espanol", "español"}:
@@ -314,130 +356,6 @@ def _normalize_ocr_language(language: str) -> str:
     return "spa+eng"
 
 
-def _extract_invoice_holder(raw_text: str) -> str:
-    if not raw_text:
-        return ""
-    patterns = [
-        r"\n\s*([A-ZÁÉÍÓÚÑ ,.'-]{6,})\s*\n\s*(?:su\s*n[uú]mero\s*de\s*cuenta|n[uú]mero\s*de\s*cuenta|numero\s*de\s*cuenta)\b",
-        r"\n\s*([A-ZÁÉÍÓÚÑ ,.'-]{6,})\s*\n\s*(?:villa|urb|calle|direccion|direcci[oó]n)\b",
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, raw_text, flags=re.IGNORECASE)
-        if not match:
-            continue
-        candidate = re.sub(r"\s+", " ", (match.group(1) or "").strip())
-        candidate = candidate.strip(" ,.-")
-        if len(candidate) >= 6:
-            return candidate
-    return ""
-
-
-def _title_case_token(value: str) -> str:
-    token = (value or "").strip()
-    if not token:
-        return ""
-    if len(token) == 1 and token.isalpha():
-        return token.upper()
-    return token[:1].upper() + token[1:].lower()
-
-
-def _normalize_customer_name(raw_name: str) -> str:
-    name = re.sub(r"\s+", " ", (raw_name or "").strip().strip(" ,.-"))
-    if not name:
-        return ""
-    if "," in name:
-        left, right = name.split(",", 1)
-        first_names = [_title_case_token(x) for x in re.split(r"\s+", right.strip()) if x.strip()]
-        last_names = [_title_case_token(x) for x in re.split(r"\s+", left.strip()) if x.strip()]
-        ordered = first_names + last_names
-        return " ".join([x for x in ordered if x]).strip()
-    return " ".join([_title_case_token(x) for x in re.split(r"\s+", name) if x.strip()]).strip()
-
-
-def _extract_customer_address_block(raw_text: str, invoice_holder: str = "") -> tuple[str, str, str, str]:
-    if not raw_text:
-        return "", "", "", ""
-    lines = [re.sub(r"\s+", " ", line).strip() for line in raw_text.splitlines()]
-    holder_norm = re.sub(r"[^A-Z0-9]", "", (invoice_holder or "").upper())
-    holder_indexes: list[int] = []
-    if holder_norm:
-        for idx, line in enumerate(lines):
-            line_norm = re.sub(r"[^A-Z0-9]", "", line.upper())
-            if line_norm and (line_norm in holder_norm or holder_norm in line_norm):
-                holder_indexes.append(idx)
-    for holder_idx in holder_indexes:
-        scope = lines[holder_idx + 1 : min(len(lines), holder_idx + 12)]
-        for i, line in enumerate(scope):
-            if not re.search(r"\bPR\b\s*\d{5}", line, flags=re.IGNORECASE):
-                continue
-            city_match = re.search(r"([A-ZÁÉÍÓÚÑ ]+)\s+PR\s*(\d{5}(?:-\d{4})?)?", line, flags=re.IGNORECASE)
-            city = city_match.group(1).strip().title() if city_match else ""
-            postal_code = (city_match.group(2) or "").strip() if city_match else ""
-            prev1 = scope[i - 1].strip(" ,.-") if i - 1 >= 0 else ""
-            prev2 = scope[i - 2].strip(" ,.-") if i - 2 >= 0 else ""
-            parts = [x for x in [prev2, prev1] if x]
-            address = ", ".join(parts).strip()
-            if not address:
-                address = re.sub(r"\s+[A-ZÁÉÍÓÚÑ ]+\s+PR\s*\d{5}(?:-\d{4})?$", "", line.strip(" ,.-"), flags=re.IGNORECASE).strip(" ,.-")
-            upper_address = address.upper()
-            if (
-                address
-                and "PO BOX" not in upper_address
-                and "DIRECCIÓN POSTAL DE LUMA" not in upper_address
-                and "DIRECCION POSTAL DE LUMA" not in upper_address
-            ):
-                return address, city, postal_code, "PR"
-    for idx, line in enumerate(lines):
-        if not line:
-            continue
-        if "DIRECCIÓN POSTAL DE LUMA" in line.upper() or "DIRECCION POSTAL DE LUMA" in line.upper():
-            continue
-        if "PO BOX" in line.upper():
-            continue
-        if not re.search(r"\bPR\b\s*\d{5}", line, flags=re.IGNORECASE):
-            continue
-        city_match = re.search(r"([A-ZÁÉÍÓÚÑ ]+)\s+PR\s*(\d{5}(?:-\d{4})?)?", line, flags=re.IGNORECASE)
-        city = city_match.group(1).strip().title() if city_match else ""
-        postal_code = (city_match.group(2) or "").strip() if city_match else ""
-        prev1 = lines[idx - 1].strip(" ,.-") if idx - 1 >= 0 else ""
-        prev2 = lines[idx - 2].strip(" ,.-") if idx - 2 >= 0 else ""
-        if prev1 and prev2 and not any(ch.isdigit() for ch in prev2 + prev1 + line):
-            # skip weak matches without street-like info
-            continue
-        parts = [x for x in [prev2, prev1] if x]
-        address = ", ".join(parts).strip()
-        if not address:
-            address = re.sub(r"\s+[A-ZÁÉÍÓÚÑ ]+\s+PR\s*\d{5}(?:-\d{4})?$", "", line.strip(" ,.-"), flags=re.IGNORECASE).strip(" ,.-")
-        upper_address = address.upper()
-        if "PO BOX" in upper_address or "DIRECCIÓN POSTAL DE LUMA" in upper_address or "DIRECCION POSTAL DE LUMA" in upper_address:
-            continue
-        if len(address) >= 12:
-            return address, city, postal_code, "PR"
-    return "", "", "", "PR"
-
-
-def _extract_consumption_history(raw_text: str) -> list[float]:
-    if not raw_text:
-        return []
-    month_line = re.search(
-        r"ene-\d{2}\s+feb\s+mar\s+abr\s+may\s+jun\s+jul\s+ago\s+sep\s+oct\s+nov\s+dic\s+ene-\d{2}",
-        raw_text,
-        flags=re.IGNORECASE,
-    )
-    if not month_line:
-        return []
-    context = raw_text[max(0, month_line.start() - 500) : month_line.start()]
-    values = [int(x) for x in re.findall(r"\b(\d{2,4})\b", context)]
-    values = [v for v in values if 100 <= v <= 1200]
-    if len(values) < 12:
-        return []
-    seq = values[-13:] if len(values) >= 13 else values[-12:]
-    if len(seq) == 13:
-        # LUMA suele traer ene-xx..dic + ene-(xx+1). Reordenamos para llenar Ene..Dic con 12 datos.
-        seq = [seq[-1]] + seq[1:-1]
-    return [float(v) for v in seq[:12]]
-
-
 def _configure_tesseract_cmd() -> bool:
     if not pytesseract:
         return False
@@ -460,48 +378,58 @@ def _configure_tesseract_cmd() -> bool:
     return False
 
 
-def _ocr_text_from_image_bytes(content: bytes, language: str = "") -> str:
-    if not content or not Image or not pytesseract:
-        return ""
-    if not _configure_tesseract_cmd():
-        return ""
-    try:
-        image = Image.open(io.BytesIO(content))
-        text = pytesseract.image_to_string(image, lang=_normalize_ocr_language(language))
-        return (text or "").strip()
-    except Exception:
-        return ""
+OCR_MAX_PDF_PAGES = 3
+
+
+def _ocr_texts_from_images(paths: list[str], language: str = "") -> tuple[list[str], bool]:
+    """OCR of each image file in parallel; one text per path, in the same order ("" when it failed).
+
+    The flag is False when some page could not be recognized in time, so the result must not be cached.
+    """
+    if not paths:
+        return [], True
+    if not pytesseract or not _configure_tesseract_cmd():
+        # Sin Tesseract la clave del cache ya lleva ":no-ocr"; el resultado es definitivo para esa clave.
+        return ["" for _ in paths], True
+    if not Image:
+        return ["" for _ in paths], False
+    lang = _normalize_ocr_language(language)
+    cmd = pytesseract.pytesseract.tesseract_cmd
+    timeout = ocr_service.request_timeout()
+    run = ocr_service.run_pages(
+        ocr_service.ocr_image,
+        [(path, idx, lang, cmd, timeout) for idx, path in enumerate(paths)],
+        timeout=timeout,
+    )
+    texts = {page.index: page.text for page in run.pages}
+    return [texts.get(idx, "") for idx in range(len(paths))], not run.timed_out
 
 
-def _ocr_text_from_pdf_bytes(content: bytes, language: str = "") -> str:
-    if not content or not pdfium or not pytesseract:
-        return ""
-    if not _configure_tesseract_cmd():
-        return ""
-    try:
-        doc = pdfium.PdfDocument(io.BytesIO(content))
-    except Exception:
-        return ""
-    chunks: list[str] = []
+def _ocr_text_from_pdf(path: str, language: str = "") -> tuple[str, bool]:
+    """OCR text of the first pages and whether every page needed was recognized in time."""
+    if not path or not pytesseract or not _configure_tesseract_cmd():
+        return "", True
+    if not pdfium:
+        return "", False
     try:
-        total_pages = min(len(doc), 3)
-        for idx in range(total_pages):
-            page = doc[idx]
-            try:
-                pil_image = page.render(scale=2.0).to_pil()
-                txt = pytesseract.image_to_string(pil_image, lang=_normalize_ocr_language(language))
-                if txt:
-                    chunks.append(txt)
-            finally:
-                page.close()
-    except Exception:
-        return ""
-    finally:
+        doc = pdfium.PdfDocument(path)
         try:
+            total_pages = min(len(doc), OCR_MAX_PDF_PAGES)
+        finally:
             doc.close()
-        except Exception:
-            pass
-    return "\n".join(chunks).strip()
+    except Exception:
+        return "", True
+    lang = _normalize_ocr_language(language)
+    cmd = pytesseract.pytesseract.tesseract_cmd
+    timeout = ocr_service.request_timeout()
+    # Los procesos del pool abren el archivo por ruta: el PDF no se copia a cada uno.
+    run = ocr_service.run_pages(
+        ocr_service.ocr_pdf_page,
+        [(path, idx, lang, cmd, timeout) for idx in range(total_pages)],
+        stop_when=has_required_fields,
+        timeout=timeout,
+    )
+    return run.text, not run.timed_out
 
 
 def _normalize_decimal(value: str) -> Decimal | None:
@@ -514,206 +442,113 @@ def _normalize_decimal(value: str) -> Decimal | None:
         return None
 
 
+def _extraction_language(language: str) -> str:
+    # Sin Tesseract el resultado sale solo del texto embebido; no debe servirse cuando el OCR ya este disponible.
+    normalized = _normalize_ocr_language(language)
+    return normalized if _configure_tesseract_cmd() else f"{normalized}:no-ocr"
+
+
 def _parse_electricity_invoice(uploaded_pdf, *, lead_id: int | None = None, language: str = "") -> dict:
-    filename = (uploaded_pdf.name or "").lower()
+    with spool_upload(uploaded_pdf) as spooled:
+        return _parse_spooled_invoice(spooled, lead_id=lead_id, language=language)
+
+
+def _parse_spooled_invoice(spooled: SpooledUpload, *, lead_id: int | None = None, language: str = "") -> dict:
+    filename = spooled.name.lower()
     account = re.search(r"account[_-]?(\d+)", filename)
     meter = re.search(r"meter[_-]?(\d+)", filename)
     location = re.search(r"location[_-]?(\d+)", filename)
-    inv_hash = _invoice_hash(uploaded_pdf)
-    raw_text = ""
-    if hasattr(uploaded_pdf, "read"):
-        try:
-            if hasattr(uploaded_pdf, "seek"):
-                uploaded_pdf.seek(0)
-            content = uploaded_pdf.read()
-            if hasattr(uploaded_pdf, "seek"):
-                uploaded_pdf.seek(0)
-            if isinstance(content, bytes):
-                if PdfReader is not None and content.lstrip().startswith(b"%PDF"):
-                    try:
-                        reader = PdfReader(io.BytesIO(content))
-                        pages_text = []
-                        for page in reader.pages:
-                            pages_text.append(page.extract_text() or "")
-                        raw_text = "\n".join(pages_text).strip()
-                    except Exception:
-                        raw_text = ""
-                if len(raw_text.strip()) < 40:
-                    raw_text = content.decode("utf-8", errors="ignore")
-                if len(raw_text.strip()) < 40:
-                    raw_text = content.decode("latin-1", errors="ignore")
-                if len(raw_text.strip()) < 40 and content.lstrip().startswith(b"%PDF"):
-                    raw_text = _ocr_text_from_pdf_bytes(content, language=language)
-            else:
-                raw_text = str(content)
-        except Exception:
-            raw_text = ""
-
-    def _find(patterns: list[str]) -> str:
-        for pattern in patterns:
-            match = re.search(pattern, raw_text, flags=re.IGNORECASE)
-            if match:
-                return (match.group(1) or "").strip()
-        return ""
-
-    account_from_text = _find(
-        [
-            r"(?:su\s*n[uú]mero\s*de\s*cuenta|numero\s*de\s*cuenta|n[uú]mero\s*de\s*cuenta)\s*[:#-]?\s*([0-9]{6,})",
-            r"(?:account(?:\s*number)?|cuenta)\s*[:#-]?\s*([A-Z0-9-]{4,})",
-        ]
-    )
-    meter_from_text = _find(
-        [
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)\s*[:#-]?\s*([0-9]{5,})",
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)\s*[:#-]?\s*([A-Z-]*\d[A-Z0-9-]{3,})",
-            r"(?:meter(?:\s*number)?)\s*[:#-]?\s*([A-Z0-9-]{4,})",
-        ]
+    inv_hash = spooled.sha256
+    fields = cached_extraction(
+        "pdf",
+        inv_hash,
+        language=_extraction_language(language),
+        version=INVOICE_EXTRACTOR_VERSION,
+        compute=lambda: _extract_pdf_fields(spooled, language=language),
     )
-    if not meter_from_text:
-        meter_block = re.search(
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)([\s\S]{0,220})",
-            raw_text,
-            flags=re.IGNORECASE,
-        )
-        if meter_block:
-            meter_candidate = re.search(r"\b([0-9]{6,})\b", meter_block.group(1))
-            if meter_candidate:
-                meter_from_text = meter_candidate.group(1)
-    location_from_text = _find(
-        [
-            r"(?:id\s*localidad|location(?:\s*id)?|service\s*point|localidad|premise)\s*[:#-]?\s*([A-Z0-9-]{4,})",
-        ]
-    )
-    bill_from_text = _find(
-        [
-            r"(?:cantidad\s*total\s*adeudada|total\s*adeudada|monto\s*total|importe\s*total|balance\s*due|total\s*amount)\s*[:\s$-]*\$?\s*([0-9]{1,6}(?:[.,][0-9]{1,2})?)",
-            r"(?:cargo\s*por\s*cliente)\s*[:\s$-]*\$?\s*([0-9]{1,6}(?:[.,][0-9]{1,2})?)",
-        ]
-    )
-    avg_kwh_from_text = _find(
-        [
-            r"(?:consumo\s*promedio(?:\s*kwh)?|average(?:\s*monthly)?\s*kwh|kwh\s*promedio)\s*[:#-]?\s*([0-9]{2,6}(?:[.,][0-9]{1,2})?)",
-            r"(?:consumo\s*de\s*kwh)\s*[:#-]?\s*([0-9]{2,6}(?:[.,][0-9]{1,2})?)",
-            r"(?:consumo)\s*(?:kwh)?\s*[:#-]?\s*([0-9]{2,6}(?:[.,][0-9]{1,2})?)",
-        ]
-    )
-    invoice_holder = _extract_invoice_holder(raw_text)
-    normalized_name = _normalize_customer_name(invoice_holder)
-    customer_address, customer_city, customer_postal_code, customer_country = _extract_customer_address_block(raw_text, invoice_holder=invoice_holder)
-    monthly_history = _extract_consumption_history(raw_text)
-    if monthly_history:
-        avg_kwh_from_text = f"{(sum(monthly_history) / len(monthly_history)):.2f}"
     return {
-        "invoice_name": invoice_holder or uploaded_pdf.name,
-        "customer_name": normalized_name or invoice_holder or "",
-        "customer_address": customer_address,
-        "customer_city": customer_city,
-        "customer_postal_code": customer_postal_code,
-        "customer_country": customer_country,
+        "invoice_name": fields["invoice_holder"] or spooled.name,
+        "customer_name": fields["customer_name"],
+        "customer_address": fields["customer_address"],
+        "customer_city": fields["customer_city"],
+        "customer_postal_code": fields["customer_postal_code"],
+        "customer_country": fields["customer_country"],
         "invoice_hash": inv_hash,
-        "account_number": account_from_text or (account.group(1) if account else ""),
-        "meter_number": meter_from_text or (meter.group(1) if meter else ""),
-        "location_id": location_from_text or (location.group(1) if location else ""),
-        "electricity_bill": bill_from_text.replace(",", "."),
-        "consumo_promedio_kwh": avg_kwh_from_text.replace(",", "."),
-        "id_consumo_historial": json.dumps(monthly_history) if monthly_history else "",
+        "account_number": fields["account_number"] or (account.group(1) if account else ""),
+        "meter_number": fields["meter_number"] or (meter.group(1) if meter else ""),
+        "location_id": fields["location_id"] or (location.group(1) if location else ""),
+        "electricity_bill": fields["electricity_bill"],
+        "consumo_promedio_kwh": fields["consumo_promedio_kwh"],
+        "id_consumo_historial": fields["id_consumo_historial"],
         "lead_id": lead_id,
     }
 
 
-def _parse_invoice_from_uploaded_images(images: list, language: str = "") -> dict:
-    raw_text_parts: list[str] = []
-    for image in images:
-        if hasattr(image, "seek"):
-            try:
-                image.seek(0)
-            except Exception:
-                pass
-        try:
-            raw_text_parts.append((image.name or "").lower())
-        except Exception:
-            pass
+def _extract_pdf_fields(spooled: SpooledUpload, *, language: str = "") -> tuple[dict, bool]:
+    """Everything in a PDF invoice that depends only on its bytes (cached by content hash), and whether it is complete."""
+    raw_text = ""
+    complete = True
+    is_pdf = spooled.head().lstrip().startswith(b"%PDF")
+    # Sin marcador %%EOF pypdf intenta recuperar el archivo leyendolo entero en memoria; pdfium si lo tolera.
+    if is_pdf and PdfReader is not None and b"%%EOF" in spooled.tail():
         try:
-            blob = image.read()
-            if hasattr(image, "seek"):
-                image.seek(0)
-            if isinstance(blob, bytes):
-                raw_text_parts.append(blob.decode("utf-8", errors="ignore"))
-                raw_text_parts.append(blob.decode("latin-1", errors="ignore"))
-                ocr_text = _ocr_text_from_image_bytes(blob, language=language)
-                if ocr_text:
-                    raw_text_parts.append(ocr_text)
-            else:
-                raw_text_parts.append(str(blob))
+            reader = PdfReader(spooled.data)
+            raw_text = "\n".join(page.extract_text() or "" for page in reader.pages).strip()
         except Exception:
-            continue
-    raw_text = "\n".join(raw_text_parts)
+            raw_text = ""
+    if len(raw_text.strip()) < 40:
+        # Un PDF escaneado solo tiene texto via OCR; decodificar sus bytes solo aporta ruido.
+        if is_pdf:
+            raw_text, complete = _ocr_text_from_pdf(spooled.path, language=language)
+        else:
+            raw_text = spooled.text()
+    return extract_invoice_fields(raw_text), complete
 
-    def _find(patterns: list[str]) -> str:
-        for pattern in patterns:
-            m = re.search(pattern, raw_text, flags=re.IGNORECASE)
-            if m:
-                return (m.group(1) or "").strip()
-        return ""
 
-    account = _find(
-        [
-            r"(?:su\s*n[uú]mero\s*de\s*cuenta|numero\s*de\s*cuenta|n[uú]mero\s*de\s*cuenta)\s*[:#-]?\s*([0-9]{6,})",
-            r"(?:cuenta|account(?:\s*number)?)\s*[:#-]?\s*([A-Z0-9-]{4,})",
-        ]
-    )
-    meter = _find(
-        [
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)\s*[:#-]?\s*([0-9]{5,})",
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)\s*[:#-]?\s*([A-Z-]*\d[A-Z0-9-]{3,})",
-            r"(?:meter(?:\s*number)?)\s*[:#-]?\s*([A-Z0-9-]{4,})",
-        ]
-    )
-    if not meter:
-        meter_block = re.search(
-            r"(?:numero\s*de\s*contador|n[uú]mero\s*de\s*contador)([\s\S]{0,220})",
-            raw_text,
-            flags=re.IGNORECASE,
-        )
-        if meter_block:
-            meter_candidate = re.search(r"\b([0-9]{6,})\b", meter_block.group(1))
-            if meter_candidate:
-                meter = meter_candidate.group(1)
-    location = _find([r"(?:id\s*localidad|location(?:\s*id)?|localidad|premise)\s*[:#-]?\s*([A-Z0-9-]{4,})"])
-    bill = _find(
-        [
-            r"(?:cantidad\s*total\s*adeudada|total\s*adeudada|monto\s*total|importe\s*total|total)\s*[:\s$-]*\$?\s*([0-9]{1,6}(?:[.,][0-9]{1,2})?)",
-        ]
-    )
-    avg = _find(
-        [
-            r"(?:consumo\s*promedio(?:\s*kwh)?|average\s*kwh)\s*[:#-]?\s*([0-9]{2,6}(?:[.,][0-9]{1,2})?)",
-            r"(?:consumo\s*de\s*kwh)\s*[:#-]?\s*([0-9]{2,6}(?:[.,][0-9]{1,2})?)",
-        ]
+def _parse_invoice_from_uploaded_images(images: list, language: str = "") -> dict:
+    with ExitStack() as stack:
+        spooled_images = [stack.enter_context(spool_upload(image)) for image in images]
+        return _parse_spooled_images(spooled_images, language=language)
+
+
+def _parse_spooled_images(spooled_images: list[SpooledUpload], language: str = "") -> dict:
+    # Los nombres de archivo tambien entran al texto analizado, asi que forman parte de la clave.
+    digest = hashlib.sha256()
+    for spooled in spooled_images:
+        digest.update(spooled.name.lower().encode("utf-8"))
+        digest.update(spooled.sha256.encode("ascii"))
+    fields = cached_extraction(
+        "images",
+        digest.hexdigest(),
+        language=_extraction_language(language),
+        version=INVOICE_EXTRACTOR_VERSION,
+        compute=lambda: _extract_image_fields(spooled_images, language=language),
     )
-    invoice_holder = _extract_invoice_holder(raw_text)
-    normalized_name = _normalize_customer_name(invoice_holder)
-    customer_address, customer_city, customer_postal_code, customer_country = _extract_customer_address_block(raw_text, invoice_holder=invoice_holder)
-    monthly_history = _extract_consumption_history(raw_text)
-    if monthly_history:
-        avg = f"{(sum(monthly_history) / len(monthly_history)):.2f}"
+    return {**fields, "electricity_invoice_language": language or ""}
 
-    return {
-        "invoice_name": invoice_holder or "Factura por imagenes",
-        "customer_name": normalized_name or invoice_holder or "",
-        "customer_address": customer_address,
-        "customer_city": customer_city,
-        "customer_postal_code": customer_postal_code,
-        "customer_country": customer_country,
-        "invoice_hash": "",
-        "account_number": account,
-        "meter_number": meter,
-        "location_id": location,
-        "electricity_bill": bill.replace(",", "."),
-        "consumo_promedio_kwh": avg.replace(",", "."),
-        "id_consumo_historial": json.dumps(monthly_history) if monthly_history else "",
-        "electricity_invoice_language": language or "",
-    }
+
+IMAGE_SIGNATURES = (b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"RIFF", b"II*\x00", b"MM\x00*", b"BM")
+
+
+def _extract_image_fields(spooled_images: list[SpooledUpload], *, language: str = "") -> tuple[dict, bool]:
+    readable = [spooled for spooled in spooled_images if spooled.size]
+    texts, complete = _ocr_texts_from_images([spooled.path for spooled in readable], language=language)
+    ocr_texts = iter(texts)
+    raw_text_parts: list[str] = []
+    for spooled in spooled_images:
+        if spooled.name:
+            raw_text_parts.append(spooled.name.lower())
+        if not spooled.size:
+            continue
+        # Los bytes de una imagen real no son texto; solo se leen como texto las subidas que no lo son.
+        if not spooled.head(16).startswith(IMAGE_SIGNATURES):
+            raw_text_parts.append(spooled.text())
+        ocr_text = next(ocr_texts)
+        if ocr_text:
+            raw_text_parts.append(ocr_text)
+    fields = extract_invoice_fields("\n".join(raw_text_parts))
+    invoice_holder = fields.pop("invoice_holder")
+    return {"invoice_name": invoice_holder or "Factura por imagenes", "invoice_hash": "", **fields}, complete
 
 
 def _is_ajax(request) -> bool:
@@ -803,84 +638,28 @@ def crm_leads_qrcode(request):
     if not salesrep:
         return JsonResponse({"success": False, "error": "No tienes perfil de asociado."}, status=400)
     link = _build_lead_generation_share_link(request, salesrep)
-    qr_lib = qrcode
-    if qr_lib is None:
-        try:
-            import qrcode as qr_lib  # lazy import in case dependency was installed after process start
-        except Exception:
-            qr_lib = None
-    if qr_lib is not None:
-        qr = qr_lib.QRCode(
-            version=1,
-            error_correction=qr_lib.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
+    salesrep_name = salesrep.user.get_full_name().strip() or salesrep.user.get_username()
+    today = timezone.localdate()
+    style = str(request.GET.get("style", "")).strip().lower()
+    if style == qr_service.STYLE_MARKETING:
+        card = qr_service.MarketingCard(
+            salesrep_name=salesrep_name,
+            salesrep_id=salesrep.id,
+            email=(request.user.email or "").strip(),
+            generated_on=today,
         )
-        qr.add_data(link)
-        qr.make(fit=True)
-        image = qr.make_image(fill_color="black", back_color="white")
-        style = str(request.GET.get("style", "")).strip().lower()
-        if style == "marketing" and Image is not None and ImageDraw is not None and ImageOps is not None:
-            qr_img = image.convert("RGB")
-            qr_img = ImageOps.contain(qr_img, (320, 320))
-            canvas = Image.new("RGB", (1080, 1080), "#f4f8ff")
-            draw = ImageDraw.Draw(canvas)
-            font_h1 = _load_marketing_font(48, bold=True)
-            font_h2 = _load_marketing_font(32, bold=True)
-            font_h3 = _load_marketing_font(26, bold=True)
-            font_body = _load_marketing_font(24, bold=False)
-            font_small = _load_marketing_font(20, bold=False)
-            brand_name = "One-Group"
-            salesrep_name = salesrep.user.get_full_name().strip() or salesrep.user.get_username()
-            associated_email = (request.user.email or "").strip()
-            generated_at = timezone.localtime(timezone.now()).strftime("%Y-%m-%d %H:%M")
-
-            # Header band
-            draw.rectangle((0, 0, 1080, 170), fill="#123a6f")
-            draw.rectangle((0, 145, 1080, 170), fill="#1a6fb2")
-            draw.text((62, 48), f"{brand_name}  |  QR de Mercadeo", fill="#ffffff", font=font_h3)
-
-            # Main card
-            draw.rounded_rectangle((48, 210, 1032, 930), radius=34, fill="#ffffff", outline="#d7e3f4", width=2)
-            draw.text((90, 254), "Escanea para solicitar asesoria solar", fill="#0f172a", font=font_h2)
-            draw.text((90, 302), "Lead Generation  •  Campana digital", fill="#4b5563", font=font_body)
-
-            # QR frame
-            draw.rounded_rectangle((88, 360, 462, 734), radius=24, fill="#f8fbff", outline="#c9d9ee", width=2)
-            canvas.paste(qr_img, (115, 387))
-            draw.text((150, 748), "Escanea aqui", fill="#1e3a8a", font=font_h3)
-
-            # Commercial info block
-            draw.rounded_rectangle((520, 360, 980, 734), radius=24, fill="#f8fbff", outline="#c9d9ee", width=2)
-            draw.text((552, 396), f"Asociado: {salesrep_name}", fill="#0f172a", font=font_body)
-            draw.text((552, 438), f"Codigo asesor: {salesrep.id}", fill="#1f2937", font=font_body)
-            if associated_email:
-                draw.text((552, 480), f"Email: {associated_email}", fill="#334155", font=font_small)
-            draw.text((552, 548), "Usalo en redes sociales,", fill="#1e293b", font=font_small)
-            draw.text((552, 580), "flyers, WhatsApp o material impreso.", fill="#1e293b", font=font_small)
-            draw.text((552, 644), "CTA recomendado:", fill="#1d4ed8", font=font_small)
-            draw.text((552, 678), '"Solicita tu asesoria solar hoy"', fill="#0f172a", font=font_small)
-
-            # Footer line
-            draw.line((88, 970, 992, 970), fill="#d4deec", width=2)
-            draw.text((90, 988), f"Generado: {generated_at}", fill="#64748b", font=font_small)
-            draw.text((730, 988), "one-group lead system", fill="#64748b", font=font_small)
-            image = canvas
-        buffer = io.BytesIO()
-        image.save(buffer, format="PNG")
-        response = HttpResponse(buffer.getvalue(), content_type="image/png")
-        if str(request.GET.get("download", "")).strip().lower() in {"1", "true", "yes"}:
-            style = str(request.GET.get("style", "")).strip().lower()
-            rep_slug = _safe_slug(salesrep.user.get_full_name().strip() or salesrep.user.get_username())
-            stamp = timezone.localtime(timezone.now()).strftime("%Y%m%d")
-            if style == "marketing":
-                filename = f"onegroup-qr-marketing-{rep_slug}-{salesrep.id}-{stamp}.png"
-            else:
-                filename = f"onegroup-qr-lead-generation-{rep_slug}-{salesrep.id}-{stamp}.png"
-            response["Content-Disposition"] = f'attachment; filename="{filename}"'
-        return response
+        spec = qr_service.QrSpec(link, qr_service.STYLE_MARKETING, card)
+    else:
+        spec = qr_service.QrSpec(link)
 
-    return JsonResponse({"success": False, "error": "No se pudo generar QR en este entorno."}, status=500)
+    filename = ""
+    if str(request.GET.get("download", "")).strip().lower() in {"1", "true", "yes"}:
+        kind = "marketing" if spec.style == qr_service.STYLE_MARKETING else "lead-generation"
+        filename = f"onegroup-qr-{kind}-{_safe_slug(salesrep_name)}-{salesrep.id}-{today:%Y%m%d}.png"
+    try:
+        return qr_service.qr_png_response(request, spec, filename=filename)
+    except qr_service.QrUnavailable:
+        return JsonResponse({"success": False, "error": "No se pudo generar QR en este entorno."}, status=500)
 
 
 @require_http_methods(["GET", "POST"])
@@ -986,37 +765,13 @@ def crm_lead_generation_public(request):
 
 
 def _duplicate_exists(*, lead: Lead, actor_salesrep: SalesRep | None) -> tuple[bool, dict]:
-    now = timezone.now()
-    invoice_hash = (lead.electricity_invoice_hash or lead.invoice_hash or "").strip()
-    hash_match = Lead.objects.filter(Q(invoice_hash=invoice_hash) | Q(electricity_invoice_hash=invoice_hash)).exclude(pk=lead.pk) if invoice_hash else Lead.objects.none()
-    combo_match = Lead.objects.filter(
-        account_number=lead.account_number,
-        meter_number=lead.meter_number,
-        location_id=lead.location_id,
-    ).exclude(pk=lead.pk)
-    has_hash_dup = hash_match.exists()
-    has_combo_dup = bool(lead.account_number and lead.meter_number and lead.location_id and combo_match.exists())
-    if not has_hash_dup and not has_combo_dup:
+    match = find_duplicate(Fingerprints.for_lead(lead), exclude_lead_id=lead.pk, override_requester=actor_salesrep)
+    if match is None or match.has_override:
         return False, {}
-
-    if actor_salesrep:
-        override_qs = InvoiceDuplicateOverride.objects.filter(requester=actor_salesrep, expires_at__gte=now, used_at__isnull=True)
-        if invoice_hash and override_qs.filter(invoice_hash=invoice_hash).exists():
-            return False, {}
-        if lead.account_number and lead.meter_number and lead.location_id:
-            if override_qs.filter(
-                account_number=lead.account_number,
-                meter_number=lead.meter_number,
-                location_id=lead.location_id,
-            ).exists():
-                return False, {}
-
-    dup = hash_match.first() or combo_match.first()
-    error_code = "duplicate_invoice" if has_hash_dup else "duplicate_service_keys"
     return True, {
-        "duplicate_lead_id": dup.id if dup else None,
-        "duplicate_by": "hash" if has_hash_dup else "cuenta+contador+localidad",
-        "error_code": error_code,
+        "duplicate_lead_id": match.lead_id,
+        "duplicate_by": "hash" if match.by_hash else "cuenta+contador+localidad",
+        "error_code": "duplicate_invoice" if match.by_hash else "duplicate_service_keys",
     }
 
 
@@ -1025,12 +780,278 @@ def _is_partner_or_superadmin(user) -> bool:
     return bool(user.is_superuser or (profile and profile.role == RoleCode.PARTNER))
 
 
-def _lead_for_owner_or_404(user, lead_id: int) -> Lead:
+def _owned_leads(user):
     access = _lead_access(user)
     scoped_salesrep = access.salesrep or _target_salesrep_for_user(user)
     if not scoped_salesrep:
         raise Http404
-    return get_object_or_404(Lead, pk=lead_id, sales_rep=scoped_salesrep, lead_kind=Lead.LeadKind.RESIDENTIAL)
+    return Lead.objects.filter(sales_rep=scoped_salesrep, lead_kind=Lead.LeadKind.RESIDENTIAL)
+
+
+def _lead_for_owner_or_404(user, lead_id: int) -> Lead:
+    return get_object_or_404(_owned_leads(user), pk=lead_id)
+
+
+LEAD_IMPORT_CHUNK_SIZE = 500
+LEAD_IMPORT_CSV_SAMPLE = 64 * 1024
+LEAD_IMPORT_COLUMNS = {
+    "full_name": ("NOMBRE", "NOMBRE COMPLETO", "CLIENTE", "FULL NAME", "NAME", "CUSTOMER NAME"),
+    "phone": ("TELEFONO", "CELULAR", "PHONE"),
+    "phone2": ("TELEFONO 2", "PHONE 2"),
+    "email": ("EMAIL", "E MAIL", "CORREO", "CORREO ELECTRONICO"),
+    "city": ("PUEBLO", "CIUDAD", "MUNICIPIO", "CITY"),
+    "address": ("DIRECCION", "ADDRESS"),
+    "postal_code": ("CODIGO POSTAL", "ZIP", "ZIP CODE", "POSTAL CODE"),
+    "source": ("FUENTE", "LEAD SOURCE", "SOURCE"),
+    "message": ("NOTAS", "MENSAJE", "COMENTARIOS", "MESSAGE"),
+    "electricity_bill": ("FACTURA", "FACTURA LUZ", "ELECTRICITY BILL"),
+    "account_number": ("NUMERO DE CUENTA", "CUENTA", "ACCOUNT NUMBER"),
+    "meter_number": ("NUMERO DE CONTADOR", "CONTADOR", "METER NUMBER"),
+    "location_id": ("LOCALIDAD", "ID LOCALIDAD", "LOCATION ID"),
+    "invoice_hash": ("HASH FACTURA", "INVOICE HASH"),
+}
+# Columna del archivo -> campos del lead que recibe (los pares legacy/customer_* se llenan igual que en el modal).
+LEAD_IMPORT_FIELDS = {
+    "full_name": ("full_name", "customer_name"),
+    "phone": ("phone", "customer_phone"),
+    "phone2": ("customer_phone2",),
+    "email": ("email", "customer_email"),
+    "city": ("city", "customer_city"),
+    "address": ("address", "customer_address"),
+    "postal_code": ("customer_postal_code",),
+    "source": ("source", "lead_source"),
+    "message": ("message",),
+    "account_number": ("account_number",),
+    "meter_number": ("meter_number",),
+    "location_id": ("location_id",),
+    "invoice_hash": ("invoice_hash",),
+}
+MAX_ELECTRICITY_BILL = Decimal("100000000")
+
+
+def _import_header(value) -> str:
+    folded = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^A-Z0-9]+", " ", folded.upper()).strip()
+
+
+def _import_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # Excel guarda telefonos y cuentas numericas como float.
+        value = int(value)
+    return str(value).strip()
+
+
+def _csv_text(file_obj) -> io.TextIOWrapper:
+    sample = file_obj.read(LEAD_IMPORT_CSV_SAMPLE)
+    file_obj.seek(0)
+    try:
+        sample.decode("utf-8")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as exc:
+        truncated = len(sample) == LEAD_IMPORT_CSV_SAMPLE and exc.start >= len(sample) - 3
+        encoding = "utf-8-sig" if truncated else "cp1252"
+    return io.TextIOWrapper(file_obj, encoding=encoding, newline="")
+
+
+@contextmanager
+def _lead_import_rows(file_obj, *, file_name: str, sheet_name: str) -> Iterator[tuple[Iterator, int]]:
+    """Rows of the uploaded list, streamed, and the row count when the format knows it (0 otherwise)."""
+    if Path(file_name or "").suffix.lower() == ".csv":
+        text = _csv_text(file_obj)
+        try:
+            first_line = text.readline()
+            delimiter = max((",", ";", "\t"), key=first_line.count)
+            yield csv.reader(itertools.chain([first_line], text), delimiter=delimiter), 0
+        finally:
+            # El archivo lo cierra quien lo abrio.
+            text.detach()
+        return
+    wb = load_workbook(file_obj, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name and sheet_name in wb.sheetnames else wb[wb.sheetnames[0]]
+        yield ws.iter_rows(values_only=True), max((ws.max_row or 0) - 1, 0)
+    finally:
+        wb.close()
+
+
+@dataclass
+class _LeadImportTarget:
+    sales_rep: SalesRep
+    business_unit: BusinessUnit
+    actor: object
+    imported_at: datetime
+    dry_run: bool
+    # (tipo, clave) de huella -> fila que la trajo, para detectar duplicados dentro del propio archivo.
+    seen: dict[tuple[str, str], int] = field(default_factory=dict)
+    rollup_buckets: set = field(default_factory=set)
+
+    @property
+    def accepted(self) -> bool:
+        # Cargar leads a tu propio nombre no abre ventana de aceptacion, igual que crearlos en el modal.
+        return self.sales_rep.user_id == getattr(self.actor, "pk", None)
+
+
+def _import_leads_from_file(*, file_obj, file_name: str, sheet_name: str, dry_run: bool, actor, sales_rep_id: int, progress=None) -> dict:
+    """Import a prospect list assigned to one associate; ``progress(rows_done, rows_total)`` runs after every chunk."""
+    summary = {
+        "processed": 0,
+        "created": 0,
+        "duplicates": 0,
+        "skipped": 0,
+        "warnings": [],
+        "errors": [],
+    }
+    sales_rep = SalesRep.objects.select_related("user").filter(pk=sales_rep_id, is_active=True).first()
+    business_unit = _solar_unit()
+    if not sales_rep:
+        summary["errors"].append("El asociado seleccionado no existe o esta inactivo.")
+    elif not business_unit:
+        summary["errors"].append("Unidad solar no disponible.")
+    else:
+        target = _LeadImportTarget(sales_rep, business_unit, actor, timezone.now(), dry_run)
+        with ExitStack() as stack:
+            # Los rollups del dia se recalculan una vez al final (tambien si el import se corta a medias).
+            stack.callback(lambda: refresh_lead_buckets(target.rollup_buckets))
+            rows, rows_total = stack.enter_context(_lead_import_rows(file_obj, file_name=file_name, sheet_name=sheet_name))
+            header_row = next(rows, None)
+            header = [_import_header(cell) for cell in header_row or ()]
+            idx = {name: i for i, name in reversed(list(enumerate(header)))}
+            columns = {
+                column: next((idx[name] for name in names if name in idx), None)
+                for column, names in LEAD_IMPORT_COLUMNS.items()
+            }
+            if header_row is None:
+                summary["errors"].append("El archivo no contiene datos.")
+            elif columns["full_name"] is None:
+                summary["errors"].append("No se encontro la columna NOMBRE.")
+            else:
+                chunk: list[tuple[int, tuple]] = []
+                for row_idx, row in enumerate(rows, start=2):
+                    chunk.append((row_idx, row))
+                    if len(chunk) >= LEAD_IMPORT_CHUNK_SIZE:
+                        _import_lead_chunk(chunk, columns, target, summary)
+                        chunk = []
+                        if progress:
+                            progress(summary["processed"], rows_total)
+                if chunk:
+                    _import_lead_chunk(chunk, columns, target, summary)
+
+    for key in ("warnings", "errors"):
+        summary[f"{key}_hidden"] = max(len(summary[key]) - 20, 0)
+        summary[key] = summary[key][:20]
+    return summary
+
+
+def _validated_lead_row(row_idx: int, row, columns: dict, summary: dict) -> dict | None:
+    values = {}
+    for column, position in columns.items():
+        values[column] = _import_cell(row[position]) if position is not None and position < len(row) else ""
+    if not any(values.values()):
+        return None
+    summary["processed"] += 1
+
+    problems = []
+    if not values["full_name"]:
+        problems.append("falta el nombre")
+    if not values["phone"] and not values["email"]:
+        problems.append("sin telefono ni correo")
+    if values["email"]:
+        values["email"] = values["email"].lower()
+        try:
+            validate_email(values["email"])
+        except ValidationError:
+            problems.append(f'correo invalido "{values["email"]}"')
+    for column, fields in LEAD_IMPORT_FIELDS.items():
+        max_length = Lead._meta.get_field(fields[0]).max_length
+        if max_length and len(values[column]) > max_length:
+            problems.append(f"{column} supera {max_length} caracteres")
+    bill = None
+    if values["electricity_bill"]:
+        bill = _parse_money_to_decimal(values["electricity_bill"])
+        if bill is None or bill >= MAX_ELECTRICITY_BILL:
+            problems.append(f'factura invalida "{values["electricity_bill"]}"')
+        else:
+            bill = bill.quantize(Decimal("0.01"))
+    if problems:
+        summary["skipped"] += 1
+        summary["errors"].append(f"Fila {row_idx}: {'; '.join(problems)}.")
+        return None
+    values["electricity_bill"] = bill
+    return values
+
+
+def _import_lead_chunk(chunk, columns, target: _LeadImportTarget, summary) -> None:
+    parsed = []
+    for row_idx, row in chunk:
+        values = _validated_lead_row(row_idx, row, columns, summary)
+        if values is not None:
+            fingerprints = Fingerprints.of(
+                invoice_hashes=[values["invoice_hash"]],
+                account_number=values["account_number"],
+                meter_number=values["meter_number"],
+                location_id=values["location_id"],
+            )
+            parsed.append((row_idx, values, fingerprints))
+    if not parsed:
+        return
+
+    # Una sola consulta por bloque contra las huellas existentes.
+    matches = find_duplicates([fingerprints for _, _, fingerprints in parsed])
+    accepted = target.accepted
+    leads = []
+    for (row_idx, values, fingerprints), match in zip(parsed, matches):
+        if match is not None:
+            summary["duplicates"] += 1
+            duplicate_by = "hash" if match.by_hash else "cuenta+contador+localidad"
+            summary["warnings"].append(f"Fila {row_idx}: duplicado del lead #{match.lead_id} ({duplicate_by}).")
+            continue
+        earlier = next((target.seen[row] for row in fingerprints.rows if row in target.seen), None)
+        if earlier is not None:
+            summary["duplicates"] += 1
+            summary["warnings"].append(f"Fila {row_idx}: duplicado de la fila {earlier}.")
+            continue
+        for row in fingerprints.rows:
+            target.seen[row] = row_idx
+
+        lead = Lead(
+            business_unit=target.business_unit,
+            sales_rep=target.sales_rep,
+            lead_kind=Lead.LeadKind.RESIDENTIAL,
+            status=Lead.Status.NUEVO,
+            electricity_bill=values["electricity_bill"],
+            assigned_by=target.actor,
+            assigned_at=target.imported_at,
+            is_accepted=accepted,
+            acceptance_deadline=None if accepted else target.imported_at + LEAD_ACCEPTANCE_WINDOW,
+        )
+        for column, lead_fields in LEAD_IMPORT_FIELDS.items():
+            for lead_field in lead_fields:
+                setattr(lead, lead_field, values[column])
+        leads.append(lead)
+
+    if target.dry_run or not leads:
+        summary["created"] += len(leads)
+        return
+
+    # bulk_create no emite post_save: huellas, indice de busqueda y bitacora se escriben aqui.
+    first_row, last_row = chunk[0][0], chunk[-1][0]
+    try:
+        with transaction.atomic():
+            Lead.objects.bulk_create(leads, batch_size=LEAD_IMPORT_CHUNK_SIZE)
+            add_fingerprints_for_leads(leads)
+            index_documents(leads)
+            if not accepted:
+                LeadActivityLog.objects.bulk_create(
+                    [LeadActivityLog(lead=lead, actor=target.actor, activity_type=LeadActivityLog.ActivityType.ASSIGN) for lead in leads],
+                    batch_size=LEAD_IMPORT_CHUNK_SIZE,
+                )
+    except Exception as exc:
+        summary["errors"].append(f"Filas {first_row}-{last_row}: error guardando registros ({exc}).")
+        return
+    target.rollup_buckets |= {(timezone.localdate(lead.created_at), target.business_unit.pk, target.sales_rep.pk) for lead in leads}
+    summary["created"] += len(leads)
 
 
 @login_required
@@ -1040,7 +1061,6 @@ def crm_leads_list_page(request):
         return JsonResponse({"detail": "No autorizado"}, status=403)
 
     access = _lead_access(request.user)
-    rows = [_serialize_lead(item) for item in _base_residential_queryset(request.user)]
     context = {
         "title": "CRM Leads Residencial",
         "api_url": reverse("dashboard:crm_leads_api"),
@@ -1048,8 +1068,7 @@ def crm_leads_list_page(request):
         "is_superadmin_or_partner": access.is_superadmin_or_partner,
         "my_profile_id": access.salesrep.id if access.salesrep else None,
         "salesreps_choices_json": json.dumps(_salesrep_choices_for_user(request.user)),
-        "kpis": _compute_kpis(rows),
-        "initial_rows": rows,
+        "kpis": _compute_kpis(_scoped_residential_leads(request.user)),
     }
     return render(request, "dashboard/leads/leads_list.html", context)
 
@@ -1060,35 +1079,76 @@ def crm_leads_api(request):
     if not _can_access_customer_management_section(request.user):
         return JsonResponse({"detail": "No autorizado"}, status=403)
 
-    lead_kind = (request.GET.get("lead_kind") or Lead.LeadKind.RESIDENTIAL).strip() or Lead.LeadKind.RESIDENTIAL
-    status_filter = (request.GET.get("status") or "").strip()
-    city_filter = (request.GET.get("city") or "").strip()
-    source_filter = (request.GET.get("source") or "").strip()
-    q = (request.GET.get("search") or request.GET.get("search[value]") or "").strip().lower()
+    params = request.GET
+    lead_kind = (params.get("lead_kind") or Lead.LeadKind.RESIDENTIAL).strip() or Lead.LeadKind.RESIDENTIAL
+    scoped = _scoped_residential_leads(request.user).filter(lead_kind=lead_kind)
+    filtered = _apply_lead_filters(scoped, params)
+
+    kpis = _compute_kpis(filtered)
+    start = max(int_param(params, "start", 0), 0)
+    length = int_param(params, "length", LEADS_PAGE_SIZE)
+    if length < 0 or length > LEADS_MAX_PAGE_SIZE:
+        length = LEADS_MAX_PAGE_SIZE
+    search = _search_param(params)
+    ordering = _datatables_ordering(params, ranked=bool(search))
+    page = _with_row_data(filtered)
+    if search:
+        page = with_search_rank(page, search)
+    page = page.order_by(*ordering)[start : start + length]
 
-    qs = _base_residential_queryset(request.user).filter(lead_kind=lead_kind)
-    if status_filter:
-        qs = qs.filter(status=status_filter)
-    if city_filter:
-        qs = qs.filter(Q(city__iexact=city_filter) | Q(customer_city__iexact=city_filter))
-    if source_filter:
-        qs = qs.filter(Q(source__iexact=source_filter) | Q(lead_source__iexact=source_filter))
-    if q:
-        qs = qs.filter(
-            Q(full_name__icontains=q)
-            | Q(customer_name__icontains=q)
-            | Q(phone__icontains=q)
-            | Q(customer_phone__icontains=q)
-            | Q(email__icontains=q)
-            | Q(customer_email__icontains=q)
-            | Q(city__icontains=q)
-            | Q(customer_city__icontains=q)
-            | Q(source__icontains=q)
-            | Q(lead_source__icontains=q)
-        )
+    return JsonResponse(
+        {
+            "draw": int_param(params, "draw", 0),
+            "data": [_serialize_lead(item) for item in page],
+            "recordsTotal": scoped.count(),
+            "recordsFiltered": kpis["total"],
+            "kpis": kpis,
+        }
+    )
 
-    data = [_serialize_lead(item) for item in qs.order_by("-created_at")]
-    return JsonResponse({"data": data, "recordsTotal": len(data), "recordsFiltered": len(data), "kpis": _compute_kpis(data)})
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def crm_leads_import_page(request):
+    if not _is_partner_or_superadmin(request.user):
+        return JsonResponse({"detail": "No autorizado"}, status=403)
+
+    salesreps = _assignable_salesreps(request.user)
+    upload_form = LeadImportUploadForm(salesrep_queryset=salesreps)
+    if request.method == "POST":
+        upload_form = LeadImportUploadForm(request.POST, request.FILES, salesrep_queryset=salesreps)
+        if upload_form.is_valid():
+            cleaned = upload_form.cleaned_data
+            job = enqueue(
+                LEAD_IMPORT_JOB,
+                user=request.user,
+                payload={
+                    "sheet_name": cleaned.get("sheet_name") or "",
+                    "dry_run": bool(cleaned.get("dry_run")),
+                    "sales_rep_id": cleaned["sales_rep"].pk,
+                },
+                files={"report_file": cleaned["report_file"]},
+            )
+            messages.info(request, "Listado recibido; el resumen aparecera cuando termine de procesarse.")
+            return redirect(f"{request.path}?{urlencode({'import_job': job.pk})}")
+
+    import_job = None
+    upload_summary = None
+    import_job_id = request.GET.get("import_job") or ""
+    if import_job_id.isdigit():
+        import_job = Job.objects.filter(pk=int(import_job_id), kind=LEAD_IMPORT_JOB, created_by=request.user).first()
+        if import_job and import_job.status == Job.Status.SUCCEEDED:
+            upload_summary = import_job.result
+
+    context = {
+        "title": "Importar leads",
+        "upload_form": upload_form,
+        "upload_summary": upload_summary,
+        "import_job": import_job,
+        "import_job_status_url": reverse("jobs:job_status", args=[import_job.pk]) if import_job else "",
+        "expected_columns": [names[0] for names in LEAD_IMPORT_COLUMNS.values()],
+    }
+    return render(request, "dashboard/leads/leads_import.html", context)
 
 
 @login_required
@@ -1138,17 +1198,10 @@ def crm_lead_create_modal(request):
         request.FILES.get("electricity_invoice_page4_img"),
     ]
     image_inputs = [img for img in image_inputs if img]
-    parsed = {}
+    parsed = _parse_request_invoice(request, uploaded_pdf, image_inputs, lead_id=None)
     if uploaded_pdf:
-        parsed = _parse_electricity_invoice(
-            uploaded_pdf,
-            lead_id=None,
-            language=(request.POST.get("electricity_invoice_language") or ""),
-        )
         lead.invoice_pdf = uploaded_pdf
         lead.electricity_invoice_pdf = uploaded_pdf
-    elif image_inputs:
-        parsed = _parse_invoice_from_uploaded_images(image_inputs, language=(request.POST.get("electricity_invoice_language") or ""))
 
     if parsed:
         lead.invoice_name = parsed.get("invoice_name") or lead.invoice_name
@@ -1189,20 +1242,8 @@ def crm_lead_create_modal(request):
         return redirect("dashboard:crm_leads_list")
 
     lead.save()
-
-    override = InvoiceDuplicateOverride.objects.filter(
-        requester=target_salesrep,
-        expires_at__gte=timezone.now(),
-    ).filter(
-        Q(invoice_hash=lead.invoice_hash)
-        | Q(invoice_hash=lead.electricity_invoice_hash)
-        | Q(account_number=lead.account_number, meter_number=lead.meter_number, location_id=lead.location_id)
-    ).first()
-    if override:
-        # consume override once used by a successful save.
-        override.used_at = timezone.now()
-        override.used_on_lead = lead
-        override.save(update_fields=["used_at", "used_on_lead"])
+    # consume override once used by a successful save.
+    consume_override(target_salesrep, lead)
 
     if _is_ajax(request):
         return JsonResponse({"success": True, "message": "Lead creado correctamente.", "id": lead.id})
@@ -1254,7 +1295,10 @@ def crm_lead_fill_table_modal(request):
                 email=f"demo{suffix}@example.com",
             )
         )
+    # bulk_create no emite post_save: indice de busqueda y rollups del dia se actualizan aqui.
     Lead.objects.bulk_create(batch)
+    index_documents(batch)
+    refresh_lead_buckets({(timezone.localdate(lead.created_at), solar_unit.pk, target_salesrep.pk) for lead in batch})
     return JsonResponse({"success": True, "message": f"Se crearon {count} clientes demo."})
 
 
@@ -1300,17 +1344,10 @@ def crm_lead_update_modal(request, lead_id: int):
         request.FILES.get("electricity_invoice_page4_img"),
     ]
     image_inputs = [img for img in image_inputs if img]
-    parsed = {}
+    parsed = _parse_request_invoice(request, uploaded_pdf, image_inputs, lead_id=lead.id)
     if uploaded_pdf:
-        parsed = _parse_electricity_invoice(
-            uploaded_pdf,
-            lead_id=lead.id,
-            language=(request.POST.get("electricity_invoice_language") or ""),
-        )
         lead.invoice_pdf = uploaded_pdf
         lead.electricity_invoice_pdf = uploaded_pdf
-    elif image_inputs:
-        parsed = _parse_invoice_from_uploaded_images(image_inputs, language=(request.POST.get("electricity_invoice_language") or ""))
     if parsed:
         if parsed.get("invoice_hash"):
             lead.invoice_hash = parsed["invoice_hash"]
@@ -1395,48 +1432,61 @@ def crm_leads_log_activity(request):
 
 @login_required
 @require_http_methods(["POST"])
-def crm_leads_parse_invoice_preview(request):
-    if not _can_access_customer_management_section(request.user):
-        return JsonResponse({"success": False, "error": "No autorizado."}, status=403)
+def crm_leads_log_activity_batch(request):
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"success": False, "message": "JSON invalido."}, status=400)
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list) or len(events) > MAX_ACTIVITY_BATCH_EVENTS:
+        return JsonResponse(
+            {"success": False, "message": f"Se esperaba una lista de hasta {MAX_ACTIVITY_BATCH_EVENTS} eventos."},
+            status=400,
+        )
+    result = record_activities(request.user, _owned_leads(request.user), events)
+    return JsonResponse({"success": True, "logged": result.logged, "rejected": result.rejected})
+
+
+def _invoice_uploads(request) -> tuple[object | None, list]:
     file_obj = request.FILES.get("electricity_invoice_pdf") or request.FILES.get("invoice_pdf")
-    img1 = request.FILES.get("electricity_invoice_page1_img")
-    img2 = request.FILES.get("electricity_invoice_page2_img")
-    img3 = request.FILES.get("electricity_invoice_page3_img")
-    img4 = request.FILES.get("electricity_invoice_page4_img")
-    images = [img for img in [img1, img2, img3, img4] if img]
-    if not file_obj and not images:
-        return JsonResponse({"success": False, "error": "Debes subir PDF o imagenes de la factura."}, status=400)
+    images = [
+        request.FILES.get("electricity_invoice_page1_img"),
+        request.FILES.get("electricity_invoice_page2_img"),
+        request.FILES.get("electricity_invoice_page3_img"),
+        request.FILES.get("electricity_invoice_page4_img"),
+    ]
+    return file_obj, [img for img in images if img]
+
+
+def _uploads_digest(spooled_uploads: list[SpooledUpload]) -> str:
+    hasher = hashlib.sha256()
+    for spooled in spooled_uploads:
+        hasher.update(spooled.sha256.encode("ascii"))
+    return hasher.hexdigest()
 
-    lead_id = int(request.POST.get("lead_id") or 0) or None
-    language = (request.POST.get("electricity_invoice_language") or "").strip()
+
+def _extract_invoice(file_obj, images: list, *, lead_id: int | None, language: str) -> dict:
     if file_obj:
-        extracted = _parse_electricity_invoice(file_obj, lead_id=lead_id, language=language)
-    else:
-        extracted = _parse_invoice_from_uploaded_images(images, language=language)
-
-    invoice_hash = (extracted.get("invoice_hash") or "").strip()
-    dup_hash_qs = Lead.objects.filter(Q(invoice_hash=invoice_hash) | Q(electricity_invoice_hash=invoice_hash)).exclude(pk=lead_id) if invoice_hash else Lead.objects.none()
-    duplicate_invoice = dup_hash_qs.exists() if invoice_hash else False
-    duplicate_lead_id = dup_hash_qs.values_list("id", flat=True).first() if invoice_hash else None
-    duplicate_service_keys = (
-        bool(extracted.get("account_number") and extracted.get("meter_number") and extracted.get("location_id"))
-        and Lead.objects.filter(
-            account_number=extracted["account_number"],
-            meter_number=extracted["meter_number"],
-            location_id=extracted["location_id"],
-        ).exclude(pk=lead_id).exists()
+        return _parse_electricity_invoice(file_obj, lead_id=lead_id, language=language)
+    return _parse_invoice_from_uploaded_images(images, language=language)
+
+
+def _invoice_preview_response(extracted: dict, lead_id: int | None) -> tuple[dict, int]:
+    match = find_duplicate(
+        Fingerprints.of(
+            invoice_hashes=[extracted.get("invoice_hash") or ""],
+            account_number=extracted.get("account_number") or "",
+            meter_number=extracted.get("meter_number") or "",
+            location_id=extracted.get("location_id") or "",
+        ),
+        exclude_lead_id=lead_id,
     )
-    if not duplicate_lead_id and duplicate_service_keys:
-        duplicate_lead_id = (
-            Lead.objects.filter(
-                account_number=extracted["account_number"],
-                meter_number=extracted["meter_number"],
-                location_id=extracted["location_id"],
-            ).exclude(pk=lead_id).values_list("id", flat=True).first()
-        )
+    duplicate_invoice = bool(match and match.by_hash)
+    duplicate_service_keys = bool(match and match.by_service_keys)
+    duplicate_lead_id = match.lead_id if match else None
     if duplicate_invoice or duplicate_service_keys:
         code = "duplicate_invoice" if duplicate_invoice else "duplicate_service_keys"
-        return JsonResponse(
+        return (
             {
                 "success": False,
                 "code": code,
@@ -1449,7 +1499,7 @@ def crm_leads_parse_invoice_preview(request):
                 "data": extracted,
                 "extracted": extracted,
             },
-            status=409,
+            409,
         )
 
     checklist_keys = [
@@ -1462,13 +1512,80 @@ def crm_leads_parse_invoice_preview(request):
         "id_consumo_historial",
     ]
     checklist = {key: bool(extracted.get(key)) for key in checklist_keys}
-    return JsonResponse(
+    return (
         {
             "success": True,
             "data": extracted,
             "extracted": extracted,
             "checklist": checklist,
-        }
+        },
+        200,
+    )
+
+
+def _invoice_from_preview_job(request, spooled_uploads: list[SpooledUpload]) -> dict:
+    """Fields already extracted by this user's OCR preview job for these exact files, or ``{}``."""
+    job_id = (request.POST.get("invoice_job_id") or "").strip()
+    if not job_id.isdigit() or not spooled_uploads:
+        return {}
+    job = Job.objects.filter(
+        pk=int(job_id),
+        kind=INVOICE_PREVIEW_JOB,
+        status=Job.Status.SUCCEEDED,
+        created_by=request.user,
+    ).first()
+    if not job or job.payload.get("upload_digest") != _uploads_digest(spooled_uploads):
+        return {}
+    return dict(((job.result or {}).get("response") or {}).get("extracted") or {})
+
+
+def _parse_request_invoice(request, uploaded_pdf, image_inputs: list, *, lead_id: int | None) -> dict:
+    """Invoice fields for the uploads of a lead form; each upload is spooled and hashed once."""
+    uploads = [uploaded_pdf] if uploaded_pdf else image_inputs
+    if not uploads:
+        return {}
+    language = request.POST.get("electricity_invoice_language") or ""
+    with ExitStack() as stack:
+        spooled_uploads = [stack.enter_context(spool_upload(upload)) for upload in uploads]
+        # El OCR ya corrio en el job de previsualizacion; solo se repite si los archivos no coinciden.
+        parsed = _invoice_from_preview_job(request, spooled_uploads)
+        if parsed:
+            return parsed
+        if uploaded_pdf:
+            return _parse_spooled_invoice(spooled_uploads[0], lead_id=lead_id, language=language)
+        return _parse_spooled_images(spooled_uploads, language=language)
+
+
+@login_required
+@require_http_methods(["POST"])
+def crm_leads_parse_invoice_preview(request):
+    if not _can_access_customer_management_section(request.user):
+        return JsonResponse({"success": False, "error": "No autorizado."}, status=403)
+    file_obj, images = _invoice_uploads(request)
+    if not file_obj and not images:
+        return JsonResponse({"success": False, "error": "Debes subir PDF o imagenes de la factura."}, status=400)
+
+    with ExitStack() as stack:
+        spooled_uploads = [stack.enter_context(spool_upload(upload)) for upload in ([file_obj] if file_obj else images)]
+        upload_digest = _uploads_digest(spooled_uploads)
+    job = enqueue(
+        INVOICE_PREVIEW_JOB,
+        user=request.user,
+        payload={
+            "lead_id": int(request.POST.get("lead_id") or 0) or None,
+            "language": (request.POST.get("electricity_invoice_language") or "").strip(),
+            "upload_digest": upload_digest,
+        },
+        files={"electricity_invoice_pdf": file_obj} if file_obj else {"images": images},
+    )
+    return JsonResponse(
+        {
+            "success": True,
+            "queued": True,
+            "job_id": job.pk,
+            "status_url": reverse("jobs:job_status", args=[job.pk]),
+        },
+        status=202,
     )
 
 
@@ -1621,7 +1738,7 @@ def crm_assign_lead_api(request, lead_id: int):
     lead.sales_rep = target
     lead.assigned_by = request.user
     lead.assigned_at = timezone.now()
-    lead.acceptance_deadline = timezone.now() + timedelta(hours=24)
+    lead.acceptance_deadline = timezone.now() + LEAD_ACCEPTANCE_WINDOW
     lead.is_accepted = False
     if work_deadline_str:
         try:
@@ -1643,12 +1760,8 @@ def crm_accept_lead_api(request, lead_id: int):
         return JsonResponse({"success": True, "message": "Lead ya aceptado."})
 
     if lead.acceptance_deadline and lead.acceptance_deadline < now:
-        lead.sales_rep = None
-        lead.is_accepted = False
-        lead.assigned_by = None
-        lead.assigned_at = None
-        lead.acceptance_deadline = None
-        lead.save(update_fields=["sales_rep", "is_accepted", "assigned_by", "assigned_at", "acceptance_deadline", "updated_at"])
+        # El barrido periodico aun no paso por este lead.
+        expire_lead_acceptances(now=now, lead_ids=[lead.pk])
         return JsonResponse({"success": False, "message": "La ventana de aceptacion expiro y el lead fue desasignado."}, status=400)
 
     lead.is_accepted = True
@@ -0,0 +1,41 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from dashboard.services.lead_activity_service import ARCHIVE_BATCH_SIZE
+from dashboard.services.lead_activity_service import archive_lead_activity
+from dashboard.services.lead_activity_service import expired_activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Move lead activity logs older than the retention window to gzip-compressed JSONL files; "
+        "--check only reports how many are pending."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.LEAD_ACTIVITY_RETENTION_DAYS, help="Retention window in days.")
+        parser.add_argument("--output-dir", default=str(settings.LEAD_ACTIVITY_ARCHIVE_DIR), help="Directory for the .jsonl.gz files.")
+        parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument("--check", action="store_true", help="Fail if rows past retention remain; change nothing.")
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        if options["check"]:
+            pending = expired_activity(cutoff).count()
+            if pending:
+                raise CommandError(f"{pending} lead activity logs are past retention; run archive_lead_activity.")
+            self.stdout.write(self.style.SUCCESS("No lead activity logs past retention."))
+            return
+
+        moved, path = archive_lead_activity(cutoff=cutoff, directory=Path(options["output_dir"]), batch_size=options["batch_size"])
+        if not moved:
+            self.stdout.write(self.style.SUCCESS("No lead activity logs past retention."))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} lead activity logs to {path}."))
@@ -0,0 +1,66 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from dashboard.services.invoice_extraction_service import extract_invoice_fields
+
+DEFAULT_CORPUS = Path(__file__).resolve().parents[2] / "fixtures" / "invoices"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure invoice field extraction speed and recall over a corpus of invoice texts "
+        "(<name>.txt files plus expected.json); --check fails when any expected field is missed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="Directory with the .txt invoices and expected.json.")
+        parser.add_argument("--iterations", type=int, default=50, help="Extractions per document for the timing.")
+        parser.add_argument("--check", action="store_true", help="Exit with an error if recall is below 100%%.")
+
+    def handle(self, *args, **options):
+        corpus = Path(options["corpus"])
+        expected_path = corpus / "expected.json"
+        if not expected_path.exists():
+            raise CommandError(f"{expected_path} not found.")
+        expected = json.loads(expected_path.read_text(encoding="utf-8"))
+        iterations = max(1, options["iterations"])
+
+        field_hits: dict[str, list[int]] = {}
+        misses: list[str] = []
+        total_ms = 0.0
+        total_chars = 0
+        for name, wanted in sorted(expected.items()):
+            text = (corpus / name).read_text(encoding="utf-8")
+            started = time.perf_counter()
+            for _ in range(iterations):
+                fields = extract_invoice_fields(text)
+            elapsed_ms = (time.perf_counter() - started) * 1000 / iterations
+            total_ms += elapsed_ms
+            total_chars += len(text)
+            for field, value in wanted.items():
+                hit = fields.get(field) == value
+                counts = field_hits.setdefault(field, [0, 0])
+                counts[0] += int(hit)
+                counts[1] += 1
+                if not hit:
+                    misses.append(f"{name}: {field} = {fields.get(field)!r}, expected {value!r}")
+            self.stdout.write(f"{name}: {elapsed_ms:.3f} ms ({len(text)} chars)")
+
+        for field, (hits, total) in sorted(field_hits.items()):
+            self.stdout.write(f"  {field}: {hits}/{total}")
+        hits = sum(counts[0] for counts in field_hits.values())
+        total = sum(counts[1] for counts in field_hits.values())
+        recall = hits / total if total else 1.0
+        documents = len(expected)
+        self.stdout.write(
+            f"{documents} documents, {total_ms / max(documents, 1):.3f} ms/document, "
+            f"{total_chars / 1024 / max(total_ms / 1000, 1e-9):.0f} KiB/s, recall {recall:.1%} ({hits}/{total})"
+        )
+        for miss in misses:
+            self.stdout.write(self.style.WARNING(f"  miss {miss}"))
+        if options["check"] and misses:
+            raise CommandError(f"Invoice extraction missed {len(misses)} expected fields.")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from dashboard.services.lead_expiry_service import expire_lead_acceptances
+from dashboard.services.lead_expiry_service import expired_leads
+
+
+class Command(BaseCommand):
+    help = (
+        "Unassign leads whose acceptance window expired, logging an EXPIRE activity for each; "
+        "--check only reports how many are pending."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Fail if expired leads are still assigned; change nothing.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            pending = expired_leads().count()
+            if pending:
+                raise CommandError(f"{pending} leads have an expired acceptance window; run expire_lead_acceptances.")
+            self.stdout.write(self.style.SUCCESS("No expired lead acceptances pending."))
+            return
+
+        released = expire_lead_acceptances()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} leads with an expired acceptance window."))
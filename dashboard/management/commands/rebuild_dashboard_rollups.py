@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from dashboard.services.rollup_service import find_rollup_drift
+from dashboard.services.rollup_service import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily dashboard rollups from Sale, Lead and CrmDeal, or check them for drift with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Only report drift; do not rewrite the rollups.")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            drift = find_rollup_drift()
+            for table, groups in drift.items():
+                self.stdout.write(f"{table}: {groups} groups out of sync")
+            if any(drift.values()):
+                raise CommandError("Dashboard rollups are out of sync; run rebuild_dashboard_rollups.")
+            self.stdout.write(self.style.SUCCESS("Dashboard rollups are in sync."))
+            return
+
+        counts = rebuild_rollups()
+        summary = ", ".join(f"{table}={total}" for table, total in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Dashboard rollups rebuilt: {summary}."))
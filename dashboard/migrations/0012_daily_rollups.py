@@ -0,0 +1,131 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:47
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+
+SEGMENT_KEYWORDS = {
+    "commercial": ("comercial", "commercial", "business", "empresa"),
+    "residential": ("residencial", "residential", "home", "casa"),
+}
+
+
+def _segment_flag(segment):
+    query = Q()
+    for keyword in SEGMENT_KEYWORDS[segment]:
+        query |= Q(product__name__icontains=keyword)
+        query |= Q(plan__name__icontains=keyword)
+        query |= Q(external_reference__icontains=keyword)
+    return Case(When(query, then=Value(True)), default=Value(False))
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    Sale = apps.get_model("crm", "Sale")
+    Lead = apps.get_model("crm", "Lead")
+    CrmDeal = apps.get_model("crm", "CrmDeal")
+    SalesDailyRollup = apps.get_model("dashboard", "SalesDailyRollup")
+    LeadDailyRollup = apps.get_model("dashboard", "LeadDailyRollup")
+    DealDailyRollup = apps.get_model("dashboard", "DealDailyRollup")
+
+    sale_rows = (
+        Sale.objects.order_by()
+        .annotate(
+            day=TruncDate("created_at"),
+            is_residential=_segment_flag("residential"),
+            is_commercial=_segment_flag("commercial"),
+        )
+        .values("day", "business_unit_id", "sales_rep_id", "status", "is_residential", "is_commercial")
+        .annotate(sale_count=Count("id"), amount_total=Sum("amount"))
+    )
+    SalesDailyRollup.objects.bulk_create((SalesDailyRollup(**row) for row in sale_rows), batch_size=1000)
+
+    has_phone = ~Q(phone="")
+    has_email = ~Q(email="")
+    lead_rows = (
+        Lead.objects.order_by()
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "business_unit_id", "sales_rep_id", "source", "status")
+        .annotate(
+            lead_count=Count("id"),
+            with_phone=Count("id", filter=has_phone),
+            with_email=Count("id", filter=has_email),
+            with_contact=Count("id", filter=has_phone & has_email),
+        )
+    )
+    LeadDailyRollup.objects.bulk_create((LeadDailyRollup(**row) for row in lead_rows), batch_size=1000)
+
+    deal_rows = (
+        CrmDeal.objects.order_by()
+        .values("deal_kind", "salesrep_id", "stage", day=F("closing_date"))
+        .annotate(
+            deal_count=Count("id"),
+            epc_price_total=Coalesce(Sum("epc_price"), Value(Decimal("0")), output_field=DecimalField()),
+        )
+    )
+    DealDailyRollup.objects.bulk_create((DealDailyRollup(**row) for row in deal_rows), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userhierarchyclosure'),
+        ('crm', '0015_crmdeal'),
+        ('dashboard', '0011_admininviterequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DealDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('deal_kind', models.CharField(max_length=40)),
+                ('stage', models.CharField(max_length=40)),
+                ('deal_count', models.PositiveIntegerField(default=0)),
+                ('epc_price_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('salesrep', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='crm.salesrep')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['deal_kind', 'salesrep'], name='dash_deal_roll_kind_rep_idx'), models.Index(fields=['deal_kind', 'day'], name='dash_deal_roll_kind_day_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeadDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('source', models.CharField(blank=True, max_length=80)),
+                ('status', models.CharField(blank=True, max_length=40)),
+                ('lead_count', models.PositiveIntegerField(default=0)),
+                ('with_phone', models.PositiveIntegerField(default=0)),
+                ('with_email', models.PositiveIntegerField(default=0)),
+                ('with_contact', models.PositiveIntegerField(default=0)),
+                ('business_unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.businessunit')),
+                ('sales_rep', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='crm.salesrep')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business_unit', 'day'], name='dash_lead_roll_bu_day_idx'), models.Index(fields=['sales_rep', 'day'], name='dash_lead_roll_rep_day_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=16)),
+                ('is_residential', models.BooleanField(default=False)),
+                ('is_commercial', models.BooleanField(default=False)),
+                ('sale_count', models.PositiveIntegerField(default=0)),
+                ('amount_total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('business_unit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.businessunit')),
+                ('sales_rep', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='crm.salesrep')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['business_unit', 'day'], name='dash_sales_roll_bu_day_idx'), models.Index(fields=['sales_rep', 'day'], name='dash_sales_roll_rep_day_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceExtractionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('kind', models.CharField(max_length=10)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('language', models.CharField(blank=True, max_length=20)),
+                ('extractor_version', models.PositiveSmallIntegerField()),
+                ('result', models.JSONField(default=dict)),
+                ('size_bytes', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -589,3 +589,74 @@ class Offer(models.Model):
             query = urlencode(params)
             return urlunparse((parsed.scheme, parsed.netloc, parsed.path, parsed.params, query, parsed.fragment))
         return embed_url
+
+
+class SalesDailyRollup(models.Model):
+    """Sales per day, business unit, sales rep and status; rebuilt bucket by bucket from ``Sale`` signals."""
+
+    day = models.DateField()
+    business_unit = models.ForeignKey(BusinessUnit, on_delete=models.CASCADE, related_name="+")
+    sales_rep = models.ForeignKey("crm.SalesRep", on_delete=models.CASCADE, related_name="+")
+    status = models.CharField(max_length=16)
+    is_residential = models.BooleanField(default=False)
+    is_commercial = models.BooleanField(default=False)
+    sale_count = models.PositiveIntegerField(default=0)
+    amount_total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["business_unit", "day"], name="dash_sales_roll_bu_day_idx"),
+            models.Index(fields=["sales_rep", "day"], name="dash_sales_roll_rep_day_idx"),
+        ]
+
+
+class LeadDailyRollup(models.Model):
+    day = models.DateField()
+    business_unit = models.ForeignKey(BusinessUnit, on_delete=models.CASCADE, related_name="+")
+    sales_rep = models.ForeignKey("crm.SalesRep", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    source = models.CharField(max_length=80, blank=True)
+    status = models.CharField(max_length=40, blank=True)
+    lead_count = models.PositiveIntegerField(default=0)
+    with_phone = models.PositiveIntegerField(default=0)
+    with_email = models.PositiveIntegerField(default=0)
+    with_contact = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["business_unit", "day"], name="dash_lead_roll_bu_day_idx"),
+            models.Index(fields=["sales_rep", "day"], name="dash_lead_roll_rep_day_idx"),
+        ]
+
+
+class DealDailyRollup(models.Model):
+    """Deals per closing date, kind, sales rep and stage (``day`` is null for deals without closing date)."""
+
+    day = models.DateField(null=True, blank=True)
+    deal_kind = models.CharField(max_length=40)
+    salesrep = models.ForeignKey("crm.SalesRep", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    stage = models.CharField(max_length=40)
+    deal_count = models.PositiveIntegerField(default=0)
+    epc_price_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deal_kind", "salesrep"], name="dash_deal_roll_kind_rep_idx"),
+            models.Index(fields=["deal_kind", "day"], name="dash_deal_roll_kind_day_idx"),
+        ]
+
+
+class InvoiceExtractionCache(models.Model):
+    """Fields extracted from an invoice, keyed by content hash, OCR language and extractor version."""
+
+    key = models.CharField(max_length=64, unique=True)
+    kind = models.CharField(max_length=10)
+    content_hash = models.CharField(max_length=64)
+    language = models.CharField(max_length=20, blank=True)
+    extractor_version = models.PositiveSmallIntegerField()
+    result = models.JSONField(default=dict)
+    size_bytes = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{self.content_hash[:12]} v{self.extractor_version}"
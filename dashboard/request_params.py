@@ -0,0 +1,6 @@
+def int_param(params, name: str, default: int) -> int:
+    """``params[name]`` as an int, or ``default`` when it is missing or not a number."""
+    try:
+        return int(params.get(name, default))
+    except (TypeError, ValueError):
+        return default
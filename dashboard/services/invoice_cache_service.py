@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Callable
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Q
+from django.db.models import Sum
+from django.utils import timezone
+
+from dashboard.models import InvoiceExtractionCache
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Al desalojar se baja hasta este porcentaje para no repetir el barrido en cada escritura.
+EVICTION_LOW_WATERMARK = 0.9
+# last_used_at solo se reescribe si quedo mas viejo que esto; el LRU no necesita mas precision.
+TOUCH_INTERVAL = timedelta(minutes=5)
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "INVOICE_EXTRACTION_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+
+def extraction_cache_key(kind: str, content_hash: str, language: str, version: int) -> str:
+    return hashlib.sha256(f"{kind}:{version}:{language}:{content_hash}".encode()).hexdigest()
+
+
+def cached_extraction(
+    kind: str,
+    content_hash: str,
+    *,
+    language: str,
+    version: int,
+    compute: Callable[[], tuple[dict, bool]],
+) -> dict:
+    """Return the stored extraction for this content, or run ``compute`` and store its result.
+
+    ``compute`` returns the result and whether it is complete. An incomplete result (an OCR
+    run that timed out) is returned to the caller but not stored, so the next upload retries.
+    """
+    key = extraction_cache_key(kind, content_hash, language, version)
+    now = timezone.now()
+    entry = InvoiceExtractionCache.objects.filter(key=key).only("id", "result", "last_used_at").first()
+    if entry is not None:
+        if entry.last_used_at < now - TOUCH_INTERVAL:
+            InvoiceExtractionCache.objects.filter(pk=entry.pk).update(last_used_at=now)
+        return dict(entry.result)
+
+    result, complete = compute()
+    if not complete:
+        return result
+    size = len(json.dumps(result, default=str))
+    try:
+        with transaction.atomic():
+            InvoiceExtractionCache.objects.create(
+                key=key,
+                kind=kind,
+                content_hash=content_hash,
+                language=language,
+                extractor_version=version,
+                result=result,
+                size_bytes=size,
+                last_used_at=now,
+            )
+    except IntegrityError:
+        # Otra peticion extrajo la misma factura a la vez; su fila sirve igual.
+        pass
+    else:
+        evict_extraction_cache()
+    return result
+
+
+def evict_extraction_cache(max_bytes: int | None = None) -> int:
+    """Drop least recently used entries once the stored results exceed ``max_bytes``."""
+    max_bytes = _max_bytes() if max_bytes is None else max_bytes
+    total = InvoiceExtractionCache.objects.aggregate(total=Sum("size_bytes"))["total"] or 0
+    if total <= max_bytes:
+        return 0
+    budget = int(max_bytes * EVICTION_LOW_WATERMARK)
+    kept = 0
+    entries = InvoiceExtractionCache.objects.order_by("-last_used_at", "-id").values_list("id", "last_used_at", "size_bytes")
+    for entry_id, last_used_at, size in entries.iterator():
+        kept += size
+        if kept > budget:
+            # Todo lo que ordena despues de la primera entrada que no cabe sale de una vez.
+            stale = Q(last_used_at__lt=last_used_at) | Q(last_used_at=last_used_at, id__lte=entry_id)
+            deleted, _ = InvoiceExtractionCache.objects.filter(stale).delete()
+            return deleted
+    return 0
@@ -0,0 +1,111 @@
+"""Buffered writes and retention of lead activity logs.
+
+The leads UI queues VIEW/PHONE/EMAIL/SMS/WHATSAPP clicks and flushes them to
+``crm_leads_log_activity_batch`` every few seconds: ``record_activities`` checks ownership
+of every lead in the batch with one query and inserts the rows with one ``bulk_create``.
+``archive_lead_activity`` moves rows older than the retention window to gzip-compressed
+JSONL files so ``crm_lead_activity_log_v2`` only holds recent activity.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+from collections.abc import Iterable
+from dataclasses import dataclass
+from dataclasses import field
+from datetime import datetime
+from pathlib import Path
+
+from crm.models import LeadActivityLog
+
+# Lo que el navegador puede registrar; ASSIGN/ACCEPT/EXPIRE solo los escribe el servidor.
+CLIENT_ACTIVITY_TYPES = frozenset(
+    {
+        LeadActivityLog.ActivityType.VIEW,
+        LeadActivityLog.ActivityType.PHONE,
+        LeadActivityLog.ActivityType.EMAIL,
+        LeadActivityLog.ActivityType.SMS,
+        LeadActivityLog.ActivityType.WHATSAPP,
+    }
+)
+MAX_ACTIVITY_BATCH_EVENTS = 200
+ARCHIVE_BATCH_SIZE = 5000
+
+
+@dataclass(frozen=True)
+class ActivityBatchResult:
+    logged: int
+    rejected: list[int] = field(default_factory=list)
+
+
+def record_activities(user, owned_leads, events: Iterable[dict]) -> ActivityBatchResult:
+    """Write the valid ``events`` for leads in ``owned_leads``; returns the indexes it rejected.
+
+    An event is ``{"lead_id": int, "activity_type": str, "payload": dict}``. Events with an
+    unknown type, a malformed id or a lead outside ``owned_leads`` are skipped, not fatal: the
+    rest of the batch is still written.
+    """
+    parsed: list[tuple[int, int, str, dict]] = []
+    rejected: list[int] = []
+    for idx, event in enumerate(events):
+        try:
+            lead_id = int(event.get("lead_id"))
+        except (AttributeError, TypeError, ValueError):
+            rejected.append(idx)
+            continue
+        activity_type = str(event.get("activity_type") or "").upper().strip()
+        payload = event.get("payload")
+        if activity_type not in CLIENT_ACTIVITY_TYPES:
+            rejected.append(idx)
+            continue
+        parsed.append((idx, lead_id, activity_type, payload if isinstance(payload, dict) else {}))
+
+    owned = set(owned_leads.filter(pk__in={lead_id for _, lead_id, _, _ in parsed}).values_list("pk", flat=True)) if parsed else set()
+    logs = []
+    for idx, lead_id, activity_type, payload in parsed:
+        if lead_id not in owned:
+            rejected.append(idx)
+            continue
+        logs.append(LeadActivityLog(lead_id=lead_id, actor=user, activity_type=activity_type, payload=payload))
+    LeadActivityLog.objects.bulk_create(logs)
+    return ActivityBatchResult(logged=len(logs), rejected=sorted(rejected))
+
+
+def expired_activity(cutoff: datetime):
+    return LeadActivityLog.objects.filter(created_at__lt=cutoff)
+
+
+def _archive_row(row: dict) -> str:
+    row["created_at"] = row["created_at"].isoformat()
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def archive_lead_activity(*, cutoff: datetime, directory: Path, batch_size: int = ARCHIVE_BATCH_SIZE) -> tuple[int, Path | None]:
+    """Move activity logs created before ``cutoff`` to ``directory``; returns (rows moved, file).
+
+    Each batch is appended to the run's ``.jsonl.gz`` file as its own gzip member, flushed to
+    disk, and only then deleted from the table. A crash between the two steps leaves the batch
+    in both places; the next run archives it again, so restores should dedupe by ``id``.
+    """
+    rows = expired_activity(cutoff).order_by("pk").values("id", "lead_id", "actor_id", "activity_type", "payload", "created_at")
+    moved = 0
+    path: Path | None = None
+    while True:
+        batch = list(rows[:batch_size])
+        if not batch:
+            break
+        if path is None:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"lead_activity_{cutoff:%Y%m%d}_{batch[0]['id']}.jsonl.gz"
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+                archive.write("".join(f"{_archive_row(row)}\n" for row in batch).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        LeadActivityLog.objects.filter(pk__in=[row["id"] for row in batch]).delete()
+        moved += len(batch)
+        if len(batch) < batch_size:
+            break
+    return moved, path
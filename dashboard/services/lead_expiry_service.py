@@ -0,0 +1,87 @@
+"""Unassignment of leads whose acceptance window closed without the associate accepting them.
+
+``expire_lead_acceptances`` runs from the ``expire_lead_acceptances`` command and as a
+periodic task of the ``run_workers`` supervisor. Once it runs regularly, lead lists can
+filter on ``(sales_rep, lead_kind)`` alone instead of re-checking every deadline.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from crm.models import Lead
+from crm.models import LeadActivityLog
+from dashboard.services.rollup_service import refresh_lead_buckets
+
+EXPIRY_BATCH_SIZE = 1000
+
+
+def expired_leads(now: datetime | None = None):
+    return Lead.objects.filter(
+        is_accepted=False,
+        sales_rep__isnull=False,
+        acceptance_deadline__lt=now or timezone.now(),
+    )
+
+
+def expire_lead_acceptances(
+    *,
+    now: datetime | None = None,
+    lead_ids: Iterable[int] | None = None,
+    batch_size: int = EXPIRY_BATCH_SIZE,
+) -> int:
+    """Unassign every expired lead (or only those in ``lead_ids``); returns how many were released.
+
+    Each batch is one ``UPDATE`` plus one bulk insert of ``EXPIRE`` activity logs.
+    """
+    now = now or timezone.now()
+    candidates = expired_leads(now).order_by("pk")
+    if lead_ids is not None:
+        candidates = candidates.filter(pk__in=list(lead_ids))
+    released = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                candidates.select_for_update(skip_locked=True).values_list("pk", "sales_rep_id", "business_unit_id", "created_at")[:batch_size]
+            )
+            if not rows:
+                break
+            # Se repite la condicion: un lead aceptado entre la lectura y el UPDATE no se toca.
+            ids = [pk for pk, *_ in rows]
+            updated = candidates.filter(pk__in=ids).update(
+                sales_rep=None,
+                assigned_by=None,
+                assigned_at=None,
+                acceptance_deadline=None,
+                updated_at=now,
+            )
+            released_ids = set(ids)
+            if updated < len(ids):
+                released_ids = set(Lead.objects.filter(pk__in=ids, sales_rep__isnull=True).values_list("pk", flat=True))
+            LeadActivityLog.objects.bulk_create(
+                [
+                    LeadActivityLog(
+                        lead_id=pk,
+                        activity_type=LeadActivityLog.ActivityType.EXPIRE,
+                        payload={"sales_rep_id": sales_rep_id},
+                    )
+                    for pk, sales_rep_id, _, _ in rows
+                    if pk in released_ids
+                ]
+            )
+            # UPDATE no emite post_save: los rollups del dia pasan del asociado a "sin asignar".
+            buckets = set()
+            for pk, sales_rep_id, business_unit_id, created_at in rows:
+                if pk in released_ids:
+                    day = timezone.localdate(created_at)
+                    buckets.add((day, business_unit_id, sales_rep_id))
+                    buckets.add((day, business_unit_id, None))
+            refresh_lead_buckets(buckets)
+        released += updated
+        if len(rows) < batch_size:
+            break
+    return released
@@ -0,0 +1,186 @@
+"""Page-level OCR on a bounded process pool.
+
+Tesseract is CPU-bound, so pages are rendered and recognized in separate
+processes. Page tasks are module-level functions without Django imports so the
+pool also works with the ``spawn`` start method.
+"""
+
+from __future__ import annotations
+
+import io
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from dataclasses import field
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_CONCURRENT_REQUESTS = 2
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 30.0
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_slots: threading.BoundedSemaphore | None = None
+
+
+@dataclass(frozen=True)
+class PageOcr:
+    index: int
+    text: str
+    render_ms: float
+    ocr_ms: float
+
+
+@dataclass
+class OcrRun:
+    pages: list[PageOcr] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    timed_out: bool = False
+    stopped_early: bool = False
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page.text for page in sorted(self.pages, key=lambda page: page.index) if page.text).strip()
+
+
+def _setting(name: str, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def request_timeout() -> float:
+    return float(_setting("OCR_REQUEST_TIMEOUT_SECONDS", DEFAULT_REQUEST_TIMEOUT_SECONDS))
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=int(_setting("OCR_MAX_WORKERS", DEFAULT_MAX_WORKERS)))
+        return _pool
+
+
+def _reset_executor() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _request_slots() -> threading.BoundedSemaphore:
+    global _slots
+    with _pool_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(int(_setting("OCR_MAX_CONCURRENT_REQUESTS", DEFAULT_MAX_CONCURRENT_REQUESTS)))
+        return _slots
+
+
+def ocr_pdf_page(source: str | bytes, index: int, lang: str, tesseract_cmd: str, timeout: float, scale: float = 2.0) -> PageOcr:
+    """Render and recognize one page; ``source`` is a file path (preferred, nothing is pickled) or the PDF bytes."""
+    import pypdfium2 as pdfium
+    import pytesseract
+
+    started = time.perf_counter()
+    doc = pdfium.PdfDocument(source)
+    try:
+        page = doc[index]
+        try:
+            image = page.render(scale=scale).to_pil()
+        finally:
+            page.close()
+    finally:
+        doc.close()
+    rendered = time.perf_counter()
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    text = pytesseract.image_to_string(image, lang=lang, timeout=timeout) or ""
+    return PageOcr(index, text.strip(), (rendered - started) * 1000, (time.perf_counter() - rendered) * 1000)
+
+
+def ocr_image(source: str | bytes, index: int, lang: str, tesseract_cmd: str, timeout: float) -> PageOcr:
+    import pytesseract
+    from PIL import Image
+
+    started = time.perf_counter()
+    image = Image.open(source if isinstance(source, str) else io.BytesIO(source))
+    image.load()
+    decoded = time.perf_counter()
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    text = pytesseract.image_to_string(image, lang=lang, timeout=timeout) or ""
+    return PageOcr(index, text.strip(), (decoded - started) * 1000, (time.perf_counter() - decoded) * 1000)
+
+
+def run_pages(
+    task: Callable[..., PageOcr],
+    page_args: Sequence[tuple],
+    *,
+    stop_when: Callable[[str], bool] | None = None,
+    timeout: float | None = None,
+) -> OcrRun:
+    """Run ``task(*args)`` for every page concurrently and collect whatever finishes in time.
+
+    ``stop_when`` sees the text recognized so far (in page order) and can end the run
+    before the remaining pages finish. Only ``OCR_MAX_CONCURRENT_REQUESTS`` runs share the
+    pool at once; a run that cannot get a slot before its deadline returns empty.
+    """
+    timeout = request_timeout() if timeout is None else float(timeout)
+    started = time.perf_counter()
+    deadline = started + timeout
+    run = OcrRun()
+    slots = _request_slots()
+    if not slots.acquire(timeout=timeout):
+        run.timed_out = True
+        run.elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.warning("OCR sin turno tras %.0f ms; %s paginas omitidas", run.elapsed_ms, len(page_args))
+        return run
+    try:
+        try:
+            executor = _executor()
+            pending = {executor.submit(task, *args) for args in page_args}
+        except (BrokenProcessPool, RuntimeError):
+            _reset_executor()
+            executor = _executor()
+            pending = {executor.submit(task, *args) for args in page_args}
+        while pending:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                run.timed_out = True
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    run.pages.append(future.result())
+                except BrokenProcessPool:
+                    logger.warning("El pool de OCR se cayo; se recrea en la siguiente peticion")
+                    _reset_executor()
+                except Exception:
+                    logger.warning("Fallo el OCR de una pagina", exc_info=True)
+            if pending and stop_when is not None and stop_when(run.text):
+                run.stopped_early = True
+                break
+        for future in pending:
+            future.cancel()
+    finally:
+        slots.release()
+    run.elapsed_ms = (time.perf_counter() - started) * 1000
+    logger.info(
+        "OCR %s: %s/%s paginas en %.0f ms (timeout=%s, early_exit=%s) %s",
+        getattr(task, "__name__", "task"),
+        len(run.pages),
+        len(page_args),
+        run.elapsed_ms,
+        run.timed_out,
+        run.stopped_early,
+        [(page.index, round(page.render_ms), round(page.ocr_ms)) for page in sorted(run.pages, key=lambda page: page.index)],
+    )
+    return run
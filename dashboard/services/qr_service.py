@@ -0,0 +1,232 @@
+"""Local QR rendering for lead-generation and team invitation links.
+
+A PNG depends only on the encoded content, the style and the card text, so it is rendered
+once and kept on disk under ``QR_CACHE_DIR``, named by the SHA-256 of those inputs plus
+``QR_TEMPLATE_VERSION``. The same hash is the ETag, which lets browsers revalidate with a
+304 without the server rendering or even reading the file. TrueType fonts are loaded once
+per process.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from datetime import date
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.cache import patch_cache_control
+
+try:
+    from PIL import Image
+    from PIL import ImageDraw
+    from PIL import ImageFont
+    from PIL import ImageOps
+except Exception:  # pragma: no cover - optional at runtime in some environments
+    Image = None
+    ImageDraw = None
+    ImageFont = None
+    ImageOps = None
+
+try:
+    import qrcode
+except Exception:  # pragma: no cover - optional at runtime in some environments
+    qrcode = None
+
+# Subir cuando cambie el dibujo de las tarjetas: las entradas viejas dejan de usarse y se purgan.
+QR_TEMPLATE_VERSION = 1
+QR_MAX_AGE_SECONDS = 3600
+# Un acierto solo reescribe el mtime si quedo mas viejo que esto; la purga no necesita mas precision.
+TOUCH_INTERVAL = timedelta(days=1)
+STYLE_PLAIN = "plain"
+STYLE_MARKETING = "marketing"
+
+FONT_CANDIDATES = {
+    True: ("DejaVuSans-Bold.ttf", "arialbd.ttf", "segoeuib.ttf", r"C:\Windows\Fonts\arialbd.ttf", r"C:\Windows\Fonts\segoeuib.ttf"),
+    False: ("DejaVuSans.ttf", "arial.ttf", "segoeui.ttf", r"C:\Windows\Fonts\arial.ttf", r"C:\Windows\Fonts\segoeui.ttf"),
+}
+
+
+class QrUnavailable(Exception):
+    """``qrcode`` or Pillow is not installed in this environment."""
+
+
+@dataclass(frozen=True)
+class MarketingCard:
+    salesrep_name: str
+    salesrep_id: int
+    email: str
+    generated_on: date
+
+
+@dataclass(frozen=True)
+class QrSpec:
+    content: str
+    style: str = STYLE_PLAIN
+    card: MarketingCard | None = None
+    # Clave estable para contenidos que cambian en cada peticion (enlaces firmados): sustituye al
+    # contenido en la clave, y el PNG guarda el contenido de la peticion que lo genero.
+    identity: str = ""
+
+    @functools.cached_property
+    def key(self) -> str:
+        card = asdict(self.card) if self.card else None
+        source = ["identity", self.identity] if self.identity else ["content", self.content]
+        raw = json.dumps([QR_TEMPLATE_VERSION, self.style, *source, card], default=str, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.key}"'
+
+
+def _cache_dir() -> Path:
+    return Path(getattr(settings, "QR_CACHE_DIR", Path(settings.BASE_DIR) / "var" / "qr"))
+
+
+@functools.lru_cache(maxsize=16)
+def load_font(size: int, *, bold: bool = False):
+    if ImageFont is None:
+        return None
+    for candidate in FONT_CANDIDATES[bold]:
+        try:
+            return ImageFont.truetype(candidate, size=size)
+        except Exception:
+            continue
+    try:
+        return ImageFont.load_default()
+    except Exception:
+        return None
+
+
+def _qr_image(content: str):
+    if qrcode is None:
+        raise QrUnavailable("qrcode no esta instalado.")
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(content)
+    qr.make(fit=True)
+    return qr.make_image(fill_color="black", back_color="white")
+
+
+def _marketing_canvas(qr_image, card: MarketingCard):
+    if Image is None or ImageDraw is None or ImageOps is None:
+        return qr_image
+    qr_img = ImageOps.contain(qr_image.convert("RGB"), (320, 320))
+    canvas = Image.new("RGB", (1080, 1080), "#f4f8ff")
+    draw = ImageDraw.Draw(canvas)
+    font_h2 = load_font(32, bold=True)
+    font_h3 = load_font(26, bold=True)
+    font_body = load_font(24)
+    font_small = load_font(20)
+
+    # Header band
+    draw.rectangle((0, 0, 1080, 170), fill="#123a6f")
+    draw.rectangle((0, 145, 1080, 170), fill="#1a6fb2")
+    draw.text((62, 48), "One-Group  |  QR de Mercadeo", fill="#ffffff", font=font_h3)
+
+    # Main card
+    draw.rounded_rectangle((48, 210, 1032, 930), radius=34, fill="#ffffff", outline="#d7e3f4", width=2)
+    draw.text((90, 254), "Escanea para solicitar asesoria solar", fill="#0f172a", font=font_h2)
+    draw.text((90, 302), "Lead Generation  •  Campana digital", fill="#4b5563", font=font_body)
+
+    # QR frame
+    draw.rounded_rectangle((88, 360, 462, 734), radius=24, fill="#f8fbff", outline="#c9d9ee", width=2)
+    canvas.paste(qr_img, (115, 387))
+    draw.text((150, 748), "Escanea aqui", fill="#1e3a8a", font=font_h3)
+
+    # Commercial info block
+    draw.rounded_rectangle((520, 360, 980, 734), radius=24, fill="#f8fbff", outline="#c9d9ee", width=2)
+    draw.text((552, 396), f"Asociado: {card.salesrep_name}", fill="#0f172a", font=font_body)
+    draw.text((552, 438), f"Codigo asesor: {card.salesrep_id}", fill="#1f2937", font=font_body)
+    if card.email:
+        draw.text((552, 480), f"Email: {card.email}", fill="#334155", font=font_small)
+    draw.text((552, 548), "Usalo en redes sociales,", fill="#1e293b", font=font_small)
+    draw.text((552, 580), "flyers, WhatsApp o material impreso.", fill="#1e293b", font=font_small)
+    draw.text((552, 644), "CTA recomendado:", fill="#1d4ed8", font=font_small)
+    draw.text((552, 678), '"Solicita tu asesoria solar hoy"', fill="#0f172a", font=font_small)
+
+    # Footer line
+    draw.line((88, 970, 992, 970), fill="#d4deec", width=2)
+    draw.text((90, 988), f"Generado: {card.generated_on.isoformat()}", fill="#64748b", font=font_small)
+    draw.text((730, 988), "one-group lead system", fill="#64748b", font=font_small)
+    return canvas
+
+
+def render_qr_png(spec: QrSpec) -> bytes:
+    image = _qr_image(spec.content)
+    if spec.style == STYLE_MARKETING and spec.card is not None:
+        image = _marketing_canvas(image, spec.card)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def cached_qr_path(spec: QrSpec) -> Path:
+    """Path of the PNG for ``spec``, rendering it first if this is the first request."""
+    path = _cache_dir() / spec.key[:2] / f"{spec.key}.png"
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        pass
+    else:
+        if stat.st_mtime < time.time() - TOUCH_INTERVAL.total_seconds():
+            os.utime(path)
+        return path
+    png = render_qr_png(spec)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Se escribe aparte y se renombra: otra peticion nunca ve un PNG a medias.
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            handle.write(png)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    return path
+
+
+def qr_png_response(request, spec: QrSpec, *, filename: str = "") -> HttpResponse:
+    """Serve ``spec`` as a cacheable PNG, answering 304 when the browser already has it."""
+    response = get_conditional_response(request, etag=spec.etag)
+    if response is None:
+        response = FileResponse(cached_qr_path(spec).open("rb"), content_type="image/png")
+        if filename:
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["ETag"] = spec.etag
+    # Las imagenes llevan datos del asociado: solo las guarda el navegador, no caches compartidas.
+    patch_cache_control(response, private=True, max_age=QR_MAX_AGE_SECONDS)
+    return response
+
+
+def purge_qr_cache(older_than: timedelta) -> int:
+    """Delete cached PNGs nobody requested in ``older_than``; returns how many were removed."""
+    cutoff = time.time() - older_than.total_seconds()
+    removed = 0
+    root = _cache_dir()
+    if not root.exists():
+        return 0
+    for path in root.glob("*/*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:
+            continue
+    return removed
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case
+from django.db.models import Count
+from django.db.models import DecimalField
+from django.db.models import F
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.db.models import Value
+from django.db.models import When
+from django.db.models.functions import Coalesce
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from crm.models import CrmDeal
+from crm.models import Lead
+from crm.models import Sale
+from dashboard.models import DealDailyRollup
+from dashboard.models import LeadDailyRollup
+from dashboard.models import SalesDailyRollup
+
+BULK_BATCH_SIZE = 1000
+
+SEGMENT_KEYWORDS = {
+    "commercial": ("comercial", "commercial", "business", "empresa"),
+    "residential": ("residencial", "residential", "home", "casa"),
+}
+
+# (day, business_unit_id, sales_rep_id)
+SaleBucket = tuple[date, int, int]
+LeadBucket = tuple[date, int, int | None]
+# (closing_date, deal_kind, salesrep_id)
+DealBucket = tuple[date | None, str, int | None]
+
+
+def _keywords(segment: str) -> tuple[str, ...]:
+    return SEGMENT_KEYWORDS["commercial" if segment == "commercial" else "residential"]
+
+
+def segment_sale_filter(segment: str) -> Q:
+    query = Q()
+    for keyword in _keywords(segment):
+        query |= Q(product__name__icontains=keyword)
+        query |= Q(plan__name__icontains=keyword)
+        query |= Q(external_reference__icontains=keyword)
+    return query
+
+
+def segment_lead_filter(segment: str, *, field: str = "source") -> Q:
+    query = Q()
+    for keyword in _keywords(segment):
+        query |= Q(**{f"{field}__icontains": keyword})
+    return query
+
+
+def _flag(condition: Q) -> Case:
+    return Case(When(condition, then=Value(True)), default=Value(False))
+
+
+def _sale_rows(sales_qs: QuerySet) -> list[SalesDailyRollup]:
+    rows = (
+        sales_qs.order_by()
+        .annotate(
+            day=TruncDate("created_at"),
+            is_residential=_flag(segment_sale_filter("residential")),
+            is_commercial=_flag(segment_sale_filter("commercial")),
+        )
+        .values("day", "business_unit_id", "sales_rep_id", "status", "is_residential", "is_commercial")
+        .annotate(sale_count=Count("id"), amount_total=Sum("amount"))
+    )
+    return [SalesDailyRollup(**row) for row in rows]
+
+
+def _lead_rows(leads_qs: QuerySet) -> list[LeadDailyRollup]:
+    has_phone = ~Q(phone="")
+    has_email = ~Q(email="")
+    rows = (
+        leads_qs.order_by()
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "business_unit_id", "sales_rep_id", "source", "status")
+        .annotate(
+            lead_count=Count("id"),
+            with_phone=Count("id", filter=has_phone),
+            with_email=Count("id", filter=has_email),
+            with_contact=Count("id", filter=has_phone & has_email),
+        )
+    )
+    return [LeadDailyRollup(**row) for row in rows]
+
+
+def _deal_rows(deals_qs: QuerySet) -> list[DealDailyRollup]:
+    rows = (
+        deals_qs.order_by()
+        .values("deal_kind", "salesrep_id", "stage", day=F("closing_date"))
+        .annotate(
+            deal_count=Count("id"),
+            epc_price_total=Coalesce(Sum("epc_price"), Value(Decimal("0")), output_field=DecimalField()),
+        )
+    )
+    return [DealDailyRollup(**row) for row in rows]
+
+
+@transaction.atomic
+def refresh_sale_buckets(buckets: Iterable[SaleBucket]) -> None:
+    """Recompute the rollup rows of each ``(day, business_unit_id, sales_rep_id)`` bucket from ``Sale``."""
+    for day, business_unit_id, sales_rep_id in set(buckets):
+        SalesDailyRollup.objects.filter(day=day, business_unit_id=business_unit_id, sales_rep_id=sales_rep_id).delete()
+        sales = Sale.objects.filter(
+            created_at__date=day,
+            business_unit_id=business_unit_id,
+            sales_rep_id=sales_rep_id,
+        )
+        SalesDailyRollup.objects.bulk_create(_sale_rows(sales))
+
+
+@transaction.atomic
+def refresh_lead_buckets(buckets: Iterable[LeadBucket]) -> None:
+    for day, business_unit_id, sales_rep_id in set(buckets):
+        LeadDailyRollup.objects.filter(day=day, business_unit_id=business_unit_id, sales_rep_id=sales_rep_id).delete()
+        leads = Lead.objects.filter(
+            created_at__date=day,
+            business_unit_id=business_unit_id,
+            sales_rep_id=sales_rep_id,
+        )
+        LeadDailyRollup.objects.bulk_create(_lead_rows(leads))
+
+
+@transaction.atomic
+def refresh_deal_buckets(buckets: Iterable[DealBucket]) -> None:
+    for day, deal_kind, salesrep_id in set(buckets):
+        # filter(campo=None) se traduce a IS NULL, asi que el mismo filtro sirve para ambos lados.
+        DealDailyRollup.objects.filter(day=day, deal_kind=deal_kind, salesrep_id=salesrep_id).delete()
+        deals = CrmDeal.objects.filter(closing_date=day, deal_kind=deal_kind, salesrep_id=salesrep_id)
+        DealDailyRollup.objects.bulk_create(_deal_rows(deals))
+
+
+def sale_buckets(sale: Sale) -> set[SaleBucket]:
+    """The bucket ``sale`` lives in now plus, if it moved, the one it was loaded from."""
+    day = timezone.localdate(sale.created_at)
+    buckets = {(day, sale.business_unit_id, sale.sales_rep_id)}
+    dirty = sale.get_dirty_fields()
+    if "business_unit" in dirty or "sales_rep" in dirty:
+        buckets.add(
+            (
+                day,
+                dirty.get("business_unit", sale.business_unit_id),
+                dirty.get("sales_rep", sale.sales_rep_id),
+            )
+        )
+    return buckets
+
+
+def lead_buckets(lead: Lead) -> set[LeadBucket]:
+    day = timezone.localdate(lead.created_at)
+    buckets = {(day, lead.business_unit_id, lead.sales_rep_id)}
+    dirty = lead.get_dirty_fields()
+    if "business_unit" in dirty or "sales_rep" in dirty:
+        buckets.add(
+            (
+                day,
+                dirty.get("business_unit", lead.business_unit_id),
+                dirty.get("sales_rep", lead.sales_rep_id),
+            )
+        )
+    return buckets
+
+
+def deal_buckets(deal: CrmDeal) -> set[DealBucket]:
+    buckets = {(deal.closing_date, deal.deal_kind, deal.salesrep_id)}
+    dirty = deal.get_dirty_fields()
+    if {"closing_date", "deal_kind", "salesrep"} & dirty.keys():
+        buckets.add(
+            (
+                dirty.get("closing_date", deal.closing_date),
+                dirty.get("deal_kind", deal.deal_kind),
+                dirty.get("salesrep", deal.salesrep_id),
+            )
+        )
+    return buckets
+
+
+# (modelo, constructor de filas, modelo fuente, dimensiones, medidas)
+ROLLUP_TABLES = (
+    (
+        SalesDailyRollup,
+        _sale_rows,
+        Sale,
+        ("day", "business_unit_id", "sales_rep_id", "status", "is_residential", "is_commercial"),
+        ("sale_count", "amount_total"),
+    ),
+    (
+        LeadDailyRollup,
+        _lead_rows,
+        Lead,
+        ("day", "business_unit_id", "sales_rep_id", "source", "status"),
+        ("lead_count", "with_phone", "with_email", "with_contact"),
+    ),
+    (
+        DealDailyRollup,
+        _deal_rows,
+        CrmDeal,
+        ("day", "deal_kind", "salesrep_id", "stage"),
+        ("deal_count", "epc_price_total"),
+    ),
+)
+
+
+@transaction.atomic
+def rebuild_rollups() -> dict[str, int]:
+    """Throw away every rollup row and regenerate them from the source tables."""
+    counts = {}
+    for model, build, source, _, _ in ROLLUP_TABLES:
+        model.objects.all().delete()
+        rows = build(source.objects.all())
+        model.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+        counts[model._meta.model_name] = len(rows)
+    return counts
+
+
+def find_rollup_drift() -> dict[str, int]:
+    """Number of rollup groups per table that no longer match the source rows."""
+    drift = {}
+    for model, build, source, fields, measures in ROLLUP_TABLES:
+        expected = {
+            tuple(getattr(row, name) for name in fields): tuple(getattr(row, name) for name in measures)
+            for row in build(source.objects.all())
+        }
+        actual = {
+            tuple(row[name] for name in fields): tuple(row[f"sum_{name}"] for name in measures)
+            for row in model.objects.order_by()
+            .values(*fields)
+            .annotate(**{f"sum_{name}": Sum(name) for name in measures})
+        }
+        drift[model._meta.model_name] = sum(
+            1 for key in expected.keys() | actual.keys() if expected.get(key) != actual.get(key)
+        )
+    return drift
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import astuple
+from dataclasses import dataclass
+from dataclasses import replace
+from datetime import date
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models import QuerySet
+from django.db.models import Sum
+from django.utils import timezone
+
+from crm.models import CrmDeal
+from crm.models import Sale
+from dashboard.models import LeadDailyRollup
+from dashboard.models import SalesDailyRollup
+from dashboard.services.rollup_service import segment_lead_filter
+
+CACHE_TTL_SECONDS = 60
+DAILY_WINDOW_DAYS = 7
+
+SALES_STATUS_SERIES = (
+    (Sale.Status.CONFIRMED, "Confirmadas", "#2fb66f"),
+    (Sale.Status.PENDING, "Pendientes", "#a57cff"),
+    (Sale.Status.DRAFT, "Borrador", "#7b8da6"),
+    (Sale.Status.CANCELLED, "Canceladas", "#df5a71"),
+)
+DAILY_SALES_COLOR = "#6f42c1"
+DAILY_LEADS_COLOR = "#0ea5e9"
+LEAD_SOURCE_PALETTE = ("#2fb66f", "#6f42c1", "#0ea5e9", "#f59e0b", "#df5a71", "#64748b")
+
+
+@dataclass(frozen=True)
+class MetricsScope:
+    """What a dashboard is allowed to see; two requests with the same scope share cached metrics.
+
+    ``business_unit_ids=None`` means every business unit (platform admins). ``segment`` is
+    ``"residential"``/``"commercial"`` for the solar segment pages and empty otherwise.
+    """
+
+    role: str
+    business_unit_ids: tuple[int, ...] | None = None
+    sales_rep_id: int | None = None
+    segment: str = ""
+
+    def narrowed(self, **changes) -> MetricsScope:
+        return replace(self, **changes)
+
+    def within_business_unit(self, business_unit_id: int) -> MetricsScope:
+        if self.business_unit_ids is None or business_unit_id in self.business_unit_ids:
+            return self.narrowed(business_unit_ids=(business_unit_id,))
+        return self.narrowed(business_unit_ids=())
+
+    @property
+    def is_empty(self) -> bool:
+        return self.business_unit_ids == ()
+
+    def filter_rollups(self, rollups: QuerySet) -> QuerySet:
+        if self.is_empty:
+            return rollups.none()
+        if self.business_unit_ids is not None:
+            rollups = rollups.filter(business_unit_id__in=self.business_unit_ids)
+        if self.sales_rep_id is not None:
+            rollups = rollups.filter(sales_rep_id=self.sales_rep_id)
+        return rollups
+
+    def cache_key(self, kind: str, day: date) -> str:
+        digest = hashlib.sha1(repr(astuple(self)).encode()).hexdigest()
+        return f"dashboard_metrics:{kind}:{day.isoformat()}:{digest}"
+
+
+def _daily_window(end_date: date) -> list[date]:
+    start_date = end_date - timedelta(days=DAILY_WINDOW_DAYS - 1)
+    return [start_date + timedelta(days=offset) for offset in range(DAILY_WINDOW_DAYS)]
+
+
+def _daily_sums(measure: str, days: list[date]) -> dict[str, Sum]:
+    return {f"day_{idx}": Sum(measure, filter=Q(day=day)) for idx, day in enumerate(days)}
+
+
+def _daily_chart(row: dict, days: list[date], color: str) -> dict:
+    return {
+        "labels": [day.strftime("%b %d") for day in days],
+        "values": [row[f"day_{idx}"] or 0 for idx in range(len(days))],
+        "color": color,
+    }
+
+
+def _cached(scope: MetricsScope, kind: str, day: date, compute):
+    cache_key = scope.cache_key(kind, day)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    metrics = compute()
+    cache.set(cache_key, metrics, CACHE_TTL_SECONDS)
+    return metrics
+
+
+def compute_sales_metrics(scope: MetricsScope) -> dict:
+    """Totals, status histogram and the 7-day series for ``scope`` in a single query over the daily rollups."""
+    end_date = timezone.now().date()
+    days = _daily_window(end_date)
+
+    def compute() -> dict:
+        rollups = scope.filter_rollups(SalesDailyRollup.objects.all())
+        if scope.segment == "commercial":
+            rollups = rollups.filter(is_commercial=True)
+        elif scope.segment == "residential":
+            rollups = rollups.filter(is_residential=True)
+        row = rollups.order_by().aggregate(
+            total=Sum("sale_count"),
+            amount=Sum("amount_total"),
+            **{
+                f"status_{status}": Sum("sale_count", filter=Q(status=status))
+                for status, _, _ in SALES_STATUS_SERIES
+            },
+            **_daily_sums("sale_count", days),
+        )
+        return {
+            "total_sales": row["total"] or 0,
+            "confirmed_sales": row[f"status_{Sale.Status.CONFIRMED}"] or 0,
+            "total_amount": row["amount"] or 0,
+            "sales_status_chart": [
+                {"label": label, "value": row[f"status_{status}"] or 0, "color": color}
+                for status, label, color in SALES_STATUS_SERIES
+            ],
+            "daily_sales_chart": _daily_chart(row, days, DAILY_SALES_COLOR),
+        }
+
+    return _cached(scope, "sales", end_date, compute)
+
+
+def lead_source_chart(rollups: QuerySet) -> list[dict]:
+    rows = rollups.values("source").annotate(total=Sum("lead_count")).order_by("-total", "source")[:6]
+    data = [
+        {
+            "label": row["source"] or "Sin fuente",
+            "value": row["total"],
+            "color": LEAD_SOURCE_PALETTE[idx % len(LEAD_SOURCE_PALETTE)],
+        }
+        for idx, row in enumerate(rows)
+    ]
+    if not data:
+        data.append({"label": "Sin datos", "value": 0, "color": "#cbd5e1"})
+    return data
+
+
+def compute_lead_metrics(scope: MetricsScope) -> dict:
+    """Contact coverage and the 7-day series in one aggregate, plus the top-sources histogram."""
+    end_date = timezone.now().date()
+    days = _daily_window(end_date)
+
+    def compute() -> dict:
+        rollups = scope.filter_rollups(LeadDailyRollup.objects.all())
+        if scope.segment:
+            rollups = rollups.filter(segment_lead_filter(scope.segment))
+        row = rollups.order_by().aggregate(
+            total=Sum("lead_count"),
+            with_phone=Sum("with_phone"),
+            with_email=Sum("with_email"),
+            with_contact=Sum("with_contact"),
+            **_daily_sums("lead_count", days),
+        )
+        total = row["total"] or 0
+        return {
+            "total_clients": total,
+            "with_phone": row["with_phone"] or 0,
+            "with_email": row["with_email"] or 0,
+            "contactable_pct": round((row["with_contact"] / total) * 100, 1) if total else 0.0,
+            "lead_source_chart": lead_source_chart(rollups),
+            "daily_leads_chart": _daily_chart(row, days, DAILY_LEADS_COLOR),
+        }
+
+    return _cached(scope, "leads", end_date, compute)
+
+
+def compute_deal_kpis(rollups: QuerySet) -> dict:
+    """Pipeline KPIs from ``DealDailyRollup`` rows already narrowed to what the viewer can see."""
+    today = timezone.localdate()
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    rows = (
+        rollups.order_by()
+        .values("stage")
+        .annotate(
+            total=Sum("deal_count"),
+            pipeline=Sum("epc_price_total"),
+            month_total=Sum("deal_count", filter=Q(day__gte=month_start, day__lt=next_month)),
+        )
+    )
+    by_stage = {row["stage"]: row for row in rows}
+    stage_counts = {}
+    for stage_key, stage_label in CrmDeal.Stage.choices:
+        value = (by_stage.get(stage_key) or {}).get("total") or 0
+        if value:
+            stage_counts[stage_label] = value
+    return {
+        "total": sum(row["total"] or 0 for row in by_stage.values()),
+        "total_pipeline": float(sum((row["pipeline"] or Decimal("0") for row in by_stage.values()), Decimal("0"))),
+        "month_total": sum(row["month_total"] or 0 for row in by_stage.values()),
+        "stage_counts": stage_counts,
+    }
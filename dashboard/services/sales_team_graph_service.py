@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import threading
 from collections import Counter
 from dataclasses import dataclass
 from datetime import datetime
+from datetime import timedelta
 from urllib.parse import quote_plus
 
 from django.contrib.auth import get_user_model
@@ -10,14 +12,24 @@ from django.core.cache import cache
 from django.urls import reverse
 from django.utils import timezone
 
+from core.cache_generations import cache_ttl
+from core.cache_generations import generation_token
+from core.cache_generations import record_lookup
 from core.rbac.constants import RoleCode
 from core.rbac.constants import role_priority
 from crm.models import SalesRep
+from crm.search import fold
+from crm.search import query_terms
 
 User = get_user_model()
-CACHE_TTL_SECONDS = 120
+
+_graph_lock = threading.Lock()
+_graph_state: dict[str, object] = {"version": None, "graph": None}
 
 DEFAULT_AVATAR_URL = "https://ui-avatars.com/api/?background=0D8ABC&color=fff&name={name}"
+GRAPH_PAGE_SIZE = 50
+GRAPH_MAX_PAGE_SIZE = 200
+GRAPH_SEARCH_LIMIT = 20
 
 
 @dataclass(frozen=True)
@@ -35,15 +47,13 @@ def _position_name(rep: SalesRep) -> str:
     return profile.get_role_display() if profile else "Sin nivel"
 
 
-def _image_url(rep: SalesRep, request) -> str:
+def _image_path(rep: SalesRep) -> str:
+    """Avatar URL as stored (usually site-relative); the viewer's host is added per request."""
     profile = getattr(rep.user, "profile", None)
-    image = None
     if profile and profile.avatar:
-        image = profile.avatar.url
-    elif rep.avatar:
-        image = rep.avatar.url
-    if image:
-        return request.build_absolute_uri(image)
+        return profile.avatar.url
+    if rep.avatar:
+        return rep.avatar.url
     return DEFAULT_AVATAR_URL.format(name=quote_plus(_full_name(rep)))
 
 
@@ -62,73 +72,267 @@ def _role_sort_from_label(position_name: str) -> int:
     return 0
 
 
-def fetch_hierarchy_iterative(root_salesrep_id: int, request) -> GraphBuildResult:
-    cache_key = f"sales_team_graph:{request.user.id}:{root_salesrep_id}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return GraphBuildResult(nodes=cached["nodes"], generated_at=cached["generated_at"])
+@dataclass(frozen=True)
+class SubtreeStats:
+    """Counts for a rep and everyone below it: ``size`` includes the rep, ``height`` counts levels."""
 
-    reps = list(SalesRep.objects.select_related("user", "user__profile", "business_unit").filter(is_active=True))
-    rep_by_id = {rep.id: rep for rep in reps}
-    user_to_rep = {rep.user_id: rep for rep in reps}
+    size: int
+    height: int
+    positions: dict[str, int]
 
-    root_rep = rep_by_id.get(root_salesrep_id)
-    if not root_rep:
-        return GraphBuildResult(nodes=[], generated_at=timezone.now())
 
-    children_by_parent_rep_id: dict[int, list[int]] = {}
-    for rep in reps:
-        profile = getattr(rep.user, "profile", None)
-        parent_rep = None
-        if profile and profile.manager_id:
-            parent_rep = user_to_rep.get(profile.manager_id)
-        if not parent_rep and rep.parent_id:
-            parent_rep = rep_by_id.get(rep.parent_id)
-        if not parent_rep:
-            continue
-        children_by_parent_rep_id.setdefault(parent_rep.id, []).append(rep.id)
+@dataclass(frozen=True)
+class ChildrenPage:
+    node: dict
+    children: list[dict]
+    offset: int
+    total: int
 
-    for parent_id in children_by_parent_rep_id:
-        children_by_parent_rep_id[parent_id].sort(key=lambda rid: _full_name(rep_by_id[rid]).lower())
 
-    nodes: list[dict] = []
-    stack: list[tuple[int, int | None]] = [(root_rep.id, None)]
-    visited: set[int] = set()
+@dataclass(frozen=True)
+class HierarchyGraph:
+    """Whole-organization tree of active reps, identical for every viewer.
+
+    ``nodes`` holds the viewer-neutral fields of each rep, ``children`` its direct reports
+    sorted by name, ``parents`` the reverse link and ``stats`` the precomputed size, height
+    and role counts of each subtree. ``slice`` walks one subtree and adds what depends on the
+    viewer; ``children_page``, ``path`` and ``search`` answer the org-chart API without walking it.
+    """
+
+    nodes: dict[int, dict]
+    children: dict[int, tuple[int, ...]]
+    parents: dict[int, int]
+    stats: dict[int, SubtreeStats]
+    generated_at: datetime
 
-    while stack:
-        rep_id, parent_rep_id = stack.pop()
-        if rep_id in visited:
-            continue
-        visited.add(rep_id)
+    def _viewer_node(self, rep_id: int, parent_rep_id: int | None, host: str, viewer_id: int | None) -> dict:
+        node = self.nodes[rep_id]
+        image = node["imagePath"]
+        stats = self.stats[rep_id]
+        return {
+            "id": node["id"],
+            "parentId": str(parent_rep_id) if parent_rep_id else None,
+            "name": node["name"],
+            "imageUrl": f"{host}{image}" if image.startswith("/") else image,
+            "area": node["area"],
+            "profileUrl": node["profileUrl"],
+            "office": node["office"],
+            "tags": node["tags"],
+            "isLoggedUser": node["userId"] == viewer_id,
+            "positionName": node["positionName"],
+            "directCount": len(self.children.get(rep_id, ())),
+            "descendantCount": stats.size - 1,
+            "subtreeDepth": stats.height - 1,
+            "size": 1,
+        }
 
-        rep = rep_by_id.get(rep_id)
-        if not rep:
+    def slice(self, root_salesrep_id: int, request) -> list[dict]:
+        if root_salesrep_id not in self.nodes:
+            return []
+        host = request.build_absolute_uri("/")[:-1]
+        viewer_id = request.user.id
+        sliced: list[dict] = []
+        stack: list[tuple[int, int | None]] = [(root_salesrep_id, None)]
+        visited: set[int] = set()
+        while stack:
+            rep_id, parent_rep_id = stack.pop()
+            if rep_id in visited:
+                continue
+            visited.add(rep_id)
+            sliced.append(self._viewer_node(rep_id, parent_rep_id, host, viewer_id))
+            for child_id in reversed(self.children.get(rep_id, ())):
+                stack.append((child_id, rep_id))
+        return sliced
+
+    def path(self, root_salesrep_id: int, rep_id: int) -> list[int] | None:
+        """Rep ids from ``root_salesrep_id`` down to ``rep_id``, or None when it is outside that subtree."""
+        if root_salesrep_id not in self.nodes or rep_id not in self.nodes:
+            return None
+        path = [rep_id]
+        seen = {rep_id}
+        while path[-1] != root_salesrep_id:
+            parent_id = self.parents.get(path[-1])
+            if parent_id is None or parent_id in seen:
+                return None
+            path.append(parent_id)
+            seen.add(parent_id)
+        path.reverse()
+        return path
+
+    def children_page(self, root_salesrep_id: int, rep_id: int, request, *, offset: int = 0, limit: int = GRAPH_PAGE_SIZE) -> ChildrenPage | None:
+        """``rep_id`` and one page of its direct reports, or None when the viewer cannot see it."""
+        path = self.path(root_salesrep_id, rep_id)
+        if path is None:
+            return None
+        host = request.build_absolute_uri("/")[:-1]
+        viewer_id = request.user.id
+        # El padre del nodo raiz queda fuera del arbol del usuario: no se expone.
+        parent_id = path[-2] if len(path) > 1 else None
+        child_ids = self.children.get(rep_id, ())
+        offset = max(offset, 0)
+        limit = min(max(limit, 1), GRAPH_MAX_PAGE_SIZE)
+        return ChildrenPage(
+            node=self._viewer_node(rep_id, parent_id, host, viewer_id),
+            children=[self._viewer_node(child_id, rep_id, host, viewer_id) for child_id in child_ids[offset : offset + limit]],
+            offset=offset,
+            total=len(child_ids),
+        )
+
+    def path_nodes(self, root_salesrep_id: int, rep_id: int, request) -> list[dict] | None:
+        path = self.path(root_salesrep_id, rep_id)
+        if path is None:
+            return None
+        host = request.build_absolute_uri("/")[:-1]
+        viewer_id = request.user.id
+        return [self._viewer_node(node_id, path[idx - 1] if idx else None, host, viewer_id) for idx, node_id in enumerate(path)]
+
+    def search(self, root_salesrep_id: int, text: str, *, limit: int = GRAPH_SEARCH_LIMIT) -> list[list[int]]:
+        """Paths to the reps under ``root_salesrep_id`` whose name has a word starting with each query word.
+
+        Closest to the root first, then by name; at most ``limit`` paths.
+        """
+        terms = query_terms(text)
+        if not terms:
+            return []
+        paths = []
+        for rep_id, node in self.nodes.items():
+            words = node["searchWords"]
+            if not all(any(word.startswith(term) for word in words) for term in terms):
+                continue
+            path = self.path(root_salesrep_id, rep_id)
+            if path is not None:
+                paths.append(path)
+        paths.sort(key=lambda path: (len(path), self.nodes[path[-1]]["name"].lower()))
+        return paths[:limit]
+
+    def summary(self, root_salesrep_id: int) -> dict:
+        """Same shape as ``compute_graph_summary`` over ``slice``, read from the precomputed stats."""
+        stats = self.stats.get(root_salesrep_id)
+        if stats is None:
+            return _summary_payload(0, 0, Counter(), 0)
+        return _summary_payload(
+            stats.size,
+            len(self.children.get(root_salesrep_id, ())),
+            Counter(stats.positions),
+            stats.height,
+        )
+
+
+def _subtree_stats(nodes: dict[int, dict], children: dict[int, tuple[int, ...]]) -> dict[int, SubtreeStats]:
+    # Recorrido post-orden iterativo: una red de 10k niveles no debe tocar el limite de recursion.
+    stats: dict[int, SubtreeStats] = {}
+    for start_id in nodes:
+        if start_id in stats:
             continue
+        pending: set[int] = set()
+        stack: list[tuple[int, bool]] = [(start_id, False)]
+        while stack:
+            rep_id, children_done = stack.pop()
+            if children_done:
+                size = 1
+                height = 1
+                positions = Counter({nodes[rep_id]["positionName"] or "Sin nivel": 1})
+                for child_id in children.get(rep_id, ()):
+                    child_stats = stats.get(child_id)
+                    # Sin estadisticas: el hijo es un ancestro (ciclo de managers), no se cuenta dos veces.
+                    if child_stats is None:
+                        continue
+                    size += child_stats.size
+                    height = max(height, child_stats.height + 1)
+                    positions.update(child_stats.positions)
+                stats[rep_id] = SubtreeStats(size=size, height=height, positions=dict(positions))
+                continue
+            if rep_id in stats or rep_id in pending:
+                continue
+            pending.add(rep_id)
+            stack.append((rep_id, True))
+            for child_id in children.get(rep_id, ()):
+                if child_id not in stats and child_id not in pending:
+                    stack.append((child_id, False))
+    return stats
+
+
+def _build_graph() -> HierarchyGraph:
+    reps = list(SalesRep.objects.select_related("user", "user__profile", "business_unit").filter(is_active=True))
+    rep_by_id = {rep.id: rep for rep in reps}
+    user_to_rep = {rep.user_id: rep for rep in reps}
+    profile_url = reverse("dashboard:associate_profile")
 
+    nodes: dict[int, dict] = {}
+    children: dict[int, list[int]] = {}
+    for rep in reps:
         profile = getattr(rep.user, "profile", None)
-        role_code = profile.role if profile else ""
-        node = {
+        name = _full_name(rep)
+        nodes[rep.id] = {
             "id": str(rep.id),
-            "parentId": str(parent_rep_id) if parent_rep_id else None,
-            "name": _full_name(rep),
-            "imageUrl": _image_url(rep, request),
+            "userId": rep.user_id,
+            "name": name,
+            "searchWords": tuple(fold(name)),
+            "imagePath": _image_path(rep),
             "area": _area(rep),
-            "profileUrl": reverse("dashboard:associate_profile"),
+            "profileUrl": profile_url,
             "office": rep.business_unit.name if rep.business_unit_id else "Sin oficina",
-            "tags": role_code,
-            "isLoggedUser": rep.user_id == request.user.id,
+            "tags": profile.role if profile else "",
             "positionName": _position_name(rep),
-            "size": 1,
         }
-        nodes.append(node)
+        parent_rep = None
+        if profile and profile.manager_id:
+            parent_rep = user_to_rep.get(profile.manager_id)
+        if not parent_rep and rep.parent_id:
+            parent_rep = rep_by_id.get(rep.parent_id)
+        if parent_rep:
+            children.setdefault(parent_rep.id, []).append(rep.id)
+
+    sorted_children = {
+        parent_id: tuple(sorted(child_ids, key=lambda rid: nodes[rid]["name"].lower()))
+        for parent_id, child_ids in children.items()
+    }
+    return HierarchyGraph(
+        nodes=nodes,
+        children=sorted_children,
+        parents={child_id: parent_id for parent_id, child_ids in sorted_children.items() for child_id in child_ids},
+        stats=_subtree_stats(nodes, sorted_children),
+        generated_at=timezone.now(),
+    )
+
+
+def _graph_max_age() -> timedelta:
+    # Red de seguridad para cambios que no pasan por signals (update(), SQL directo).
+    return timedelta(seconds=cache_ttl())
+
+
+def get_hierarchy_graph() -> HierarchyGraph:
+    """The graph for the current generations: this process's copy, then the default cache, then the DB.
+
+    Generations are read from the database, so every process drops its copy after a bump; the built
+    graph itself is only reused across processes when the default cache backend is shared.
+
+    The graph spans every business unit, so it depends on the global and the "any unit" generation.
+    """
+    version = generation_token()
+    graph = _graph_state["graph"]
+    if _graph_state["version"] == version and graph is not None and timezone.now() - graph.generated_at < _graph_max_age():
+        record_lookup("sales_team_graph", True)
+        return graph
+    with _graph_lock:
+        graph = _graph_state["graph"]
+        if _graph_state["version"] == version and graph is not None and timezone.now() - graph.generated_at < _graph_max_age():
+            record_lookup("sales_team_graph", True)
+            return graph
+        cache_key = f"sales_team_graph:{version}"
+        graph = cache.get(cache_key)
+        record_lookup("sales_team_graph", graph is not None)
+        if graph is None:
+            graph = _build_graph()
+            cache.set(cache_key, graph, cache_ttl())
+        _graph_state["graph"] = graph
+        _graph_state["version"] = version
+        return graph
 
-        child_ids = children_by_parent_rep_id.get(rep_id, [])
-        for child_id in reversed(child_ids):
-            stack.append((child_id, rep_id))
 
-    generated_at = timezone.now()
-    cache.set(cache_key, {"nodes": nodes, "generated_at": generated_at}, CACHE_TTL_SECONDS)
-    return GraphBuildResult(nodes=nodes, generated_at=generated_at)
+def fetch_hierarchy_iterative(root_salesrep_id: int, request) -> GraphBuildResult:
+    graph = get_hierarchy_graph()
+    return GraphBuildResult(nodes=graph.slice(root_salesrep_id, request), generated_at=graph.generated_at)
 
 
 def compute_graph_summary(nodes: list[dict], root_id: str) -> dict:
@@ -136,7 +340,6 @@ def compute_graph_summary(nodes: list[dict], root_id: str) -> dict:
     direct_reports = sum(1 for node in nodes if node.get("parentId") == root_id)
 
     level_counter = Counter((node.get("positionName") or "Sin nivel") for node in nodes)
-    levels = len(level_counter)
 
     by_id = {node["id"]: node for node in nodes}
     depth_cache: dict[str, int] = {}
@@ -155,7 +358,10 @@ def compute_graph_summary(nodes: list[dict], root_id: str) -> dict:
         return depth_cache[node_id]
 
     max_depth = max((depth_for(node["id"]) for node in nodes), default=0)
+    return _summary_payload(total, direct_reports, level_counter, max_depth)
+
 
+def _summary_payload(total: int, direct_reports: int, level_counter: Counter, max_depth: int) -> dict:
     level_breakdown = [
         {
             "name": name,
@@ -171,7 +377,7 @@ def compute_graph_summary(nodes: list[dict], root_id: str) -> dict:
         "team_totals": {
             "total": total,
             "direct_reports": direct_reports,
-            "levels": levels,
+            "levels": len(level_counter),
             "depth": max_depth,
         },
         "level_breakdown": level_breakdown,
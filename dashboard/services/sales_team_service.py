@@ -6,22 +6,24 @@ from dataclasses import dataclass
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.utils import timezone
 
+from core.cache_generations import get_or_build
 from core.models import UserProfile
 from core.rbac.constants import RoleCode
 from core.rbac.constants import role_priority
 from core.rbac.services import can_manage
 from crm.models import SalesRep
 from dashboard.models import OperationsAdminInviteRequest
-from dashboard.services.team_personal_info_service import get_salesrep_profiles
+from dashboard.services.team_personal_info_service import get_salesrep_profiles_for_scope
+from dashboard.services.team_personal_info_service import resolve_profile_scope
 from dashboard.services.team_personal_info_service import sanitize_team_payload_for_actor
 from dashboard.services.team_personal_info_service import display_user_name
+from dashboard.services.team_service import TeamScope
 from dashboard.services.team_service import resolve_team_scope
+from dashboard.services.team_service import team_scope_cache_key
 
 User = get_user_model()
-CACHE_TTL_SECONDS = 120
 PROMOTION_ELIGIBLE_ROLES = {
     RoleCode.SENIOR_MANAGER,
     RoleCode.ELITE_MANAGER,
@@ -147,12 +149,16 @@ def resolve_sales_team_scope_profile_for_user(user: User) -> SalesTeamAccessResu
 
 
 def get_sales_team_rows(scope_profile_id: int, actor: User, *, all_requested: bool = False) -> list[dict[str, Any]]:
-    cache_key = f"sales_team_rows:{scope_profile_id}:{actor.pk}:{int(all_requested)}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
+    scope = resolve_profile_scope(scope_profile_id, all_requested=all_requested)
+    if scope is None or not scope.can_access:
+        return []
+    # Lo que ve el actor depende de su rol y su downline: cambian con la generacion global.
+    cache_key = f"sales_team_rows:{team_scope_cache_key(scope)}:{actor.pk}"
+    return get_or_build("sales_team_rows", cache_key, lambda: _sales_team_rows(scope, actor))
 
-    payload = get_salesrep_profiles(scope_profile_id, all_requested=all_requested)
+
+def _sales_team_rows(scope: TeamScope, actor: User) -> list[dict[str, Any]]:
+    payload = get_salesrep_profiles_for_scope(scope)
     rows = sanitize_team_payload_for_actor(payload, actor)
 
     # Remove partner entities for non-authorized actors and clean partner references.
@@ -172,8 +178,6 @@ def get_sales_team_rows(scope_profile_id: int, actor: User, *, all_requested: bo
                 row_copy["parent_name"] = ""
             redacted.append(row_copy)
         rows = redacted
-
-    cache.set(cache_key, rows, CACHE_TTL_SECONDS)
     return rows
 
 
@@ -1,30 +1,46 @@
 from __future__ import annotations
 
 from collections import Counter
+from collections import deque
 from dataclasses import dataclass
+from decimal import Decimal
 from typing import Any
 
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 
+from core.cache_generations import get_or_build
 from core.models import UserProfile
 from core.rbac.constants import RoleCode
 from crm.models import SalesRep
 from dashboard.services.hierarchy_scope_service import get_downline_user_ids
+from dashboard.services.team_service import TeamScope
 from dashboard.services.team_service import resolve_team_scope
+from dashboard.services.team_service import team_scope_cache_key
+from finance.services import ROLE_BASE_RATE
+from finance.services import _distribution_from_chain
 
 User = get_user_model()
-CACHE_TTL_SECONDS = 120
-MAX_COMMISSION_RATE = 0.19
-ROLE_BASE_RATE = {
-    RoleCode.PARTNER: 0.19,
-    RoleCode.JR_PARTNER: 0.17,
-    RoleCode.BUSINESS_MANAGER: 0.16,
-    RoleCode.ELITE_MANAGER: 0.15,
-    RoleCode.SENIOR_MANAGER: 0.14,
-    RoleCode.MANAGER: 0.13,
-    RoleCode.SOLAR_ADVISOR: 0.12,
-    RoleCode.SOLAR_CONSULTANT: 0.06,
+# Columna de nombre que ocupa cada rol; en la cadena de managers gana el mas cercano.
+ANCESTOR_NAME_FIELDS = {
+    RoleCode.SOLAR_CONSULTANT: "consultant_name",
+    RoleCode.SOLAR_ADVISOR: "teamleader_name",
+    RoleCode.MANAGER: "manager_name",
+    RoleCode.SENIOR_MANAGER: "senior_manager_name",
+    RoleCode.ELITE_MANAGER: "elite_manager_name",
+    RoleCode.BUSINESS_MANAGER: "promanager_name",
+    RoleCode.JR_PARTNER: "jr_partner_name",
+    RoleCode.PARTNER: "partner_name",
+}
+EMPTY_ANCESTOR_NAMES = {
+    "consultant_name": "",
+    "teamleader_name": "",
+    "manager_name": "",
+    "senior_manager_name": "",
+    "elite_manager_name": "",
+    "executive_manager_name": "",
+    "promanager_name": "",
+    "jr_partner_name": "",
+    "partner_name": "",
 }
 
 
@@ -42,43 +58,75 @@ def display_user_name(user: User | None) -> str:
     return full_name or user.get_username()
 
 
-def _commission_distribution_for_profile(profile: UserProfile | None) -> tuple[dict[int, float], dict[int, str]]:
-    if not profile or not profile.user_id:
-        return {}, {}
-
-    chain: list[UserProfile] = []
-    current = profile
-    visited: set[int] = set()
-    while current and current.user_id and current.user_id not in visited:
-        visited.add(current.user_id)
-        chain.append(current)
-        if not current.manager_id:
-            break
-        current = getattr(current.manager, "profile", None)
-
-    if not chain:
-        return {}, {}
-
-    seller_rate = ROLE_BASE_RATE.get(chain[0].role, 0.0)
-    if seller_rate <= 0:
-        return {}, {}
-
-    role_by_user = {item.user_id: item.role for item in chain}
-    distribution: dict[int, float] = {chain[0].user_id: seller_rate}
-    current_max = seller_rate
-
-    for ancestor in chain[1:]:
-        target_rate = ROLE_BASE_RATE.get(ancestor.role, 0.0)
-        if target_rate <= current_max:
-            continue
-        share = round(target_rate - current_max, 6)
-        if share > 0:
-            distribution[ancestor.user_id] = share
-            current_max = target_rate
-        if current_max >= MAX_COMMISSION_RATE:
-            break
-
-    return distribution, role_by_user
+@dataclass(frozen=True)
+class _ChainState:
+    """What a profile inherits from its manager chain.
+
+    ``names`` maps each role column to the closest holder of that role (the profile included)
+    and ``payees`` keeps, from the profile upwards, only the links ``_distribution_from_chain``
+    can pay: each one has a higher rate than everyone below it. Both are derived from the
+    manager's state, so a whole organization is resolved in one top-down pass.
+    """
+
+    names: dict[str, str]
+    payees: tuple[tuple[int, str], ...]
+
+
+def _chain_state(parent: _ChainState | None, user_id: int, role: str, name: str) -> _ChainState:
+    names = parent.names if parent else EMPTY_ANCESTOR_NAMES
+    field = ANCESTOR_NAME_FIELDS.get(role)
+    if field:
+        names = {**names, field: name}
+    rate = ROLE_BASE_RATE.get(role, Decimal("0"))
+    # Los payees del manager suben en tasa: los que no superan la propia no cobran nada encima de ella.
+    above = tuple(link for link in (parent.payees if parent else ()) if ROLE_BASE_RATE.get(link[1], Decimal("0")) > rate)
+    return _ChainState(names=names, payees=((user_id, role), *above))
+
+
+def _chain_states() -> dict[int, _ChainState]:
+    """Chain state of every profile by user id, from a single profiles query.
+
+    Managers are resolved before their reports (breadth-first from the profiles without a
+    manager), so each state costs O(1). Profiles caught in a manager cycle have no such
+    root; they fall back to walking their own chain, stopping where it repeats, like
+    ``finance.services._chain_from_snapshot``.
+    """
+    snapshot: dict[int, tuple[int | None, str, str]] = {}
+    for user_id, manager_id, role, first_name, last_name, username in UserProfile.objects.order_by().values_list(
+        "user_id", "manager_id", "role", "user__first_name", "user__last_name", "user__username"
+    ):
+        snapshot[user_id] = (manager_id, role, f"{first_name} {last_name}".strip() or username)
+
+    reports: dict[int, list[int]] = {}
+    roots: list[int] = []
+    for user_id, (manager_id, _, _) in snapshot.items():
+        if manager_id is None or manager_id not in snapshot:
+            roots.append(user_id)
+        else:
+            reports.setdefault(manager_id, []).append(user_id)
+
+    states: dict[int, _ChainState] = {}
+    queue = deque((user_id, None) for user_id in roots)
+    while queue:
+        user_id, parent = queue.popleft()
+        _, role, name = snapshot[user_id]
+        state = _chain_state(parent, user_id, role, name)
+        states[user_id] = state
+        queue.extend((report_id, state) for report_id in reports.get(user_id, ()))
+
+    for user_id in snapshot.keys() - states.keys():
+        chain: list[int] = []
+        visited: set[int] = set()
+        current: int | None = user_id
+        while current is not None and current in snapshot and current not in visited:
+            visited.add(current)
+            chain.append(current)
+            current = snapshot[current][0]
+        state = None
+        for link_id in reversed(chain):
+            state = _chain_state(state, link_id, snapshot[link_id][1], snapshot[link_id][2])
+        states[user_id] = state
+    return states
 
 
 def _can_view_partner_sensitive(actor: User) -> bool:
@@ -90,49 +138,6 @@ def _can_view_partner_sensitive(actor: User) -> bool:
     return profile.role in {RoleCode.PARTNER, RoleCode.ADMINISTRADOR}
 
 
-def _ancestor_names(profile: UserProfile | None) -> dict[str, str]:
-    names = {
-        "consultant_name": "",
-        "teamleader_name": "",
-        "manager_name": "",
-        "senior_manager_name": "",
-        "elite_manager_name": "",
-        "executive_manager_name": "",
-        "promanager_name": "",
-        "jr_partner_name": "",
-        "partner_name": "",
-    }
-    current = profile
-    visited: set[int] = set()
-    while current and current.user_id and current.user_id not in visited:
-        visited.add(current.user_id)
-        role = current.role
-        display_name = display_user_name(current.user)
-        if role == RoleCode.SOLAR_CONSULTANT and not names["consultant_name"]:
-            names["consultant_name"] = display_name
-        elif role == RoleCode.SOLAR_ADVISOR and not names["teamleader_name"]:
-            names["teamleader_name"] = display_name
-        elif role == RoleCode.MANAGER and not names["manager_name"]:
-            names["manager_name"] = display_name
-        elif role == RoleCode.SENIOR_MANAGER and not names["senior_manager_name"]:
-            names["senior_manager_name"] = display_name
-        elif role == RoleCode.ELITE_MANAGER and not names["elite_manager_name"]:
-            names["elite_manager_name"] = display_name
-        elif role == RoleCode.BUSINESS_MANAGER and not names["promanager_name"]:
-            names["promanager_name"] = display_name
-        elif role == RoleCode.JR_PARTNER and not names["jr_partner_name"]:
-            names["jr_partner_name"] = display_name
-        elif role == RoleCode.PARTNER and not names["partner_name"]:
-            names["partner_name"] = display_name
-        if not current.manager_id:
-            break
-        manager_user = current.manager
-        current = getattr(manager_user, "profile", None)
-    # Campo legado para compatibilidad con vistas antiguas.
-    names["executive_manager_name"] = names["senior_manager_name"] or names["elite_manager_name"]
-    return names
-
-
 def can_access_team_personal_info(user: User) -> bool:
     if not user.is_authenticated:
         return False
@@ -174,20 +179,30 @@ def resolve_scope_profile_for_user(user: User) -> TeamPersonalAccessResult:
     return TeamPersonalAccessResult(False, None, "No hay perfil valido para mostrar equipo.")
 
 
-def get_salesrep_profiles(scope_profile_id: int, all_requested: bool = False) -> list[dict[str, Any]]:
-    cache_key = f"team_personal_info:{scope_profile_id}:{int(all_requested)}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
-
+def resolve_profile_scope(scope_profile_id: int, all_requested: bool = False) -> TeamScope | None:
     scope_profile = UserProfile.objects.select_related("user").filter(id=scope_profile_id).first()
     if not scope_profile:
-        return []
+        return None
+    return resolve_team_scope(scope_profile.user, all_requested=all_requested)
+
 
-    scope = resolve_team_scope(scope_profile.user, all_requested=all_requested)
-    reps = SalesRep.objects.select_related("user", "user__profile", "business_unit", "tier")
-    if not scope.can_access:
+def get_salesrep_profiles(scope_profile_id: int, all_requested: bool = False) -> list[dict[str, Any]]:
+    scope = resolve_profile_scope(scope_profile_id, all_requested=all_requested)
+    if scope is None or not scope.can_access:
         return []
+    return get_salesrep_profiles_for_scope(scope)
+
+
+def get_salesrep_profiles_for_scope(scope: TeamScope) -> list[dict[str, Any]]:
+    """Team rows visible to ``scope``; the cache key is the scope, so profiles that share it share rows."""
+    cache_key = f"team_personal_info:{team_scope_cache_key(scope)}"
+    return get_or_build("team_personal_info", cache_key, lambda: _salesrep_profiles(scope))
+
+
+def _salesrep_profiles(scope: TeamScope) -> list[dict[str, Any]]:
+    reps = SalesRep.objects.select_related(
+        "user", "user__profile", "user__profile__manager", "user__profile__role_ref", "business_unit", "tier"
+    )
     if not scope.global_scope:
         if scope.business_unit_ids:
             reps = reps.filter(business_unit_id__in=scope.business_unit_ids)
@@ -196,14 +211,21 @@ def get_salesrep_profiles(scope_profile_id: int, all_requested: bool = False) ->
         else:
             reps = reps.none()
 
+    reps = list(reps.order_by("user__first_name", "user__last_name", "user__username"))
+    chain_states = _chain_states() if reps else {}
     payload: list[dict[str, Any]] = []
-    for rep in reps.order_by("user__first_name", "user__last_name", "user__username"):
+    for rep in reps:
         profile = getattr(rep.user, "profile", None)
         parent_name = display_user_name(profile.manager) if profile and profile.manager_id else ""
-        ancestor = _ancestor_names(profile)
+        state = chain_states.get(rep.user_id) if profile else None
+        ancestor = dict(state.names if state else EMPTY_ANCESTOR_NAMES)
+        # Campo legado para compatibilidad con vistas antiguas.
+        ancestor["executive_manager_name"] = ancestor["senior_manager_name"] or ancestor["elite_manager_name"]
         level_name = profile.get_role_display() if profile else "Sin nivel"
         is_operations_admin = bool(profile and profile.role == RoleCode.ADMINISTRADOR)
-        distribution, role_by_user = _commission_distribution_for_profile(profile)
+        # Mismo reparto que finance al confirmar una venta; las tasas se exponen como float.
+        shares, role_by_user = _distribution_from_chain(list(state.payees) if state else [])
+        distribution = {user_id: float(share) for user_id, share in shares.items()}
         own_share = distribution.get(rep.user_id, 0.0)
 
         solar_consultant_rate = 0.0
@@ -285,8 +307,6 @@ def get_salesrep_profiles(scope_profile_id: int, all_requested: bool = False) ->
                 "is_operations_admin": is_operations_admin,
             }
         )
-
-    cache.set(cache_key, payload, CACHE_TTL_SECONDS)
     return payload
 
 
@@ -5,9 +5,10 @@ from typing import Any
 from typing import Sequence
 
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 from django.db import connection
 
+from core.cache_generations import generation_token
+from core.cache_generations import get_or_build
 from core.models import UserProfile
 from core.rbac.constants import RoleCode
 from core.rbac.services import is_platform_admin
@@ -15,7 +16,6 @@ from crm.models import SalesRep
 
 User = get_user_model()
 
-CACHE_TTL_SECONDS = 120
 ELEVATED_TEAM_SCOPE_ROLES = {
     RoleCode.PARTNER,
     RoleCode.JR_PARTNER,
@@ -152,6 +152,14 @@ def resolve_my_team_scope(user: User, *, all_requested: bool = False) -> TeamSco
     return _resolve_team_scope(user, all_requested=all_requested, include_elevated_team=True)
 
 
+def team_scope_cache_key(scope: TeamScope) -> str:
+    """Cache key part for data limited to ``scope``, including the generations it depends on."""
+    # Sin unidades (alcance global o solo el propio rep) depende de cualquier unidad.
+    unit_ids = scope.business_unit_ids if scope.business_unit_ids and not scope.global_scope else None
+    units = "-".join(map(str, scope.business_unit_ids))
+    return f"{generation_token(unit_ids)}:{int(scope.global_scope)}:{units}:{scope.own_sales_rep_id or 0}"
+
+
 def _build_filters_sql(
     *,
     scope: TeamScope,
@@ -214,28 +222,9 @@ def _normalize_order(column: str, direction: str) -> str:
     return f"{order_column} {order_direction}"
 
 
-def query_team_rows(
-    *,
-    user: User,
-    all_requested: bool,
-    scope: TeamScope | None = None,
-    level: str = "",
-    city: str = "",
-    search: str = "",
-    order_column: str = "full_name",
-    order_dir: str = "asc",
-    start: int = 0,
-    length: int = 25,
-) -> dict[str, Any]:
-    scope = scope or resolve_team_scope(user, all_requested=all_requested)
-    if not scope.can_access:
-        return {"scope": scope, "records_total": 0, "records_filtered": 0, "rows": []}
-
-    where_sql, where_params = _build_filters_sql(scope=scope, level=level, city=city, search=search)
-    order_sql = _normalize_order(order_column, order_dir)
-
+def _team_source_cte(where_sql: str, extra_columns_sql: str = "") -> str:
     # CTE defines a role hierarchy map and projects flattened display fields for the team table.
-    cte_sql = f"""
+    return f"""
         WITH RECURSIVE role_hierarchy(role_code, role_label, role_rank) AS (
             SELECT 'PARTNER', 'Partner', 100
             UNION ALL
@@ -278,7 +267,7 @@ def query_team_rows(
                 END AS contactability,
                 COALESCE(rh.role_label, 'Solar Consultant') AS role_label,
                 up.role AS role_code,
-                COALESCE(up.hire_date, sr.hire_date) AS hire_date
+                COALESCE(up.hire_date, sr.hire_date) AS hire_date{extra_columns_sql}
             FROM crm_salesrep sr
             JOIN auth_user u ON u.id = sr.user_id
             LEFT JOIN core_userprofile up ON up.user_id = u.id
@@ -289,36 +278,67 @@ def query_team_rows(
         )
     """
 
-    total_where_sql, total_params = _build_filters_sql(scope=scope, level="", city="", search="")
 
-    total_sql = f"""
-        SELECT COUNT(*)
-        FROM crm_salesrep sr
-        JOIN auth_user u ON u.id = sr.user_id
-        LEFT JOIN rewards_tier t ON t.id = sr.tier_id
-        LEFT JOIN core_businessunit bu ON bu.id = sr.business_unit_id
-        WHERE {total_where_sql}
+def query_team_rows(
+    *,
+    user: User,
+    all_requested: bool,
+    scope: TeamScope | None = None,
+    level: str = "",
+    city: str = "",
+    search: str = "",
+    order_column: str = "full_name",
+    order_dir: str = "asc",
+    start: int = 0,
+    length: int = 25,
+) -> dict[str, Any]:
+    """One page of the team table plus the DataTables totals, in a single statement.
+
+    ``team_source`` holds the whole scope and flags the rows that pass the level, city and
+    search filters, so ``records_total`` and ``records_filtered`` are window counts over it.
     """
+    scope = scope or resolve_team_scope(user, all_requested=all_requested)
+    if not scope.can_access:
+        return {"scope": scope, "records_total": 0, "records_filtered": 0, "rows": []}
 
-    filtered_sql = cte_sql + "SELECT COUNT(*) FROM team_source"
+    scope_where_sql, scope_params = _build_filters_sql(scope=scope, level="", city="", search="")
+    where_sql, where_params = _build_filters_sql(scope=scope, level=level, city=city, search=search)
+    order_sql = _normalize_order(order_column, order_dir)
+
+    cte_sql = _team_source_cte(scope_where_sql, f",\n                CASE WHEN {where_sql} THEN 1 ELSE 0 END AS matches")
     data_sql = cte_sql + f"""
+        , counted AS (
+            SELECT
+                team_source.*,
+                COUNT(*) OVER () AS records_total,
+                SUM(matches) OVER () AS records_filtered
+            FROM team_source
+        )
         SELECT *
-        FROM team_source
+        FROM counted
+        WHERE matches = 1
         ORDER BY {order_sql}
         LIMIT %s OFFSET %s
     """
+    params = [*where_params, *scope_params]
 
     with connection.cursor() as cursor:
-        cursor.execute(total_sql, total_params)
-        records_total = int(cursor.fetchone()[0])
-
-        cursor.execute(filtered_sql, where_params)
-        records_filtered = int(cursor.fetchone()[0])
-
-        cursor.execute(data_sql, [*where_params, length, start])
+        cursor.execute(data_sql, [*params, length, start])
         columns = [col[0] for col in cursor.description]
         rows = [dict(zip(columns, item)) for item in cursor.fetchall()]
 
+        if rows:
+            records_total = int(rows[0]["records_total"])
+            records_filtered = int(rows[0]["records_filtered"] or 0)
+        else:
+            # Pagina vacia (sin coincidencias o desplazamiento fuera de rango): los totales salen aparte.
+            cursor.execute(cte_sql + "SELECT COUNT(*), COALESCE(SUM(matches), 0) FROM team_source", params)
+            records_total, records_filtered = (int(value) for value in cursor.fetchone())
+
+    for row in rows:
+        for column in ("matches", "records_total", "records_filtered"):
+            row.pop(column, None)
+
     return {
         "scope": scope,
         "records_total": records_total,
@@ -327,6 +347,49 @@ def query_team_rows(
     }
 
 
+@dataclass(frozen=True)
+class TeamAnalytics:
+    total: int
+    contactables: int
+    level_counts: tuple[tuple[str, int], ...]
+    cities: tuple[str, ...]
+
+
+def query_team_analytics(scope: TeamScope) -> TeamAnalytics:
+    """Headcount, contactable count, members per level and distinct cities for ``scope``.
+
+    Aggregated in the database over the same ``team_source`` as the team table, so the
+    summary covers every member however large the scope is.
+    """
+    if not scope.can_access:
+        return TeamAnalytics(total=0, contactables=0, level_counts=(), cities=())
+
+    where_sql, where_params = _build_filters_sql(scope=scope, level="", city="", search="")
+    analytics_sql = _team_source_cte(where_sql) + """
+        SELECT 'level' AS kind, level AS value, COUNT(*) AS members,
+               SUM(CASE WHEN contactability = 'Contactable' THEN 1 ELSE 0 END) AS contactables
+        FROM team_source
+        GROUP BY level
+        UNION ALL
+        SELECT 'city' AS kind, TRIM(city) AS value, COUNT(*) AS members, 0 AS contactables
+        FROM team_source
+        WHERE TRIM(city) <> ''
+        GROUP BY TRIM(city)
+    """
+
+    with connection.cursor() as cursor:
+        cursor.execute(analytics_sql, where_params)
+        results = cursor.fetchall()
+
+    level_counts = [(value, int(members)) for kind, value, members, _ in results if kind == "level"]
+    return TeamAnalytics(
+        total=sum(members for _, members in level_counts),
+        contactables=sum(int(contactables) for kind, _, _, contactables in results if kind == "level"),
+        level_counts=tuple(sorted(level_counts, key=lambda item: (-item[1], item[0]))),
+        cities=tuple(sorted(value for kind, value, _, _ in results if kind == "city")),
+    )
+
+
 def get_team_dashboard_context(*, user: User, all_requested: bool = False, scope: TeamScope | None = None) -> dict[str, Any]:
     scope = scope or resolve_team_scope(user, all_requested=all_requested)
     if not scope.can_access:
@@ -341,37 +404,17 @@ def get_team_dashboard_context(*, user: User, all_requested: bool = False, scope
             "cities": [],
         }
 
-    cache_key = f"my_team:summary:{user.id}:{int(all_requested)}:{int(scope.global_scope)}:{'-'.join(map(str, scope.business_unit_ids))}:{scope.own_sales_rep_id or 0}"
-    cached = cache.get(cache_key)
-    if cached is not None:
-        return cached
-
-    payload = query_team_rows(
-        user=user,
-        all_requested=all_requested,
-        scope=scope,
-        start=0,
-        length=5000,
-    )
-    rows = payload["rows"]
+    cache_key = f"my_team:summary:{team_scope_cache_key(scope)}:{user.id}:{int(all_requested)}"
+    return get_or_build("my_team_summary", cache_key, lambda: _team_dashboard_context(user=user, all_requested=all_requested, scope=scope))
 
-    total = len(rows)
-    contactables = sum(1 for row in rows if row.get("contactability") == "Contactable")
-    contactabilidad = round((contactables / total) * 100, 1) if total else 0
 
-    level_counts: dict[str, int] = {}
-    cities = set()
-    for row in rows:
-        level = row.get("level") or "Sin nivel"
-        level_counts[level] = level_counts.get(level, 0) + 1
-        city = (row.get("city") or "").strip()
-        if city:
-            cities.add(city)
+def _team_dashboard_context(*, user: User, all_requested: bool, scope: TeamScope) -> dict[str, Any]:
+    analytics = query_team_analytics(scope)
+    total = analytics.total
+    contactables = analytics.contactables
+    contactabilidad = round((contactables / total) * 100, 1) if total else 0
 
-    breakdown = [
-        {"nivel": level, "total": count}
-        for level, count in sorted(level_counts.items(), key=lambda item: (-item[1], item[0]))
-    ]
+    breakdown = [{"nivel": level, "total": count} for level, count in analytics.level_counts]
 
     context = {
         "scope": scope,
@@ -381,11 +424,6 @@ def get_team_dashboard_context(*, user: User, all_requested: bool = False, scope
             "contactabilidad": contactabilidad,
             "breakdown": breakdown,
         },
-        "cities": sorted(cities),
+        "cities": list(analytics.cities),
     }
-
-    cache.set(cache_key, context, CACHE_TTL_SECONDS)
     return context
-
-
-
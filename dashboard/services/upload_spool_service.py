@@ -0,0 +1,124 @@
+"""Single-read handling of uploaded invoices.
+
+An upload is read exactly once, ``SPOOL_CHUNK_SIZE`` bytes at a time, into one temporary
+file while its SHA-256 is computed. Parsers then get a read-only memory map of that file
+(pypdf) or its path (pdfium, the OCR pool), so the request never holds a full copy of the
+invoice in the Python heap. Uploads Django already wrote to disk (``TemporaryUploadedFile``)
+are hashed in place and not copied again.
+
+Peak heap per invoice is one chunk for the spool, plus at most ``MAX_PLAIN_TEXT_BYTES``
+when an upload is plain text rather than a PDF or an image, plus whatever the PDF text
+layer itself takes. The mapped bytes live in the OS page cache and are released on exit.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+SPOOL_CHUNK_SIZE = 64 * 1024
+MAX_PLAIN_TEXT_BYTES = 1024 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    name: str
+    path: str
+    size: int
+    sha256: str
+    data: mmap.mmap | bytes
+
+    def head(self, length: int = 1024) -> bytes:
+        return self.data[:length]
+
+    def tail(self, length: int = 8 * 1024) -> bytes:
+        return self.data[max(0, self.size - length) :]
+
+    def text(self) -> str:
+        """The upload decoded as text, capped at ``MAX_PLAIN_TEXT_BYTES``."""
+        content = self.data[:MAX_PLAIN_TEXT_BYTES]
+        try:
+            return content.decode("utf-8")
+        except UnicodeDecodeError as exc:
+            if len(content) == MAX_PLAIN_TEXT_BYTES and exc.start >= len(content) - 3:
+                # El corte cayo en medio de un caracter multibyte.
+                return content[: exc.start].decode("utf-8")
+            return content.decode("latin-1")
+
+
+def _rewind(file_obj) -> None:
+    if hasattr(file_obj, "seek"):
+        try:
+            file_obj.seek(0)
+        except Exception:
+            pass
+
+
+def _read_chunks(file_obj, chunk_size: int) -> Iterator[bytes]:
+    # ``File.chunks()`` de un InMemoryUploadedFile devuelve todo el contenido de una vez; se lee a mano.
+    _rewind(file_obj)
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk if isinstance(chunk, bytes) else chunk.encode("utf-8")
+
+
+@contextmanager
+def spool_upload(file_obj, *, chunk_size: int = SPOOL_CHUNK_SIZE) -> Iterator[SpooledUpload]:
+    """Hash ``file_obj`` while writing it to disk once, and map the result read-only.
+
+    The upload is rewound afterwards so views can still save it to a ``FileField``.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    owned = False
+    disk_path = getattr(file_obj, "temporary_file_path", None)
+    if callable(disk_path):
+        path = disk_path()
+        for chunk in _read_chunks(file_obj, chunk_size):
+            hasher.update(chunk)
+            size += len(chunk)
+    else:
+        suffix = os.path.splitext(getattr(file_obj, "name", "") or "")[1][:16]
+        fd, path = tempfile.mkstemp(prefix="invoice-", suffix=suffix)
+        owned = True
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                for chunk in _read_chunks(file_obj, chunk_size):
+                    hasher.update(chunk)
+                    spool.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+    _rewind(file_obj)
+
+    handle = None
+    data: mmap.mmap | bytes = b""
+    try:
+        if size:
+            handle = open(path, "rb")
+            data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        yield SpooledUpload(
+            name=getattr(file_obj, "name", "") or "",
+            path=path,
+            size=size,
+            sha256=hasher.hexdigest(),
+            data=data,
+        )
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+        if handle is not None:
+            handle.close()
+        if owned:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
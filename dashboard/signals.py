@@ -0,0 +1,77 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from django.contrib.auth import get_user_model
+
+from core.cache_generations import invalidate_team_caches
+from core.models import BusinessUnit, UserProfile
+from crm.models import CrmDeal, Lead, Sale, SalesRep
+from dashboard.services.rollup_service import deal_buckets
+from dashboard.services.rollup_service import lead_buckets
+from dashboard.services.rollup_service import refresh_deal_buckets
+from dashboard.services.rollup_service import refresh_lead_buckets
+from dashboard.services.rollup_service import refresh_sale_buckets
+from dashboard.services.rollup_service import sale_buckets
+
+# Campos que un alcance ve aunque el usuario sea de otra unidad (nombres de ancestros, roles,
+# managers, alcance del actor): invalidan la generacion global. Un save con update_fields fuera
+# de ellos no invalida nada.
+HIERARCHY_FIELDS = {
+    get_user_model(): {"first_name", "last_name", "username", "email", "is_superuser"},
+    UserProfile: {"role", "role_ref", "manager", "avatar", "business_unit"},
+}
+
+
+# Las cargas raw (loaddata) no pasan por aqui: se reparan con rebuild_dashboard_rollups.
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+def refresh_sale_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_sale_buckets(sale_buckets(instance))
+
+
+@receiver(post_save, sender=Lead)
+@receiver(post_delete, sender=Lead)
+def refresh_lead_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_lead_buckets(lead_buckets(instance))
+
+
+@receiver(post_save, sender=CrmDeal)
+@receiver(post_delete, sender=CrmDeal)
+def refresh_deal_rollups(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_deal_buckets(deal_buckets(instance))
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_delete, sender=UserProfile)
+def invalidate_team_caches_on_hierarchy_write(sender, created=False, update_fields=None, **kwargs):
+    # Un usuario nuevo no sale en ninguna fila hasta tener SalesRep, y ese alta invalida su unidad.
+    if created:
+        return
+    # last_login y similares se guardan en cada login: no tocan las caches de equipo.
+    if update_fields is not None and not set(update_fields) & HIERARCHY_FIELDS[sender]:
+        return
+    invalidate_team_caches(hierarchy=True)
+
+
+@receiver(m2m_changed, sender=UserProfile.business_units.through)
+def invalidate_team_caches_on_scope_units(sender, action, **kwargs):
+    if action in {"post_add", "post_remove", "post_clear"}:
+        invalidate_team_caches(hierarchy=True)
+
+
+# Los datos de un rep o de una unidad solo aparecen en los alcances que incluyen esa unidad.
+@receiver(post_save, sender=SalesRep)
+@receiver(post_delete, sender=SalesRep)
+def invalidate_team_caches_on_rep_write(sender, instance, **kwargs):
+    invalidate_team_caches({instance.business_unit_id, instance.get_loaded_value("business_unit")})
+
+
+@receiver(post_save, sender=BusinessUnit)
+@receiver(post_delete, sender=BusinessUnit)
+def invalidate_team_caches_on_unit_write(sender, instance, **kwargs):
+    invalidate_team_caches({instance.pk})
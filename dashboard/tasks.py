@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from dashboard.deals_views import DEAL_IMPORT_JOB
+from dashboard.deals_views import _import_deals_from_excel
+from dashboard.leads_views import INVOICE_PREVIEW_JOB
+from dashboard.leads_views import LEAD_IMPORT_JOB
+from dashboard.leads_views import _extract_invoice
+from dashboard.leads_views import _import_leads_from_file
+from dashboard.leads_views import _invoice_preview_response
+from dashboard.services.lead_activity_service import archive_lead_activity
+from dashboard.services.lead_expiry_service import expire_lead_acceptances
+from dashboard.services.qr_service import purge_qr_cache
+from jobs.services import JobContext
+from jobs.services import JobError
+from jobs.services import periodic
+from jobs.services import register
+
+logger = logging.getLogger(__name__)
+
+
+@register(DEAL_IMPORT_JOB)
+def import_deals_report(ctx: JobContext) -> dict:
+    files = ctx.open_files("report_file")
+    if not files:
+        raise JobError("No se encontro el archivo del informe.")
+
+    def progress(done: int, total: int) -> None:
+        ctx.progress(done * 100 // total if total else 0, f"{done} filas procesadas")
+
+    payload = ctx.payload
+    try:
+        with files[0] as report:
+            return _import_deals_from_excel(
+                file_obj=report,
+                sheet_name=payload.get("sheet_name") or "",
+                dry_run=bool(payload.get("dry_run")),
+                actor=ctx.user,
+                deal_kind=payload["deal_kind"],
+                progress=progress,
+            )
+    except Exception as exc:
+        logger.exception("Error procesando importacion de deals")
+        raise JobError("No fue posible procesar el informe.") from exc
+
+
+@register(LEAD_IMPORT_JOB)
+def import_leads_file(ctx: JobContext) -> dict:
+    files = ctx.open_files("report_file")
+    if not files:
+        raise JobError("No se encontro el archivo del listado.")
+
+    def progress(done: int, total: int) -> None:
+        ctx.progress(done * 100 // total if total else 0, f"{done} filas procesadas")
+
+    payload = ctx.payload
+    try:
+        with files[0] as report:
+            return _import_leads_from_file(
+                file_obj=report,
+                file_name=report.name,
+                sheet_name=payload.get("sheet_name") or "",
+                dry_run=bool(payload.get("dry_run")),
+                actor=ctx.user,
+                sales_rep_id=payload["sales_rep_id"],
+                progress=progress,
+            )
+    except Exception as exc:
+        logger.exception("Error procesando importacion de leads")
+        raise JobError("No fue posible procesar el listado.") from exc
+
+
+@register(INVOICE_PREVIEW_JOB)
+def parse_invoice_preview(ctx: JobContext) -> dict:
+    pdfs = ctx.open_files("electricity_invoice_pdf")
+    images = ctx.open_files("images")
+    if not pdfs and not images:
+        raise JobError("No se encontraron los archivos de la factura.")
+    ctx.progress(10, "Extrayendo texto de la factura")
+    try:
+        extracted = _extract_invoice(
+            pdfs[0] if pdfs else None,
+            images,
+            lead_id=ctx.payload.get("lead_id"),
+            language=ctx.payload.get("language") or "",
+        )
+    finally:
+        for file_obj in (*pdfs, *images):
+            file_obj.close()
+    response, status = _invoice_preview_response(extracted, ctx.payload.get("lead_id"))
+    return {"http_status": status, "response": response}
+
+
+@periodic("leads.expire_acceptances", every=timedelta(seconds=settings.LEAD_ACCEPTANCE_SWEEP_SECONDS))
+def sweep_expired_lead_acceptances() -> None:
+    released = expire_lead_acceptances()
+    if released:
+        logger.info("Liberados %s leads con ventana de aceptacion vencida", released)
+
+
+@periodic("qr.purge_cache", every=timedelta(hours=6))
+def purge_stale_qr_images() -> None:
+    purge_qr_cache(timedelta(days=settings.QR_CACHE_MAX_AGE_DAYS))
+
+
+@periodic("leads.archive_activity", every=timedelta(days=1))
+def archive_old_lead_activity() -> None:
+    cutoff = timezone.now() - timedelta(days=settings.LEAD_ACTIVITY_RETENTION_DAYS)
+    moved, path = archive_lead_activity(cutoff=cutoff, directory=settings.LEAD_ACTIVITY_ARCHIVE_DIR)
+    if moved:
+        logger.info("Archivados %s registros de actividad de leads en %s", moved, path)
@@ -1,4 +1,14 @@
+import hashlib
+import os
+import tempfile
+import tracemalloc
 from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from io import StringIO
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.contrib.auth.tokens import default_token_generator
@@ -6,26 +16,68 @@ from django.core import mail
 from django.core import signing
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory
 from django.test import TestCase
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import NoReverseMatch
 from django.urls import reverse
 from django.utils.dateparse import parse_date
 from django.utils.encoding import force_bytes
 from django.utils.http import urlsafe_base64_encode
 from django.utils import timezone
+from pypdf import PdfWriter
 
 from core.models import BusinessUnit, Role, UserProfile
-from crm.models import CallLog, SalesRep
+from core.rbac.constants import RoleCode
+from crm.models import CallLog, CrmDeal, Lead, Sale, SalesRep
 from dashboard.models import Announcement
 from dashboard.models import AdminInviteRequest
+from dashboard.models import DealDailyRollup
+from dashboard.models import InvoiceExtractionCache
 from dashboard.models import Offer
 from dashboard.models import OperationsAdminInviteRequest
 from dashboard.models import SharedResource
+from dashboard.deals_views import _compute_deal_kpis
+from dashboard.leads_views import INVOICE_PREVIEW_JOB
+from dashboard.leads_views import _parse_electricity_invoice
+from dashboard.leads_views import _parse_invoice_from_uploaded_images
+from dashboard.leads_views import _parse_request_invoice
+from dashboard.views import GROW_TEAM_QR_WINDOW_SECONDS
+from dashboard.services import ocr_service
+from dashboard.services import qr_service
+from dashboard.services import sales_team_graph_service
+from dashboard.services.invoice_cache_service import cached_extraction
+from dashboard.services.invoice_cache_service import evict_extraction_cache
+from dashboard.services.invoice_extraction_service import extract_invoice_fields
+from dashboard.services.invoice_extraction_service import has_required_fields
+from dashboard.services.rollup_service import find_rollup_drift
+from dashboard.services.rollup_service import rebuild_rollups
+from dashboard.services.sales_metrics_service import MetricsScope
+from dashboard.services.sales_metrics_service import compute_deal_kpis
+from dashboard.services.sales_metrics_service import compute_lead_metrics
+from dashboard.services.sales_metrics_service import compute_sales_metrics
 from dashboard.services.team_personal_info_service import compute_team_personal_metrics
 from dashboard.services.team_personal_info_service import sanitize_team_payload_for_actor
+from dashboard.services.team_personal_info_service import get_salesrep_profiles
+from dashboard.services.team_personal_info_service import get_salesrep_profiles_for_scope
+from dashboard.services.team_service import TeamScope
+from dashboard.services.team_service import get_team_dashboard_context
+from dashboard.services.team_service import query_team_analytics
+from dashboard.services.team_service import query_team_rows
+from dashboard.services.sales_team_graph_service import compute_graph_summary
+from dashboard.services.sales_team_graph_service import fetch_hierarchy_iterative
 from dashboard.services.sales_team_service import compute_sales_team_summary
+from dashboard.services.upload_spool_service import spool_upload
 from finance.models import FinancingPartner
+from finance.services import _commission_distribution_for_sale
+from inventory.models import Product
+from jobs.models import Job
+from rewards.models import CompensationPlan
+from rewards.models import PlanTierRule
 from rewards.models import Tier
 
 User = get_user_model()
@@ -437,6 +489,43 @@ class DashboardSmokeTests(TestCase):
         payload = response.json()
         self.assertGreaterEqual(payload["recordsFiltered"], 2)
 
+    def test_my_team_rows_and_totals_come_from_one_query(self):
+        self.rep_sales_profile.postal_city = "Ponce"
+        self.rep_sales_profile.save(update_fields=["postal_city"])
+        scope = TeamScope(can_access=True, can_view_all=False, global_scope=False, business_unit_ids=(self.bu.id,), own_sales_rep_id=None)
+
+        with self.assertNumQueries(1):
+            payload = query_team_rows(user=self.manager_hybrid, all_requested=False, scope=scope, city="ponce", length=10)
+        self.assertEqual(payload["records_total"], 3)
+        self.assertEqual(payload["records_filtered"], 1)
+        self.assertEqual([row["username"] for row in payload["rows"]], ["rep"])
+        self.assertNotIn("matches", payload["rows"][0])
+
+        past_end = query_team_rows(user=self.manager_hybrid, all_requested=False, scope=scope, start=50, length=10)
+        self.assertEqual((past_end["records_total"], past_end["records_filtered"], past_end["rows"]), (3, 3, []))
+
+    def test_my_team_summary_aggregates_in_the_database(self):
+        senior = Tier.objects.create(name="Senior", rank=2)
+        self.rep_sales_profile.postal_city = " Ponce "
+        self.rep_sales_profile.save(update_fields=["postal_city"])
+        self.manager_sales_profile.tier = senior
+        self.manager_sales_profile.postal_city = "Arecibo"
+        self.manager_sales_profile.save(update_fields=["tier", "postal_city"])
+        self.operations_admin.email = ""
+        self.operations_admin.save(update_fields=["email"])
+        scope = TeamScope(can_access=True, can_view_all=False, global_scope=False, business_unit_ids=(self.bu.id,), own_sales_rep_id=None)
+
+        with self.assertNumQueries(1):
+            analytics = query_team_analytics(scope)
+        self.assertEqual((analytics.total, analytics.contactables), (3, 2))
+        self.assertEqual(analytics.level_counts, (("Base", 2), ("Senior", 1)))
+        self.assertEqual(analytics.cities, ("Arecibo", "Ponce"))
+
+        summary = get_team_dashboard_context(user=self.manager_hybrid, scope=scope)
+        self.assertEqual(summary["kpis"]["contactabilidad"], 66.7)
+        self.assertEqual(summary["kpis"]["breakdown"], [{"nivel": "Base", "total": 2}, {"nivel": "Senior", "total": 1}])
+        self.assertEqual(summary["cities"], ["Arecibo", "Ponce"])
+
     def test_tools_page_allows_uploading_pdf_resource(self):
         self.client.login(username="rep", password="secretpass123")
         response = self.client.post(
@@ -900,6 +989,29 @@ class DashboardSmokeTests(TestCase):
         response = self.client.get(reverse("dashboard:grow_team"))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "/pages/authentication/signup-invited/")
+        self.assertNotContains(response, "quickchart.io")
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(QR_CACHE_DIR=cache_dir):
+            qr = self.client.get(response.context["qr_image_url"])
+            self.assertEqual((qr.status_code, qr["Content-Type"]), (200, "image/png"))
+
+    def test_grow_team_qr_for_signed_link_is_cached_per_inviter_and_level(self):
+        # Sin fila Role para el nivel, la invitacion usa el enlace con token firmado.
+        Role.objects.filter(code=RoleCode.ELITE_MANAGER).update(code="ELITE_MANAGER_RETIRED")
+        self.client.login(username="admin_test", password="secretpass123")
+        url = reverse("dashboard:grow_team_qr")
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(QR_CACHE_DIR=cache_dir):
+            with patch.object(signing.TimestampSigner, "timestamp", side_effect=["1a", "1b", "1c"]):
+                with patch.object(qr_service, "render_qr_png", wraps=qr_service.render_qr_png) as render:
+                    first = self.client.get(url, {"level": RoleCode.ELITE_MANAGER})
+                    second = self.client.get(url, {"level": RoleCode.ELITE_MANAGER})
+                    self.assertEqual(first["ETag"], second["ETag"])
+                    self.assertEqual(render.call_count, 1)
+                    later = timezone.now() + timedelta(seconds=GROW_TEAM_QR_WINDOW_SECONDS)
+                    with patch("dashboard.views.timezone.now", return_value=later):
+                        renewed = self.client.get(url, {"level": RoleCode.ELITE_MANAGER})
+                    self.assertNotEqual(renewed["ETag"], first["ETag"])
+                    self.assertEqual(render.call_count, 2)
+            self.assertEqual(len(list(Path(cache_dir).glob("*/*.png"))), 2)
 
     def test_salesrep_can_access_grow_team(self):
         self.client.login(username="rep", password="secretpass123")
@@ -1667,6 +1779,86 @@ class SalesTeamTests(TestCase):
         rows = response.json()["data"]
         self.assertTrue(all(float(row.get("parent_rate") or 0) == 0 for row in rows))
 
+    def _assert_rows_match_finance(self, rows):
+        rate_field = {
+            RoleCode.SOLAR_CONSULTANT: "solar_consultant_rate",
+            RoleCode.SOLAR_ADVISOR: "solar_advisor_rate",
+            RoleCode.MANAGER: "manager_rate",
+            RoleCode.SENIOR_MANAGER: "senior_manager_rate",
+            RoleCode.ELITE_MANAGER: "elite_manager_rate",
+            RoleCode.BUSINESS_MANAGER: "business_manager_rate",
+            RoleCode.JR_PARTNER: "jr_partner_rate",
+            RoleCode.PARTNER: "partner_rate",
+        }
+        row_by_user = {row["user_id"]: row for row in rows}
+        for rep in SalesRep.objects.select_related("user__profile"):
+            distribution, role_by_user = _commission_distribution_for_sale(SimpleNamespace(sales_rep=rep))
+            expected = dict.fromkeys(rate_field.values(), 0.0)
+            for user_id, share in distribution.items():
+                expected[rate_field[role_by_user[user_id]]] = float(share)
+            row = row_by_user[rep.user_id]
+            self.assertEqual({field: row[field] for field in expected}, expected, rep.user.username)
+            self.assertEqual(row["own_share_rate"], float(distribution.get(rep.user_id, 0)))
+
+    def test_salesrep_profiles_match_finance_shares_without_per_row_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = get_salesrep_profiles(self.partner.profile.id)
+        self._assert_rows_match_finance(rows)
+        consultant_row = next(row for row in rows if row["username"] == "consultant_st")
+        self.assertEqual(
+            (consultant_row["consultant_name"], consultant_row["teamleader_name"], consultant_row["senior_manager_name"], consultant_row["partner_name"]),
+            ("Carlos Andujar", "advisor_st", "manager_st", "partner_st"),
+        )
+        self.assertEqual(consultant_row["executive_manager_name"], "manager_st")
+        self.assertEqual(consultant_row["parent_name"], "advisor_st")
+
+        for idx in range(5):
+            user = User.objects.create_user(username=f"extra_st_{idx}", password="secretpass123")
+            user.profile.manager = self.consultant
+            user.profile.save(update_fields=["manager"])
+            SalesRep.objects.create(user=user, business_unit=self.bu, tier=self.tier)
+        cache.clear()
+        with CaptureQueriesContext(connection) as more_queries:
+            rows = get_salesrep_profiles(self.partner.profile.id)
+        self.assertEqual(len(more_queries), len(queries))
+        self._assert_rows_match_finance(rows)
+
+    def test_team_rows_follow_generations_instead_of_expiring(self):
+        scope = TeamScope(can_access=True, can_view_all=True, global_scope=False, business_unit_ids=(self.bu.id,), own_sales_rep_id=None)
+        get_salesrep_profiles_for_scope(scope)
+
+        other_bu = BusinessUnit.objects.create(name="Otra unidad", code="other-team")
+        other_user = User.objects.create_user(username="other_bu_st", password="secretpass123")
+        other_rep = SalesRep.objects.create(user=other_user, business_unit=other_bu, tier=self.tier)
+        other_rep.phone = "(787)000-0000"
+        other_rep.save()
+        # Solo se leen las generaciones; las filas salen del cache.
+        with self.assertNumQueries(1):
+            get_salesrep_profiles_for_scope(scope)
+
+        self.consultant_rep.phone = "(787)111-2222"
+        self.consultant_rep.save()
+        rows = get_salesrep_profiles_for_scope(scope)
+        self.assertEqual(next(row for row in rows if row["username"] == "consultant_st")["phone"], "(787)111-2222")
+
+        # Un ascenso se ve de inmediato aunque el TTL sea de horas.
+        self.consultant.profile.role = UserProfile.Role.MANAGER
+        self.consultant.profile.save(update_fields=["role"])
+        rows = get_salesrep_profiles_for_scope(scope)
+        self.assertEqual(next(row for row in rows if row["username"] == "consultant_st")["level_name"], "Manager")
+
+        # Al moverse de unidad, el rep desaparece de la unidad anterior.
+        self.consultant_rep.business_unit = other_bu
+        self.consultant_rep.save(update_fields=["business_unit"])
+        rows = get_salesrep_profiles_for_scope(scope)
+        self.assertNotIn("consultant_st", {row["username"] for row in rows})
+
+    def test_salesrep_profiles_handle_manager_cycles_like_finance(self):
+        self.partner.profile.manager = self.consultant
+        self.partner.profile.save(update_fields=["manager"])
+        cache.clear()
+        self._assert_rows_match_finance(get_salesrep_profiles(self.partner.profile.id))
+
     def test_sales_team_modal_action_ajax_success(self):
         self.client.login(username="partner_st", password="secretpass123")
         response = self.client.post(
@@ -1784,3 +1976,488 @@ class SalesTeamGraphTests(TestCase):
         self.assertEqual(response.status_code, 200)
         csv_content = response.content.decode("utf-8")
         self.assertIn("Child Graph", csv_content)
+
+
+    def _child(self, username: str, manager=None, first_name: str = "", **rep_fields) -> SalesRep:
+        user = User.objects.create_user(username=username, password="secretpass123", first_name=first_name or username.title())
+        user.profile.role = UserProfile.Role.SOLAR_CONSULTANT
+        user.profile.manager = manager or self.partner
+        user.profile.save(update_fields=["role", "manager"])
+        return SalesRep.objects.create(user=user, business_unit=self.bu, tier=self.tier, is_active=True, **rep_fields)
+
+    @override_settings(ALLOWED_HOSTS=["one.example.com", "two.example.com"])
+    def test_graph_is_built_once_and_sliced_per_viewer(self):
+        child = self._child("child_a")
+        self._child("child_b")
+        factory = RequestFactory()
+        partner_request = factory.get("/", HTTP_HOST="one.example.com")
+        partner_request.user = self.partner
+        child_request = factory.get("/", HTTP_HOST="two.example.com")
+        child_request.user = child.user
+
+        with patch.object(sales_team_graph_service, "_build_graph", wraps=sales_team_graph_service._build_graph) as build:
+            full = fetch_hierarchy_iterative(self.partner_rep.id, partner_request).nodes
+            sub = fetch_hierarchy_iterative(child.id, child_request).nodes
+        self.assertEqual(build.call_count, 1)
+        self.assertEqual([node["name"] for node in full], ["partner_graph", "Child_A", "Child_B"])
+        self.assertEqual([node["isLoggedUser"] for node in full], [True, False, False])
+        self.assertEqual(full[1]["parentId"], str(self.partner_rep.id))
+        self.assertEqual(len(sub), 1)
+        self.assertEqual((sub[0]["parentId"], sub[0]["isLoggedUser"]), (None, True))
+
+        self.partner.profile.avatar = "avatars/p.png"
+        self.partner.profile.save(update_fields=["avatar"])
+        image = fetch_hierarchy_iterative(self.partner_rep.id, partner_request).nodes[0]["imageUrl"]
+        self.assertTrue(image.startswith("http://one.example.com/"), image)
+
+    def test_graph_version_follows_hierarchy_changes_only(self):
+        child = self._child("child_c")
+        request = RequestFactory().get("/")
+        request.user = self.partner
+        self.assertEqual(len(fetch_hierarchy_iterative(self.partner_rep.id, request).nodes), 2)
+
+        with patch.object(sales_team_graph_service, "_build_graph", wraps=sales_team_graph_service._build_graph) as build:
+            self.partner.last_login = timezone.now()
+            self.partner.save(update_fields=["last_login"])
+            fetch_hierarchy_iterative(self.partner_rep.id, request)
+            self.assertEqual(build.call_count, 0)
+
+            child.is_active = False
+            child.save(update_fields=["is_active"])
+            self.assertEqual(len(fetch_hierarchy_iterative(self.partner_rep.id, request).nodes), 1)
+            self.assertEqual(build.call_count, 1)
+
+    def test_graph_nodes_api_pages_direct_reports_with_subtree_counts(self):
+        child_a = self._child("child_a")
+        self._child("child_b")
+        self._child("child_c")
+        self._child("grand_a", manager=child_a.user)
+        url = reverse("dashboard:apps_crm_salesteam_graph_nodes")
+        self.client.login(username="partner_graph", password="secretpass123")
+
+        first = self.client.get(url, {"limit": 2}).json()
+        self.assertEqual(first["node"]["id"], str(self.partner_rep.id))
+        self.assertIsNone(first["node"]["parentId"])
+        self.assertEqual(
+            (first["node"]["directCount"], first["node"]["descendantCount"], first["node"]["subtreeDepth"]),
+            (3, 4, 2),
+        )
+        self.assertEqual([node["name"] for node in first["children"]], ["Child_A", "Child_B"])
+        self.assertEqual((first["children"][0]["directCount"], first["total"], first["nextOffset"]), (1, 3, 2))
+
+        rest = self.client.get(url, {"limit": 2, "offset": first["nextOffset"]}).json()
+        self.assertEqual([node["name"] for node in rest["children"]], ["Child_C"])
+        self.assertIsNone(rest["nextOffset"])
+
+        expanded = self.client.get(url, {"node": child_a.id}).json()
+        self.assertEqual(expanded["node"]["parentId"], str(self.partner_rep.id))
+        self.assertEqual([node["name"] for node in expanded["children"]], ["Grand_A"])
+
+        self.client.login(username="child_b", password="secretpass123")
+        self.assertEqual(self.client.get(url, {"node": child_a.id}).status_code, 404)
+
+    def test_graph_search_returns_paths_inside_the_viewer_subtree(self):
+        child_a = self._child("child_a")
+        self._child("child_b")
+        grand = self._child("grand_a", manager=child_a.user, first_name="Ángela")
+        url = reverse("dashboard:apps_crm_salesteam_graph_search")
+
+        self.client.login(username="partner_graph", password="secretpass123")
+        results = self.client.get(url, {"q": "ange"}).json()["results"]
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["node"]["id"], str(grand.id))
+        self.assertEqual([node["id"] for node in results[0]["path"]], [str(self.partner_rep.id), str(child_a.id), str(grand.id)])
+        self.assertEqual(results[0]["path"][2]["parentId"], str(child_a.id))
+
+        self.client.login(username="child_b", password="secretpass123")
+        self.assertEqual(self.client.get(url, {"q": "ange"}).json()["results"], [])
+
+    def test_graph_page_summary_comes_from_precomputed_stats(self):
+        child_a = self._child("child_a")
+        self._child("child_b")
+        self._child("grand_a", manager=child_a.user)
+        request = RequestFactory().get("/")
+        request.user = self.partner
+        expected = compute_graph_summary(fetch_hierarchy_iterative(self.partner_rep.id, request).nodes, str(self.partner_rep.id))
+
+        self.client.login(username="partner_graph", password="secretpass123")
+        response = self.client.get(reverse("dashboard:sales_hierarchy"))
+        self.assertEqual(response.context["team_totals"], expected["team_totals"])
+        self.assertEqual(response.context["level_breakdown"], expected["level_breakdown"])
+        self.assertEqual(expected["team_totals"]["depth"], 3)
+        self.assertContains(response, reverse("dashboard:apps_crm_salesteam_graph_nodes"))
+
+
+class SalesMetricsServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.bu = BusinessUnit.objects.create(name="Metrics BU", code="metrics-bu")
+        self.tier = Tier.objects.create(name="Metrics Tier", rank=30)
+        user = User.objects.create_user(username="metrics_rep", password="secretpass123")
+        self.rep = SalesRep.objects.create(user=user, business_unit=self.bu, tier=self.tier)
+        self.product = Product.objects.create(business_unit=self.bu, name="Kit Residencial", sku="MET-1", price=Decimal("100.00"))
+        self.plan = CompensationPlan.objects.create(business_unit=self.bu, product=self.product, name="Metrics Plan")
+        PlanTierRule.objects.create(plan=self.plan, tier=self.tier, commission_percent=Decimal("10.00"))
+        self.sales = [
+            Sale.objects.create(
+                business_unit=self.bu,
+                sales_rep=self.rep,
+                product=self.product,
+                plan=self.plan,
+                amount=Decimal(amount),
+                status=status,
+            )
+            for status, amount in [
+                (Sale.Status.CONFIRMED, "100.00"),
+                (Sale.Status.CONFIRMED, "50.00"),
+                (Sale.Status.PENDING, "25.00"),
+                (Sale.Status.CANCELLED, "10.00"),
+            ]
+        ]
+        # update() no dispara señales: los rollups se reconstruyen a mano.
+        Sale.objects.filter(status=Sale.Status.CANCELLED).update(created_at=timezone.now() - timedelta(days=3))
+        rebuild_rollups()
+        self.scope = MetricsScope(role=UserProfile.Role.MANAGER, business_unit_ids=(self.bu.pk,))
+
+    def test_sales_metrics_come_from_a_single_query(self):
+        with self.assertNumQueries(1):
+            metrics = compute_sales_metrics(self.scope)
+
+        self.assertEqual(metrics["total_sales"], 4)
+        self.assertEqual(metrics["confirmed_sales"], 2)
+        self.assertEqual(metrics["total_amount"], Decimal("185.00"))
+        self.assertEqual(
+            [(item["label"], item["value"]) for item in metrics["sales_status_chart"]],
+            [("Confirmadas", 2), ("Pendientes", 1), ("Borrador", 0), ("Canceladas", 1)],
+        )
+        self.assertEqual(metrics["daily_sales_chart"]["values"], [0, 0, 0, 1, 0, 0, 3])
+        self.assertEqual(metrics["daily_sales_chart"]["labels"][-1], timezone.now().date().strftime("%b %d"))
+
+    def test_sales_metrics_are_cached_per_scope(self):
+        compute_sales_metrics(self.scope)
+
+        with self.assertNumQueries(0):
+            cached = compute_sales_metrics(self.scope)
+        self.assertEqual(cached["total_sales"], 4)
+
+        with self.assertNumQueries(1):
+            compute_sales_metrics(self.scope.narrowed(sales_rep_id=self.rep.pk))
+
+    def test_segment_and_empty_scopes(self):
+        self.assertEqual(compute_sales_metrics(self.scope.narrowed(segment="residential"))["total_sales"], 4)
+        self.assertEqual(compute_sales_metrics(self.scope.narrowed(segment="commercial"))["total_sales"], 0)
+        self.assertEqual(compute_sales_metrics(self.scope.within_business_unit(self.bu.pk + 1))["total_sales"], 0)
+
+    def test_rollups_follow_sale_updates_and_deletes(self):
+        sale = Sale.objects.get(pk=self.sales[2].pk)
+        sale.status = Sale.Status.CONFIRMED
+        sale.save()
+        other_bu = BusinessUnit.objects.create(name="Other Metrics BU", code="metrics-other")
+        moved = Sale.objects.get(pk=self.sales[1].pk)
+        moved.business_unit = other_bu
+        moved.save()
+        Sale.objects.get(pk=self.sales[0].pk).delete()
+
+        cache.clear()
+        metrics = compute_sales_metrics(self.scope)
+        self.assertEqual(metrics["total_sales"], 2)
+        self.assertEqual(metrics["confirmed_sales"], 1)
+        self.assertEqual(metrics["total_amount"], Decimal("35.00"))
+        self.assertEqual(compute_sales_metrics(self.scope.narrowed(business_unit_ids=(other_bu.pk,)))["total_sales"], 1)
+        self.assertFalse(any(find_rollup_drift().values()))
+
+    def test_lead_metrics_count_contact_coverage(self):
+        Lead.objects.create(business_unit=self.bu, sales_rep=self.rep, full_name="A", phone="787", email="a@x.com", source="web")
+        Lead.objects.create(business_unit=self.bu, sales_rep=self.rep, full_name="B", phone="787", source="web")
+        Lead.objects.create(business_unit=self.bu, sales_rep=self.rep, full_name="C", source="Comercial")
+
+        with self.assertNumQueries(2):
+            metrics = compute_lead_metrics(self.scope)
+
+        self.assertEqual(metrics["total_clients"], 3)
+        self.assertEqual(metrics["with_phone"], 2)
+        self.assertEqual(metrics["with_email"], 1)
+        self.assertEqual(metrics["contactable_pct"], 33.3)
+        self.assertEqual(metrics["daily_leads_chart"]["values"][-1], 3)
+        self.assertEqual(metrics["lead_source_chart"][0], {"label": "web", "value": 2, "color": "#2fb66f"})
+        self.assertEqual(compute_lead_metrics(self.scope.narrowed(segment="commercial"))["total_clients"], 1)
+
+    def test_lead_metrics_include_leads_from_fill_table_modal(self):
+        solar = BusinessUnit.objects.create(name="Solar Home Power", code="solar-home-power")
+        self.client.login(username="metrics_rep", password="secretpass123")
+        response = self.client.post(reverse("dashboard:crm_lead_fill_table_modal"), {"count": 3, "city": "Ponce"})
+        self.assertEqual(response.status_code, 200)
+
+        metrics = compute_lead_metrics(MetricsScope(role=UserProfile.Role.MANAGER, business_unit_ids=(solar.pk,)))
+        self.assertEqual(metrics["total_clients"], 3)
+        self.assertEqual(metrics["with_email"], 3)
+        self.assertFalse(any(find_rollup_drift().values()))
+
+    def test_deal_kpis_from_rollups_match_raw_aggregates(self):
+        today = timezone.localdate()
+        for stage, epc, closing in [
+            (CrmDeal.Stage.PLANNED, "1000.00", today),
+            (CrmDeal.Stage.SIGNED, "2500.50", today - timedelta(days=70)),
+            (CrmDeal.Stage.SIGNED, None, None),
+        ]:
+            CrmDeal.objects.create(salesrep=self.rep, stage=stage, epc_price=epc and Decimal(epc), closing_date=closing)
+        deal = CrmDeal.objects.get(stage=CrmDeal.Stage.PLANNED)
+        deal.stage = CrmDeal.Stage.APPROVED
+        deal.save()
+
+        rollups = DealDailyRollup.objects.filter(deal_kind=CrmDeal.DealKind.RESIDENTIAL)
+        self.assertEqual(
+            compute_deal_kpis(rollups),
+            _compute_deal_kpis(CrmDeal.objects.filter(deal_kind=CrmDeal.DealKind.RESIDENTIAL)),
+        )
+
+    def test_rebuild_command_reports_drift(self):
+        Sale.objects.filter(pk=self.sales[0].pk).update(amount=Decimal("1.00"))
+        with self.assertRaises(CommandError):
+            call_command("rebuild_dashboard_rollups", "--check", stdout=StringIO())
+
+        call_command("rebuild_dashboard_rollups", stdout=StringIO())
+        call_command("rebuild_dashboard_rollups", "--check", stdout=StringIO())
+
+    def test_overview_pages_render_metrics(self):
+        self.client.login(username="metrics_rep", password="secretpass123")
+        response = self.client.get(reverse("dashboard:admin_overview"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("sales_status_chart", response.context)
+
+
+class InvoiceExtractionCacheTests(TestCase):
+    PDF_TEXT = (
+        b"Numero de cuenta: A4444\n"
+        b"Numero de contador: M4444\n"
+        b"Monto total: $99.10\n"
+        b"Consumo promedio kWh: 610\n"
+    )
+
+    def test_pdf_extraction_is_reused_across_uploads(self):
+        first = _parse_electricity_invoice(SimpleUploadedFile("bill.pdf", self.PDF_TEXT), language="es")
+        self.assertEqual(InvoiceExtractionCache.objects.count(), 1)
+        with patch("dashboard.leads_views._extract_pdf_fields") as extract:
+            second = _parse_electricity_invoice(
+                SimpleUploadedFile("location_77.pdf", self.PDF_TEXT),
+                lead_id=5,
+                language="spa",
+            )
+        extract.assert_not_called()
+        self.assertEqual(second["account_number"], first["account_number"])
+        self.assertEqual(second["electricity_bill"], "99.10")
+        # Lo que depende del nombre del archivo o de la peticion no sale del cache.
+        self.assertEqual(second["location_id"], "77")
+        self.assertEqual(second["lead_id"], 5)
+        self.assertEqual(second["invoice_hash"], first["invoice_hash"])
+
+    def test_language_and_version_are_part_of_the_key(self):
+        _parse_electricity_invoice(SimpleUploadedFile("bill.pdf", self.PDF_TEXT), language="es")
+        _parse_electricity_invoice(SimpleUploadedFile("bill.pdf", self.PDF_TEXT), language="en")
+        with patch("dashboard.leads_views.INVOICE_EXTRACTOR_VERSION", 999):
+            _parse_electricity_invoice(SimpleUploadedFile("bill.pdf", self.PDF_TEXT), language="en")
+        self.assertEqual(InvoiceExtractionCache.objects.count(), 3)
+
+    def test_image_extraction_is_cached(self):
+        images = [SimpleUploadedFile("page1.png", b"Numero de cuenta: 123456789")]
+        first = _parse_invoice_from_uploaded_images(images, language="es")
+        with patch("dashboard.leads_views._extract_image_fields") as extract:
+            second = _parse_invoice_from_uploaded_images(
+                [SimpleUploadedFile("page1.png", b"Numero de cuenta: 123456789")],
+                language="es",
+            )
+        extract.assert_not_called()
+        self.assertEqual(second, first)
+        self.assertEqual(second["account_number"], "123456789")
+
+    def test_timed_out_ocr_is_not_cached(self):
+        images = [SimpleUploadedFile("scan.png", b"\x89PNG\r\n\x1a\n escaneo")]
+        slow = ocr_service.OcrRun(timed_out=True)
+        done = ocr_service.OcrRun(pages=[ocr_service.PageOcr(0, "Numero de cuenta: 123456789", 0.0, 0.0)])
+        with patch("dashboard.leads_views._configure_tesseract_cmd", return_value=True):
+            with patch("dashboard.leads_views.ocr_service.run_pages", return_value=slow):
+                self.assertEqual(_parse_invoice_from_uploaded_images(images, language="es")["account_number"], "")
+            self.assertFalse(InvoiceExtractionCache.objects.exists())
+
+            with patch("dashboard.leads_views.ocr_service.run_pages", return_value=done) as run_pages:
+                self.assertEqual(_parse_invoice_from_uploaded_images(images, language="es")["account_number"], "123456789")
+            run_pages.assert_called_once()
+            self.assertEqual(InvoiceExtractionCache.objects.count(), 1)
+
+    def test_field_patterns_are_tried_in_priority_order(self):
+        fields = extract_invoice_fields("Total: $5.00\nCargo por cliente: $4.00\nMonto total: $10.00\n")
+        self.assertEqual(fields["electricity_bill"], "10.00")
+        self.assertEqual(extract_invoice_fields("Total: $5.00\n")["electricity_bill"], "5.00")
+
+    def test_image_bytes_are_not_scanned_as_text(self):
+        png = SimpleUploadedFile("scan.png", b"\x89PNG\r\n\x1a\n Numero de cuenta: 999999")
+        text = SimpleUploadedFile("scan.txt.png", b"Numero de cuenta: 999999")
+        self.assertEqual(_parse_invoice_from_uploaded_images([png], language="es")["account_number"], "")
+        self.assertEqual(_parse_invoice_from_uploaded_images([text], language="es")["account_number"], "999999")
+
+    def test_benchmark_corpus_has_full_recall(self):
+        out = StringIO()
+        call_command("benchmark_invoice_extraction", "--check", "--iterations", "1", stdout=out)
+        self.assertIn("recall 100.0%", out.getvalue())
+
+    def test_eviction_drops_least_recently_used_entries(self):
+        now = timezone.now()
+        for idx in range(5):
+            cached_extraction(
+                "pdf",
+                f"hash-{idx}",
+                language="spa",
+                version=1,
+                compute=lambda: ({"blob": "x" * 100}, True),
+            )
+            InvoiceExtractionCache.objects.filter(content_hash=f"hash-{idx}").update(last_used_at=now - timedelta(minutes=50 - idx))
+        entry_size = InvoiceExtractionCache.objects.first().size_bytes
+        self.assertEqual(evict_extraction_cache(max_bytes=entry_size * 3), 3)
+        self.assertEqual(
+            sorted(InvoiceExtractionCache.objects.values_list("content_hash", flat=True)),
+            ["hash-3", "hash-4"],
+        )
+
+
+class InvoiceUploadSpoolTests(TestCase):
+    def test_spool_hashes_once_and_cleans_up(self):
+        upload = SimpleUploadedFile("bill.pdf", b"%PDF-1.4 contenido" * 10000)
+        with spool_upload(upload, chunk_size=4096) as spooled:
+            path = spooled.path
+            self.assertEqual(spooled.sha256, hashlib.sha256(b"%PDF-1.4 contenido" * 10000).hexdigest())
+            self.assertEqual(spooled.size, 180000)
+            self.assertEqual(spooled.head(8), b"%PDF-1.4")
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(upload.read(8), b"%PDF-1.4")
+
+    def test_lead_form_reads_the_invoice_once_to_reuse_the_preview_job(self):
+        user = User.objects.create_user(username="spool_user", password="secretpass123")
+        content = b"Numero de cuenta: 55555\n"
+        job = Job.objects.create(
+            kind=INVOICE_PREVIEW_JOB,
+            status=Job.Status.SUCCEEDED,
+            created_by=user,
+            payload={"upload_digest": hashlib.sha256(hashlib.sha256(content).hexdigest().encode("ascii")).hexdigest()},
+            result={"response": {"extracted": {"account_number": "55555"}}},
+        )
+        request = RequestFactory().post("/", {"invoice_job_id": job.pk})
+        request.user = user
+        upload = SimpleUploadedFile("bill.pdf", content)
+        with patch("dashboard.leads_views.spool_upload", wraps=spool_upload) as spool:
+            parsed = _parse_request_invoice(request, upload, [], lead_id=None)
+        spool.assert_called_once_with(upload)
+        self.assertEqual(parsed, {"account_number": "55555"})
+        self.assertFalse(InvoiceExtractionCache.objects.exists())
+
+    def test_large_pdf_is_parsed_without_copying_it_into_memory(self):
+        writer = PdfWriter()
+        writer.add_blank_page(612, 792)
+        writer.add_attachment("anexo.bin", os.urandom(8 * 1024 * 1024))
+        buffer = BytesIO()
+        writer.write(buffer)
+        upload = SimpleUploadedFile("grande.pdf", buffer.getvalue())
+        del writer, buffer
+
+        tracemalloc.start()
+        try:
+            parsed = _parse_electricity_invoice(upload, language="es")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(parsed["invoice_hash"]), 64)
+        # Una sola copia del archivo ya serian 8 MB; el limite deja margen para pypdf y el ORM.
+        self.assertLess(peak, 2 * 1024 * 1024)
+
+
+def _fake_ocr_page(index, delay, text):
+    # Tarea de pool a nivel de modulo para que el proceso hijo pueda importarla.
+    import time
+
+    time.sleep(delay)
+    return ocr_service.PageOcr(index, text, 0.0, delay * 1000)
+
+
+class OcrServiceTests(TestCase):
+    def tearDown(self):
+        ocr_service._reset_executor()
+
+    def test_pages_come_back_in_page_order(self):
+        run = ocr_service.run_pages(
+            _fake_ocr_page,
+            [(0, 0.3, "primera"), (1, 0.0, "segunda"), (2, 0.1, "tercera")],
+            timeout=10,
+        )
+        self.assertEqual(run.text, "primera\nsegunda\ntercera")
+        self.assertFalse(run.timed_out)
+        self.assertFalse(run.stopped_early)
+
+    def test_stops_once_required_fields_are_found(self):
+        complete = "Numero de cuenta: 123456789\nNumero de contador: 5551234\nMonto total: $99.10"
+        self.assertTrue(has_required_fields(complete))
+        self.assertFalse(has_required_fields("Numero de cuenta: 123456789"))
+        run = ocr_service.run_pages(
+            _fake_ocr_page,
+            [(0, 0.0, complete), (1, 3.0, "contraportada")],
+            stop_when=has_required_fields,
+            timeout=10,
+        )
+        self.assertTrue(run.stopped_early)
+        self.assertEqual([page.index for page in run.pages], [0])
+        self.assertLess(run.elapsed_ms, 3000)
+
+    def test_request_timeout_returns_partial_text(self):
+        run = ocr_service.run_pages(
+            _fake_ocr_page,
+            [(0, 0.0, "rapida"), (1, 3.0, "lenta")],
+            timeout=1,
+        )
+        self.assertTrue(run.timed_out)
+        self.assertEqual(run.text, "rapida")
+        self.assertLess(run.elapsed_ms, 3000)
+
+
+class QrServiceTests(TestCase):
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        self.enterContext(override_settings(QR_CACHE_DIR=self.cache_dir.name))
+
+    def test_png_is_rendered_once_and_revalidated_with_etag(self):
+        spec = qr_service.QrSpec("https://example.com/leads?salesrep_id=1")
+        with patch.object(qr_service, "render_qr_png", wraps=qr_service.render_qr_png) as render:
+            first = qr_service.qr_png_response(RequestFactory().get("/qr"), spec)
+            body = b"".join(first.streaming_content)
+            again = qr_service.qr_png_response(RequestFactory().get("/qr"), spec)
+            self.assertEqual(b"".join(again.streaming_content), body)
+            not_modified = qr_service.qr_png_response(RequestFactory().get("/qr", HTTP_IF_NONE_MATCH=spec.etag), spec)
+        self.assertEqual(render.call_count, 1)
+        self.assertTrue(body.startswith(b"\x89PNG"))
+        self.assertEqual(first["ETag"], spec.etag)
+        self.assertIn("private", first["Cache-Control"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], spec.etag)
+
+    def test_cache_key_covers_content_style_and_card(self):
+        card = qr_service.MarketingCard("Ana", 1, "ana@example.com", timezone.localdate())
+        keys = {
+            qr_service.QrSpec("a").key,
+            qr_service.QrSpec("b").key,
+            qr_service.QrSpec("a", qr_service.STYLE_MARKETING, card).key,
+            qr_service.QrSpec("a", qr_service.STYLE_MARKETING, qr_service.MarketingCard("Ana", 2, "", card.generated_on)).key,
+        }
+        self.assertEqual(len(keys), 4)
+        with patch.object(qr_service, "QR_TEMPLATE_VERSION", qr_service.QR_TEMPLATE_VERSION + 1):
+            self.assertNotIn(qr_service.QrSpec("a").key, keys)
+
+    def test_fonts_load_once_and_stale_files_are_purged(self):
+        qr_service.load_font.cache_clear()
+        qr_service.load_font(20)
+        qr_service.load_font(20)
+        self.assertEqual(qr_service.load_font.cache_info().misses, 1)
+
+        path = qr_service.cached_qr_path(qr_service.QrSpec("viejo"))
+        os.utime(path, (0, 0))
+        fresh = qr_service.cached_qr_path(qr_service.QrSpec("nuevo"))
+        self.assertEqual(qr_service.purge_qr_cache(timedelta(days=30)), 1)
+        self.assertFalse(path.exists())
+        self.assertTrue(fresh.exists())
@@ -47,6 +47,7 @@ urlpatterns = [
     path("apps/crm/deals/<int:deal_id>/update/", deals_views.crm_deal_update_modal, name="crm_deal_update_modal"),
     path("apps/crm/leads", leads_views.crm_leads_list_page, name="crm_leads_list"),
     path("apps/api/leads/", leads_views.crm_leads_api, name="crm_leads_api"),
+    path("apps/crm/leads/import/", leads_views.crm_leads_import_page, name="crm_leads_import"),
     path("apps/crm/leads/create/", leads_views.crm_lead_create_modal, name="crm_lead_create_modal"),
     path("apps/crm/leads/fill-table/", leads_views.crm_lead_fill_table_modal, name="crm_lead_fill_table_modal"),
     path("apps/crm/leads/<int:lead_id>/update/", leads_views.crm_lead_update_modal, name="crm_lead_update_modal"),
@@ -54,6 +55,7 @@ urlpatterns = [
     path("apps/crm/leads/<int:lead_id>/delete/", leads_views.crm_lead_delete_modal, name="crm_lead_delete_modal"),
     path("apps/crm/leads/<int:lead_id>/notes/create/", leads_views.crm_lead_note_create, name="crm_lead_note_create"),
     path("apps/crm/leads/log_activity/", leads_views.crm_leads_log_activity, name="crm_leads_log_activity"),
+    path("apps/crm/leads/log_activity/batch/", leads_views.crm_leads_log_activity_batch, name="crm_leads_log_activity_batch"),
     path("apps/crm/leads/parse-invoice-preview/", leads_views.crm_leads_parse_invoice_preview, name="crm_leads_parse_invoice_preview"),
     path("apps/crm/leads/duplicate-review/request/", leads_views.crm_duplicate_review_request, name="crm_duplicate_review_request"),
     path("apps/crm/leads/duplicate-review/pending/", leads_views.crm_duplicate_review_pending, name="crm_duplicate_review_pending"),
@@ -62,6 +64,8 @@ urlpatterns = [
     path("apps/api/leads/<int:lead_id>/accept_lead/", leads_views.crm_accept_lead_api, name="crm_accept_lead_api"),
     path("apps/crm/salesteam-graph", views.apps_crm_salesteam_graph, name="apps_crm_salesteam_graph"),
     path("apps/crm/salesteam-graph-source", views.apps_crm_salesteam_graph_source, name="apps_crm_salesteam_graph_source"),
+    path("apps/crm/salesteam-graph/nodes/", views.apps_crm_salesteam_graph_nodes, name="apps_crm_salesteam_graph_nodes"),
+    path("apps/crm/salesteam-graph/search/", views.apps_crm_salesteam_graph_search, name="apps_crm_salesteam_graph_search"),
     path("apps/crm/salesteam-personal/", views.apps_crm_sales_team_personal_info_view, name="apps_crm_sales_team_personal_info_view"),
     path("apps/api/salesrep_profile/", views.salesrep_profile_api, name="salesrep_profile_api"),
     path("apps/crm/salesteam/admin-role/<int:salesrep_id>/", views.apps_crm_salesteam_admin_role, name="apps_crm_salesteam_admin_role"),
@@ -71,6 +75,7 @@ urlpatterns = [
     path("jerarquia-ventas/", views.sales_hierarchy, name="sales_hierarchy"),
     path("estructura-comisiones/", views.commission_structure, name="commission_structure"),
     path("crece-tu-equipo/", views.grow_team, name="grow_team"),
+    path("crece-tu-equipo/qr/", views.grow_team_qr, name="grow_team_qr"),
     path("registro-invitacion/<str:signed_token>/", views.invitation_register, name="invitation_register"),
     path(
         "pages/authentication/signup-invited/<int:parent_id>/<int:level_id>/",
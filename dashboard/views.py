@@ -19,9 +19,8 @@ from allauth.account.views import SignupView
 from django.contrib.messages import get_messages
 from django.core import signing
 from django.core.paginator import Paginator
-from django.db.models import Avg, Count, Sum
+from django.db.models import Avg, Sum
 from django.db.models import Q
-from django.db.models.functions import TruncDate
 from django.http import HttpResponseForbidden
 from django.http import HttpResponse
 from django.http import JsonResponse
@@ -75,7 +74,9 @@ from dashboard.models import Offer
 from dashboard.models import ResourceTag
 from dashboard.models import SharedResource
 from dashboard.models import Task
+from dashboard.request_params import int_param
 from dashboard.serializers import TeamMemberSerializer
+from dashboard.services import qr_service
 from dashboard.services.team_personal_info_service import compute_team_personal_metrics
 from dashboard.services.team_personal_info_service import filter_team_personal_rows
 from dashboard.services.team_personal_info_service import get_salesrep_profiles
@@ -85,6 +86,11 @@ from dashboard.services.team_service import get_team_dashboard_context
 from dashboard.services.team_service import query_team_rows
 from dashboard.services.team_service import resolve_my_team_scope
 from dashboard.services.team_service import resolve_team_scope
+from dashboard.services.rollup_service import segment_lead_filter
+from dashboard.services.rollup_service import segment_sale_filter
+from dashboard.services.sales_metrics_service import MetricsScope
+from dashboard.services.sales_metrics_service import compute_lead_metrics
+from dashboard.services.sales_metrics_service import compute_sales_metrics
 from dashboard.services.sales_team_service import apply_sales_team_filters
 from dashboard.services.sales_team_service import can_access_team_section
 from dashboard.services.sales_team_service import can_manage_operations_admin_group
@@ -97,8 +103,9 @@ from dashboard.services.sales_team_service import role_sort_value
 from dashboard.services.sales_team_service import set_admin_invite_decision
 from dashboard.services.sales_team_service import user_can_execute_removal
 from dashboard.services.sales_team_service import user_can_request_removal
-from dashboard.services.sales_team_graph_service import compute_graph_summary
+from dashboard.services.sales_team_graph_service import GRAPH_PAGE_SIZE
 from dashboard.services.sales_team_graph_service import fetch_hierarchy_iterative
+from dashboard.services.sales_team_graph_service import get_hierarchy_graph
 from finance.models import Commission
 from finance.models import CommissionAllocation
 from finance.models import FinancingPartner
@@ -109,6 +116,8 @@ from rewards.models import Tier
 User = get_user_model()
 GROW_TEAM_SIGNER_SALT = "grow-team-invite"
 GROW_TEAM_TOKEN_MAX_AGE_SECONDS = 60 * 60 * 24
+# Un QR con token firmado se reutiliza a lo sumo esta ventana, asi el enlace impreso conserva la mitad de su vigencia.
+GROW_TEAM_QR_WINDOW_SECONDS = GROW_TEAM_TOKEN_MAX_AGE_SECONDS // 2
 
 
 class OneGroupLoginView(LoginView):
@@ -437,21 +446,40 @@ def _can_manage(user, profile):
     return bool(profile and is_manager_role(profile.role))
 
 
-def _sales_queryset(user, profile, sales_rep):
-    qs = Sale.objects.select_related("sales_rep__user", "product", "plan", "business_unit")
+def _sales_scope(user, profile, sales_rep):
     if _is_platform_admin(user, profile):
-        return qs
+        return MetricsScope(role="platform_admin")
     if profile and is_manager_role(profile.role):
-        manager_unit_ids = _manager_business_unit_ids(profile)
-        if not manager_unit_ids:
-            return qs.none()
-        return qs.filter(business_unit_id__in=manager_unit_ids)
+        return MetricsScope(role=profile.role, business_unit_ids=tuple(sorted(_manager_business_unit_ids(profile))))
     if _is_associate(profile, sales_rep):
-        associate_unit_ids = _associate_business_unit_ids(profile, sales_rep)
-        if not associate_unit_ids:
-            return qs.none()
-        return qs.filter(sales_rep=sales_rep, business_unit_id__in=associate_unit_ids)
-    return qs.none()
+        return MetricsScope(
+            role=profile.role,
+            business_unit_ids=tuple(sorted(_associate_business_unit_ids(profile, sales_rep))),
+            sales_rep_id=sales_rep.pk,
+        )
+    return MetricsScope(role=profile.role if profile else "", business_unit_ids=())
+
+
+def _sales_queryset(user, profile, sales_rep, scope=None):
+    scope = scope or _sales_scope(user, profile, sales_rep)
+    qs = Sale.objects.select_related("sales_rep__user", "product", "plan", "business_unit")
+    if scope.business_unit_ids is None:
+        return qs
+    if not scope.business_unit_ids:
+        return qs.none()
+    qs = qs.filter(business_unit_id__in=scope.business_unit_ids)
+    if scope.sales_rep_id is not None:
+        qs = qs.filter(sales_rep_id=scope.sales_rep_id)
+    return qs
+
+
+def _solar_scope(user, profile, sales_rep, solar_unit, segment):
+    return MetricsScope(
+        role="platform_admin" if _is_platform_admin(user, profile) else (profile.role if profile else ""),
+        business_unit_ids=(solar_unit.pk,),
+        sales_rep_id=sales_rep.pk if _is_associate(profile, sales_rep) else None,
+        segment=segment,
+    )
 
 
 def _can_access_business_unit(user, profile, sales_rep, business_unit):
@@ -462,106 +490,6 @@ def _can_access_business_unit(user, profile, sales_rep, business_unit):
     return bool(profile or sales_rep)
 
 
-def _status_chart_data(sales_qs):
-    return [
-        {"label": "Confirmadas", "value": sales_qs.filter(status=Sale.Status.CONFIRMED).count(), "color": "#2fb66f"},
-        {"label": "Pendientes", "value": sales_qs.filter(status=Sale.Status.PENDING).count(), "color": "#a57cff"},
-        {"label": "Borrador", "value": sales_qs.filter(status=Sale.Status.DRAFT).count(), "color": "#7b8da6"},
-        {"label": "Canceladas", "value": sales_qs.filter(status=Sale.Status.CANCELLED).count(), "color": "#df5a71"},
-    ]
-
-
-def _daily_sales_chart_data(sales_qs):
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=6)
-
-    raw_rows = (
-        sales_qs.filter(created_at__date__gte=start_date)
-        .annotate(day=TruncDate("created_at"))
-        .values("day")
-        .annotate(total=Count("id"))
-        .order_by("day")
-    )
-    totals_by_day = {row["day"]: row["total"] for row in raw_rows}
-
-    labels = []
-    values = []
-    for offset in range(7):
-        day = start_date + timedelta(days=offset)
-        labels.append(day.strftime("%b %d"))
-        values.append(totals_by_day.get(day, 0))
-
-    return {"labels": labels, "values": values, "color": "#6f42c1"}
-
-
-def _lead_source_chart_data(leads_qs):
-    palette = ["#2fb66f", "#6f42c1", "#0ea5e9", "#f59e0b", "#df5a71", "#64748b"]
-    rows = (
-        leads_qs.values("source")
-        .annotate(total=Count("id"))
-        .order_by("-total", "source")[:6]
-    )
-    data = []
-    for idx, row in enumerate(rows):
-        data.append(
-            {
-                "label": row["source"] or "Sin fuente",
-                "value": row["total"],
-                "color": palette[idx % len(palette)],
-            }
-        )
-    if not data:
-        data.append({"label": "Sin datos", "value": 0, "color": "#cbd5e1"})
-    return data
-
-
-def _daily_leads_chart_data(leads_qs):
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=6)
-
-    raw_rows = (
-        leads_qs.filter(created_at__date__gte=start_date)
-        .annotate(day=TruncDate("created_at"))
-        .values("day")
-        .annotate(total=Count("id"))
-        .order_by("day")
-    )
-    totals_by_day = {row["day"]: row["total"] for row in raw_rows}
-
-    labels = []
-    values = []
-    for offset in range(7):
-        day = start_date + timedelta(days=offset)
-        labels.append(day.strftime("%b %d"))
-        values.append(totals_by_day.get(day, 0))
-
-    return {"labels": labels, "values": values, "color": "#0ea5e9"}
-
-
-def _segment_lead_filter(segment: str) -> Q:
-    if segment == "commercial":
-        keywords = ["comercial", "commercial", "business", "empresa"]
-    else:
-        keywords = ["residencial", "residential", "home", "casa"]
-    query = Q()
-    for keyword in keywords:
-        query |= Q(source__icontains=keyword)
-    return query
-
-
-def _segment_sale_filter(segment: str) -> Q:
-    if segment == "commercial":
-        keywords = ["comercial", "commercial", "business", "empresa"]
-    else:
-        keywords = ["residencial", "residential", "home", "casa"]
-    query = Q()
-    for keyword in keywords:
-        query |= Q(product__name__icontains=keyword)
-        query |= Q(plan__name__icontains=keyword)
-        query |= Q(external_reference__icontains=keyword)
-    return query
-
-
 def _sales_quick_links():
     return [
         {"label": "Propuesta Solar", "url": settings.ENERGY_ADVISOR_URL, "external": True},
@@ -655,7 +583,9 @@ def home(request):
 def admin_overview(request):
     profile = _profile(request.user)
 
-    sales = _sales_queryset(request.user, profile, _sales_rep(request.user))
+    sales_rep = _sales_rep(request.user)
+    scope = _sales_scope(request.user, profile, sales_rep)
+    sales = _sales_queryset(request.user, profile, sales_rep, scope=scope)
     today = timezone.localdate()
     active_announcements = Announcement.objects.filter(is_active=True, start_date__lte=today, end_date__gte=today).order_by(
         "-start_date", "-created_at"
@@ -675,11 +605,7 @@ def admin_overview(request):
         "title": "Resumen para Socio/Administrador",
         "active_announcements": active_announcements,
         "announcement_slides": announcement_slides,
-        "total_sales": sales.count(),
-        "confirmed_sales": sales.filter(status=Sale.Status.CONFIRMED).count(),
-        "total_amount": sales.aggregate(value=Sum("amount"))["value"] or 0,
-        "sales_status_chart": _status_chart_data(sales),
-        "daily_sales_chart": _daily_sales_chart_data(sales),
+        **compute_sales_metrics(scope),
         "recent_sales": sales[:10],
     }
     return render(request, "dashboard/admin_overview.html", context)
@@ -700,14 +626,9 @@ def business_unit_overview(request, unit_key):
     if not _can_access_business_unit(request.user, profile, sales_rep, business_unit):
         return HttpResponseForbidden("No autorizado")
 
-    if _is_platform_admin(request.user, profile):
-        sales = Sale.objects.filter(business_unit=business_unit)
-    else:
-        # Mantener aislamiento de datos por usuario/rol aunque todos puedan abrir la página.
-        sales = _sales_queryset(request.user, profile, sales_rep).filter(business_unit=business_unit)
-
-    sales = sales.select_related("sales_rep__user", "product", "plan", "business_unit")
-    sales = sales.order_by("-created_at")
+    # Mantener aislamiento de datos por usuario/rol aunque todos puedan abrir la página.
+    scope = _sales_scope(request.user, profile, sales_rep).within_business_unit(business_unit.pk)
+    sales = _sales_queryset(request.user, profile, sales_rep, scope=scope).order_by("-created_at")
 
     business_unit_display = business_unit or SimpleNamespace(name=page["label"], code=page["code"])
 
@@ -716,11 +637,7 @@ def business_unit_overview(request, unit_key):
         "unit_label": page["label"],
         "business_unit": business_unit_display,
         "sales_quick_links": _sales_quick_links(),
-        "total_sales": sales.count(),
-        "confirmed_sales": sales.filter(status=Sale.Status.CONFIRMED).count(),
-        "total_amount": sales.aggregate(value=Sum("amount"))["value"] or 0,
-        "sales_status_chart": _status_chart_data(sales),
-        "daily_sales_chart": _daily_sales_chart_data(sales),
+        **compute_sales_metrics(scope),
         "recent_sales": sales[:10],
     }
     if page["code"] == "solar-home-power":
@@ -827,27 +744,17 @@ def solar_client_residential_iframe(request):
     if not _can_access_business_unit(request.user, profile, sales_rep, solar_unit):
         return HttpResponseForbidden("No autorizado")
 
+    scope = _solar_scope(request.user, profile, sales_rep, solar_unit, "")
     leads = Lead.objects.filter(business_unit=solar_unit).select_related("sales_rep__user").order_by("-created_at")
     if _is_associate(profile, sales_rep):
         leads = leads.filter(sales_rep=sales_rep)
 
-    total_clients = leads.count()
-    with_phone = leads.exclude(phone="").count()
-    with_email = leads.exclude(email="").count()
-    with_contact = leads.exclude(phone="").exclude(email="").count()
-    contactable_pct = round((with_contact / total_clients) * 100, 1) if total_clients else 0.0
-
     return render(
         request,
         "dashboard/solar_client_residential_dashboard.html",
         {
             "title": "Cliente Residencial",
-            "total_clients": total_clients,
-            "with_phone": with_phone,
-            "with_email": with_email,
-            "contactable_pct": contactable_pct,
-            "lead_source_chart": _lead_source_chart_data(leads),
-            "daily_leads_chart": _daily_leads_chart_data(leads),
+            **compute_lead_metrics(scope),
             "recent_leads": leads[:10],
         },
     )
@@ -864,7 +771,8 @@ def solar_sale_residential_iframe(request):
     if not _can_access_business_unit(request.user, profile, sales_rep, solar_unit):
         return HttpResponseForbidden("No autorizado")
 
-    sales = Sale.objects.filter(business_unit=solar_unit).filter(_segment_sale_filter("residential"))
+    scope = _solar_scope(request.user, profile, sales_rep, solar_unit, "residential")
+    sales = Sale.objects.filter(business_unit=solar_unit).filter(segment_sale_filter("residential"))
     if _is_associate(profile, sales_rep):
         sales = sales.filter(sales_rep=sales_rep)
     sales = sales.select_related("sales_rep__user", "product", "plan").order_by("-created_at")
@@ -874,11 +782,7 @@ def solar_sale_residential_iframe(request):
         "dashboard/solar_sale_residential_dashboard.html",
         {
             "title": "Venta Residencial",
-            "total_sales": sales.count(),
-            "confirmed_sales": sales.filter(status=Sale.Status.CONFIRMED).count(),
-            "total_amount": sales.aggregate(value=Sum("amount"))["value"] or 0,
-            "sales_status_chart": _status_chart_data(sales),
-            "daily_sales_chart": _daily_sales_chart_data(sales),
+            **compute_sales_metrics(scope),
             "recent_sales": sales[:10],
         },
     )
@@ -895,28 +799,18 @@ def solar_client_commercial_iframe(request):
     if not _can_access_business_unit(request.user, profile, sales_rep, solar_unit):
         return HttpResponseForbidden("No autorizado")
 
-    leads = Lead.objects.filter(business_unit=solar_unit).filter(_segment_lead_filter("commercial"))
+    scope = _solar_scope(request.user, profile, sales_rep, solar_unit, "commercial")
+    leads = Lead.objects.filter(business_unit=solar_unit).filter(segment_lead_filter("commercial"))
     if _is_associate(profile, sales_rep):
         leads = leads.filter(sales_rep=sales_rep)
     leads = leads.select_related("sales_rep__user").order_by("-created_at")
 
-    total_clients = leads.count()
-    with_phone = leads.exclude(phone="").count()
-    with_email = leads.exclude(email="").count()
-    with_contact = leads.exclude(phone="").exclude(email="").count()
-    contactable_pct = round((with_contact / total_clients) * 100, 1) if total_clients else 0.0
-
     return render(
         request,
         "dashboard/solar_client_commercial_dashboard.html",
         {
             "title": "Cliente Comercial",
-            "total_clients": total_clients,
-            "with_phone": with_phone,
-            "with_email": with_email,
-            "contactable_pct": contactable_pct,
-            "lead_source_chart": _lead_source_chart_data(leads),
-            "daily_leads_chart": _daily_leads_chart_data(leads),
+            **compute_lead_metrics(scope),
             "recent_leads": leads[:10],
         },
     )
@@ -933,7 +827,8 @@ def solar_sale_commercial_iframe(request):
     if not _can_access_business_unit(request.user, profile, sales_rep, solar_unit):
         return HttpResponseForbidden("No autorizado")
 
-    sales = Sale.objects.filter(business_unit=solar_unit).filter(_segment_sale_filter("commercial"))
+    scope = _solar_scope(request.user, profile, sales_rep, solar_unit, "commercial")
+    sales = Sale.objects.filter(business_unit=solar_unit).filter(segment_sale_filter("commercial"))
     if _is_associate(profile, sales_rep):
         sales = sales.filter(sales_rep=sales_rep)
     sales = sales.select_related("sales_rep__user", "product", "plan").order_by("-created_at")
@@ -943,11 +838,7 @@ def solar_sale_commercial_iframe(request):
         "dashboard/solar_sale_commercial_dashboard.html",
         {
             "title": "Venta Comercial",
-            "total_sales": sales.count(),
-            "confirmed_sales": sales.filter(status=Sale.Status.CONFIRMED).count(),
-            "total_amount": sales.aggregate(value=Sum("amount"))["value"] or 0,
-            "sales_status_chart": _status_chart_data(sales),
-            "daily_sales_chart": _daily_sales_chart_data(sales),
+            **compute_sales_metrics(scope),
             "recent_sales": sales[:10],
         },
     )
@@ -1665,8 +1556,8 @@ def sales_hierarchy(request):
         messages.error(request, "Tu perfil no está configurado aún.")
         return redirect("dashboard:home")
 
-    graph = fetch_hierarchy_iterative(root_rep.id, request)
-    summary = compute_graph_summary(graph.nodes, str(root_rep.id))
+    graph = get_hierarchy_graph()
+    summary = graph.summary(root_rep.id)
     storage = get_messages(request)
     swal_messages = [{"message": message.message, "tags": message.tags} for message in storage]
     context = {
@@ -1675,6 +1566,9 @@ def sales_hierarchy(request):
         "team_totals": summary["team_totals"],
         "level_breakdown": summary["level_breakdown"],
         "chart_source_url": reverse("dashboard:apps_crm_salesteam_graph_source"),
+        "chart_nodes_url": reverse("dashboard:apps_crm_salesteam_graph_nodes"),
+        "chart_search_url": reverse("dashboard:apps_crm_salesteam_graph_search"),
+        "chart_page_size": GRAPH_PAGE_SIZE,
         "last_generated": graph.generated_at,
         "swal_messages": swal_messages,
     }
@@ -1734,6 +1628,60 @@ def apps_crm_salesteam_graph_source(request):
     return response
 
 
+@login_required
+@require_http_methods(["GET"])
+def apps_crm_salesteam_graph_nodes(request):
+    """One org-chart node with a page of its direct reports; ``node`` defaults to the viewer's root."""
+    if not can_access_team_section(request.user):
+        return JsonResponse({"detail": "No tienes permisos para acceder a Mi Equipo."}, status=403)
+
+    root_rep = _graph_root_salesrep_for_user(request.user)
+    if not root_rep:
+        return JsonResponse({"detail": "Tu perfil no está configurado aún."}, status=403)
+
+    graph = get_hierarchy_graph()
+    node_id = int_param(request.GET, "node", root_rep.id)
+    page = graph.children_page(
+        root_rep.id,
+        node_id,
+        request,
+        offset=int_param(request.GET, "offset", 0),
+        limit=int_param(request.GET, "limit", GRAPH_PAGE_SIZE),
+    )
+    if page is None:
+        return JsonResponse({"detail": "Integrante no encontrado."}, status=404)
+    next_offset = page.offset + len(page.children)
+    return JsonResponse(
+        {
+            "node": page.node,
+            "children": page.children,
+            "offset": page.offset,
+            "total": page.total,
+            "nextOffset": next_offset if next_offset < page.total else None,
+            "generatedAt": graph.generated_at.isoformat(),
+        }
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+def apps_crm_salesteam_graph_search(request):
+    """Reps under the viewer whose name matches ``q``, each with the node path from the viewer's root."""
+    if not can_access_team_section(request.user):
+        return JsonResponse({"detail": "No tienes permisos para acceder a Mi Equipo."}, status=403)
+
+    root_rep = _graph_root_salesrep_for_user(request.user)
+    if not root_rep:
+        return JsonResponse({"detail": "Tu perfil no está configurado aún."}, status=403)
+
+    graph = get_hierarchy_graph()
+    results = []
+    for path in graph.search(root_rep.id, request.GET.get("q", "")):
+        nodes = graph.path_nodes(root_rep.id, path[-1], request)
+        results.append({"node": nodes[-1], "path": nodes})
+    return JsonResponse({"results": results, "generatedAt": graph.generated_at.isoformat()})
+
+
 @login_required
 def commission_structure(request):
     profile = _profile(request.user)
@@ -2005,10 +1953,11 @@ def apps_crm_salesteam_admin_invite_action(request, request_id):
     return JsonResponse({"success": True, "message": message})
 
 
-@login_required
-@require_module_permission(ModuleCode.USERS, PermissionAction.VIEW)
-def grow_team(request):
-    profile = _profile(request.user)
+def _grow_team_invite(request) -> tuple[list[tuple[str, str]], str, str, str, str]:
+    """Level choices, selected level, signed token, invitation link and QR cache identity for ``?level=``.
+
+    The identity is empty unless the link carries the signed token, which changes every second.
+    """
     allowed_codes = _inviteable_role_codes_for_user(request.user)
     level_choices = [(code, label) for code, label in UserProfile.Role.choices if code in allowed_codes]
 
@@ -2024,12 +1973,22 @@ def grow_team(request):
     signer = signing.TimestampSigner(salt=GROW_TEAM_SIGNER_SALT)
     signed_token = signer.sign(f"{request.user.id}:{level}") if level else ""
     invite_link = request.build_absolute_uri(reverse("dashboard:grow_team"))
+    qr_identity = ""
     if level_obj:
         invite_link = request.build_absolute_uri(reverse("dashboard:signup_invited", args=[request.user.id, level_obj.id]))
     elif signed_token:
         invite_link = request.build_absolute_uri(reverse("dashboard:invitation_register", args=[signed_token]))
-    qr_query = urlencode({"text": invite_link, "size": "360"})
-    qr_image_url = f"https://quickchart.io/qr?{qr_query}"
+        window = int(timezone.now().timestamp()) // GROW_TEAM_QR_WINDOW_SECONDS
+        qr_identity = f"grow-team:{request.user.id}:{level}:{window}"
+    return level_choices, level, signed_token, invite_link, qr_identity
+
+
+@login_required
+@require_module_permission(ModuleCode.USERS, PermissionAction.VIEW)
+def grow_team(request):
+    profile = _profile(request.user)
+    level_choices, level, signed_token, invite_link, _ = _grow_team_invite(request)
+    qr_image_url = f"{reverse('dashboard:grow_team_qr')}?{urlencode({'level': level})}"
 
     inviter_role_label = "Modo Superadmin" if request.user.is_superuser else (profile.get_role_display() if profile else "Usuario")
     can_invite_admin = bool(profile and profile.role == RoleCode.PARTNER)
@@ -2084,6 +2043,20 @@ def grow_team(request):
     return render(request, "dashboard/grow_team.html", context)
 
 
+@login_required
+@require_module_permission(ModuleCode.USERS, PermissionAction.VIEW)
+@require_http_methods(["GET"])
+def grow_team_qr(request):
+    _, level, _, invite_link, qr_identity = _grow_team_invite(request)
+    filename = ""
+    if str(request.GET.get("download", "")).strip().lower() in {"1", "true", "yes"}:
+        filename = f"onegroup-qr-invitacion-{level or 'equipo'}.png"
+    try:
+        return qr_service.qr_png_response(request, qr_service.QrSpec(invite_link, identity=qr_identity), filename=filename)
+    except qr_service.QrUnavailable:
+        return JsonResponse({"success": False, "error": "No se pudo generar QR en este entorno."}, status=500)
+
+
 @require_http_methods(["GET", "POST"])
 def invitation_register(request, signed_token):
     if request.user.is_authenticated:
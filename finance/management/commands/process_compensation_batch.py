@@ -0,0 +1,47 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils.dateparse import parse_date
+
+from crm.models import Sale
+from finance.services import process_sales_compensation_batch
+
+
+class Command(BaseCommand):
+    help = "Compute commissions, allocations and reward points for confirmed sales in one batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--business-unit", default="", help="BusinessUnit code to restrict the batch.")
+        parser.add_argument("--confirmed-from", default="", help="First confirmation date (YYYY-MM-DD).")
+        parser.add_argument("--confirmed-to", default="", help="Last confirmation date (YYYY-MM-DD).")
+        parser.add_argument("--sale-id", action="append", type=int, default=[], help="Restrict to these sale ids.")
+
+    def handle(self, *args, **options):
+        sales = Sale.objects.filter(status=Sale.Status.CONFIRMED)
+        if options["business_unit"]:
+            sales = sales.filter(business_unit__code=options["business_unit"])
+        for option, lookup in (("confirmed_from", "confirmed_at__date__gte"), ("confirmed_to", "confirmed_at__date__lte")):
+            if not options[option]:
+                continue
+            value = parse_date(options[option])
+            if value is None:
+                raise CommandError(f"Invalid date for --{option.replace('_', '-')}: {options[option]}")
+            sales = sales.filter(**{lookup: value})
+        if options["sale_id"]:
+            sales = sales.filter(pk__in=options["sale_id"])
+
+        try:
+            result = process_sales_compensation_batch(sales)
+        except ValidationError as exc:
+            raise CommandError("; ".join(exc.messages)) from exc
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {result.sales} sales: "
+                f"{result.commissions_created} commissions, "
+                f"{result.allocations_created} allocations created, "
+                f"{result.allocations_updated} updated, "
+                f"{result.allocations_deleted} removed, "
+                f"{result.reward_points_created} reward point records."
+            )
+        )
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
 
 from django.core.exceptions import ValidationError
@@ -7,6 +8,7 @@ from core.models import UserProfile
 from core.rbac.constants import RoleCode
 from finance.models import Commission
 from finance.models import CommissionAllocation
+from crm.models import Sale
 from crm.models import SalesRep
 from rewards.models import PlanTierRule, RewardPoint
 
@@ -22,45 +24,44 @@ ROLE_BASE_RATE = {
     RoleCode.SOLAR_ADVISOR: Decimal("0.12"),
     RoleCode.SOLAR_CONSULTANT: Decimal("0.06"),
 }
+BULK_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class BatchCompensationResult:
+    sales: int
+    commissions_created: int
+    allocations_created: int
+    allocations_updated: int
+    allocations_deleted: int
+    reward_points_created: int
 
 
 def _quantize(value: Decimal) -> Decimal:
     return value.quantize(TWOPLACES, rounding=ROUND_HALF_UP)
 
 
-def _commission_distribution_for_sale(sale) -> tuple[dict[int, Decimal], dict[int, str]]:
-    seller_profile = getattr(sale.sales_rep.user, "profile", None)
-    if not seller_profile:
-        return {}, {}
-
-    chain: list[UserProfile] = []
-    current = seller_profile
-    visited: set[int] = set()
-    while current and current.user_id and current.user_id not in visited:
-        visited.add(current.user_id)
-        chain.append(current)
-        if not current.manager_id:
-            break
-        current = getattr(current.manager, "profile", None)
-
+def _distribution_from_chain(chain: list[tuple[int, str]]) -> tuple[dict[int, Decimal], dict[int, str]]:
+    """Split the commission along ``(user_id, role)`` pairs ordered from seller upwards."""
     if not chain:
         return {}, {}
 
-    seller_rate = ROLE_BASE_RATE.get(chain[0].role, Decimal("0"))
+    seller_user_id, seller_role = chain[0]
+    seller_rate = ROLE_BASE_RATE.get(seller_role, Decimal("0"))
     if seller_rate <= 0:
         return {}, {}
 
-    role_by_user = {node.user_id: node.role for node in chain}
-    distribution: dict[int, Decimal] = {chain[0].user_id: seller_rate}
+    role_by_user = {user_id: role for user_id, role in chain}
+    distribution: dict[int, Decimal] = {seller_user_id: seller_rate}
     current_max = seller_rate
 
-    for ancestor in chain[1:]:
-        target_rate = ROLE_BASE_RATE.get(ancestor.role, Decimal("0"))
+    for user_id, role in chain[1:]:
+        target_rate = ROLE_BASE_RATE.get(role, Decimal("0"))
         if target_rate <= current_max:
             continue
         share = target_rate - current_max
         if share > 0:
-            distribution[ancestor.user_id] = share
+            distribution[user_id] = share
             current_max = target_rate
         if current_max >= MAX_COMMISSION_RATE:
             break
@@ -68,25 +69,55 @@ def _commission_distribution_for_sale(sale) -> tuple[dict[int, Decimal], dict[in
     return distribution, role_by_user
 
 
-@transaction.atomic
-def process_sale_compensation(sale):
-    if sale.status != sale.Status.CONFIRMED:
-        return None
+def _commission_distribution_for_sale(sale) -> tuple[dict[int, Decimal], dict[int, str]]:
+    seller_profile = getattr(sale.sales_rep.user, "profile", None)
+    if not seller_profile:
+        return {}, {}
+
+    chain: list[tuple[int, str]] = []
+    current = seller_profile
+    visited: set[int] = set()
+    while current and current.user_id and current.user_id not in visited:
+        visited.add(current.user_id)
+        chain.append((current.user_id, current.role))
+        if not current.manager_id:
+            break
+        current = getattr(current.manager, "profile", None)
+
+    return _distribution_from_chain(chain)
+
 
-    if sale.sales_rep.tier is None:
+def _rule_for_sale(sale, rules: dict[tuple[int, int], PlanTierRule] | None = None) -> PlanTierRule:
+    if sale.sales_rep.tier_id is None:
         raise ValidationError("SalesRep must have an assigned tier before confirming a sale.")
 
-    try:
-        rule = PlanTierRule.objects.get(plan=sale.plan, tier=sale.sales_rep.tier)
-    except PlanTierRule.DoesNotExist as exc:
-        raise ValidationError("No PlanTierRule found for the selected plan and SalesRep tier.") from exc
+    if rules is not None:
+        rule = rules.get((sale.plan_id, sale.sales_rep.tier_id))
+    else:
+        rule = PlanTierRule.objects.filter(plan_id=sale.plan_id, tier_id=sale.sales_rep.tier_id).first()
+    if rule is None:
+        raise ValidationError("No PlanTierRule found for the selected plan and SalesRep tier.")
+    return rule
 
+
+def _commission_values(sale, rule: PlanTierRule, seller_share: Decimal) -> tuple[Decimal, Decimal, Decimal]:
     amount = Decimal(sale.amount)
-    distribution, role_by_user = _commission_distribution_for_sale(sale)
-    seller_share = distribution.get(sale.sales_rep.user_id, Decimal("0"))
     commission_value = _quantize(amount * seller_share)
     bonus_value = _quantize(amount * (rule.bonus_percent / Decimal("100")))
     points_value = _quantize(amount * rule.points_per_dollar)
+    return commission_value, bonus_value, points_value
+
+
+@transaction.atomic
+def process_sale_compensation(sale):
+    if sale.status != sale.Status.CONFIRMED:
+        return None
+
+    rule = _rule_for_sale(sale)
+    amount = Decimal(sale.amount)
+    distribution, role_by_user = _commission_distribution_for_sale(sale)
+    seller_share = distribution.get(sale.sales_rep.user_id, Decimal("0"))
+    commission_value, bonus_value, points_value = _commission_values(sale, rule, seller_share)
 
     commission, _ = Commission.objects.get_or_create(
         sale=sale,
@@ -130,3 +161,144 @@ def process_sale_compensation(sale):
     )
 
     return commission
+
+
+def _hierarchy_snapshot() -> dict[int, tuple[int | None, str]]:
+    return {
+        user_id: (manager_id, role)
+        for user_id, manager_id, role in UserProfile.objects.order_by().values_list("user_id", "manager_id", "role")
+    }
+
+
+def _chain_from_snapshot(user_id: int, snapshot: dict[int, tuple[int | None, str]]) -> list[tuple[int, str]]:
+    chain: list[tuple[int, str]] = []
+    current: int | None = user_id
+    visited: set[int] = set()
+    while current is not None and current in snapshot and current not in visited:
+        visited.add(current)
+        manager_id, role = snapshot[current]
+        chain.append((current, role))
+        current = manager_id
+    return chain
+
+
+@transaction.atomic
+def process_sales_compensation_batch(sales) -> BatchCompensationResult:
+    """Set-based equivalent of ``process_sale_compensation`` for a queryset of sales.
+
+    Chains are resolved from a single snapshot of ``UserProfile`` and every row is
+    written with ``bulk_create``/``bulk_update``; existing commissions and reward
+    points are kept, allocations are reconciled exactly like the per-sale path.
+    """
+    sales = list(
+        sales.filter(status=Sale.Status.CONFIRMED)
+        .select_related("sales_rep")
+        .order_by("pk")
+    )
+    if not sales:
+        return BatchCompensationResult(0, 0, 0, 0, 0, 0)
+
+    rules = {
+        (rule.plan_id, rule.tier_id): rule
+        for rule in PlanTierRule.objects.filter(
+            plan_id__in={sale.plan_id for sale in sales},
+            tier_id__in={sale.sales_rep.tier_id for sale in sales if sale.sales_rep.tier_id},
+        ).order_by()
+    }
+    for sale in sales:
+        try:
+            _rule_for_sale(sale, rules)
+        except ValidationError as exc:
+            raise ValidationError(f"Sale #{sale.pk}: {exc.messages[0]}") from exc
+
+    snapshot = _hierarchy_snapshot()
+    distribution_by_seller: dict[int, tuple[dict[int, Decimal], dict[int, str]]] = {}
+    for sale in sales:
+        seller_user_id = sale.sales_rep.user_id
+        if seller_user_id not in distribution_by_seller:
+            distribution_by_seller[seller_user_id] = _distribution_from_chain(
+                _chain_from_snapshot(seller_user_id, snapshot)
+            )
+
+    sale_ids = [sale.pk for sale in sales]
+    existing_commission_sale_ids = set(Commission.objects.filter(sale_id__in=sale_ids).order_by().values_list("sale_id", flat=True))
+    existing_point_sale_ids = set(RewardPoint.objects.filter(sale_id__in=sale_ids).order_by().values_list("sale_id", flat=True))
+
+    new_commissions: list[Commission] = []
+    new_points: list[RewardPoint] = []
+    for sale in sales:
+        distribution, _ = distribution_by_seller[sale.sales_rep.user_id]
+        rule = rules[(sale.plan_id, sale.sales_rep.tier_id)]
+        seller_share = distribution.get(sale.sales_rep.user_id, Decimal("0"))
+        commission_value, bonus_value, points_value = _commission_values(sale, rule, seller_share)
+        if sale.pk not in existing_commission_sale_ids:
+            new_commissions.append(
+                Commission(
+                    sale_id=sale.pk,
+                    sales_rep_id=sale.sales_rep_id,
+                    business_unit_id=sale.business_unit_id,
+                    commission_amount=commission_value,
+                    bonus_amount=bonus_value,
+                    total_amount=commission_value + bonus_value,
+                )
+            )
+        if sale.pk not in existing_point_sale_ids:
+            new_points.append(RewardPoint(sale_id=sale.pk, sales_rep_id=sale.sales_rep_id, points=points_value))
+
+    Commission.objects.bulk_create(new_commissions, batch_size=BULK_BATCH_SIZE)
+    RewardPoint.objects.bulk_create(new_points, batch_size=BULK_BATCH_SIZE)
+    commission_id_by_sale = dict(Commission.objects.filter(sale_id__in=sale_ids).order_by().values_list("sale_id", "id"))
+
+    beneficiary_user_ids = {user_id for distribution, _ in distribution_by_seller.values() for user_id in distribution}
+    rep_id_by_user = dict(SalesRep.objects.filter(user_id__in=beneficiary_user_ids).order_by().values_list("user_id", "id"))
+
+    existing_allocations = {
+        (allocation.commission_id, allocation.sales_rep_id): allocation
+        for allocation in CommissionAllocation.objects.filter(commission_id__in=commission_id_by_sale.values()).order_by()
+    }
+    expected_keys: set[tuple[int, int]] = set()
+    to_create: list[CommissionAllocation] = []
+    to_update: list[CommissionAllocation] = []
+    for sale in sales:
+        commission_id = commission_id_by_sale[sale.pk]
+        distribution, role_by_user = distribution_by_seller[sale.sales_rep.user_id]
+        amount = Decimal(sale.amount)
+        for user_id, share in distribution.items():
+            rep_id = rep_id_by_user.get(user_id)
+            if not rep_id:
+                continue
+            key = (commission_id, rep_id)
+            expected_keys.add(key)
+            values = {
+                "sale_id": sale.pk,
+                "role_code": role_by_user.get(user_id, ""),
+                "share_percent": share,
+                "amount": _quantize(amount * share),
+            }
+            allocation = existing_allocations.get(key)
+            if allocation is None:
+                to_create.append(CommissionAllocation(commission_id=commission_id, sales_rep_id=rep_id, **values))
+                continue
+            if any(getattr(allocation, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(allocation, field, value)
+                to_update.append(allocation)
+
+    stale_ids = [allocation.id for key, allocation in existing_allocations.items() if key not in expected_keys]
+    if stale_ids:
+        CommissionAllocation.objects.filter(id__in=stale_ids).delete()
+    CommissionAllocation.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    CommissionAllocation.objects.bulk_update(
+        to_update,
+        ["sale", "role_code", "share_percent", "amount"],
+        batch_size=BULK_BATCH_SIZE,
+    )
+
+    return BatchCompensationResult(
+        sales=len(sales),
+        commissions_created=len(new_commissions),
+        allocations_created=len(to_create),
+        allocations_updated=len(to_update),
+        allocations_deleted=len(stale_ids),
+        reward_points_created=len(new_points),
+    )
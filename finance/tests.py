@@ -1,12 +1,15 @@
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
 from django.test import TestCase
 
 from core.models import BusinessUnit
+from core.rbac.constants import RoleCode
 from crm.models import Sale, SalesRep
 from finance.models import Commission
 from finance.models import CommissionAllocation
+from finance.services import process_sales_compensation_batch
 from inventory.models import Product
 from rewards.models import CompensationPlan, PlanTierRule, RewardPoint, Tier
 
@@ -64,3 +67,113 @@ class CompensationFlowTests(TestCase):
         self.assertEqual(allocation.share_percent, Decimal("0.0600"))
         self.assertEqual(allocation.amount, Decimal("60.00"))
         self.assertEqual(points.points, Decimal("100.00"))
+
+
+class BatchCompensationTests(TestCase):
+    def setUp(self):
+        self.bu = BusinessUnit.objects.create(name="Techo", code="techo")
+        self.tier = Tier.objects.create(name="Junior", rank=1)
+        self.product = Product.objects.create(
+            business_unit=self.bu,
+            name="Solar Kit",
+            sku="SKU-1",
+            price=Decimal("1000.00"),
+        )
+        self.plan = CompensationPlan.objects.create(business_unit=self.bu, product=self.product, name="PPA")
+        PlanTierRule.objects.create(
+            plan=self.plan,
+            tier=self.tier,
+            commission_percent=Decimal("10.00"),
+            bonus_percent=Decimal("2.00"),
+            points_per_dollar=Decimal("0.10"),
+        )
+        self.partner = self._rep("partner", RoleCode.PARTNER)
+        self.manager = self._rep("manager", RoleCode.MANAGER, manager=self.partner)
+        self.advisor = self._rep("advisor", RoleCode.SOLAR_ADVISOR, manager=self.manager)
+        self.consultant = self._rep("consultant", RoleCode.SOLAR_CONSULTANT, manager=self.advisor)
+        self.direct = self._rep("direct", RoleCode.SOLAR_CONSULTANT, manager=self.partner)
+
+    def _rep(self, username, role, manager=None):
+        user = User.objects.create_user(username=username, password="secretpass123")
+        profile = user.profile
+        profile.role = role
+        profile.manager = manager.user if manager else None
+        profile.save(update_fields=["role", "manager"])
+        return SalesRep.objects.create(user=user, business_unit=self.bu, tier=self.tier)
+
+    def _sales(self):
+        amounts = [Decimal("1000.00"), Decimal("2500.50"), Decimal("333.33"), Decimal("999.99")]
+        return [
+            Sale(
+                business_unit=self.bu,
+                sales_rep=rep,
+                product=self.product,
+                plan=self.plan,
+                amount=amount,
+                status=Sale.Status.CONFIRMED,
+            )
+            for rep in (self.consultant, self.advisor, self.direct, self.manager)
+            for amount in amounts
+        ]
+
+    def _results(self):
+        return (
+            sorted(Commission.objects.values_list("sale_id", "sales_rep_id", "commission_amount", "bonus_amount", "total_amount")),
+            sorted(CommissionAllocation.objects.values_list("sale_id", "sales_rep_id", "role_code", "share_percent", "amount")),
+            sorted(RewardPoint.objects.values_list("sale_id", "sales_rep_id", "points")),
+        )
+
+    def test_batch_matches_per_sale_path(self):
+        for sale in self._sales():
+            sale.save()
+        expected = self._results()
+
+        Commission.objects.all().delete()
+        RewardPoint.objects.all().delete()
+        result = process_sales_compensation_batch(Sale.objects.all())
+
+        self.assertEqual(self._results(), expected)
+        self.assertEqual(result.sales, 16)
+        self.assertEqual(result.commissions_created, 16)
+
+    def test_batch_query_count_does_not_grow_with_sales(self):
+        Sale.objects.bulk_create(self._sales())
+        with self.assertNumQueries(13):
+            process_sales_compensation_batch(Sale.objects.all())
+
+    def test_batch_reconciles_existing_allocations(self):
+        sale = Sale.objects.create(
+            business_unit=self.bu,
+            sales_rep=self.consultant,
+            product=self.product,
+            plan=self.plan,
+            amount=Decimal("1000.00"),
+            status=Sale.Status.CONFIRMED,
+        )
+        expected = self._results()
+        allocation = CommissionAllocation.objects.get(sale=sale, sales_rep=self.manager)
+        allocation.amount = Decimal("1.00")
+        allocation.save(update_fields=["amount"])
+        CommissionAllocation.objects.create(
+            commission=sale.commission,
+            sale=sale,
+            sales_rep=self.direct,
+            share_percent=Decimal("0.0100"),
+            amount=Decimal("10.00"),
+        )
+
+        result = process_sales_compensation_batch(Sale.objects.filter(pk=sale.pk))
+
+        self.assertEqual(self._results(), expected)
+        self.assertEqual(result.allocations_updated, 1)
+        self.assertEqual(result.allocations_deleted, 1)
+        self.assertEqual(result.commissions_created, 0)
+
+    def test_batch_requires_tier_for_every_sale(self):
+        self.direct.tier = None
+        self.direct.save(update_fields=["tier"])
+        Sale.objects.bulk_create(self._sales())
+
+        with self.assertRaises(ValidationError):
+            process_sales_compensation_batch(Sale.objects.all())
+        self.assertFalse(Commission.objects.exists())
@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "progress", "attempts", "created_by", "created_at", "finished_at")
+    list_filter = ("status", "kind")
+    search_fields = ("kind", "created_by__username", "error")
+    readonly_fields = ("payload", "result", "error", "worker", "started_at", "heartbeat_at", "finished_at")
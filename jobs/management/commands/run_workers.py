@@ -0,0 +1,89 @@
+import multiprocessing
+import signal
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import connections
+
+from jobs.services import purge_finished_jobs
+from jobs.services import requeue_stale_jobs
+from jobs.services import run_due_periodic_tasks
+from jobs.services import run_pending_jobs
+from jobs.worker import worker_main
+
+SUPERVISOR_INTERVAL_SECONDS = 30
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs (imports, invoice OCR) from the database queue with a pool of worker processes; "
+        "the supervisor also runs the periodic tasks (lead acceptance expiry)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2, help="Number of worker processes.")
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds an idle worker waits before polling again.")
+        parser.add_argument("--stale-after", type=int, default=600, help="Seconds without heartbeat before a running job is recovered.")
+        parser.add_argument("--purge-days", type=int, default=7, help="Delete finished jobs older than this many days (0 keeps them).")
+        parser.add_argument("--once", action="store_true", help="Drain the queue in this process and exit.")
+        parser.add_argument("--no-periodic", action="store_true", help="Do not run periodic tasks (e.g. when cron already runs them).")
+
+    def handle(self, *args, **options):
+        if options["processes"] < 1:
+            raise CommandError("--processes must be at least 1.")
+        stale_after = timedelta(seconds=options["stale_after"])
+        self.periodic = not options["no_periodic"]
+        self._housekeeping(stale_after, options["purge_days"])
+
+        if options["once"]:
+            processed = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
+            return
+
+        context = multiprocessing.get_context()
+        stop_event = context.Event()
+        # Poner el Event desde el handler puede bloquearse contra el wait() en curso; se sale por excepcion.
+        signal.signal(signal.SIGTERM, _interrupt)
+        workers: dict[int, multiprocessing.Process] = {}
+        self.stdout.write(f"Starting {options['processes']} workers (Ctrl+C to stop).")
+        try:
+            while not stop_event.is_set():
+                for index in range(options["processes"]):
+                    process = workers.get(index)
+                    if process is not None and process.is_alive():
+                        continue
+                    if process is not None:
+                        self.stderr.write(f"Worker {index} exited with code {process.exitcode}; restarting.")
+                    # Los hijos no deben heredar conexiones abiertas del padre.
+                    connections.close_all()
+                    process = context.Process(
+                        target=worker_main,
+                        args=(index, stop_event, options["poll_interval"]),
+                        name=f"job-worker-{index}",
+                    )
+                    process.start()
+                    workers[index] = process
+                stop_event.wait(SUPERVISOR_INTERVAL_SECONDS)
+                if not stop_event.is_set():
+                    self._housekeeping(stale_after, options["purge_days"])
+        except KeyboardInterrupt:
+            stop_event.set()
+        finally:
+            for process in workers.values():
+                process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped."))
+
+    def _housekeeping(self, stale_after: timedelta, purge_days: int) -> None:
+        recovered = requeue_stale_jobs(stale_after)
+        if recovered:
+            self.stderr.write(f"Recovered {recovered} stale jobs.")
+        if purge_days:
+            purge_finished_jobs(timedelta(days=purge_days))
+        if self.periodic:
+            run_due_periodic_tasks()
+        connections.close_all()
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_INPUT_PREFIX = "jobs/inputs"
+CLAIM_CANDIDATES = 10
+
+_HANDLERS: dict[str, Callable[[JobContext], dict]] = {}
+_PERIODIC: dict[str, tuple[timedelta, Callable[[], object]]] = {}
+_periodic_last_run: dict[str, float] = {}
+
+
+class JobError(Exception):
+    """Expected failure of a job; the message is shown to the user as is."""
+
+
+def register(kind: str):
+    """Register the decorated function as the handler for jobs of ``kind``."""
+
+    def decorator(handler: Callable[[JobContext], dict]):
+        _HANDLERS[kind] = handler
+        return handler
+
+    return decorator
+
+
+def periodic(name: str, every: timedelta):
+    """Register the decorated function to run every ``every`` from the ``run_workers`` supervisor."""
+
+    def decorator(func: Callable[[], object]):
+        _PERIODIC[name] = (every, func)
+        return func
+
+    return decorator
+
+
+@dataclass
+class JobContext:
+    job: Job
+
+    @property
+    def payload(self) -> dict:
+        return self.job.payload
+
+    @property
+    def user(self):
+        return self.job.created_by
+
+    def open_files(self, field: str) -> list[File]:
+        """Uploaded inputs stored under ``field`` at enqueue time, with their original names."""
+        return [
+            File(default_storage.open(item["path"], "rb"), name=item["name"])
+            for item in self.payload.get("files", {}).get(field, [])
+        ]
+
+    def progress(self, percent: int, message: str = "") -> None:
+        # 100 queda reservado para el cierre del trabajo.
+        percent = max(0, min(int(percent), 99))
+        Job.objects.filter(pk=self.job.pk).update(
+            progress=percent,
+            progress_message=message[:200],
+            heartbeat_at=timezone.now(),
+        )
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _store_inputs(files: dict) -> dict[str, list[dict]]:
+    prefix = f"{JOB_INPUT_PREFIX}/{uuid.uuid4().hex}"
+    stored: dict[str, list[dict]] = {}
+    for field, uploads in files.items():
+        if not isinstance(uploads, (list, tuple)):
+            uploads = [uploads]
+        for upload in uploads:
+            if not upload:
+                continue
+            name = os.path.basename(upload.name or field)
+            if hasattr(upload, "seek"):
+                upload.seek(0)
+            path = default_storage.save(f"{prefix}/{field}/{name}", upload)
+            if hasattr(upload, "seek"):
+                upload.seek(0)
+            stored.setdefault(field, []).append({"path": path, "name": name})
+    return stored
+
+
+def _delete_inputs(job: Job) -> None:
+    for items in job.payload.get("files", {}).values():
+        for item in items:
+            try:
+                default_storage.delete(item["path"])
+            except OSError:
+                logger.warning("No se pudo borrar el archivo de entrada %s del job %s", item["path"], job.pk)
+
+
+def enqueue(kind: str, *, user=None, payload: dict | None = None, files: dict | None = None, max_attempts: int = 1) -> Job:
+    """Queue a job; uploaded ``files`` (field -> file or list of files) are copied to storage for the worker."""
+    if kind not in _HANDLERS:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    payload = dict(payload or {})
+    if files:
+        payload["files"] = _store_inputs(files)
+    return Job.objects.create(
+        kind=kind,
+        payload=payload,
+        max_attempts=max_attempts,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_next(worker: str) -> Job | None:
+    """Atomically move the oldest queued job to ``running`` for ``worker``.
+
+    The compare-and-set ``UPDATE ... WHERE status='queued'`` works the same on SQLite
+    and Postgres, so two workers never run the same job.
+    """
+    candidates = list(
+        Job.objects.filter(status=Job.Status.QUEUED).order_by("created_at", "id").values_list("id", flat=True)[:CLAIM_CANDIDATES]
+    )
+    for job_id in candidates:
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=job_id, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.select_related("created_by").get(pk=job_id)
+    return None
+
+
+def _finish(job: Job, status: str, **fields) -> None:
+    Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(
+        status=status,
+        finished_at=timezone.now(),
+        heartbeat_at=timezone.now(),
+        **fields,
+    )
+
+
+def run_job(job: Job) -> None:
+    handler = _HANDLERS.get(job.kind)
+    if handler is None:
+        _finish(job, Job.Status.FAILED, error=f"Tipo de trabajo desconocido: {job.kind}")
+        _delete_inputs(job)
+        return
+    try:
+        result = handler(JobContext(job))
+    except JobError as exc:
+        _finish(job, Job.Status.FAILED, error=str(exc))
+    except Exception:
+        logger.exception("Error ejecutando job %s (%s)", job.pk, job.kind)
+        if job.attempts < job.max_attempts:
+            Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING).update(status=Job.Status.QUEUED, worker="")
+            return
+        _finish(job, Job.Status.FAILED, error="Error inesperado procesando el trabajo.")
+    else:
+        _finish(job, Job.Status.SUCCEEDED, result=result, progress=100, progress_message="")
+    _delete_inputs(job)
+
+
+def run_pending_jobs(worker: str | None = None, *, limit: int | None = None) -> int:
+    """Run queued jobs in this process until the queue is empty (or ``limit`` jobs ran)."""
+    worker = worker or worker_name()
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next(worker)
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def work_loop(worker: str, stop_event, poll_interval: float) -> None:
+    while not stop_event.is_set():
+        close_old_connections()
+        job = claim_next(worker)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+
+
+def requeue_stale_jobs(stale_after: timedelta) -> int:
+    """Recover jobs whose worker stopped sending heartbeats (killed process, lost host)."""
+    cutoff = timezone.now() - stale_after
+    stale = Job.objects.filter(status=Job.Status.RUNNING, heartbeat_at__lt=cutoff)
+    requeued = stale.filter(attempts__lt=F("max_attempts")).update(status=Job.Status.QUEUED, worker="")
+    failed_jobs = list(stale.filter(attempts__gte=F("max_attempts")))
+    for job in failed_jobs:
+        _finish(job, Job.Status.FAILED, error="El proceso dejo de responder.")
+        _delete_inputs(job)
+    return requeued + len(failed_jobs)
+
+
+def purge_finished_jobs(older_than: timedelta) -> int:
+    cutoff = timezone.now() - older_than
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.Status.SUCCEEDED, Job.Status.FAILED],
+        finished_at__lt=cutoff,
+    ).delete()
+    return deleted
+
+
+def run_due_periodic_tasks() -> list[str]:
+    """Run the periodic tasks whose interval has elapsed in this process; returns their names.
+
+    Tasks must be idempotent: every ``run_workers`` supervisor runs its own schedule.
+    """
+    now = time.monotonic()
+    ran = []
+    for name, (every, func) in _PERIODIC.items():
+        last = _periodic_last_run.get(name)
+        if last is not None and now - last < every.total_seconds():
+            continue
+        _periodic_last_run[name] = now
+        try:
+            func()
+        except Exception:
+            logger.exception("Error ejecutando la tarea periodica %s", name)
+        ran.append(name)
+    return ran
+
+
+def serialize_job(job: Job) -> dict:
+    return {
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "finished": job.is_finished,
+        "progress": job.progress,
+        "message": job.progress_message,
+        "result": job.result if job.status == Job.Status.SUCCEEDED else None,
+        "error": job.error if job.status == Job.Status.FAILED else "",
+    }
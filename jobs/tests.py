@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.services import JobError
+from jobs.services import _HANDLERS
+from jobs.services import claim_next
+from jobs.services import _periodic_last_run
+from jobs.services import enqueue
+from jobs.services import periodic
+from jobs.services import register
+from jobs.services import requeue_stale_jobs
+from jobs.services import run_due_periodic_tasks
+from jobs.services import run_pending_jobs
+
+User = get_user_model()
+
+
+@register("tests.echo")
+def _echo(ctx):
+    files = ctx.open_files("upload")
+    ctx.progress(50, "mitad")
+    contents = []
+    for file_obj in files:
+        with file_obj:
+            contents.append(file_obj.read().decode())
+    if ctx.payload.get("fail"):
+        raise JobError("Fallo controlado.")
+    if ctx.payload.get("crash"):
+        raise RuntimeError("boom")
+    return {"value": ctx.payload.get("value"), "contents": contents, "user": ctx.user.username if ctx.user else ""}
+
+
+_ticks: list[str] = []
+
+
+@periodic("tests.tick", every=timedelta(hours=1))
+def _tick():
+    _ticks.append("tick")
+    raise RuntimeError("los errores se registran y no cortan el resto")
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="job_owner", password="secretpass123")
+
+    def test_enqueue_rejects_unknown_kind(self):
+        self.assertNotIn("tests.missing", _HANDLERS)
+        with self.assertRaises(ValueError):
+            enqueue("tests.missing")
+
+    def test_job_runs_with_uploaded_files_and_cleans_them_up(self):
+        job = enqueue(
+            "tests.echo",
+            user=self.user,
+            payload={"value": 7},
+            files={"upload": SimpleUploadedFile("nota.txt", b"hola")},
+        )
+        stored_path = job.payload["files"]["upload"][0]["path"]
+        self.assertTrue(default_storage.exists(stored_path))
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.SUCCEEDED)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.result, {"value": 7, "contents": ["hola"], "user": "job_owner"})
+        self.assertFalse(default_storage.exists(stored_path))
+
+    def test_claim_is_exclusive(self):
+        job = enqueue("tests.echo")
+        self.assertEqual(claim_next("worker-a").pk, job.pk)
+        self.assertIsNone(claim_next("worker-b"))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.Status.RUNNING, "worker-a"))
+
+    def test_failures_record_errors_and_retry_until_max_attempts(self):
+        expected = enqueue("tests.echo", payload={"fail": True})
+        crashing = enqueue("tests.echo", payload={"crash": True}, max_attempts=2)
+        with self.assertLogs("jobs.services", level="ERROR"):
+            self.assertEqual(run_pending_jobs(), 3)
+        expected.refresh_from_db()
+        crashing.refresh_from_db()
+        self.assertEqual((expected.status, expected.error), (Job.Status.FAILED, "Fallo controlado."))
+        self.assertEqual(crashing.status, Job.Status.FAILED)
+        self.assertEqual(crashing.attempts, 2)
+        self.assertEqual(crashing.error, "Error inesperado procesando el trabajo.")
+
+    def test_stale_running_jobs_are_recovered(self):
+        retry = enqueue("tests.echo", max_attempts=2)
+        give_up = enqueue("tests.echo")
+        claim_next("lost-worker")
+        claim_next("lost-worker")
+        Job.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=10)), 2)
+        retry.refresh_from_db()
+        give_up.refresh_from_db()
+        self.assertEqual(retry.status, Job.Status.QUEUED)
+        self.assertEqual(give_up.status, Job.Status.FAILED)
+
+    def test_status_endpoint_is_private_to_owner(self):
+        job = enqueue("tests.echo", user=self.user, payload={"value": 1})
+        url = reverse("jobs:job_status", args=[job.pk])
+        User.objects.create_user(username="job_other", password="secretpass123")
+        self.client.login(username="job_other", password="secretpass123")
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.login(username="job_owner", password="secretpass123")
+        queued = self.client.get(url).json()
+        self.assertEqual((queued["status"], queued["finished"], queued["result"]), ("queued", False, None))
+        run_pending_jobs()
+        done = self.client.get(url).json()
+        self.assertEqual((done["status"], done["finished"], done["result"]["value"]), ("succeeded", True, 1))
+
+    def test_run_workers_once_drains_queue(self):
+        enqueue("tests.echo")
+        enqueue("tests.echo")
+        call_command("run_workers", "--once", stdout=StringIO())
+        self.assertFalse(Job.objects.exclude(status=Job.Status.SUCCEEDED).exists())
+
+    def test_periodic_tasks_run_once_per_interval(self):
+        _periodic_last_run.pop("tests.tick", None)
+        _ticks.clear()
+        with self.assertLogs("jobs.services", level="ERROR"):
+            self.assertIn("tests.tick", run_due_periodic_tasks())
+        self.assertNotIn("tests.tick", run_due_periodic_tasks())
+        self.assertEqual(_ticks, ["tick"])
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from jobs import views
+
+app_name = "jobs"
+
+urlpatterns = [
+    path("api/jobs/<int:job_id>/", views.job_status, name="job_status"),
+]
@@ -0,0 +1,17 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
+
+from jobs.models import Job
+from jobs.services import serialize_job
+
+
+@login_required
+@require_http_methods(["GET"])
+def job_status(request, job_id: int):
+    job = get_object_or_404(Job, pk=job_id)
+    if job.created_by_id != request.user.id and not request.user.is_superuser:
+        raise Http404
+    return JsonResponse(serialize_job(job))
@@ -0,0 +1,22 @@
+"""Entry point of the ``run_workers`` child processes.
+
+Kept free of model imports at module level so it also works with the ``spawn``
+start method (Windows, macOS), where the child has to set Django up itself.
+"""
+
+
+def worker_main(index: int, stop_event, poll_interval: float) -> None:
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+    from jobs.services import work_loop
+    from jobs.services import worker_name
+
+    try:
+        work_loop(f"{worker_name()}#{index}", stop_event, poll_interval)
+    except KeyboardInterrupt:
+        # Ctrl+C llega a todo el grupo de procesos; el padre coordina la parada.
+        pass
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     "inventory",
     "finance",
     "rewards",
+    "jobs",
     "dashboard",
     "allauth",
     "allauth.account",
@@ -75,6 +76,15 @@ DATABASES = {
     }
 }
 
+# Por omision el cache es local a cada proceso; DJANGO_CACHE_BACKEND/LOCATION lo comparten entre web y workers
+# (p. ej. django.core.cache.backends.redis.RedisCache con redis://localhost:6379/1).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", ""),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -117,6 +127,31 @@ ACCOUNT_EMAIL_VERIFICATION = "none"
 EMAIL_BACKEND = os.getenv("DJANGO_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 DEFAULT_FROM_EMAIL = os.getenv("DJANGO_DEFAULT_FROM_EMAIL", "no-reply@onegroup.local")
 
+# Limite del cache de extraccion de facturas (dashboard.InvoiceExtractionCache); se desaloja por LRU.
+INVOICE_EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("INVOICE_EXTRACTION_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# OCR de facturas (dashboard.services.ocr_service): procesos del pool, peticiones simultaneas por proceso web y limite por peticion.
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+OCR_MAX_CONCURRENT_REQUESTS = int(os.getenv("OCR_MAX_CONCURRENT_REQUESTS", "2"))
+OCR_REQUEST_TIMEOUT_SECONDS = float(os.getenv("OCR_REQUEST_TIMEOUT_SECONDS", "30"))
+
+# Cada cuanto el supervisor de run_workers libera leads con la ventana de aceptacion vencida.
+LEAD_ACCEPTANCE_SWEEP_SECONDS = int(os.getenv("LEAD_ACCEPTANCE_SWEEP_SECONDS", "60"))
+
+# PNG de codigos QR ya dibujados (dashboard.services.qr_service); se purgan los que nadie pidio en QR_CACHE_MAX_AGE_DAYS.
+QR_CACHE_DIR = Path(os.getenv("QR_CACHE_DIR", str(BASE_DIR / "var" / "qr")))
+QR_CACHE_MAX_AGE_DAYS = int(os.getenv("QR_CACHE_MAX_AGE_DAYS", "30"))
+
+# Caches de Mi Equipo y del grafo de jerarquia: se versionan con core.cache_generations, el TTL es solo un tope
+# para cambios que no pasan por signals. Es largo solo con un cache compartido; en memoria de cada proceso, 2 minutos.
+TEAM_CACHE_TTL_SECONDS = int(
+    os.getenv("TEAM_CACHE_TTL_SECONDS", str(120 if CACHES["default"]["BACKEND"].endswith("LocMemCache") else 6 * 60 * 60))
+)
+
+# Bitacora de actividad de leads: lo mas viejo que LEAD_ACTIVITY_RETENTION_DAYS se mueve a JSONL comprimido.
+LEAD_ACTIVITY_RETENTION_DAYS = int(os.getenv("LEAD_ACTIVITY_RETENTION_DAYS", "180"))
+LEAD_ACTIVITY_ARCHIVE_DIR = Path(os.getenv("LEAD_ACTIVITY_ARCHIVE_DIR", str(BASE_DIR / "var" / "lead_activity")))
+
 ENERGY_ADVISOR_URL = os.getenv("ENERGY_ADVISOR_URL", "#")
 QUOTER_URL = os.getenv("QUOTER_URL", "#")
 SUNRUN_ACCESS_URL = os.getenv("SUNRUN_ACCESS_URL", "#")